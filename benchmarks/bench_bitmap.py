@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A benchmark of object enumeration with and without reachability bitmaps.
+A synthetic history is written: a work tree of many files in directories,
+each commit changing a few of them. The objects reachable from the tip, and
+from the tip but not from random older commits, are then counted by
+walking every tree, and again with the bitmap file.
+Usage:
+    python -m benchmarks.bench_bitmap [--commits N] [--dirs N] [--files N]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from src.dit_commands.bitmap import write_bitmap
+from src.dit_commands.hash_object import hash_object
+from src.objects import read_bitmap
+from src.repos.create_repo import create_repo
+
+
+def write_tree(repo, entries):
+    """Write a tree of (mode, name, hex sha) entries, returning its sha."""
+    # git sorts a sub-tree under its name followed by a slash:
+    entries = sorted(entries, key=lambda entry: entry[1] + (
+        "/" if entry[0] == "40000" else ""))
+    data = b"".join(f"{mode} {name}".encode() + b"\x00" + bytes.fromhex(sha)
+                    for mode, name, sha in entries)
+    return hash_object(repo, data, "tree")
+
+
+def write_commit(repo, tree, parents, date):
+    """Write a commit, returning its sha."""
+    lines = [f"tree {tree}"]
+    lines += [f"parent {parent}" for parent in parents]
+    lines += [f"author A U Thor <author@example.com> {date} +0000",
+              f"committer C O Mitter <committer@example.com> {date} +0000",
+              "", f"commit {date}", ""]
+    return hash_object(repo, "\n".join(lines).encode(), "commit")
+
+
+def make_synthetic_history(path, commits, dirs, files, changes=2, seed=0):
+    """Create a repository with a linear history, each commit changing a few
+    files of a work tree of dirs directories of files files each.
+    Returns:
+        A (repo, shas) tuple, shas listing the commits oldest first.
+    """
+    rng = random.Random(seed)
+    repo = create_repo(path)
+    blobs = [[hash_object(repo, f"{d}/{f} 0\n".encode(), "blob")
+              for f in range(files)] for d in range(dirs)]
+    subtrees = [write_tree(repo, [("100644", f"file{f}", blobs[d][f])
+                                  for f in range(files)])
+                for d in range(dirs)]
+    date = 1500000000
+    shas = []
+    for index in range(commits):
+        for _ in range(changes):
+            d = rng.randrange(dirs)
+            f = rng.randrange(files)
+            blobs[d][f] = hash_object(repo, f"{d}/{f} {index}\n".encode(),
+                                      "blob")
+            subtrees[d] = write_tree(repo, [
+                ("100644", f"file{g}", blobs[d][g]) for g in range(files)])
+        root = write_tree(repo, [("40000", f"dir{d}", subtrees[d])
+                                 for d in range(dirs)])
+        date += rng.randint(30, 3600)
+        shas.append(write_commit(repo, root, shas[-1:], date))
+    return repo, shas
+
+
+def timed(step):
+    """Run a step, returning its result and how long it took."""
+    start = time.perf_counter()
+    result = step()
+    return result, time.perf_counter() - start
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--commits", type=int, default=5000)
+    parser.add_argument("--dirs", type=int, default=50)
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="dit-bench-")
+    try:
+        (repo, shas), elapsed = timed(lambda: make_synthetic_history(
+            workdir + "/repo", args.commits, args.dirs, args.files))
+        print(f"{len(shas)} commits written in {elapsed:.1f} s")
+        rng = random.Random(1)
+        bases = [shas[rng.randrange(len(shas))] for _ in range(args.queries)]
+
+        results = {}
+        for label in ("walk", "bitmap"):
+            if label == "bitmap":
+                (count, bitmaps), elapsed = timed(
+                    lambda: write_bitmap(repo, [shas[-1]]))
+                size = os.path.getsize(read_bitmap.bitmap_path(repo))
+                print(f"bitmap file written in {elapsed:.1f} s: {count} "
+                      f"objects, {bitmaps} bitmaps, {size / 1024:.0f} KiB")
+            read_bitmap.invalidate_bitmap(repo)
+            bitmap = read_bitmap.reachability_bitmap(repo)
+            repo.object_cache.clear()
+
+            everything, elapsed = timed(lambda: read_bitmap.reachable_objects(
+                repo, [shas[-1]], bitmap))
+            print(f"{label:>6}: {len(everything)} objects reachable from the "
+                  f"tip, counted in {elapsed * 1e3:.1f} ms")
+            latencies = []
+            counts = []
+            for base in bases:
+                def count_range(base=base):
+                    tip = read_bitmap.reachable_objects(repo, [shas[-1]],
+                                                        bitmap)
+                    return len(tip.difference(read_bitmap.reachable_objects(
+                        repo, [base], bitmap)))
+                count, elapsed = timed(count_range)
+                counts.append(count)
+                latencies.append(elapsed)
+            results[label] = counts
+            print(f"{label:>6}: <base>..<tip> counted in "
+                  f"{statistics.median(latencies) * 1e3:.1f} ms (p50), "
+                  f"{max(latencies) * 1e3:.1f} ms (max)")
+        if results["walk"] != results["bitmap"]:
+            print("error: the walk and the bitmaps disagree")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
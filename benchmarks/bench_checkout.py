@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A benchmark of switching a large work tree between two close trees.
+The trees of a work tree of many small files are written before and after
+a few of the files change; the first tree is then checked out into an
+empty work tree (every file written), and the second one over it (only the
+files that differ written).
+Usage:
+    python -m benchmarks.bench_checkout [--files N] [--changed N] [--jobs N]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+
+from benchmarks.bench_status import make_workdir, timed
+from src.dit_commands.hash_tree import hash_tree
+from src.dit_commands.read_tree import CheckoutStats, checkout_tree
+from src.repos.create_repo import create_repo
+from src.repos.index_class import GitIndex
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--files", type=int, default=100000)
+    parser.add_argument("--per-dir", type=int, default=100)
+    parser.add_argument("--changed", type=int, default=100)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="dit-bench-")
+    try:
+        repo = create_repo(workdir + "/repo")
+        make_workdir(repo.workdir, args.files, args.per_dir)
+        old_tree = hash_tree(repo, write=True, jobs=args.jobs)
+        step = max(1, args.files // args.changed)
+        for number in range(0, args.files, step):
+            path = os.path.join(repo.workdir, f"dir{number // args.per_dir}",
+                                f"file{number}")
+            with open(path, "ab") as f:
+                f.write(b"changed\n")
+        new_tree = hash_tree(repo, write=True, jobs=args.jobs)
+        print(f"{args.files} files, {len(range(0, args.files, step))} "
+              "changed between the trees")
+
+        for name in os.listdir(repo.workdir):
+            if name != ".git":
+                shutil.rmtree(os.path.join(repo.workdir, name))
+        index = GitIndex()
+        for tree, what in ((old_tree, "full checkout"),
+                           (new_tree, "switch")):
+            stats = CheckoutStats()
+            _, elapsed = timed(lambda tree=tree, stats=stats: checkout_tree(
+                repo, index, tree, jobs=args.jobs, stats=stats))
+            print(f"{what}: {stats.written} files written, {stats.removed} "
+                  f"removed in {elapsed:.2f} s ({args.jobs} processes)")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A benchmark of dit fsck across a growing number of processes.
+A synthetic repository is half packed and half left loose, then every
+object is verified with 1, 2, 4, ... processes up to --jobs, reporting the
+objects checked per second and the speedup over a single process.
+Usage:
+    python -m benchmarks.bench_fsck [--files N] [--revisions N] [--jobs N]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.bench_repack import make_synthetic_repo
+from src.dit_commands.fsck import check_objects
+from src.dit_commands.repack import repack
+from src.repos.repo_paths import git_file_path
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--revisions", type=int, default=40)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="dit-bench-")
+    try:
+        repo = make_synthetic_repo(os.path.join(workdir, "repo"), args.files,
+                                   args.revisions // 2)
+        repack(repo, delete=True)
+        # the objects of other revisions, left loose:
+        loose = make_synthetic_repo(os.path.join(workdir, "loose"),
+                                    args.files,
+                                    args.revisions - args.revisions // 2,
+                                    seed=1)
+        shutil.copytree(git_file_path(loose, "objects"),
+                        git_file_path(repo, "objects"), dirs_exist_ok=True)
+
+        print(f"{'jobs':>4} {'objects':>8} {'seconds':>8} {'objects/s':>10} "
+              f"{'speedup':>7}")
+        counts = sorted({2 ** power for power in range(args.jobs.bit_length())
+                         } | {args.jobs})
+        single = None
+        for jobs in counts:
+            start = time.perf_counter()
+            objects, errors = check_objects(repo, jobs)
+            elapsed = time.perf_counter() - start
+            if errors:
+                raise SystemExit("\n".join(errors))
+            single = single or elapsed
+            print(f"{jobs:>4} {len(objects):>8} {elapsed:>8.2f} "
+                  f"{len(objects) / elapsed:>10.0f} "
+                  f"{single / elapsed:>6.2f}x")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
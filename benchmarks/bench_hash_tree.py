@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A benchmark of the phases of hash-tree on a large work tree.
+The tree of a work tree of many small files is computed without an index
+(every file hashed), with one thread and one process and then with pools,
+and again once the index knows every file.
+Usage:
+    python -m benchmarks.bench_hash_tree [--files N] [--per-dir N]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+
+from benchmarks.bench_status import make_workdir
+from src.dit_commands.add import add_paths
+from src.dit_commands.hash_tree import HashTreeStats, hash_tree
+from src.repos.create_repo import create_repo
+from src.repos.index_class import read_index, write_index
+
+
+def run(repo, label, jobs, threads):
+    """Compute the tree of the work tree, printing the time of each phase.
+    """
+    stats = HashTreeStats()
+    sha = hash_tree(repo, jobs=jobs, threads=threads, stats=stats)
+    phases = ", ".join(f"{phase} {seconds:.2f} s"
+                       for phase, seconds in stats.times.items())
+    print(f"{label}: {phases} ({stats.hashed} hashed)")
+    return sha
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--files", type=int, default=100000)
+    parser.add_argument("--per-dir", type=int, default=100)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="dit-bench-")
+    try:
+        repo = create_repo(workdir + "/repo")
+        make_workdir(repo.workdir, args.files, args.per_dir)
+        shas = {run(repo, "serial, no index", 1, 1),
+                run(repo, f"{args.jobs} processes, {args.threads} threads, "
+                    "no index", args.jobs, args.threads)}
+        index = read_index(repo)
+        add_paths(repo, index, [b""], args.jobs)
+        write_index(repo, index)
+        shas.add(run(repo, "with the index", args.jobs, args.threads))
+        if len(shas) != 1:
+            print("error: the trees differ")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
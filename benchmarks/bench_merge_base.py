@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A benchmark of merge-base and is-ancestor queries on a long history.
+A synthetic history is written: a main line of commits, with a short side
+branch forking off and merged back every few commits. Random pairs of
+commits are then queried with is_ancestor and merge_bases, without and with
+a commit-graph, first cold and then again with the per-process memo warm.
+Usage:
+    python -m benchmarks.bench_merge_base [--commits N] [--queries N]
+"""
+
+import argparse
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from src.dit_commands import merge_base
+from src.dit_commands.commit_graph import write_commit_graph
+from src.dit_commands.hash_object import hash_object
+from src.objects import read_commit
+from src.repos.create_repo import create_repo
+
+EMPTY_TREE = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+
+
+def write_commit(repo, parents, date, message):
+    """Write a commit of the empty tree, returning its sha."""
+    lines = [f"tree {EMPTY_TREE}"]
+    lines += [f"parent {parent}" for parent in parents]
+    lines += [f"author A U Thor <author@example.com> {date} +0000",
+              f"committer C O Mitter <committer@example.com> {date} +0000",
+              "", message, ""]
+    return hash_object(repo, "\n".join(lines).encode(), "commit")
+
+
+def make_synthetic_history(path, commits, merge_every=20, branch_length=4,
+                           seed=0):
+    """Create a repository holding a main line of commits, with a side
+    branch forked off and merged back every merge_every commits.
+    Args:
+        path: where to create the repository.
+        commits: the number of commits (about).
+        merge_every: how often a side branch is merged.
+        branch_length: the number of commits of each side branch.
+        seed: the random seed.
+    Returns:
+        A (repo, shas) tuple, shas listing every commit written.
+    """
+    rng = random.Random(seed)
+    repo = create_repo(path)
+    hash_object(repo, b"", "tree")
+    date = 1500000000
+    main = []
+    shas = []
+    while len(shas) < commits:
+        date += rng.randint(30, 3600)
+        parents = main[-1:]
+        if len(main) > merge_every and len(main) % merge_every == 0:
+            # a side branch forking off a few commits back, merged here:
+            side = main[-rng.randint(2, merge_every)]
+            for index in range(branch_length):
+                side = write_commit(repo, [side], date - branch_length + index,
+                                    f"side {len(shas)}")
+                shas.append(side)
+            parents.append(side)
+        main.append(write_commit(repo, parents, date, f"main {len(shas)}"))
+        shas.append(main[-1])
+    return repo, shas
+
+
+def run_queries(repo, pairs, query):
+    """Run a query over pairs of commits, returning the latencies."""
+    latencies = []
+    for one, two in pairs:
+        start = time.perf_counter()
+        query(repo, one, two)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(name, latencies):
+    """Print the throughput and latency percentiles of a run."""
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"{name:<34} {len(latencies) / sum(latencies):>10.0f} "
+          f"{statistics.median(ordered) * 1e3:>9.3f} {p99 * 1e3:>9.3f}")
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--commits", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--distance", type=int, default=2000,
+                        help="the largest distance, in commits, between the "
+                        "two commits of a query")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="dit-bench-")
+    try:
+        start = time.perf_counter()
+        repo, shas = make_synthetic_history(workdir + "/repo", args.commits)
+        print(f"{len(shas)} commits written in "
+              f"{time.perf_counter() - start:.1f} s")
+
+        rng = random.Random(1)
+        pairs = []
+        for _ in range(args.queries):
+            one = rng.randrange(len(shas))
+            two = min(len(shas) - 1, one + rng.randint(0, args.distance))
+            pairs.append((shas[one], shas[two]))
+
+        queries = [
+            ("is-ancestor", lambda r, a, b: merge_base.is_ancestor(r, a, b)),
+            ("merge-base", lambda r, a, b: merge_base.merge_bases(r, a, [b])),
+        ]
+        print(f"{'query':<34} {'ops/sec':>10} {'p50 ms':>9} {'p99 ms':>9}")
+        for graph in (False, True):
+            if graph:
+                start = time.perf_counter()
+                write_commit_graph(repo, [shas[-1]])
+                print(f"commit-graph written in "
+                      f"{time.perf_counter() - start:.1f} s")
+            read_commit.invalidate_commit_graph(repo)
+            label = "graph" if graph else "objects"
+            for name, query in queries:
+                merge_base.clear_memo()
+                repo.object_cache.clear()
+                report(f"{name} ({label}, cold)",
+                       run_queries(repo, pairs, query))
+                report(f"{name} ({label}, memoized)",
+                       run_queries(repo, pairs, query))
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
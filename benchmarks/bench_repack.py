@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A benchmark of dit repack on a synthetic repository.
+A repository is filled with loose blobs and trees for several revisions of
+a set of text files, then packed with a few window/depth settings. The
+pack size and the wall time of each run are reported.
+Usage:
+    python -m benchmarks.bench_repack [--files N] [--revisions N]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from src.dit_commands.hash_object import hash_object
+from src.dit_commands.repack import repack
+from src.objects.find_object import loose_object_shas
+from src.repos.create_repo import create_repo
+from src.repos.gitrepo_class import GitRepo
+from src.repos.repo_paths import git_file_path
+
+
+def make_synthetic_repo(path, files, revisions, seed=0):
+    """Create a repository holding every revision of a set of text files,
+    each revision changing a few lines of a few files.
+    Args:
+        path: where to create the repository.
+        files: the number of files.
+        revisions: the number of revisions.
+        seed: the random seed.
+    Returns:
+        The git repository.
+    """
+    rng = random.Random(seed)
+    repo = create_repo(path)
+    contents = [
+        [f"line {line} of file {index}: {rng.random()}\n"
+         for line in range(rng.randint(20, 400))]
+        for index in range(files)]
+
+    for _ in range(revisions):
+        entries = []
+        for index, lines in enumerate(contents):
+            if rng.random() < 0.3:
+                for _ in range(rng.randint(1, 5)):
+                    lines[rng.randrange(len(lines))] = f"edit {rng.random()}\n"
+            sha = hash_object(repo, "".join(lines).encode(), "blob")
+            entries.append((f"file{index}.txt".encode(), sha))
+        tree = b"".join(b"100644 " + name + b"\x00" + bytes.fromhex(sha)
+                        for name, sha in sorted(entries))
+        hash_object(repo, tree, "tree")
+    return repo
+
+
+def directory_size(path):
+    """Return the total size of the files under a directory."""
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--revisions", type=int, default=20)
+    args = parser.parse_args()
+
+    settings = [(0, 0), (10, 50), (50, 50)]
+    workdir = tempfile.mkdtemp(prefix="dit-bench-")
+    try:
+        template = os.path.join(workdir, "template")
+        repo = make_synthetic_repo(template, args.files, args.revisions)
+        count = len(list(loose_object_shas(repo)))
+        loose = directory_size(git_file_path(repo, "objects"))
+        print(f"{count} loose objects, {loose} bytes")
+        print(f"{'window':>6} {'depth':>5} {'pack bytes':>12} {'seconds':>8}")
+
+        for window, depth in settings:
+            path = os.path.join(workdir, f"w{window}d{depth}")
+            shutil.copytree(template, path)
+            copy = GitRepo(path)
+            start = time.perf_counter()
+            repack(copy, window, depth, delete=True)
+            elapsed = time.perf_counter() - start
+            size = directory_size(git_file_path(copy, "objects", "pack"))
+            print(f"{window:>6} {depth:>5} {size:>12} {elapsed:>8.3f}")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A benchmark of dit commands run through the daemon.
+The same commands, as a git hook would run them, are timed as separate
+dit processes, first in process, then forwarded to a dit serve daemon
+started on a private socket.
+Usage:
+    python -m benchmarks.bench_serve [--runs N]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_repack import make_synthetic_repo
+from src.client import request
+
+# the dit script, run as a hook would:
+DIT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))), "dit")
+
+
+def run_commands(commands, cwd, env, runs):
+    """Run each command runs times, returning the mean wall time of a run."""
+    start = time.perf_counter()
+    for _ in range(runs):
+        for command in commands:
+            subprocess.run([sys.executable, DIT] + command, cwd=cwd, env=env,
+                           stdout=subprocess.DEVNULL, check=True)
+    return (time.perf_counter() - start) / (runs * len(commands))
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="dit-bench-")
+    socket_file = os.path.join(workdir, "dit.sock")
+    env = dict(os.environ, DIT_SOCKET=socket_file)
+    daemon = None
+    try:
+        repo = make_synthetic_repo(os.path.join(workdir, "repo"), 20, 2)
+        with open(os.path.join(repo.workdir, "file0.txt"), "wb") as f:
+            f.write(b"hello\n")
+        # an object named by a prefix of its sha, as hooks often do:
+        fanout = sorted(os.listdir(os.path.join(repo.dotgit, "objects")))[0]
+        name = fanout + os.listdir(os.path.join(repo.dotgit, "objects",
+                                                fanout))[0][:6]
+        commands = [["cat-file", "-t", name], ["cat-file", "-p", name],
+                    ["show-ref"], ["hash-object", "file0.txt"]]
+
+        alone = run_commands(commands, repo.workdir, env, args.runs)
+        daemon = subprocess.Popen(  # pylint: disable=consider-using-with
+            [sys.executable, DIT, "serve", "--socket", socket_file],
+            env=env, stderr=subprocess.DEVNULL)
+        while not os.path.exists(socket_file):
+            time.sleep(0.01)
+        forwarded = run_commands(commands, repo.workdir, env, args.runs)
+        print(f"in process: {alone * 1000:.1f} ms per command")
+        print(f"through the daemon: {forwarded * 1000:.1f} ms per command "
+              f"({alone / forwarded:.2f}x)")
+    finally:
+        if daemon is not None:
+            request({"op": "shutdown"}, socket_file)
+            daemon.wait()
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
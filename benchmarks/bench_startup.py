@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A benchmark of the cold start of dit, failing past a budget.
+dit show-ref is run in a new process under python -X importtime, with the
+daemon disabled, several times; the time spent importing what the dit
+script imports (the median of the runs) is compared with the budget, and
+the heaviest imports are listed, to tell what a regression came from.
+Exits with status 1 when the budget is exceeded.
+Usage:
+    python -m benchmarks.bench_startup [--runs N] [--budget MS] [--top N]
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from src.repos.create_repo import create_repo
+
+# the dit script:
+DIT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))), "dit")
+# the import time allowed to dit show-ref, in milliseconds:
+DEFAULT_BUDGET_MS = 40
+
+
+def parse_importtime(output):
+    """Parse the report of python -X importtime.
+    Returns:
+        The list of (module, self us, cumulative us, depth) tuples, in the
+        order of the report (a module after the ones it imported).
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us),
+                        depth))
+    return imports
+
+
+def startup(repo, command):
+    """Run a dit command under python -X importtime.
+    Returns:
+        A (dit imports in us, wall time in s, imports) tuple, the dit
+        imports being everything the dit script imported (the imports of
+        the interpreter itself, such as site, left out).
+    """
+    env = dict(os.environ, DIT_NO_DAEMON="1")
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", DIT] + command, cwd=repo.workdir,
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        check=True)
+    wall = time.perf_counter() - start
+    imports = parse_importtime(result.stderr)
+    total = sum(cumulative for name, _, cumulative, depth in imports
+                if depth == 0 and name.startswith("src"))
+    return total, wall, imports
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_MS,
+                        help="the import time allowed, in milliseconds")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="dit-bench-")
+    try:
+        repo = create_repo(workdir + "/repo")
+        # a first run writes the .pyc files, which later runs only load:
+        startup(repo, ["show-ref"])
+        runs = [startup(repo, ["show-ref"]) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(workdir)
+
+    median = statistics.median(total for total, _, _ in runs) / 1000
+    wall = statistics.median(wall for _, wall, _ in runs) * 1000
+    # the heaviest imports (by their own time) of the median run:
+    _, _, imports = sorted(runs, key=lambda run: run[0])[len(runs) // 2]
+    print(f"dit show-ref: {median:.1f} ms of imports, {wall:.1f} ms wall "
+          f"(median of {args.runs} runs), budget {args.budget:.0f} ms")
+    for name, self_us, _, _ in sorted(imports, key=lambda item: item[1],
+                                      reverse=True)[:args.top]:
+        print(f"{self_us / 1000:>8.2f} ms  {name}")
+    if median > args.budget:
+        print(f"startup budget exceeded: {median:.1f} ms > "
+              f"{args.budget:.0f} ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
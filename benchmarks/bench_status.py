@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A benchmark of the status of a large work tree.
+A work tree of many small files in directories is staged with dit add, then
+its status is computed with the stat cache (only lstat is called for each
+file), and again with every file hashed, as it would be without an index.
+Usage:
+    python -m benchmarks.bench_status [--files N] [--per-dir N]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from src.dit_commands.add import add_paths, hash_workdir_files
+from src.dit_commands.status import StatusStats, repo_status
+from src.repos.create_repo import create_repo
+from src.repos.index_class import read_index, write_index
+
+
+def make_workdir(path, files, per_dir):
+    """Write files small files, per_dir to a directory."""
+    for number in range(files):
+        directory = os.path.join(path, f"dir{number // per_dir}")
+        if number % per_dir == 0:
+            os.makedirs(directory)
+        with open(os.path.join(directory, f"file{number}"), "wb") as f:
+            f.write(f"file {number}\n".encode())
+
+
+def timed(step):
+    """Run a step, returning its result and how long it took."""
+    start = time.perf_counter()
+    result = step()
+    return result, time.perf_counter() - start
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--files", type=int, default=200000)
+    parser.add_argument("--per-dir", type=int, default=100)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="dit-bench-")
+    try:
+        repo = create_repo(workdir + "/repo")
+        _, elapsed = timed(lambda: make_workdir(repo.workdir, args.files,
+                                                args.per_dir))
+        print(f"{args.files} files written in {elapsed:.1f} s")
+        # the files must be older than the index, not to be racily clean:
+        past = time.time() - 10
+        for directory, dirs, names in os.walk(repo.workdir):
+            if ".git" in dirs:
+                dirs.remove(".git")
+            for name in names:
+                os.utime(os.path.join(directory, name), (past, past))
+        index = read_index(repo)
+        hashed, elapsed = timed(lambda: add_paths(repo, index, [b""],
+                                                  args.jobs))
+        write_index(repo, index)
+        print(f"dit add: {hashed} files hashed in {elapsed:.1f} s")
+
+        def status():
+            stats = StatusStats()
+            result = repo_status(repo, read_index(repo), stats)
+            return result, stats
+        (_, stats), elapsed = timed(status)
+        print(f"status: {stats.checked} files checked, {stats.hashed} "
+              f"hashed in {elapsed:.2f} s")
+
+        root = os.fsencode(repo.workdir)
+        files = [(entry.path, os.lstat(os.path.join(root, entry.path)))
+                 for entry in read_index(repo)]
+        _, elapsed = timed(lambda: hash_workdir_files(repo, files, False,
+                                                      args.jobs))
+        print(f"hashing every file instead: {elapsed:.2f} s "
+              f"({args.jobs} processes)")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A suite of micro-benchmarks of the object database, run on a synthetic
+repository.
+Each benchmark runs in a process of its own, so that its peak RSS is its
+own: the operations are timed one by one, after a few warm-up ones, and
+reported as operations per second and p50/p99 latencies. The results can
+be written as JSON and compared with those of an earlier run, the
+comparison failing (status 1) when a benchmark got slower than the
+threshold allows.
+Usage:
+    python -m benchmarks.bench_suite [--repo PATH] [--ops N] [--only NAME]
+        [--json FILE] [--compare FILE] [--threshold F] [generator options]
+"""
+
+import argparse
+import concurrent.futures
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic_repo import (add_generator_arguments, blob_data,
+                                       generate_repo, generator_options)
+from src.dit_commands.hash_object import hash_object
+from src.dit_commands.ls_tree import ls_tree
+from src.dit_commands.resolve_list_refs import invalidate_refs, list_refs
+from src.dit_commands.tree_parsing import tree_parse
+from src.objects.blob_object_class import BlobObject
+from src.objects.find_object import find_object, loose_object_shas
+from src.objects.read_object import read_object, read_raw_object
+from src.objects.read_pack import repo_packs
+from src.objects.write_object import write_object
+from src.repos.gitrepo_class import GitRepo
+
+# the operations run before the timed ones, to fill caches and indexes:
+WARMUP_OPS = 10
+# the fraction by which a benchmark may get slower before it is reported
+#  as a regression:
+DEFAULT_THRESHOLD = 0.10
+
+
+def all_objects(repo):
+    """Return the sorted shas of the objects of a repository, loose or
+    packed."""
+    shas = set(loose_object_shas(repo))
+    for pack in repo_packs(repo, rescan=True):
+        shas.update(pack.index.sha_at(pos).hex()
+                    for pos in range(pack.count))
+    return sorted(shas)
+
+
+def objects_of_type(repo, shas, object_format):
+    """Return the shas of the objects of a type."""
+    return [sha for sha in shas
+            if read_raw_object(repo, sha)[0] == object_format]
+
+
+def bench_read_object(repo, rng, ops):
+    """read_object of objects of every type, each read once."""
+    shas = all_objects(repo)
+    inputs = rng.sample(shas, min(ops + WARMUP_OPS, len(shas)))
+    return lambda sha: read_object(repo, sha), inputs
+
+
+def bench_hash_object(repo, rng, ops):
+    """hash_object of blobs sized as those of the repository, not written."""
+    inputs = [blob_data(rng, 2048, 1.0, 1 << 20, number)
+              for number in range(ops + WARMUP_OPS)]
+    return lambda data: hash_object(repo, data, "blob", False), inputs
+
+
+def bench_write_object(repo, rng, ops):
+    """write_object of new blobs."""
+    inputs = [BlobObject(repo, blob_data(rng, 2048, 1.0, 1 << 20,
+                                         -1 - number))
+              for number in range(ops + WARMUP_OPS)]
+    return write_object, inputs
+
+
+def bench_tree_parse(repo, rng, ops):
+    """tree_parse of trees already read."""
+    trees = objects_of_type(repo, all_objects(repo), b"tree")
+    inputs = [read_raw_object(repo, sha)[1]
+              for sha in rng.choices(trees, k=ops + WARMUP_OPS)]
+    return tree_parse, inputs
+
+
+def bench_list_refs(repo, rng, ops):  # pylint: disable=unused-argument
+    """list_refs, the refs read again (from a new snapshot) every time."""
+    def operation(_):
+        invalidate_refs(repo)
+        return list_refs(repo)
+    return operation, range(ops + WARMUP_OPS)
+
+
+def bench_find_object(repo, rng, ops):
+    """find_object of 7 digit sha prefixes."""
+    shas = all_objects(repo)
+    inputs = [sha[:7] for sha in rng.choices(shas, k=ops + WARMUP_OPS)]
+    return lambda prefix: find_object(repo, prefix), inputs
+
+
+def bench_ls_tree_recursive(repo, rng, ops):
+    """ls_tree -r of the root trees of commits."""
+    commits = objects_of_type(repo, all_objects(repo), b"commit")
+    inputs = [read_object(repo, read_raw_object(repo, sha)[1][5:45].decode())
+              for sha in rng.choices(commits, k=max(1, ops // 10) +
+                                     WARMUP_OPS)]
+    return lambda tree: ls_tree(repo, tree, True, io.BytesIO()), inputs
+
+
+BENCHMARKS = {
+    "read_object": bench_read_object,
+    "hash_object": bench_hash_object,
+    "write_object": bench_write_object,
+    "tree_parse": bench_tree_parse,
+    "list_refs": bench_list_refs,
+    "find_object": bench_find_object,
+    "ls_tree_r": bench_ls_tree_recursive,
+}
+
+
+def percentile(sorted_values, fraction):
+    """Return a percentile of sorted values (the nearest rank)."""
+    if not sorted_values:
+        return 0
+    rank = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[rank]
+
+
+def run_benchmark(name, workdir, ops, seed):
+    """Run a benchmark, in the process of its own it is meant to run in.
+    Returns:
+        The dictionary of its results.
+    """
+    repo = GitRepo(workdir)
+    operation, inputs = BENCHMARKS[name](repo, random.Random(seed), ops)
+    inputs = list(inputs)
+    for item in inputs[:WARMUP_OPS]:
+        operation(item)
+    latencies = []
+    perf_counter_ns = time.perf_counter_ns
+    start = perf_counter_ns()
+    for item in inputs[WARMUP_OPS:]:
+        op_start = perf_counter_ns()
+        operation(item)
+        latencies.append(perf_counter_ns() - op_start)
+    elapsed = (perf_counter_ns() - start) / 1e9
+    latencies.sort()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, in kilobytes elsewhere:
+    if sys.platform == "darwin":
+        peak_rss //= 1024
+    return {
+        "ops": len(latencies),
+        "seconds": round(elapsed, 6),
+        "ops_per_sec": round(len(latencies) / elapsed, 1) if elapsed else 0,
+        "p50_us": round(percentile(latencies, 0.50) / 1000, 2),
+        "p99_us": round(percentile(latencies, 0.99) / 1000, 2),
+        "peak_rss_kb": peak_rss,
+    }
+
+
+def run_suite(workdir, names, ops, seed):
+    """Run benchmarks, each in a new process.
+    Returns:
+        The {name: results} dictionary of the benchmarks.
+    """
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for name in names:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=1, mp_context=context) as executor:
+            results[name] = executor.submit(run_benchmark, name, workdir,
+                                            ops, seed).result()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Compare results with those of an earlier run.
+    Returns:
+        The lines of the comparison, and the names of the benchmarks that
+        regressed: fewer operations per second, or a higher p99 latency,
+        than the threshold allows.
+    """
+    lines = []
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get("benchmarks", {}).get(name)
+        if old is None:
+            lines.append(f"{name:<14} (not in the baseline)")
+            continue
+        speed = result["ops_per_sec"] / old["ops_per_sec"] \
+            if old["ops_per_sec"] else 1.0
+        tail = result["p99_us"] / old["p99_us"] if old["p99_us"] else 1.0
+        regressed = speed < 1 - threshold or tail > 1 + threshold
+        if regressed:
+            regressions.append(name)
+        lines.append(f"{name:<14} ops/s {speed - 1:>+7.1%}  p99 "
+                     f"{tail - 1:>+7.1%}{'  REGRESSION' if regressed else ''}")
+    return lines, regressions
+
+
+def main():
+    """Run the benchmark suite."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--repo", help="benchmark an existing repository "
+                        "instead of generating one")
+    parser.add_argument("--ops", type=int, default=2000,
+                        help="the operations timed per benchmark")
+    parser.add_argument("--only", action="append", choices=list(BENCHMARKS),
+                        help="run only that benchmark (repeatable)")
+    parser.add_argument("--json", metavar="FILE",
+                        help="write the results as JSON to the file "
+                        "('-' for stdout)")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="compare with the JSON results of an earlier run")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="the slowdown allowed before a regression is "
+                        f"reported (default: {DEFAULT_THRESHOLD})")
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+
+    names = args.only or list(BENCHMARKS)
+    workdir = None
+    try:
+        if args.repo:
+            path = os.path.abspath(args.repo)
+            repo_info = {"path": path}
+        else:
+            workdir = tempfile.mkdtemp(prefix="dit-bench-")
+            path = os.path.join(workdir, "repo")
+            start = time.perf_counter()
+            _, summary = generate_repo(path, **generator_options(args))
+            summary.pop("commit_shas")
+            repo_info = dict(summary, generated_in=round(
+                time.perf_counter() - start, 2),
+                generator=generator_options(args))
+        results = run_suite(path, names, args.ops, args.seed)
+    finally:
+        if workdir is not None:
+            shutil.rmtree(workdir)
+
+    report = {
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(
+            timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repo": repo_info,
+        "benchmarks": results,
+    }
+    out = sys.stderr if args.json == "-" else sys.stdout
+    print(f"{'benchmark':<14} {'ops/s':>10} {'p50 us':>9} {'p99 us':>9} "
+          f"{'peak RSS':>10}", file=out)
+    for name, result in results.items():
+        print(f"{name:<14} {result['ops_per_sec']:>10.0f} "
+              f"{result['p50_us']:>9.1f} {result['p99_us']:>9.1f} "
+              f"{result['peak_rss_kb'] // 1024:>7} MiB", file=out)
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        lines, regressions = compare(results, baseline, args.threshold)
+        print(f"compared with {args.compare}:", file=out)
+        print("\n".join(lines), file=out)
+        if regressions:
+            print(f"regressions: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A benchmark of parsing a very large tree object.
+A synthetic tree of a million entries (files and sub-trees, in git order)
+is parsed into a TreeObject, then iterated and searched by name. The time
+and the memory allocated by each step are reported, next to building every
+leaf eagerly as a list, as the parser used to.
+Usage:
+    python -m benchmarks.bench_tree_parse [--entries N] [--lookups N]
+"""
+
+import argparse
+import hashlib
+import random
+import time
+import tracemalloc
+
+from src.objects.tree_object_class import TreeObject
+
+
+def make_synthetic_tree(entries, seed=0):
+    """Return a serialized tree of files and sub-trees, sorted as git does.
+    Args:
+        entries: the number of entries.
+        seed: the random seed.
+    Returns:
+        A (data, names) tuple: the serialized tree and its entry names.
+    """
+    rng = random.Random(seed)
+    items = []
+    for index in range(entries):
+        name = f"{rng.choice('abcdefgh')}{index:07d}"
+        if rng.random() < 0.1:
+            items.append((name.encode() + b"/", b"40000", name.encode()))
+        else:
+            name += rng.choice((".py", ".txt", ".c", "-x"))
+            items.append((name.encode(), b"100644", name.encode()))
+    items.sort()
+    data = b"".join(
+        mode + b" " + name + b"\x00" + hashlib.sha1(name).digest()
+        for _, mode, name in items)
+    return data, [name.decode() for _, _, name in items]
+
+
+def measure(step, memory=True):
+    """Run a step, returning its result, seconds and allocated bytes.
+    The step is timed first, then run again under tracemalloc (which slows
+    it down) to measure the memory it keeps allocated.
+    """
+    start = time.perf_counter()
+    result = step()
+    elapsed = time.perf_counter() - start
+    if not memory:
+        return result, elapsed, 0
+    del result
+    tracemalloc.start()
+    result = step()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, size
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--entries", type=int, default=1000000)
+    parser.add_argument("--lookups", type=int, default=10000)
+    args = parser.parse_args()
+
+    data, names = make_synthetic_tree(args.entries)
+    print(f"{args.entries} entries, {len(data)} bytes")
+    print(f"{'step':<24} {'seconds':>8} {'MiB':>8}")
+
+    def report(step, elapsed, size):
+        """Print one line of the report."""
+        print(f"{step:<24} {elapsed:>8.3f} {size / 2 ** 20:>8.1f}")
+
+    tree, elapsed, size = measure(lambda: TreeObject(None, data))
+    report("parse offsets", elapsed, size)
+
+    _, elapsed, _ = measure(lambda: sum(1 for _ in tree), memory=False)
+    report("iterate leaves", elapsed, 0)
+
+    leaves, elapsed, size = measure(lambda: tree.leaves)
+    report("build all leaves", elapsed, size)
+    del leaves
+
+    rng = random.Random(1)
+    wanted = [rng.choice(names) for _ in range(args.lookups)]
+    found, elapsed, _ = measure(
+        lambda: sum(tree.find(name) is not None for name in wanted),
+        memory=False)
+    assert found == len(wanted)
+    print(f"{args.lookups} lookups by name: {elapsed:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A generator of synthetic repositories for the benchmarks.
+The work tree is a directory tree of a given fan-out and depth, every
+directory holding the same number of files. Each commit rewrites a few
+files (their sizes drawn from a log-normal distribution), and only the
+trees along the changed paths are built again, as they would be in a real
+history. The refs are a branch at the last commit and lightweight tags
+spread over the history. Everything is derived from the seed, so the same
+parameters always give the same objects.
+Usage:
+    python -m benchmarks.synthetic_repo <path> [--commits N] [--fanout N]
+        [--depth N] [--files-per-dir N] [--churn N] [--blob-size BYTES]
+        [--blob-sigma S] [--refs N] [--packed-refs] [--pack] [--seed N]
+"""
+
+import argparse
+import json
+import math
+import random
+
+from src.dit_commands.packed_refs import write_packed_refs
+from src.dit_commands.repack import repack
+from src.dit_commands.tree_parsing import tree_serialize
+from src.objects.tree_leaf_class import GitTreeLeaf
+from src.objects.write_object import object_sha, write_objects
+from src.repos.create_repo import create_repo
+from src.repos.lock_file import LockFile
+from src.repos.repo_paths import git_file_path
+
+# the objects buffered before they are written, in bytes:
+WRITE_BATCH_BYTES = 64 * 1024 * 1024
+# the date of the first commit; each commit is a minute after its parent:
+FIRST_COMMIT_DATE = 1600000000
+
+
+def add_generator_arguments(arg_parser):
+    """Add the options of generate_repo to an argument parser."""
+    arg_parser.add_argument("--commits", type=int, default=200)
+    arg_parser.add_argument("--fanout", type=int, default=4,
+                            help="the sub-directories of each directory")
+    arg_parser.add_argument("--depth", type=int, default=3,
+                            help="the levels of sub-directories")
+    arg_parser.add_argument("--files-per-dir", type=int, default=8)
+    arg_parser.add_argument("--churn", type=int, default=8,
+                            help="the files each commit rewrites")
+    arg_parser.add_argument("--blob-size", type=int, default=2048,
+                            help="the median size of a blob, in bytes")
+    arg_parser.add_argument("--blob-sigma", type=float, default=1.0,
+                            help="the sigma of the log-normal blob sizes")
+    arg_parser.add_argument("--max-blob-size", type=int, default=1 << 20)
+    arg_parser.add_argument("--refs", type=int, default=100)
+    arg_parser.add_argument("--packed-refs", action="store_true",
+                            help="write the refs to packed-refs")
+    arg_parser.add_argument("--pack", action="store_true",
+                            help="pack the objects once they are written")
+    arg_parser.add_argument("--seed", type=int, default=0)
+
+
+def generator_options(args):
+    """Return the options of generate_repo from parsed arguments."""
+    return {
+        "commits": args.commits, "fanout": args.fanout, "depth": args.depth,
+        "files_per_dir": args.files_per_dir, "churn": args.churn,
+        "blob_size": args.blob_size, "blob_sigma": args.blob_sigma,
+        "max_blob_size": args.max_blob_size, "refs": args.refs,
+        "packed_refs": args.packed_refs, "pack": args.pack,
+        "seed": args.seed,
+    }
+
+
+def blob_data(rng, blob_size, blob_sigma, max_blob_size, serial):
+    """Return the content of a blob of a random size: hex text, which
+    compresses about as well as source code does."""
+    size = min(max_blob_size, int(rng.lognormvariate(math.log(blob_size),
+                                                     blob_sigma)))
+    header = b"%d\n" % serial
+    return header + rng.randbytes(max(0, size - len(header)) // 2).hex(
+        ).encode()
+
+
+def directory_layout(fanout, depth):
+    """Return the {directory: sub-directory names} dictionary of a
+    directory tree, the root being b""."""
+    layout = {}
+    pending = [(b"", 0)]
+    while pending:
+        directory, level = pending.pop()
+        names = [b"d%d" % index for index in range(fanout)] \
+            if level < depth else []
+        layout[directory] = names
+        prefix = directory + b"/" if directory else b""
+        pending += [(prefix + name, level + 1) for name in names]
+    return layout
+
+
+def parent_directory(path):
+    """Return the directory of a path, b"" being the root."""
+    slash = path.rfind(b"/")
+    return path[:slash] if slash != -1 else b""
+
+
+def generate_repo(path, commits=200, fanout=4, depth=3, files_per_dir=8,
+                  churn=8, blob_size=2048, blob_sigma=1.0,
+                  max_blob_size=1 << 20, refs=100, packed_refs=False,
+                  pack=False, seed=0):
+    """Create a synthetic repository.
+    Args:
+        path: where to create the repository (it must not exist).
+        commits: the number of commits, in a single line of history.
+        fanout: the number of sub-directories of each directory.
+        depth: the number of levels of sub-directories.
+        files_per_dir: the number of files in each directory.
+        churn: the number of files each commit after the first rewrites.
+        blob_size: the median size of a blob.
+        blob_sigma: the sigma of the log-normal distribution of the sizes.
+        max_blob_size: the largest blob.
+        refs: the number of refs: the branch HEAD points to, and tags.
+        packed_refs: if True, write the refs to packed-refs.
+        pack: if True, pack the objects (and delete the loose ones).
+        seed: the seed every object is derived from.
+    Returns:
+        A (repo, summary) tuple: the GitRepo, and the dictionary of what
+        was written (the numbers of objects, their total size, the shas of
+        the commits, of HEAD).
+    """
+    rng = random.Random(seed)
+    repo = create_repo(path)
+    layout = directory_layout(fanout, depth)
+    files = [(directory + b"/" if directory else b"") + b"f%d.txt" % index
+             for directory in layout for index in range(files_per_dir)]
+    dir_files = {directory: [] for directory in layout}
+    for file in files:
+        dir_files[parent_directory(file)].append(file)
+
+    blobs = {}
+    trees = {}
+    # the objects not written yet, and the shas of all of them:
+    objects = {}
+    known = set()
+    pending_bytes = 0
+    counts = {"blob": 0, "tree": 0, "commit": 0}
+    total_bytes = 0
+    commit_shas = []
+
+    def add_object(object_format, data):
+        nonlocal pending_bytes, total_bytes
+        sha = object_sha(object_format, data)
+        if sha not in known:
+            known.add(sha)
+            objects[sha] = (object_format, data)
+            pending_bytes += len(data)
+            total_bytes += len(data)
+            counts[object_format] += 1
+        return sha
+
+    for number in range(commits):
+        changed = files if number == 0 else rng.sample(files,
+                                                       min(churn, len(files)))
+        dirty = set()
+        for file in changed:
+            blobs[file] = add_object("blob", blob_data(
+                rng, blob_size, blob_sigma, max_blob_size, number))
+            directory = parent_directory(file)
+            while directory not in dirty:
+                dirty.add(directory)
+                if not directory:
+                    break
+                directory = parent_directory(directory)
+        # a directory is deeper than its parent, so its tree is built first:
+        for directory in sorted(dirty, key=lambda path: path.count(b"/") +
+                                1 if path else 0, reverse=True):
+            prefix = directory + b"/" if directory else b""
+            leaves = [GitTreeLeaf(b"100644", file[len(prefix):], blobs[file])
+                      for file in dir_files[directory]]
+            leaves += [GitTreeLeaf(b"40000", name, trees[prefix + name])
+                       for name in layout[directory]]
+            trees[directory] = add_object("tree", tree_serialize(leaves))
+
+        date = FIRST_COMMIT_DATE + 60 * number
+        lines = [f"tree {trees[b'']}"]
+        if commit_shas:
+            lines.append(f"parent {commit_shas[-1]}")
+        lines += [f"author A U Thor <author@example.com> {date} +0000",
+                  f"committer C O Mitter <committer@example.com> {date} "
+                  "+0000", "", f"commit {number}", ""]
+        commit_shas.append(add_object("commit", "\n".join(lines).encode()))
+        if pending_bytes >= WRITE_BATCH_BYTES:
+            write_objects(repo, objects)
+            objects.clear()
+            pending_bytes = 0
+    write_objects(repo, objects)
+
+    names = write_refs(repo, commit_shas, refs, packed_refs)
+    if pack:
+        repack(repo, delete=True)
+    summary = dict(counts, bytes=total_bytes, files=len(files),
+                   directories=len(layout), refs=len(names),
+                   head=commit_shas[-1] if commit_shas else None,
+                   commit_shas=commit_shas)
+    return repo, summary
+
+
+def write_refs(repo, commit_shas, count, packed=False):
+    """Write the branch HEAD points to, at the last commit, and lightweight
+    tags spread evenly over the history, count refs in all.
+    Returns:
+        The {ref name: sha} dictionary of the refs written.
+    """
+    if not commit_shas or count < 1:
+        return {}
+    with open(git_file_path(repo, "HEAD"), encoding="utf-8") as f:
+        branch = f.read().strip()[len("ref: "):]
+    refs = {branch: commit_shas[-1]}
+    for number in range(count - 1):
+        refs[f"refs/tags/v{number}"] = commit_shas[
+            number * len(commit_shas) // (count - 1)]
+    if packed:
+        write_packed_refs(repo, refs, {})
+        return refs
+    for name, sha in refs.items():
+        with LockFile(git_file_path(repo, *name.split("/"),
+                                    create_dir=True)) as lock:
+            lock.write(f"{sha}\n")
+    return refs
+
+
+def main():
+    """Generate a repository and print what was written, as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("path")
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+    _, summary = generate_repo(args.path, **generator_options(args))
+    summary.pop("commit_shas")
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
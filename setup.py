@@ -40,7 +40,7 @@ setup(
     entry_points={
         "console_scripts": [
             # command-line scripts
-            "dit = src.mainlib:main",
+            "dit = src.client:main",
         ],
     },
 )
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A module that defines the client of the dit daemon (dit serve).
+The daemon answers requests over a Unix socket, each request and response
+being a JSON object preceded by its length as a 4 byte big-endian integer.
+When the daemon is running, the commands it can answer (cat-file of one
+object, show-ref, hash-object of files) are forwarded to it; anything else
+runs in process as usual. This module is imported before any command, so
+it only imports what the client needs, and what talking to the daemon
+needs (json, socket, base64) only once there is a daemon to talk to.
+"""
+
+import os
+import stat
+import struct
+import sys
+
+# the header of each message: the length of the JSON that follows:
+MESSAGE_HEADER = struct.Struct(">I")
+# the largest message accepted, either way:
+MAX_MESSAGE_SIZE = 1 << 30
+# how long the client waits for the daemon, in seconds:
+CLIENT_TIMEOUT = 30
+
+
+def socket_path():
+    """Return the path of the socket of the daemon of the current user:
+    $DIT_SOCKET, else dit-<uid>.sock in $XDG_RUNTIME_DIR, else dit.sock in
+    a dit-<uid> directory of $TMPDIR (or /tmp), which only the user may
+    enter."""
+    path = os.environ.get("DIT_SOCKET")
+    if path:
+        return path
+    directory = os.environ.get("XDG_RUNTIME_DIR")
+    if directory:
+        return os.path.join(directory, f"dit-{os.getuid()}.sock")
+    directory = os.environ.get("TMPDIR") or "/tmp"
+    return os.path.join(directory, f"dit-{os.getuid()}", "dit.sock")
+
+
+def is_private(path, file_type):
+    """Return True if a file is of a type (stat.S_ISSOCK, stat.S_ISDIR),
+    owned by the current user, and not accessible to the group or others.
+    A symbolic link is not followed, and is not private."""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return file_type(st.st_mode) and st.st_uid == os.getuid() and \
+        not st.st_mode & 0o077
+
+
+def socket_is_private(path):
+    """Return True if a socket, and the directory holding it, belong to the
+    current user alone, so that no other user can have put a daemon of
+    theirs behind it (to read the commands sent, and forge the output)."""
+    return is_private(path, stat.S_ISSOCK) and \
+        is_private(os.path.dirname(os.path.abspath(path)), stat.S_ISDIR)
+
+
+def encode_message(message):
+    """Encode a message, preceded by its length."""
+    import json  # pylint: disable=import-outside-toplevel
+    data = json.dumps(message, separators=(",", ":")).encode()
+    return MESSAGE_HEADER.pack(len(data)) + data
+
+
+def receive_exactly(sock, size):
+    """Read exactly size bytes from a socket.
+    Raises:
+        ConnectionError: if the socket is closed before.
+    """
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    pos = 0
+    while pos < size:
+        read = sock.recv_into(view[pos:])
+        if not read:
+            raise ConnectionError("the dit daemon closed the connection")
+        pos += read
+    return bytes(buffer)
+
+
+def request(message, path=None):
+    """Send one request to the daemon and return its response.
+    Args:
+        message: the request, a dictionary with at least an "op" key.
+        path: the path of the socket (default: socket_path()).
+    Returns:
+        The response, a dictionary.
+    Raises:
+        OSError: if the daemon is not running or the connection fails.
+    """
+    # pylint: disable=import-outside-toplevel
+    import json
+    import socket
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(CLIENT_TIMEOUT)
+        sock.connect(path or socket_path())
+        sock.sendall(encode_message(message))
+        size, = MESSAGE_HEADER.unpack(receive_exactly(sock,
+                                                      MESSAGE_HEADER.size))
+        if size > MAX_MESSAGE_SIZE:
+            raise ConnectionError(f"response of {size} bytes is too large")
+        return json.loads(receive_exactly(sock, size))
+
+
+def find_worktree(path):
+    """Return the top of the work tree holding a path (the directory with
+    a .git directory), or None, without opening the repository."""
+    path = os.path.realpath(path)
+    while True:
+        if os.path.isdir(os.path.join(path, ".git")):
+            return path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def cat_file_request(args):
+    """Map the arguments of cat-file to a read-object request, or None."""
+    modes = {"-t": "type", "-s": "size", "-e": "exists", "-p": "pretty"}
+    if len(args) != 2 or args[1].startswith("-"):
+        return None
+    if args[0] in modes:
+        return {"op": "read-object", "name": args[1],
+                "header": args[0] in ("-t", "-s", "-e"),
+                "pretty": args[0] == "-p", "mode": modes[args[0]]}
+    if args[0] in ("blob", "tree", "commit", "tag"):
+        return {"op": "read-object", "name": args[1], "header": False,
+                "pretty": False, "mode": None, "type": args[0]}
+    return None
+
+
+def hash_object_request(args):
+    """Map the arguments of hash-object to a hash request, or None."""
+    message = {"op": "hash", "type": "blob", "write": False}
+    files = []
+    pos = 0
+    while pos < len(args):
+        arg = args[pos]
+        if arg == "-w":
+            message["write"] = True
+        elif arg == "-t" and pos + 1 < len(args):
+            pos += 1
+            message["type"] = args[pos]
+        elif arg.startswith("-"):
+            return None
+        else:
+            files.append(os.path.abspath(arg))
+        pos += 1
+    # stdin is left to the command run in process, which may still have
+    #  to read it if the daemon fails:
+    if message["type"] not in ("blob", "commit", "tag", "tree") or not files:
+        return None
+    message["paths"] = files
+    return message
+
+
+def command_request(argv):
+    """Map a dit command line to the request the daemon answers it with.
+    Returns:
+        The request, or None if the daemon cannot answer the command.
+    """
+    if not argv:
+        return None
+    command, args = argv[0], argv[1:]
+    if command == "cat-file":
+        return cat_file_request(args)
+    if command == "show-ref" and args in ([], ["-d"], ["--dereference"]):
+        return {"op": "list-refs", "peel": bool(args)}
+    if command == "hash-object":
+        return hash_object_request(args)
+    return None
+
+
+def print_response(message, response):
+    """Write the output of a forwarded command, as the command would.
+    Returns:
+        The exit status of the command.
+    """
+    import base64  # pylint: disable=import-outside-toplevel
+    out = sys.stdout.buffer
+    error = response.get("error")
+    if message["op"] == "read-object":
+        mode = message["mode"]
+        if error is not None:
+            if mode == "exists":
+                return 1
+            print(f"fatal: Not a valid object name {message['name']}",
+                  file=sys.stderr)
+            return 128
+        if mode == "type":
+            out.write(response["type"].encode() + b"\n")
+        elif mode == "size":
+            out.write(f"{response['size']}\n".encode())
+        elif mode != "exists":
+            if mode is None and response["type"] != message["type"]:
+                print(f"fatal: git cat-file {message['name']}: bad file",
+                      file=sys.stderr)
+                return 128
+            out.write(base64.b64decode(response["data"]))
+    elif error is not None:
+        print(f"fatal: {error}", file=sys.stderr)
+        return 128
+    elif message["op"] == "list-refs":
+        lines = []
+        for name, sha, peeled in response["refs"]:
+            lines.append(f"{sha} {name}\n")
+            if peeled:
+                lines.append(f"{peeled} {name}^{{}}\n")
+        out.write("".join(lines).encode())
+    elif message["op"] == "hash":
+        out.write("".join(f"{sha}\n" for sha in response["shas"]).encode())
+    out.flush()
+    return 0
+
+
+def forward(argv):
+    """Run a dit command through the daemon, if it is running and can
+    answer it.
+    Returns:
+        The exit status of the command, or None if it was not forwarded.
+    """
+    # a traced command is run in process, where its spans are recorded:
+    if os.environ.get("DIT_NO_DAEMON") or os.environ.get("DIT_TRACE"):
+        return None
+    path = socket_path()
+    if not socket_is_private(path):
+        return None
+    message = command_request(argv)
+    worktree = find_worktree(".")
+    if message is None or worktree is None:
+        return None
+    message["repo"] = worktree
+    try:
+        response = request(message, path)
+    except (OSError, ValueError):
+        # no daemon behind the socket (or a broken one): running in process:
+        return None
+    if message["op"] == "hash" and "error" in response:
+        # hashing in process reports the file that could not be read, after
+        #  the shas of the files before it, as git does:
+        return None
+    return print_response(message, response)
+
+
+def main():
+    """Run dit: through the daemon when it can answer the command, else in
+    process."""
+    status = forward(sys.argv[1:])
+    if status is None:
+        # pylint: disable=import-outside-toplevel
+        from src import mainlib
+        mainlib.main()
+    elif status:
+        sys.exit(status)
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""A module that defines the add command."""
+
+import bisect
+import os
+import sys
+
+from src.dit_commands.hash_object import hash_files, hash_object
+from src.parsers import subparsers
+from src.repos.find_root import find_repo_root
+from src.repos.ignore import ignore_rules
+from src.repos.index_class import (MODE_GITLINK, MODE_SYMLINK, IndexEntry,
+                                   index_mode, index_path, read_index,
+                                   stat_fields, write_index)
+from src.repos.lock_file import LockFile
+from src.repos.workdir import iter_workdir, relative_path, workdir_path
+
+# dit add: allows adding file contents to the index
+# dit add will be implemented as dit add [-f] [--jobs N] <pathspec>...
+add_arg = subparsers.add_parser(
+    "add",
+    help="Add file contents to the index",
+    usage="dit add [-f] [-j N] <pathspec>...",
+    epilog="See 'dit add --help' for more information on a specific "
+    "command.")
+
+add_arg.add_argument(
+    "-f", "--force",
+    action="store_true",
+    dest="force",
+    help="Allow adding files that are otherwise ignored")
+
+add_arg.add_argument(
+    "-j", "--jobs",
+    metavar="N",
+    type=int,
+    default=1,
+    dest="jobs",
+    help="Hash the changed files across N processes (default: 1)")
+
+add_arg.add_argument(
+    "paths",
+    metavar="pathspec",
+    nargs="+",
+    help="The files to add; directories are added recursively")
+
+
+def is_unchanged(index, entry, st):
+    """Return True if a file certainly has the content of its entry: its
+    stat data matches and it was not modified in the second the index was
+    written (racy git)."""
+    return (entry is not None and entry.stat_matches(st) and
+            not index.is_racy(entry))
+
+
+def tracked_under(tracked, path):
+    """Return the tracked paths a pathspec matches: the path itself and the
+    paths beneath it.
+    Args:
+        tracked: the sorted list of the paths (bytes) of the index.
+        path: the work tree path of a file or directory.
+    Returns:
+        The list of the matching paths, found by bisection.
+    """
+    if not path:
+        return tracked
+    start = bisect.bisect_left(tracked, path)
+    matches = tracked[start:start + 1] if tracked[start:start + 1] == [
+        path] else []
+    # paths beneath the directory sort between "path/" and "path0":
+    start = bisect.bisect_left(tracked, path + b"/", start)
+    end = bisect.bisect_left(tracked, path + b"0", start)
+    return matches + tracked[start:end]
+
+
+def ignored_paths(repo, index, paths):
+    """Return the paths of a command line that are untracked and ignored,
+    which git refuses to add without -f.
+    Args:
+        repo: the git repository.
+        index: the GitIndex.
+        paths: the work tree paths (bytes) of files or directories.
+    Returns:
+        The list of the ignored paths.
+    """
+    tracked = list(dict.fromkeys(entry.path for entry in index))
+    ignored = []
+    for path in paths:
+        full_path = workdir_path(repo, path)
+        if not path or not os.path.lexists(full_path) or tracked_under(
+                tracked, path):
+            continue
+        rules = ignore_rules(repo, path)
+        parts = path.split(b"/")
+        # the path is ignored if it, or a directory above it, is:
+        if any(rules.is_ignored(b"/".join(parts[:end]), end < len(parts) or
+                                os.path.isdir(full_path))
+               for end in range(1, len(parts) + 1)):
+            ignored.append(path)
+    return ignored
+
+
+def hash_workdir_files(repo, files, write=True, jobs=1):
+    """Compute the blob shas of work tree files, optionally writing them.
+    Args:
+        repo: the git repository.
+        files: a list of (work tree path, stat result) tuples.
+        write: if True, write the blobs into the object database.
+        jobs: the number of processes hashing the regular files.
+    Returns:
+        The {work tree path: sha} dictionary.
+    """
+    shas = {}
+    regular = []
+    for path, st in files:
+        if index_mode(st) == MODE_SYMLINK:
+            # a symbolic link is stored as the path it points to:
+            target = os.readlink(workdir_path(repo, path))
+            shas[path] = hash_object(repo, target, "blob", write)
+        else:
+            regular.append(path)
+    hashed = hash_files(repo, [workdir_path(repo, path) for path in regular],
+                        "blob", write, jobs)
+    shas.update(zip(regular, hashed))
+    return shas
+
+
+def add_paths(repo, index, paths, jobs=1):
+    """Stage work tree files in the index.
+    Files whose stat data matches their entry are not read again. The
+    untracked files .gitignore files exclude are skipped in directories;
+    tracked files that no longer exist are removed from the index.
+    Args:
+        repo: the git repository.
+        index: the GitIndex to update.
+        paths: the work tree paths (bytes) of files or directories.
+        jobs: the number of processes hashing the changed files.
+    Returns:
+        The number of files hashed.
+    Raises:
+        ValueError: if a path matches neither a file nor a tracked path.
+    """
+    changed = []
+    # the paths of the index, sorted (each once, whatever its stages), as
+    #  they were before any pathspec changed them:
+    index_paths = list(dict.fromkeys(entry.path for entry in index))
+    for path in paths:
+        tracked = tracked_under(index_paths, path)
+        full_path = workdir_path(repo, path)
+        if os.path.isdir(full_path) and not os.path.islink(full_path):
+            files = [(file, entry.stat(follow_symlinks=False))
+                     for file, entry in iter_workdir(
+                         repo, path, ignore_rules(repo, path))]
+        elif os.path.lexists(full_path):
+            files = [(path, os.lstat(full_path))]
+        elif tracked:
+            files = []
+        else:
+            raise ValueError(f"pathspec '{os.fsdecode(path)}' did not "
+                             "match any files")
+
+        found = set()
+        for file, st in files:
+            found.add(file)
+            if index_mode(st) is None:
+                continue
+            if not is_unchanged(index, index.get(file), st):
+                changed.append((file, st))
+        root = workdir_path(repo, b"")
+        for file in tracked:
+            entry = index.get(file)
+            if file in found or (entry is not None and
+                                 entry.mode == MODE_GITLINK):
+                continue
+            # an ignored file that is tracked is still staged:
+            try:
+                st = os.lstat(root + file)
+            except (FileNotFoundError, NotADirectoryError):
+                index.remove(file)
+                continue
+            if index_mode(st) is None:
+                index.remove(file)
+            elif not is_unchanged(index, entry, st):
+                changed.append((file, st))
+
+    shas = hash_workdir_files(repo, changed, True, jobs)
+    for file, st in changed:
+        index.add(IndexEntry(file, shas[file], stat_fields(st)))
+    return len(changed)
+
+
+def dit_add(args):
+    """Add file contents to the index.
+    Untracked paths that are ignored are not added without -f: they are
+    reported, the other paths are added, and the exit status is 1.
+    Usage:
+        dit add [-f] [-j N] <pathspec>...
+        dit add (-h | --help)
+    Options:
+        -h, --help  Show this screen and exit.
+    """
+    repo = find_repo_root()
+    try:
+        lock = LockFile(index_path(repo))
+    except FileExistsError:
+        print(f"fatal: unable to create '{index_path(repo)}.lock': File "
+              "exists.", file=sys.stderr)
+        sys.exit(128)
+    ignored = []
+    try:
+        index = read_index(repo)
+        paths = [relative_path(repo, path) for path in args.paths]
+        if not args.force:
+            ignored = ignored_paths(repo, index, paths)
+            paths = [path for path in paths if path not in ignored]
+        add_paths(repo, index, paths, args.jobs)
+    except ValueError as error:
+        lock.rollback()
+        print(f"fatal: {error}", file=sys.stderr)
+        sys.exit(128)
+    except BaseException:
+        lock.rollback()
+        raise
+    write_index(repo, index, lock)
+    if ignored:
+        print("The following paths are ignored by one of your .gitignore "
+              "files:", file=sys.stderr)
+        for path in ignored:
+            print(os.fsdecode(path), file=sys.stderr)
+        print("hint: Use -f if you really want to add them.",
+              file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""A module that defines the bitmap command."""
+
+import hashlib
+import struct
+import sys
+
+from src.dit_commands.commit_graph import collect_commits, compute_generations
+from src.dit_commands.resolve_list_refs import ref_tips
+from src.objects.bitmap_class import (BITMAP_HASH_VERSION, BITMAP_SIGNATURE,
+                                      BITMAP_TYPES, BITMAP_VERSION,
+                                      CHUNK_BITMAPS, CHUNK_COMMITS,
+                                      CHUNK_FANOUT, CHUNK_LOOKUP, CHUNK_ORDER,
+                                      CHUNK_POSITIONS, CHUNK_TYPES)
+from src.objects.commit_graph_class import chunk_file_parts
+from src.objects.ewah import ewah_encode
+from src.objects.pack_class import OBJ_COMMIT, OBJ_TREE
+from src.objects.read_bitmap import (bitmap_path, invalidate_bitmap,
+                                     reachable_objects, walk_tree)
+from src.parsers import subparsers
+from src.repos.find_root import find_repo_root
+from src.repos.lock_file import LockFile
+
+# one commit in this many gets a bitmap, as well as every ref tip:
+DEFAULT_INTERVAL = 100
+
+# dit bitmap: allows writing the reachability bitmap file
+# dit bitmap will be implemented as dit bitmap write [--interval <n>]
+bitmap_arg = subparsers.add_parser(
+    "bitmap",
+    help="Write the reachability bitmap file",
+    usage="dit bitmap write [--interval <n>]",
+    epilog="See 'dit bitmap --help' for more information on a specific "
+    "command.")
+
+bitmap_arg.add_argument(
+    "action",
+    choices=["write"],
+    help="Write the bitmaps of the commits reachable from the refs")
+
+bitmap_arg.add_argument(
+    "--interval",
+    metavar="n",
+    type=int,
+    default=DEFAULT_INTERVAL,
+    help="Give a bitmap to one commit in n, as well as to every ref "
+    f"(default: {DEFAULT_INTERVAL})")
+
+
+class BitmapBuilder:
+    """A class that numbers the objects of a bitmap file being written, and
+    keeps the bitmaps computed so far. It stands for the ReachabilityBitmap
+    in reachable_objects, so that each bitmap is built from those of older
+    commits.
+    Attributes:
+        positions: the {binary sha: bit position} dictionary.
+        object_types: the type of the object at each bit position.
+        bitmaps: the {bit position of a commit: bitmap} dictionary.
+    """
+
+    def __init__(self):
+        """Initialize an empty builder."""
+        self.positions = {}
+        self.object_types = bytearray()
+        self.bitmaps = {}
+
+    def __len__(self):
+        """Return the number of objects numbered."""
+        return len(self.object_types)
+
+    def add(self, sha, object_type):
+        """Number an object; return False if it already was."""
+        if sha in self.positions:
+            return False
+        self.positions[sha] = len(self.object_types)
+        self.object_types.append(object_type)
+        return True
+
+    def find(self, sha):
+        """Return the bit position of an object, or None."""
+        return self.positions.get(sha)
+
+    def bitmap_at(self, pos):
+        """Return the bitmap of the commit at a bit position, or None."""
+        return self.bitmaps.get(pos)
+
+
+def write_bitmap(repo, tips, interval=DEFAULT_INTERVAL):
+    """Write the reachability bitmap file of the commits reachable from the
+    tips.
+    The objects are numbered oldest commit first, each commit followed by
+    the trees and blobs it brings in, so that the bitmaps of related
+    commits share long runs and compress well. The tips, and one commit in
+    interval in that order, get a bitmap.
+    Args:
+        repo: the git repository.
+        tips: the hex shas to start from; those that are not commits are
+            skipped.
+        interval: one commit in this many gets a bitmap.
+    Returns:
+        A (number of objects, number of bitmaps) tuple.
+    Raises:
+        FileExistsError: if bitmap.lock already exists.
+    """
+    nodes = collect_commits(repo, tips)
+    generations = compute_generations(nodes)
+    order = sorted(nodes, key=lambda sha: (generations[sha], nodes[sha].date,
+                                           sha))
+
+    builder = BitmapBuilder()
+    for sha in order:
+        builder.add(bytes.fromhex(sha), OBJ_COMMIT)
+        tree = nodes[sha].tree
+        if builder.add(bytes.fromhex(tree), OBJ_TREE):
+            walk_tree(repo, tree, lambda binsha, object_type, _:
+                      builder.add(binsha, object_type))
+
+    selected = {sha for sha in tips if sha in nodes}
+    selected.update(order[interval - 1::interval])
+    # older commits first, so that each walk stops at their bitmaps:
+    for sha in order:
+        if sha in selected:
+            pos = builder.positions[bytes.fromhex(sha)]
+            builder.bitmaps[pos] = reachable_objects(repo, [sha],
+                                                     builder).bits
+
+    count = len(builder)
+    shas = sorted(builder.positions)
+    fanout = [0] * 256
+    for sha in shas:
+        fanout[sha[0]] += 1
+    for index in range(1, 256):
+        fanout[index] += fanout[index - 1]
+    sorted_index = [0] * count
+    for index, sha in enumerate(shas):
+        sorted_index[builder.positions[sha]] = index
+
+    type_bitmaps = []
+    for object_type in BITMAP_TYPES:
+        bits = bytearray((count + 7) // 8)
+        for pos, pos_type in enumerate(builder.object_types):
+            if pos_type == object_type:
+                bits[pos >> 3] |= 1 << (pos & 7)
+        type_bitmaps.append(ewah_encode(int.from_bytes(bits, "little"),
+                                        count))
+
+    commit_table = bytearray()
+    bitmap_data = bytearray()
+    for pos in sorted(builder.bitmaps):
+        commit_table += struct.pack(">IQ", pos, len(bitmap_data))
+        bitmap_data += ewah_encode(builder.bitmaps[pos], count)
+
+    chunks = [
+        (CHUNK_FANOUT, struct.pack(">256I", *fanout)),
+        (CHUNK_LOOKUP, b"".join(shas)),
+        (CHUNK_POSITIONS, struct.pack(f">{count}I", *(
+            builder.positions[sha] for sha in shas))),
+        (CHUNK_ORDER, struct.pack(f">{count}I", *sorted_index)),
+        (CHUNK_TYPES, b"".join(type_bitmaps)),
+        (CHUNK_COMMITS, bytes(commit_table)),
+        (CHUNK_BITMAPS, bytes(bitmap_data)),
+    ]
+    content = chunk_file_parts(
+        struct.pack(">4sBBBB", BITMAP_SIGNATURE, BITMAP_VERSION,
+                    BITMAP_HASH_VERSION, len(chunks), 0), chunks)
+
+    checksum = hashlib.sha1()
+    with LockFile(bitmap_path(repo)) as lock:
+        for part in content:
+            checksum.update(part)
+            lock.write(part)
+        lock.write(checksum.digest())
+    invalidate_bitmap(repo)
+    return count, len(builder.bitmaps)
+
+
+def dit_bitmap(args):
+    """Write the reachability bitmap file.
+    Usage:
+        dit bitmap write [--interval <n>]
+        dit bitmap (-h | --help)
+    Options:
+        -h, --help  Show this screen and exit.
+    """
+    repo = find_repo_root()
+    if args.interval < 1:
+        bitmap_arg.error("--interval must be at least 1")
+    try:
+        write_bitmap(repo, ref_tips(repo), args.interval)
+    except (ValueError, FileExistsError) as error:
+        print(f"fatal: {error}", file=sys.stderr)
+        sys.exit(128)
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""A module that defines the cat-file command."""
+
+import re
+import sys
+
+from src.dit_commands.resolve_list_refs import ref_resolver
+from src.dit_commands.tree_parsing import iter_tree_entries
+from src.objects.find_object import find_object
+from src.objects.read_object import read_object_header, read_raw_object
+from src.objects.sha_index import HEX_DIGITS, MIN_ABBREV, sha_index
+from src.parsers import subparsers
+from src.repos.find_root import find_repo_root
+
+# the output formats of --batch-check and --batch (before the contents):
+DEFAULT_BATCH_FORMAT = "%(objectname) %(objecttype) %(objectsize)"
+BATCH_ATOM = re.compile(r"%\((objectname|objecttype|objectsize|rest)\)")
+SHA_PATTERN = re.compile(r"[0-9a-f]{40}")
+# a batch line split into its name and %(rest) (at the first space or tab,
+#  the blanks after it being skipped, as git does):
+BATCH_LINE = re.compile(r"([^ \t]*)[ \t]*(.*)", re.DOTALL)
+
+# dit cat-file: allows printing the type, size or contents of objects
+# dit cat-file will be implemented as dit cat-file (-t | -s | -p | <type>)
+#  <object>, or dit cat-file (--batch | --batch-check) < object-names
+cat_file_arg = subparsers.add_parser(
+    "cat-file",
+    help="Provide contents or details of repository objects",
+    usage="dit cat-file (-t | -s | -e | -p | <type>) <object>\n"
+    "       dit cat-file (--batch | --batch-check)[=<format>] [--buffer]",
+    epilog="See 'dit cat-file --help' for more information on a specific "
+    "command.")
+
+cat_file_mode = cat_file_arg.add_mutually_exclusive_group()
+
+cat_file_mode.add_argument(
+    "-t",
+    action="store_const",
+    const="type",
+    dest="mode",
+    help="Show the object type")
+
+cat_file_mode.add_argument(
+    "-s",
+    action="store_const",
+    const="size",
+    dest="mode",
+    help="Show the object size")
+
+cat_file_mode.add_argument(
+    "-e",
+    action="store_const",
+    const="exists",
+    dest="mode",
+    help="Exit with zero status if the object exists and is valid")
+
+cat_file_mode.add_argument(
+    "-p",
+    action="store_const",
+    const="pretty",
+    dest="mode",
+    help="Pretty-print the object contents")
+
+cat_file_mode.add_argument(
+    "--batch",
+    metavar="format",
+    nargs="?",
+    const=DEFAULT_BATCH_FORMAT,
+    dest="batch",
+    help="Print the details and contents of each object named on stdin")
+
+cat_file_mode.add_argument(
+    "--batch-check",
+    metavar="format",
+    nargs="?",
+    const=DEFAULT_BATCH_FORMAT,
+    dest="batch_check",
+    help="Print the details of each object named on stdin")
+
+cat_file_arg.add_argument(
+    "--buffer",
+    action="store_true",
+    dest="buffer",
+    help="Only flush the batch output at the end, instead of after each "
+    "object")
+
+cat_file_arg.add_argument(
+    "args",
+    metavar="[<type>] <object>",
+    nargs="*",
+    help="The object to show, optionally preceded by its expected type")
+
+
+def resolve_name(repo, name):
+    """Resolve an object name to a full sha.
+    Args:
+        repo: the git repository.
+        name: a sha, a sha prefix, a ref, or a tag or branch name.
+    Returns:
+        The full hex sha, or None if the name does not resolve to one.
+    """
+    if SHA_PATTERN.fullmatch(name):
+        return name
+    try:
+        sha = None
+        if name != "HEAD" and not name.startswith("refs/"):
+            sha = find_object(repo, name)
+        # trying the name as a ref, then as a tag or branch name:
+        for ref in (name, f"refs/tags/{name}", f"refs/heads/{name}"):
+            if sha:
+                break
+            try:
+                sha = ref_resolver(repo, ref)
+            except ValueError:
+                pass
+    except (ValueError, OSError):
+        return None
+    if sha and SHA_PATTERN.fullmatch(sha):
+        return sha
+    return None
+
+
+def is_ambiguous(repo, name):
+    """Return True if a name is a short sha more than one object starts
+    with."""
+    return (len(name) >= MIN_ABBREV and all(c in HEX_DIGITS for c in name)
+            and len(sha_index(repo).match_prefix(name, limit=2)) > 1)
+
+
+def format_batch_line(batch_format, sha, object_format, size, rest):
+    """Expand the %(atom)s of a batch format for one object."""
+    values = {
+        "objectname": sha,
+        "objecttype": object_format.decode(),
+        "objectsize": str(size),
+        "rest": rest,
+    }
+    return BATCH_ATOM.sub(lambda match: values[match.group(1)], batch_format)
+
+
+def cat_file_batch(repo, lines, out, batch_format, contents=True,
+                   flush=True):
+    """Answer the git cat-file --batch / --batch-check protocol.
+    For each object name read, "<sha> <type> <size>" (or the custom format)
+    is written, followed with --batch by the contents and a newline. Names
+    that cannot be found are answered with "<name> missing", and short shas
+    of more than one object with "<name> ambiguous". A line is split into
+    the name and %(rest) only if the format uses %(rest); otherwise the
+    whole line is the name.
+    With --batch, an object is read whole before its header is written, so
+    that a corrupt object is answered as missing, not with a header and
+    truncated contents.
+    Args:
+        repo: the git repository.
+        lines: the input lines, each holding an object name.
+        out: a binary file the answers are written to.
+        batch_format: the format of the line written for each object.
+        contents: if True (--batch), write the contents of the objects.
+        flush: if True, flush the output after each object, so that a
+            caller reading the answers one by one does not block.
+    """
+    split_rest = "%(rest)" in batch_format
+    for line in lines:
+        name = line.rstrip("\r\n")
+        if not name:
+            continue
+        rest = ""
+        if split_rest:
+            name, rest = BATCH_LINE.fullmatch(name).groups()
+        sha = resolve_name(repo, name)
+        try:
+            if sha is None:
+                raise ValueError(f"{name} not found")
+            if contents:
+                object_format, data = read_raw_object(repo, sha)
+                size = len(data)
+            else:
+                # --batch-check only inflates the object header:
+                object_format, size = read_object_header(repo, sha)
+        except ValueError:
+            if sha is None and is_ambiguous(repo, name):
+                print(f"error: short object ID {name} is ambiguous",
+                      file=sys.stderr)
+                out.write(f"{name} ambiguous\n".encode())
+            else:
+                out.write(f"{name} missing\n".encode())
+        else:
+            out.write(format_batch_line(
+                batch_format, sha, object_format, size, rest).encode())
+            out.write(b"\n")
+            if contents:
+                out.write(data)
+                out.write(b"\n")
+        if flush:
+            out.flush()
+    out.flush()
+
+
+def pretty_print(object_format, data, out):
+    """Write the contents of an object as git cat-file -p does."""
+    if object_format != b"tree":
+        out.write(data)
+        return
+    for mode, name, sha in iter_tree_entries(data):
+        mode = mode.rjust(6, b"0")
+        if mode.startswith(b"04"):
+            entry_type = b"tree"
+        elif mode.startswith(b"160"):
+            entry_type = b"commit"
+        else:
+            entry_type = b"blob"
+        out.write(mode + b" " + entry_type + b" " + sha.encode() + b"\t" +
+                  name + b"\n")
+
+
+def dit_cat_file(args):
+    """Provide contents or details of repository objects.
+    Usage:
+        dit cat-file (-t | -s | -e | -p | <type>) <object>
+        dit cat-file (--batch | --batch-check)[=<format>] [--buffer]
+        dit cat-file (-h | --help)
+    Options:
+        -h, --help  Show this screen and exit.
+    """
+    repo = find_repo_root()
+    out = sys.stdout.buffer
+    if args.batch is not None or args.batch_check is not None:
+        if args.args:
+            cat_file_arg.error("--batch and --batch-check take no arguments")
+        contents = args.batch is not None
+        batch_format = args.batch if contents else args.batch_check
+        cat_file_batch(repo, sys.stdin, out, batch_format, contents,
+                       flush=not args.buffer)
+        return
+
+    if args.mode is None and len(args.args) == 2:
+        expected_type, name = args.args
+    elif args.mode is not None and len(args.args) == 1:
+        expected_type, name = None, args.args[0]
+    else:
+        cat_file_arg.error("expected (-t | -s | -e | -p | <type>) <object>")
+
+    sha = resolve_name(repo, name)
+    try:
+        if sha is None:
+            raise ValueError(f"{name} not found")
+        if args.mode in ("type", "size", "exists"):
+            object_format, size = read_object_header(repo, sha)
+        else:
+            object_format, data = read_raw_object(repo, sha)
+    except ValueError:
+        if args.mode == "exists":
+            sys.exit(1)
+        print(f"fatal: Not a valid object name {name}", file=sys.stderr)
+        sys.exit(128)
+
+    if args.mode == "type":
+        out.write(object_format + b"\n")
+    elif args.mode == "size":
+        out.write(f"{size}\n".encode())
+    elif args.mode == "pretty":
+        pretty_print(object_format, data, out)
+    elif args.mode is None:
+        if object_format.decode() != expected_type:
+            print(f"fatal: git cat-file {name}: bad file", file=sys.stderr)
+            sys.exit(128)
+        out.write(data)
+    out.flush()
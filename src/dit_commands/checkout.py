@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""A module that defines the checkout command."""
+
+import sys
+
+from src.dit_commands.cat_file import resolve_name
+from src.dit_commands.packed_refs import peel_object
+from src.dit_commands.read_tree import (CheckoutStats, checkout_tree,
+                                        peel_to_tree)
+from src.dit_commands.resolve_list_refs import (invalidate_refs,
+                                                ref_snapshot)
+from src.objects.read_object import read_object_header
+from src.parsers import subparsers
+from src.repos.find_root import find_repo_root
+from src.repos.index_class import index_path, read_index, write_index
+from src.repos.lock_file import LockFile
+from src.repos.repo_paths import git_file_path
+
+# dit checkout: allows switching branches
+# dit checkout will be implemented as dit checkout [-f] <branch | commit>
+checkout_arg = subparsers.add_parser(
+    "checkout",
+    help="Switch branches, or check out a commit",
+    usage="dit checkout [-f] [-j N] [--timing] <branch | commit>",
+    epilog="See 'dit checkout --help' for more information on a specific "
+    "command.")
+
+checkout_arg.add_argument(
+    "-f", "--force",
+    action="store_true",
+    dest="force",
+    help="Overwrite local changes and untracked files in the way")
+
+checkout_arg.add_argument(
+    "-j", "--jobs",
+    metavar="N",
+    type=int,
+    default=1,
+    dest="jobs",
+    help="Write the files across N processes (default: 1)")
+
+checkout_arg.add_argument(
+    "--timing",
+    action="store_true",
+    dest="timing",
+    help="Report the files written and removed on stderr")
+
+checkout_arg.add_argument(
+    "target",
+    metavar="branch | commit",
+    help="The branch to switch to, or the commit to detach HEAD at")
+
+
+def resolve_target(repo, name):
+    """Resolve the target of a checkout.
+    Returns:
+        A (branch ref or None, commit sha) tuple: the branch HEAD is to point
+        to, or None to detach HEAD at the commit.
+    Raises:
+        ValueError: if the name is neither a branch nor a commit.
+    """
+    snapshot = ref_snapshot(repo)
+    ref = f"refs/heads/{name}"
+    if snapshot.get(ref) is not None:
+        return ref, snapshot.resolve(ref)
+    sha = resolve_name(repo, name)
+    if sha is not None:
+        # an annotated tag is checked out as the commit it points to:
+        sha = peel_object(repo, sha) or sha
+    if sha is None or read_object_header(repo, sha)[0] != b"commit":
+        raise ValueError(f"pathspec '{name}' did not match any file(s) "
+                         "known to dit")
+    return None, sha
+
+
+def update_head(repo, branch, sha):
+    """Point HEAD to a branch, or detach it at a commit."""
+    with LockFile(git_file_path(repo, "HEAD")) as lock:
+        lock.write(f"ref: {branch}\n" if branch is not None else f"{sha}\n")
+    invalidate_refs(repo)
+
+
+def dit_checkout(args):
+    """Switch branches, or check out a commit (detaching HEAD).
+    Usage:
+        dit checkout [-f] [-j N] [--timing] <branch | commit>
+        dit checkout (-h | --help)
+    Options:
+        -h, --help  Show this screen and exit.
+    """
+    repo = find_repo_root()
+    try:
+        lock = LockFile(index_path(repo))
+    except FileExistsError:
+        print(f"fatal: unable to create '{index_path(repo)}.lock': File "
+              "exists.", file=sys.stderr)
+        sys.exit(128)
+    stats = CheckoutStats()
+    try:
+        branch, sha = resolve_target(repo, args.target)
+        head = resolve_name(repo, "HEAD")
+        index = read_index(repo)
+        checkout_tree(repo, index, peel_to_tree(repo, sha),
+                      peel_to_tree(repo, head) if head else None,
+                      args.force, args.jobs, stats)
+    except ValueError as error:
+        lock.rollback()
+        print(f"error: {error}", file=sys.stderr)
+        sys.exit(1)
+    except BaseException:
+        lock.rollback()
+        raise
+    write_index(repo, index, lock)
+
+    current = ref_snapshot(repo).get("HEAD") or ""
+    if branch is not None and current == f"ref: {branch}":
+        print(f"Already on '{args.target}'", file=sys.stderr)
+    else:
+        update_head(repo, branch, sha)
+        if branch is not None:
+            print(f"Switched to branch '{args.target}'", file=sys.stderr)
+        else:
+            print(f"HEAD is now at {sha[:7]}", file=sys.stderr)
+    if args.timing:
+        print(stats.report("checkout"), file=sys.stderr)
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""A module that defines the commit-graph command."""
+
+import hashlib
+import struct
+import sys
+
+from src.dit_commands.resolve_list_refs import ref_tips
+from src.objects.commit_graph_class import (CHUNK_DATA, CHUNK_EXTRA_EDGES,
+                                            CHUNK_FANOUT, CHUNK_LOOKUP,
+                                            GENERATION_MAX,
+                                            GRAPH_HASH_VERSION,
+                                            GRAPH_SIGNATURE, GRAPH_VERSION,
+                                            PARENT_EXTRA_EDGES,
+                                            PARENT_LAST_EDGE, PARENT_NONE,
+                                            chunk_file_parts)
+from src.objects.read_commit import (commit_graph, commit_graph_path,
+                                     commit_node, invalidate_commit_graph)
+from src.objects.read_object import read_object, read_object_header
+from src.parsers import subparsers
+from src.repos.find_root import find_repo_root
+from src.repos.lock_file import LockFile
+
+# dit commit-graph: allows writing and verifying the commit-graph file
+# dit commit-graph will be implemented as dit commit-graph write
+#  [--reachable | --stdin-commits], or dit commit-graph verify
+commit_graph_arg = subparsers.add_parser(
+    "commit-graph",
+    help="Write and verify the commit-graph file",
+    usage="dit commit-graph write [--reachable | --stdin-commits]\n"
+    "       dit commit-graph verify",
+    epilog="See 'dit commit-graph --help' for more information on a "
+    "specific command.")
+
+commit_graph_arg.add_argument(
+    "action",
+    choices=["write", "verify"],
+    help="Write the commit-graph, or check it against the commits")
+
+commit_graph_source = commit_graph_arg.add_mutually_exclusive_group()
+
+commit_graph_source.add_argument(
+    "--reachable",
+    action="store_true",
+    dest="reachable",
+    help="Write the commits reachable from the refs (the default)")
+
+commit_graph_source.add_argument(
+    "--stdin-commits",
+    action="store_true",
+    dest="stdin_commits",
+    help="Write the commits reachable from the commits listed on stdin")
+
+
+def collect_commits(repo, tips):
+    """Read every commit reachable from the tips provided.
+    Args:
+        repo: the git repository.
+        tips: the hex shas to start from; those that are not commits are
+            skipped.
+    Returns:
+        A {sha: CommitNode} dictionary.
+    """
+    nodes = {}
+    stack = [sha for sha in tips
+             if read_object_header(repo, sha)[0] == b"commit"]
+    while stack:
+        sha = stack.pop()
+        if sha in nodes:
+            continue
+        # commits already in the current graph are not parsed again:
+        nodes[sha] = node = commit_node(repo, sha)
+        stack.extend(parent for parent in node.parents if parent not in nodes)
+    return nodes
+
+
+def compute_generations(nodes):
+    """Compute the generation number (topological level) of each commit:
+    1 for a root commit, and one more than its highest parent otherwise.
+    Args:
+        nodes: a {sha: CommitNode} dictionary, closed under parents.
+    Returns:
+        A {sha: generation} dictionary.
+    """
+    generations = {}
+    for sha in nodes:
+        stack = [sha]
+        while stack:
+            current = stack[-1]
+            if current in generations:
+                stack.pop()
+                continue
+            parents = nodes[current].parents
+            pending = [parent for parent in parents
+                       if parent not in generations]
+            if pending:
+                stack.extend(pending)
+                continue
+            generations[current] = min(GENERATION_MAX, 1 + max(
+                (generations[parent] for parent in parents), default=0))
+            stack.pop()
+    return generations
+
+
+def write_commit_graph(repo, tips):
+    """Write the commit-graph of the commits reachable from the tips.
+    Args:
+        repo: the git repository.
+        tips: the hex shas to start from.
+    Returns:
+        The number of commits written.
+    Raises:
+        FileExistsError: if commit-graph.lock already exists.
+    """
+    nodes = collect_commits(repo, tips)
+    generations = compute_generations(nodes)
+    shas = sorted(nodes)
+    positions = {sha: pos for pos, sha in enumerate(shas)}
+
+    fanout = [0] * 256
+    for sha in shas:
+        fanout[int(sha[:2], 16)] += 1
+    for index in range(1, 256):
+        fanout[index] += fanout[index - 1]
+
+    commit_data = bytearray()
+    edges = []
+    for sha in shas:
+        node = nodes[sha]
+        parents = [positions[parent] for parent in node.parents]
+        first = parents[0] if parents else PARENT_NONE
+        if len(parents) <= 1:
+            second = PARENT_NONE
+        elif len(parents) == 2:
+            second = parents[1]
+        else:
+            # the other parents of an octopus merge go to EDGE:
+            second = PARENT_EXTRA_EDGES | len(edges)
+            edges.extend(parents[1:-1])
+            edges.append(PARENT_LAST_EDGE | parents[-1])
+        commit_data += bytes.fromhex(node.tree)
+        commit_data += struct.pack(
+            ">IIII", first, second,
+            (generations[sha] << 2) | ((node.date >> 32) & 0x3),
+            node.date & 0xffffffff)
+
+    chunks = [
+        (CHUNK_FANOUT, struct.pack(">256I", *fanout)),
+        (CHUNK_LOOKUP, b"".join(bytes.fromhex(sha) for sha in shas)),
+        (CHUNK_DATA, bytes(commit_data)),
+    ]
+    if edges:
+        chunks.append((CHUNK_EXTRA_EDGES, struct.pack(f">{len(edges)}I",
+                                                      *edges)))
+
+    content = chunk_file_parts(
+        struct.pack(">4sBBBB", GRAPH_SIGNATURE, GRAPH_VERSION,
+                    GRAPH_HASH_VERSION, len(chunks), 0), chunks)
+
+    checksum = hashlib.sha1()
+    with LockFile(commit_graph_path(repo)) as lock:
+        for part in content:
+            checksum.update(part)
+            lock.write(part)
+        lock.write(checksum.digest())
+    invalidate_commit_graph(repo)
+    return len(shas)
+
+
+def verify_commit_graph(repo):
+    """Check the checksum of the commit-graph, then the graph against the
+    commit objects.
+    Args:
+        repo: the git repository.
+    Returns:
+        The list of the problems found, empty if the graph is valid.
+    """
+    invalidate_commit_graph(repo)
+    graph = commit_graph(repo)
+    if graph is None:
+        return [f"no usable commit-graph at {commit_graph_path(repo)}"]
+
+    errors = []
+    if not graph.checksum_ok():
+        errors.append("the commit-graph file has incorrect checksum and is "
+                      "likely corrupt")
+    previous = None
+    for pos in range(len(graph)):
+        sha = graph.sha_at(pos)
+        if previous is not None and previous >= sha:
+            errors.append(f"commit-graph has unsorted sha {sha.hex()}")
+        previous = sha
+        node = graph.node_at(pos)
+        try:
+            commit = read_object(repo, node.sha)
+        except ValueError:
+            errors.append(f"commit {node.sha} is missing")
+            continue
+        if commit.object_format != "commit":
+            errors.append(f"{node.sha} is not a commit")
+            continue
+        if commit.tree != node.tree:
+            errors.append(f"commit {node.sha} has tree {commit.tree} in the "
+                          f"graph but {node.tree} in the object")
+        if commit.parents != node.parents:
+            errors.append(f"commit {node.sha} has different parents in the "
+                          "graph and in the object")
+            continue
+        if commit.date != node.date:
+            errors.append(f"commit {node.sha} has date {node.date} in the "
+                          f"graph but {commit.date} in the object")
+        parent_positions = [graph.find(bytes.fromhex(parent))
+                            for parent in node.parents]
+        if None in parent_positions:
+            errors.append(f"commit {node.sha} has a parent missing from the "
+                          "graph")
+            continue
+        expected = min(GENERATION_MAX, 1 + max(
+            (graph.generation_at(parent) for parent in parent_positions),
+            default=0))
+        if node.generation != expected:
+            errors.append(f"commit {node.sha} has generation "
+                          f"{node.generation}, expected {expected}")
+    return errors
+
+
+def dit_commit_graph(args):
+    """Write and verify the commit-graph file.
+    Usage:
+        dit commit-graph write [--reachable | --stdin-commits]
+        dit commit-graph verify
+        dit commit-graph (-h | --help)
+    Options:
+        -h, --help  Show this screen and exit.
+    """
+    repo = find_repo_root()
+    if args.action == "verify":
+        errors = verify_commit_graph(repo)
+        for error in errors:
+            print(f"error: {error}", file=sys.stderr)
+        sys.exit(1 if errors else 0)
+
+    if args.stdin_commits:
+        tips = [line.strip() for line in sys.stdin if line.strip()]
+    else:
+        tips = ref_tips(repo)
+    try:
+        write_commit_graph(repo, tips)
+    except (ValueError, FileExistsError) as error:
+        print(f"fatal: {error}", file=sys.stderr)
+        sys.exit(128)
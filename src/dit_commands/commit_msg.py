@@ -7,51 +7,53 @@ import collections
 def commit_msg_parse(raw, begin=0, dictn=None):
     """Parse a commit message as a key-value list message with support for
     multiline values.
+    A key that appears more than once (such as "parent" in a merge commit)
+    maps to the list of its values. The message, after the first empty
+    line, is stored under the None key.
     """
     # Making sure the commit message is not empty:
-    if not dictn:
+    if dictn is None:
         dictn = collections.OrderedDict()
 
-    # Find the next space and newline characters:
-    next_space = raw.find(b' ', begin)
-    next_newline = raw.find(b'\n', begin)
+    while True:
+        # Find the next space and newline characters:
+        next_space = raw.find(b' ', begin)
+        next_newline = raw.find(b'\n', begin)
 
-    # If the next space or newline characters are not found, set them to the
-    # length of the raw string:
-    if next_space == -1:
-        next_space = len(raw)
-    if next_newline == -1:
-        next_newline = len(raw)
+        # If a newline comes first (or there is no space left), this is the
+        #  empty line that separates the headers from the message:
+        if next_space == -1 or next_newline < next_space:
+            if next_newline == -1:
+                next_newline = len(raw)
+            dictn[None] = raw[next_newline + 1:]
+            return dictn    # Return the key-value list
 
-    # If the next space character is found before the next newline character,
-    # then the key-value pair is on the same line:
-    if next_space < next_newline:
         key = raw[begin:next_space]
-        value_start = next_space + 1
-        value_end = next_newline
 
-        # Check if the value continues on the next line
-        #  (starts with space or tab):
-        while value_end < len(raw) and (
-            raw[value_end] == b' ' or
-            raw[value_end] == b'\t'
-            ):
-            next_newline = raw.find(b'\n', value_end + 1)
-            if next_newline == -1:
-                next_newline = len(raw)
-            value_end = next_newline
+        # Find the end of the value, which continues on the next lines as
+        #  long as they start with a space:
+        value_end = next_space
+        while True:
+            value_end = raw.find(b'\n', value_end + 1)
+            if value_end == -1:
+                value_end = len(raw)
+                break
+            if raw[value_end + 1:value_end + 2] != b' ':
+                break
+
+        # Drop the leading spaces of the continuation lines:
+        value = raw[next_space + 1:value_end].replace(b'\n ', b'\n')
 
-    # If the next newline character is found before the next space character,
-    #  then the key-value pair is on different lines:
-        value = raw[value_start:value_end]
-        dictn[key] = value
+        # Keep repeated keys as a list of values:
+        if key in dictn:
+            if isinstance(dictn[key], list):
+                dictn[key].append(value)
+            else:
+                dictn[key] = [dictn[key], value]
+        else:
+            dictn[key] = value
 
-        # Recursively call the function with the next newline as the beginning
-        return commit_msg_parse(raw, next_newline + 1, dictn)
-    else:
-        # If the next space character is not found before the next newline
-        #  character, then the key-value pair is on different lines:
-        return dictn    # Return the key-value list
+        begin = value_end + 1
 
 
 def commit_msg_serialize(dictn):
@@ -72,10 +74,6 @@ def commit_msg_serialize(dictn):
         for val in value:
             msg += key + b' ' + (val.replace(b'\n', b'\n ')) + b'\n'
 
-    # Append the message with a newline character:
-    msg += b'\n' + dictn[None] + b'\n'
-    # Check that the length of the message is correct:
-    if len(msg) != len(dictn[None]) + 2:
-        raise ValueError(
-            f"expected {len(dictn[None]) + 2} bytes, got {len(msg)}")
+    # Append the message after an empty line:
+    msg += b'\n' + dictn[None]
     return msg
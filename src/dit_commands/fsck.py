@@ -0,0 +1,531 @@
+#!/usr/bin/env python3
+"""A module that defines the fsck command.
+The objects are checked across a process pool: each loose fan-out
+directory is one task, and each pack is cut into runs of entries in pack
+order (so that delta bases are found in the cache of the worker that just
+inflated them), plus one task checksumming the pack and its index. Every
+object is inflated, its size checked against its header, its sha computed
+again and its content parsed; the workers send back the objects each one
+links to, and the connectivity pass walks them from the refs, HEAD and the
+index without reading anything again. The commit-graph, if there is one,
+is verified last, its checksum included.
+"""
+
+import concurrent.futures
+import hashlib
+import os
+import re
+import sys
+import time
+import zlib
+
+from src.dit_commands.commit_graph import verify_commit_graph
+from src.dit_commands.resolve_list_refs import ref_snapshot
+from src.dit_commands.tree_parsing import iter_tree_entries
+from src.objects.find_object import loose_object_shas
+from src.objects.read_commit import commit_graph_path
+from src.objects.read_object import read_loose_object, read_raw_object
+from src.objects.read_pack import repo_packs
+from src.objects.write_object import object_sha
+from src.parsers import subparsers
+from src.repos.find_root import find_repo_root
+from src.repos.gitrepo_class import GitRepo
+from src.repos.index_class import MODE_GITLINK, read_index
+from src.repos.repo_paths import git_file_path
+
+# dit fsck: allows verifying the objects of a repository
+# dit fsck will be implemented as dit fsck [--connectivity-only]
+fsck_arg = subparsers.add_parser(
+    "fsck",
+    help="Verify the connectivity and validity of the objects",
+    usage="dit fsck [--connectivity-only] [-j N]",
+    epilog="See 'dit fsck --help' for more information on a specific "
+    "command.")
+
+fsck_arg.add_argument(
+    "--connectivity-only",
+    action="store_true",
+    dest="connectivity_only",
+    help="Only check that the objects reachable from the refs exist, "
+    "reading the commits, trees and tags but no blob")
+
+fsck_arg.add_argument(
+    "-j", "--jobs",
+    metavar="N",
+    type=int,
+    default=os.cpu_count() or 1,
+    dest="jobs",
+    help="Check the objects across N processes (default: the CPU count)")
+
+# the modes a tree entry may have:
+TREE_ENTRY_MODES = (b"40000", b"100644", b"100755", b"120000", b"160000",
+                    b"100664")
+HEX_SHA = re.compile(rb"[0-9a-f]{40}")
+# how many pack entries a task checks, at most:
+PACK_TASK_ENTRIES = 4096
+
+
+def check_commit(data):
+    """Check the header of a commit.
+    Returns:
+        The (format, sha) links of the commit: its tree and parents.
+    Raises:
+        ValueError: if the header is malformed.
+    """
+    header = data.split(b"\n\n", 1)[0].split(b"\n")
+    if not header[0].startswith(b"tree ") or not HEX_SHA.fullmatch(
+            header[0][5:]):
+        raise ValueError("invalid format - expected 'tree' line")
+    links = [(b"tree", header[0][5:].decode())]
+    pos = 1
+    while pos < len(header) and header[pos].startswith(b"parent "):
+        if not HEX_SHA.fullmatch(header[pos][7:]):
+            raise ValueError("invalid 'parent' line format - bad sha1")
+        links.append((b"commit", header[pos][7:].decode()))
+        pos += 1
+    for field in (b"author ", b"committer "):
+        if pos >= len(header) or not header[pos].startswith(field):
+            raise ValueError(f"invalid format - expected "
+                             f"'{field.decode().strip()}' line")
+        pos += 1
+    return links
+
+
+def check_tree(data):
+    """Check the entries of a tree: their modes, names and order.
+    Returns:
+        The (format, sha) links of the tree: its sub-trees and blobs
+        (submodule commits live in other repositories, and are skipped).
+    Raises:
+        ValueError: if an entry is malformed or the tree is not sorted.
+    """
+    links = []
+    previous = None
+    # the bare names seen: a blob and a tree of the same name sort apart
+    #  (a tree sorts as "name/"), with other names possibly in between:
+    names = set()
+    for mode, name, sha in iter_tree_entries(data):
+        if mode not in TREE_ENTRY_MODES:
+            raise ValueError(f"contains bad file mode {mode.decode()}")
+        if not name or name in (b".", b"..") or name.lower() == b".git" or \
+                b"/" in name:
+            raise ValueError(f"contains bad name '{os.fsdecode(name)}'")
+        if name in names:
+            raise ValueError(f"contains duplicate name '{os.fsdecode(name)}'")
+        names.add(name)
+        key = name + b"/" if mode == b"40000" else name
+        if previous is not None and key < previous:
+            raise ValueError("not properly sorted")
+        previous = key
+        if mode == b"40000":
+            links.append((b"tree", sha))
+        elif int(mode, 8) != MODE_GITLINK:
+            links.append((b"blob", sha))
+    return links
+
+
+def check_tag(data):
+    """Check the header of an annotated tag.
+    Returns:
+        The (format, sha) link of the tag: the object it points to.
+    Raises:
+        ValueError: if the header is malformed.
+    """
+    header = data.split(b"\n\n", 1)[0].split(b"\n")
+    if not header[0].startswith(b"object ") or not HEX_SHA.fullmatch(
+            header[0][7:]):
+        raise ValueError("invalid format - expected 'object' line")
+    if len(header) < 3 or not header[1].startswith(b"type "):
+        raise ValueError("invalid format - expected 'type' line")
+    if header[1][5:] not in (b"blob", b"tree", b"commit", b"tag"):
+        raise ValueError("invalid 'type' value")
+    if not header[2].startswith(b"tag "):
+        raise ValueError("invalid format - expected 'tag' line")
+    return [(header[1][5:], header[0][7:].decode())]
+
+
+OBJECT_CHECKS = {
+    b"commit": check_commit,
+    b"tree": check_tree,
+    b"tag": check_tag,
+    b"blob": lambda data: [],
+}
+
+
+def check_object(object_format, data):
+    """Check the content of an object.
+    Returns:
+        The (format, sha) links of the object.
+    Raises:
+        ValueError: if the object is malformed or of an unknown type.
+    """
+    check = OBJECT_CHECKS.get(object_format)
+    if check is None:
+        raise ValueError(f"unknown object type {object_format.decode()}")
+    return check(data)
+
+
+def verify_object(sha, object_format, data, objects, errors):
+    """Verify an object read under a sha, recording its links in objects
+    or what is wrong with it in errors."""
+    actual = object_sha(object_format.decode(), data)
+    if actual != sha:
+        errors.append(f"error: hash mismatch for {sha} (got {actual})")
+        return
+    try:
+        objects[sha] = (object_format, tuple(check_object(object_format,
+                                                          data)))
+    except ValueError as error:
+        errors.append(f"error: in {object_format.decode()} {sha}: {error}")
+
+
+def check_loose_directory(repo, fanout):
+    """Check the loose objects of a fan-out directory.
+    Returns:
+        An (objects, errors) tuple: the {sha: (format, links)} dictionary
+        of the valid objects, and the error lines.
+    """
+    objects = {}
+    errors = []
+    directory = git_file_path(repo, "objects", fanout)
+    for name in sorted(os.listdir(directory)):
+        if len(name) != 38:
+            continue
+        sha = fanout + name
+        try:
+            object_format, data = read_loose_object(
+                os.path.join(directory, name))
+        except (ValueError, zlib.error) as error:
+            errors.append(f"error: {sha}: object corrupt or missing: "
+                          f"{error}")
+            continue
+        verify_object(sha, object_format, data, objects, errors)
+    return objects, errors
+
+
+# the entries of each pack in pack order, per process:
+#   pack path -> [(offset, index position), ...]
+_PACK_ORDERS = {}
+
+
+def pack_order(pack):
+    """Return the (offset, index position) pairs of a pack in pack order."""
+    order = _PACK_ORDERS.get(pack.path)
+    if order is None:
+        offset_at = pack.index.offset_at
+        order = sorted((offset_at(pos), pos) for pos in range(pack.count))
+        _PACK_ORDERS[pack.path] = order
+    return order
+
+
+def find_pack(repo, path):
+    """Return the PackFile of a repository mapped from a path."""
+    for pack in repo_packs(repo):
+        if pack.path == path:
+            return pack
+    raise ValueError(f"{path}: pack vanished")
+
+
+def check_pack_entries(repo, path, start, end):
+    """Check a run of entries of a pack, in pack order: the crc32 the index
+    records for each packed entry, then the object it holds.
+    Returns:
+        An (objects, errors) tuple, as check_loose_directory returns it.
+    """
+    objects = {}
+    errors = []
+    pack = find_pack(repo, path)
+    order = pack_order(pack)
+    pack_end = len(pack.data) - 20
+    resolve_ref = lambda sha: read_raw_object(repo, sha)
+    for number in range(start, end):
+        offset, pos = order[number]
+        entry_end = order[number + 1][0] if number + 1 < len(order) \
+            else pack_end
+        sha = pack.index.sha_at(pos).hex()
+        if zlib.crc32(pack.view[offset:entry_end]) != pack.index.crc_at(pos):
+            errors.append(f"error: {path}: bad crc32 for {sha} at offset "
+                          f"{offset}")
+            continue
+        try:
+            object_format, data = pack.read_at(offset, resolve_ref)
+        except (ValueError, zlib.error) as error:
+            errors.append(f"error: {sha}: object corrupt or missing: "
+                          f"{error}")
+            continue
+        verify_object(sha, object_format, data, objects, errors)
+    return objects, errors
+
+
+def check_pack_checksums(repo, path):
+    """Check the trailing checksums of a pack and of its index, and that
+    the index was made for the pack.
+    Returns:
+        An (objects, errors) tuple, with no objects.
+    """
+    errors = []
+    pack = find_pack(repo, path)
+    trailer = pack.data[-20:]
+    if hashlib.sha1(pack.view[:-20]).digest() != trailer:
+        errors.append(f"error: {path}: pack checksum mismatch")
+    index = pack.index.data
+    if hashlib.sha1(memoryview(index)[:-20]).digest() != index[-20:]:
+        errors.append(f"error: {pack.index.path}: index checksum mismatch")
+    if index[-40:-20] != trailer:
+        errors.append(f"error: {pack.index.path}: index does not match its "
+                      "pack")
+    return {}, errors
+
+
+def check_task(repo, task):
+    """Run one task of a fsck: ("loose", fan-out), ("pack", path, start,
+    end) or ("checksum", path)."""
+    kind, *args = task
+    if kind == "loose":
+        return check_loose_directory(repo, *args)
+    if kind == "pack":
+        return check_pack_entries(repo, *args)
+    return check_pack_checksums(repo, *args)
+
+
+def fsck_tasks(repo, jobs):
+    """List the tasks of a fsck, the biggest first so that the pool is not
+    left waiting on one of them at the end.
+    Returns:
+        A list of (task, number of objects) tuples.
+    """
+    tasks = []
+    objects_dir = git_file_path(repo, "objects")
+    for fanout in sorted(os.listdir(objects_dir)):
+        if len(fanout) == 2 and all(c in "0123456789abcdef" for c in fanout):
+            count = len(os.listdir(os.path.join(objects_dir, fanout)))
+            tasks.append((("loose", fanout), count))
+    for pack in repo_packs(repo, rescan=True):
+        tasks.append((("checksum", pack.path), 0))
+        # enough runs for every worker, of at most PACK_TASK_ENTRIES:
+        runs = max(jobs * 4, -(-pack.count // PACK_TASK_ENTRIES))
+        runs = max(1, min(runs, pack.count))
+        for run in range(runs):
+            start = pack.count * run // runs
+            end = pack.count * (run + 1) // runs
+            tasks.append((("pack", pack.path, start, end), end - start))
+    tasks.sort(key=lambda item: item[1], reverse=True)
+    return tasks
+
+
+# the repository of a fsck worker process:
+_WORKER_REPO = None
+
+
+def _init_worker(workdir):
+    """Open the repository once per worker process."""
+    global _WORKER_REPO  # pylint: disable=global-statement
+    _WORKER_REPO = GitRepo(workdir)
+
+
+def _check_in_worker(task):
+    """Run one task in a worker process."""
+    return check_task(_WORKER_REPO, task)
+
+
+class Progress:
+    """A class that shows the progress of a long operation on stderr, when
+    stderr is a terminal.
+    Attributes:
+        title: what is being done.
+        total: the total amount of work.
+        done: the work done so far.
+    """
+
+    def __init__(self, title, total):
+        """Start showing the progress."""
+        self.title = title
+        self.total = total
+        self.done = 0
+        self.shown = -1
+        self.enabled = sys.stderr.isatty()
+
+    def update(self, amount):
+        """Add to the work done, and show it if the percentage changed."""
+        self.done += amount
+        percent = self.done * 100 // self.total if self.total else 100
+        if self.enabled and percent != self.shown:
+            self.shown = percent
+            print(f"\r{self.title}: {percent}% ({self.done}/{self.total})",
+                  end="", file=sys.stderr, flush=True)
+
+    def finish(self):
+        """End the progress line."""
+        if self.enabled:
+            print(f"\r{self.title}: 100% ({self.done}/{self.total}), done.",
+                  file=sys.stderr)
+
+
+def check_objects(repo, jobs=1):
+    """Verify every object of a repository, loose or packed.
+    Returns:
+        An (objects, errors) tuple: the {sha: (format, links)} dictionary
+        of the valid objects, and the error lines.
+    """
+    tasks = fsck_tasks(repo, jobs)
+    progress = Progress("Checking objects", sum(count for _, count in tasks))
+    objects = {}
+    errors = []
+    if jobs <= 1:
+        for task, count in tasks:
+            task_objects, task_errors = check_task(repo, task)
+            objects.update(task_objects)
+            errors += task_errors
+            progress.update(count)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=jobs, initializer=_init_worker,
+                initargs=(repo.workdir,)) as executor:
+            futures = {executor.submit(_check_in_worker, task): count
+                       for task, count in tasks}
+            for future in concurrent.futures.as_completed(futures):
+                task_objects, task_errors = future.result()
+                objects.update(task_objects)
+                errors += task_errors
+                progress.update(futures[future])
+    progress.finish()
+    return objects, errors
+
+
+def list_objects(repo):
+    """Return the {sha: None} dictionary of the objects of a repository,
+    loose or packed, without reading any of them."""
+    objects = dict.fromkeys(loose_object_shas(repo))
+    for pack in repo_packs(repo, rescan=True):
+        for pos in range(pack.count):
+            objects.setdefault(pack.index.sha_at(pos).hex())
+    return objects
+
+
+def fsck_roots(repo, snapshot, objects, errors):
+    """Return the (name, format, sha) roots of the connectivity pass: the
+    refs, HEAD and the entries of the index."""
+    roots = []
+    for name, _ in snapshot.items():
+        try:
+            roots.append((name, None, snapshot.resolve(name)))
+        except ValueError:
+            errors.append(f"error: {name}: invalid reflink")
+    head = snapshot.get("HEAD")
+    if head is not None and not head.startswith("ref: "):
+        roots.append(("HEAD", b"commit", head))
+    elif head is not None and snapshot.get(head[5:]) is None:
+        print("notice: HEAD points to an unborn branch "
+              f"({head[5:].removeprefix('refs/heads/')})", file=sys.stderr)
+    for name, _, sha in roots:
+        if sha not in objects:
+            errors.append(f"error: {name}: invalid sha1 pointer {sha}")
+    index = read_index(repo)
+    roots += [(entry.path, b"blob", entry.sha) for entry in index
+              if entry.mode != MODE_GITLINK]
+    if index.tree is not None:
+        roots.append(("index", b"tree", index.tree))
+    return roots
+
+
+def check_connectivity(repo, objects, errors):
+    """Walk the objects reachable from the refs, HEAD and the index,
+    reporting the ones that are missing or not of the type expected.
+    The links of an object are read from objects; an object listed
+    without them (None) is read and parsed, unless it is expected to be a
+    blob.
+    Returns:
+        The number of objects reached.
+    """
+    snapshot = ref_snapshot(repo)
+    roots = fsck_roots(repo, snapshot, objects, errors)
+    reached = set()
+    missing = set()
+    stack = [(None, None, object_format, sha)
+             for _, object_format, sha in roots]
+    while stack:
+        parent, parent_format, expected, sha = stack.pop()
+        if sha in reached:
+            continue
+        if sha not in objects:
+            if parent is not None:
+                errors.append(f"broken link from {parent_format.decode():>6} "
+                              f"{parent}\n"
+                              f"              to {expected.decode():>6} "
+                              f"{sha}")
+            if sha not in missing:
+                missing.add(sha)
+                errors.append(f"missing {(expected or b'object').decode()} "
+                              f"{sha}")
+            continue
+        reached.add(sha)
+        entry = objects[sha]
+        if entry is None:
+            if expected == b"blob":
+                continue
+            try:
+                object_format, data = read_raw_object(repo, sha)
+                entry = (object_format, tuple(check_object(object_format,
+                                                           data)))
+            except ValueError as error:
+                errors.append(f"error: {sha}: {error}")
+                continue
+        object_format, links = entry
+        if expected is not None and object_format != expected:
+            errors.append(f"error: object {sha} is a "
+                          f"{object_format.decode()}, not a "
+                          f"{expected.decode()}")
+            continue
+        stack.extend((sha, object_format, link_format, link)
+                     for link_format, link in links)
+    return len(reached)
+
+
+def fsck(repo, connectivity_only=False, jobs=1):
+    """Check the objects of a repository, then their connectivity.
+    Args:
+        repo: the git repository.
+        connectivity_only: if True, only check that the objects reachable
+            from the refs exist, reading no blob (nor the commit-graph).
+        jobs: the number of processes checking the objects.
+    Returns:
+        An (errors, checked) tuple: the error lines, and the number of
+        objects checked.
+    """
+    if connectivity_only:
+        errors = []
+        objects = list_objects(repo)
+        checked = check_connectivity(repo, objects, errors)
+    else:
+        objects, errors = check_objects(repo, jobs)
+        checked = len(objects) + len(errors)
+        check_connectivity(repo, objects, errors)
+        if os.path.exists(commit_graph_path(repo)):
+            errors += [f"error: {error}"
+                       for error in verify_commit_graph(repo)]
+    return errors, checked
+
+
+def dit_fsck(args):
+    """Verify the connectivity and validity of the objects.
+    Usage:
+        dit fsck [--connectivity-only] [-j N]
+        dit fsck (-h | --help)
+    Options:
+        -h, --help  Show this screen and exit.
+    """
+    repo = find_repo_root()
+    start_time = time.perf_counter()
+    try:
+        errors, checked = fsck(repo, args.connectivity_only, args.jobs)
+    except ValueError as error:
+        print(f"fatal: {error}", file=sys.stderr)
+        sys.exit(128)
+    seconds = time.perf_counter() - start_time
+    for line in errors:
+        print(line)
+    print(f"fsck: {checked} objects checked in {seconds:.2f} s "
+          f"({checked / max(seconds, 1e-9):.0f} objects/s, {args.jobs} "
+          "processes)", file=sys.stderr)
+    if errors:
+        sys.exit(1)
@@ -11,26 +11,33 @@ Raises:
     ValueError: if the repository already exists.
     Usage:
         dit hash-object <file>
-        dit hash-object [-w] [-t TYPE] <file>
+        dit hash-object [-w] [-t TYPE] <file>...
+        dit hash-object [-w] [-t TYPE] [--jobs N] --stdin-paths < paths
+        dit hash-object [-w] [-t TYPE] --stdin < content
 """
-# NOTE: The current implementation of hash-object does not support
-# the -w and -t flags.
-# NOTE: The current implementation of hash-object:
-# dit hash-object <file>
+# NOTE: Files are read, hashed and compressed in fixed-size chunks, so the
+# memory used does not depend on the size of the file.
 
 
+import concurrent.futures
+import contextlib
 import hashlib
+import os
+import sys
+import tempfile
 import zlib
 
 from src.parsers import subparsers
 from src.repos.find_root import find_repo_root
+from src.repos.gitrepo_class import GitRepo
 from src.repos.repo_paths import git_file_path
+from src.trace import TRACING, count as trace_count, traced
 
 hash_object_arg = subparsers.add_parser(
     "hash-object",
     help="Compute object ID and optionally creates a blob from a file",
-    # usage="dit hash-object [-w] [-t TYPE] <file>",
-    usage="dit hash-object <file>",
+    usage="dit hash-object [-w] [-t TYPE] [--stdin | --stdin-paths] "
+    "[--jobs N] [<file>...]",
     epilog="See 'dit hash-object --help' for more information on a specific command.")
 
 hash_object_arg.add_argument(
@@ -47,39 +54,234 @@ hash_object_arg.add_argument(
     choices=["blob", "commit", "tag", "tree"],
     help="Specify the type of the object being written")
 
+hash_object_arg.add_argument(
+    "--stdin",
+    action="store_true",
+    dest="stdin",
+    help="Read the object from standard input instead of from a file")
+
+hash_object_arg.add_argument(
+    "--stdin-paths",
+    action="store_true",
+    dest="stdin_paths",
+    help="Read file names from standard input, one per line")
+
+hash_object_arg.add_argument(
+    "-j", "--jobs",
+    metavar="N",
+    type=int,
+    default=1,
+    dest="jobs",
+    help="Hash the files across N processes (default: 1)")
+
 hash_object_arg.add_argument(
     "file",
     metavar="file",
-    help="The file to compute the object ID from")
+    nargs="*",
+    help="The file(s) to compute the object ID from")
 
 
+# how much of a file is hashed and compressed at a time:
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@traced("hash_object")
 def hash_object(repo, data, object_format, write=True):
     """Compute object ID and optionally creates a blob from a file."""
     # creating the header:
     header = f"{object_format} {len(data)}\x00".encode()
 
-    # creating the object:
-    store = header + data
+    # creating the sha (the header and data are hashed in turn rather than
+    # joined, which would copy the data):
+    sha1 = hashlib.sha1(header)
+    sha1.update(data)
+    sha = sha1.hexdigest()
+
+    # writing the object to the git repository:
+    if write:
+        compressor = zlib.compressobj()
+        with temp_object_file(repo) as (f, tmp_path):
+            f.write(compressor.compress(header))
+            f.write(compressor.compress(data))
+            f.write(compressor.flush())
+            if TRACING:
+                trace_count("deflate_bytes", len(header) + len(data))
+                trace_count("deflated_bytes", f.tell())
+        store_temp_object(repo, tmp_path, sha)
+    return sha
+
 
-    # creating the sha:
-    sha = hashlib.sha1(store).hexdigest()
+@traced("hash_object_file")
+def hash_object_file(repo, file, object_format="blob", write=True):
+    """Compute the object ID of a file and optionally write the object,
+    streaming the file through sha1 and zlib in fixed-size chunks.
+    The size in the header comes from os.fstat, the compressed object goes
+    to a temporary file, and the file is renamed into place once its sha is
+    known. Memory use stays flat whatever the size of the file.
+    Args:
+        repo: the git repository.
+        file: the path to the file.
+        object_format: the type of the object being written.
+        write: if True, write the object into the object database.
+    Returns:
+        The object ID.
+    Raises:
+        OSError: if the file cannot be read.
+        ValueError: if the file changes size while it is being read.
+    """
+    with open(file, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        header = f"{object_format} {size}\x00".encode()
+        sha1 = hashlib.sha1(header)
 
-    # creating the path to the object:
-    path = git_file_path(repo, "objects", sha[:2], sha[2:],
-                         create_dir=write)
+        # reading into a single reusable buffer:
+        buffer = bytearray(HASH_CHUNK_SIZE)
+        view = memoryview(buffer)
+        if not write:
+            total = 0
+            while True:
+                count = f.readinto(buffer)
+                if not count:
+                    break
+                sha1.update(view[:count])
+                total += count
+        else:
+            compressor = zlib.compressobj()
+            with temp_object_file(repo) as (out, tmp_path):
+                out.write(compressor.compress(header))
+                total = 0
+                while True:
+                    count = f.readinto(buffer)
+                    if not count:
+                        break
+                    chunk = view[:count]
+                    sha1.update(chunk)
+                    out.write(compressor.compress(chunk))
+                    total += count
+                out.write(compressor.flush())
+                if TRACING:
+                    trace_count("deflate_bytes", len(header) + total)
+                    trace_count("deflated_bytes", out.tell())
 
-    # writing the object to the git repository:
+    if total != size:
+        if write:
+            os.remove(tmp_path)
+        raise ValueError(f"{file} changed size while being hashed")
+
+    sha = sha1.hexdigest()
     if write:
-        with open(path, "wb") as f:
-            f.write(zlib.compress(store))
+        store_temp_object(repo, tmp_path, sha)
     return sha
 
 
+@contextlib.contextmanager
+def temp_object_file(repo):
+    """Open a temporary file in the objects directory.
+    Args:
+        repo: the git repository.
+    Yields:
+        A (file, path) tuple; the file is removed if the block raises.
+    """
+    fd, path = tempfile.mkstemp(prefix="tmp_obj_",
+                                dir=git_file_path(repo, "objects"))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f, path
+    except BaseException:
+        os.remove(path)
+        raise
+
+
+def store_temp_object(repo, tmp_path, sha):
+    """Move a temporary object file to the path of the object.
+    Args:
+        repo: the git repository.
+        tmp_path: the path of the temporary file.
+        sha: the sha of the object.
+    Returns:
+        The path to the object.
+    """
+    path = git_file_path(repo, "objects", sha[:2], sha[2:], create_dir=True)
+    if os.path.exists(path):
+        # the object is already stored:
+        os.remove(tmp_path)
+    else:
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, path)
+    return path
+
+
+# the repository of a hash_files worker process:
+_WORKER_REPO = None
+
+
+def _init_worker(workdir):
+    """Open the repository once per worker process."""
+    global _WORKER_REPO  # pylint: disable=global-statement
+    _WORKER_REPO = GitRepo(workdir)
+
+
+def _hash_in_worker(file, object_format, write):
+    """Hash one file in a worker process."""
+    return hash_object_file(_WORKER_REPO, file, object_format, write)
+
+
+def hash_files(repo, files, object_format="blob", write=True, jobs=1):
+    """Compute the object IDs of many files, optionally writing the objects.
+    With more than one job the files are hashed and compressed across a
+    process pool; the repository is opened once per worker.
+    Args:
+        repo: the git repository.
+        files: the paths of the files.
+        object_format: the type of the objects being written.
+        write: if True, write the objects into the object database.
+        jobs: the number of worker processes.
+    Yields:
+        The object ID of each file, in the order of the files.
+    """
+    if jobs <= 1:
+        for file in files:
+            yield hash_object_file(repo, file, object_format, write)
+        return
+
+    files = list(files)
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs, initializer=_init_worker,
+            initargs=(repo.workdir,)) as executor:
+        # map keeps the results in the order of the files:
+        yield from executor.map(
+            _hash_in_worker, files, [object_format] * len(files),
+            [write] * len(files), chunksize=max(1, len(files) // (jobs * 8)))
+
+
 def dit_hash_object(args):
     """Compute object ID and optionally creates a blob from a file,
-    that is, converts a file into a git object."""
+    that is, converts a file into a git object.
+    The repository is found once, however many files are hashed."""
+    # --stdin would read the whole of stdin, leaving no paths to read:
+    if args.stdin and args.stdin_paths:
+        hash_object_arg.error("Can't use --stdin-paths with --stdin")
     repo = find_repo_root()
-    with open(args.file, "rb") as f:
-        data = f.read()
-    sha = hash_object(repo, data, args.type, args.write)
-    print(sha)
+    if args.stdin:
+        data = sys.stdin.buffer.read()
+        print(hash_object(repo, data, args.type, args.write))
+
+    files = list(args.file)
+    if args.stdin_paths:
+        files.extend(line.rstrip("\n") for line in sys.stdin if line.strip())
+    if not (files or args.stdin):
+        hash_object_arg.error("a file, --stdin or --stdin-paths is required")
+
+    try:
+        for sha in hash_files(repo, files, args.type, args.write, args.jobs):
+            print(sha)
+    except IsADirectoryError as error:
+        print(f"fatal: Unable to hash {error.filename}", file=sys.stderr)
+        sys.exit(128)
+    except OSError as error:
+        print(f"fatal: could not open '{error.filename}' for reading: "
+              f"{error.strerror}", file=sys.stderr)
+        sys.exit(128)
+    except ValueError as error:
+        print(f"fatal: {error}", file=sys.stderr)
+        sys.exit(128)
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""A module that defines the hash-tree command.
+The tree of a directory of the work tree is computed in phases: the
+directories are listed across a thread pool (ignored paths pruned as they
+are found), the files are stat'ed across the same pool, the index is read,
+the files that it does not already know unchanged are hashed across a
+process pool, and the trees are built bottom-up from the deepest
+directories.
+"""
+
+import concurrent.futures
+import sys
+import time
+
+from src.dit_commands.add import hash_workdir_files, is_unchanged
+from src.dit_commands.tree_parsing import tree_serialize
+from src.objects.tree_leaf_class import GitTreeLeaf
+from src.objects.write_object import object_sha, write_objects
+from src.parsers import subparsers
+from src.repos.find_root import find_repo_root
+from src.repos.ignore import ignore_rules
+from src.repos.index_class import index_mode, read_index
+from src.repos.workdir import SCAN_THREADS, relative_path, scan_workdir
+
+# dit hash-tree: allows computing the tree object of a directory
+# dit hash-tree will be implemented as dit hash-tree [-w] [<dir>]
+hash_tree_arg = subparsers.add_parser(
+    "hash-tree",
+    help="Compute the tree object ID of a directory of the work tree",
+    usage="dit hash-tree [-w] [-j N] [--threads N] [--no-ignore] [--timing] "
+    "[<dir>]",
+    epilog="See 'dit hash-tree --help' for more information on a specific "
+    "command.")
+
+hash_tree_arg.add_argument(
+    "-w",
+    action="store_true",
+    dest="write",
+    help="Actually write the blobs and trees into the object database")
+
+hash_tree_arg.add_argument(
+    "-j", "--jobs",
+    metavar="N",
+    type=int,
+    default=1,
+    dest="jobs",
+    help="Hash the files across N processes (default: 1)")
+
+hash_tree_arg.add_argument(
+    "--threads",
+    metavar="N",
+    type=int,
+    default=SCAN_THREADS,
+    dest="threads",
+    help=f"List and stat N directories at once (default: {SCAN_THREADS})")
+
+hash_tree_arg.add_argument(
+    "--no-ignore",
+    action="store_true",
+    dest="no_ignore",
+    help="Do not skip the paths .gitignore files exclude")
+
+hash_tree_arg.add_argument(
+    "--timing",
+    action="store_true",
+    dest="timing",
+    help="Report the time spent in each phase on stderr")
+
+hash_tree_arg.add_argument(
+    "directory",
+    metavar="dir",
+    nargs="?",
+    default=".",
+    help="The directory to compute the tree of (default: .)")
+
+# the tree modes of the index modes:
+TREE_MODES = {
+    0o100644: b"100644",
+    0o100755: b"100755",
+    0o120000: b"120000",
+}
+
+
+class HashTreeStats:
+    """A class that records the work of each phase of a hash-tree.
+    Attributes:
+        directories: the number of directories listed.
+        files: the number of files stat'ed.
+        entries: the number of entries of the index.
+        hashed: the number of files hashed.
+        cached: the number of files whose sha came from the index.
+        trees: the number of trees built.
+        times: the {phase: seconds} dictionary of the phases.
+    """
+
+    def __init__(self):
+        """Initialize the counters."""
+        self.directories = 0
+        self.files = 0
+        self.entries = 0
+        self.hashed = 0
+        self.cached = 0
+        self.trees = 0
+        self.times = {}
+
+    def report(self):
+        """Return the timing report of the phases."""
+        counts = {
+            "walk": f"{self.directories} directories",
+            "stat": f"{self.files} files",
+            "index": f"{self.entries} entries",
+            "hash": f"{self.hashed} hashed, {self.cached} from the index",
+            "trees": f"{self.trees} trees",
+        }
+        return "\n".join(f"{phase}: {seconds:.3f} s ({counts[phase]})"
+                         for phase, seconds in self.times.items())
+
+
+def stat_files(listings, threads):
+    """Stat the files of listed directories, one task per directory.
+    Returns:
+        The {work tree path: stat result} dictionary of the files.
+    """
+    def stat_directory(directory, files):
+        prefix = directory + b"/" if directory else b""
+        stats = []
+        for entry in files:
+            try:
+                stats.append((prefix + entry.name,
+                              entry.stat(follow_symlinks=False)))
+            except FileNotFoundError:
+                pass
+        return stats
+
+    stats = {}
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        for result in executor.map(
+                lambda item: stat_directory(item[0], item[1][0]),
+                listings.items()):
+            stats.update(result)
+    return stats
+
+
+def build_trees(repo, listings, stats, blobs, start, write=False):
+    """Build the trees of listed directories bottom-up.
+    A directory holding no file, at any depth, has no tree, as in git.
+    Args:
+        repo: the git repository.
+        listings: the listings, as scan_workdir returns them.
+        stats: the {work tree path: stat result} dictionary of the files.
+        blobs: the {work tree path: sha} dictionary of the files.
+        start: the work tree path of the top directory.
+        write: if True, write the trees into the object database, in one
+            batch once they are all built.
+    Returns:
+        The {work tree path: tree sha} dictionary of the directories.
+    """
+    trees = {}
+    objects = {}
+    # a directory is deeper than its parent, so its tree is built first:
+    for directory in sorted(listings, key=lambda path: path.count(b"/") + 1
+                            if path else 0, reverse=True):
+        files, directories = listings[directory]
+        prefix = directory + b"/" if directory else b""
+        entries = []
+        for entry in files:
+            path = prefix + entry.name
+            if path in blobs:
+                mode = TREE_MODES[index_mode(stats[path])]
+                entries.append(GitTreeLeaf(mode, entry.name, blobs[path]))
+        for path in directories:
+            if path in trees:
+                entries.append(GitTreeLeaf(b"40000", path[len(prefix):],
+                                           trees[path]))
+        if entries or directory == start:
+            data = tree_serialize(entries)
+            trees[directory] = sha = object_sha("tree", data)
+            objects[sha] = ("tree", data)
+    if write:
+        write_objects(repo, objects)
+    return trees
+
+
+def hash_tree(repo, start=b"", write=False, jobs=1, threads=SCAN_THREADS,
+              ignore=True, stats=None):
+    """Compute the tree of a directory of the work tree.
+    Files whose stat data matches their index entry are not read again.
+    Args:
+        repo: the git repository.
+        start: the work tree path of the directory.
+        write: if True, write the blobs and trees into the object database.
+        jobs: the number of processes hashing the files.
+        threads: the number of directories listed and stat'ed at once.
+        ignore: if True, skip the paths .gitignore files exclude.
+        stats: a HashTreeStats to record the phases into, or None.
+    Returns:
+        The sha of the tree.
+    """
+    if stats is None:
+        stats = HashTreeStats()
+
+    start_time = time.perf_counter()
+    rules = ignore_rules(repo, start) if ignore else None
+    listings = scan_workdir(repo, start, rules, threads)
+    stats.directories = len(listings)
+    stats.times["walk"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    file_stats = {path: st for path, st in stat_files(listings,
+                                                      threads).items()
+                  if index_mode(st) is not None}
+    stats.files = len(file_stats)
+    stats.times["stat"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    index = read_index(repo)
+    stats.entries = len(index)
+    stats.times["index"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    blobs = {}
+    changed = []
+    for path, st in file_stats.items():
+        entry = index.get(path)
+        if is_unchanged(index, entry, st):
+            blobs[path] = entry.sha
+        else:
+            changed.append((path, st))
+    stats.cached = len(blobs)
+    stats.hashed = len(changed)
+    blobs.update(hash_workdir_files(repo, changed, write, jobs))
+    stats.times["hash"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    trees = build_trees(repo, listings, file_stats, blobs, start, write)
+    stats.trees = len(trees)
+    stats.times["trees"] = time.perf_counter() - start_time
+    return trees[start]
+
+
+def dit_hash_tree(args):
+    """Compute the tree object ID of a directory of the work tree, and
+    optionally write its blobs and trees.
+    Usage:
+        dit hash-tree [-w] [-j N] [--threads N] [--no-ignore] [--timing]
+                      [<dir>]
+        dit hash-tree (-h | --help)
+    Options:
+        -h, --help  Show this screen and exit.
+    """
+    repo = find_repo_root()
+    try:
+        start = relative_path(repo, args.directory)
+        stats = HashTreeStats()
+        sha = hash_tree(repo, start, args.write, args.jobs, args.threads,
+                        not args.no_ignore, stats)
+    except (ValueError, FileNotFoundError, NotADirectoryError) as error:
+        print(f"fatal: {error}", file=sys.stderr)
+        sys.exit(128)
+    print(sha)
+    if args.timing:
+        print(stats.report(), file=sys.stderr)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""A module that defines the log command."""
+
+import sys
+import time
+
+from src.dit_commands.rev_list import (OUTPUT_BUFFER_SIZE, add_walk_arguments,
+                                       walk_from_args)
+from src.objects.read_object import read_object
+from src.objects.sha_index import sha_index
+from src.parsers import subparsers
+from src.repos.find_root import find_repo_root
+
+# dit log: allows showing the commit logs
+# dit log will be implemented as dit log [--oneline] [-n <n>]
+#  [--since=<date>] [--first-parent] [--all] [<commit>... | <a>..<b>]
+log_arg = subparsers.add_parser(
+    "log",
+    help="Show commit logs",
+    usage="dit log [--oneline] [-n <n>] [--since=<date>] [--first-parent] "
+    "[--all] <commit>... [^<commit>...] [<a>..<b>]",
+    epilog="See 'dit log --help' for more information on a specific "
+    "command.")
+
+log_arg.add_argument(
+    "--oneline",
+    action="store_true",
+    dest="oneline",
+    help="Show each commit as its abbreviated sha and its subject")
+
+add_walk_arguments(log_arg)
+
+
+def format_date(signature):
+    """Format the date of an author line as git log does, e.g.
+    "Thu Sep 24 14:13:20 2020 +0000", in the timezone of the line."""
+    fields = signature.rsplit(b" ", 2)
+    if len(fields) != 3 or not fields[1].isdigit():
+        return ""
+    timezone = fields[2].decode()
+    offset = 0
+    if len(timezone) == 5 and timezone[1:].isdigit():
+        offset = int(timezone[1:3]) * 3600 + int(timezone[3:]) * 60
+        if timezone[0] == "-":
+            offset = -offset
+    date = time.gmtime(int(fields[1]) + offset)
+    return (time.strftime("%a %b ", date) + str(date.tm_mday) +
+            time.strftime(" %H:%M:%S %Y ", date) + timezone)
+
+
+def format_commit(repo, node, oneline=False):
+    """Format a commit as git log does (the medium format or --oneline).
+    Args:
+        repo: the git repository.
+        node: the CommitNode of the commit.
+        oneline: if True, format the commit on a single line.
+    Returns:
+        The formatted commit, as bytes.
+    """
+    commit = read_object(repo, node.sha)
+    message = commit.message.rstrip(b"\n")
+    if oneline:
+        subject = message.split(b"\n\n", 1)[0].replace(b"\n", b" ")
+        return (sha_index(repo).abbreviate(node.sha).encode() + b" " +
+                subject + b"\n")
+
+    lines = [b"commit " + node.sha.encode()]
+    if len(commit.parents) > 1:
+        lines.append(b"Merge: " + b" ".join(
+            sha_index(repo).abbreviate(parent).encode()
+            for parent in commit.parents))
+    lines.append(b"Author: " + commit.author.rsplit(b" ", 2)[0])
+    lines.append(b"Date:   " + format_date(commit.author).encode())
+    lines.append(b"")
+    for line in message.split(b"\n"):
+        lines.append(b"    " + line)
+    return b"\n".join(lines) + b"\n"
+
+
+def dit_log(args):
+    """Show commit logs.
+    Usage:
+        dit log [--oneline] [-n <n>] [--since=<date>] [--first-parent]
+            [--all] <commit>... [^<commit>...] [<a>..<b>]
+        dit log (-h | --help)
+    Options:
+        -h, --help  Show this screen and exit.
+    """
+    repo = find_repo_root()
+    out = sys.stdout.buffer
+    try:
+        pending = bytearray()
+        for count, node in enumerate(walk_from_args(repo, args)):
+            # the medium format separates the commits with an empty line:
+            if count and not args.oneline:
+                pending += b"\n"
+            pending += format_commit(repo, node, args.oneline)
+            # the first commits are written right away:
+            if count < 16 or len(pending) >= OUTPUT_BUFFER_SIZE:
+                out.write(pending)
+                out.flush()
+                pending.clear()
+        out.write(pending)
+        out.flush()
+    except ValueError as error:
+        print(f"fatal: {error}", file=sys.stderr)
+        sys.exit(128)
+    except BrokenPipeError:
+        # the reader (e.g. a pager) is gone: stopping quietly:
+        sys.stderr.close()
+        sys.exit(0)
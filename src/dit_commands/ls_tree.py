@@ -1,16 +1,25 @@
 #!/usr/bin/env python3
 """A module that defines the ls-tree command."""
 
+import concurrent.futures
+import os
+import sys
 
-from src.objects.read_object import read_object
+from src.dit_commands.cat_file import resolve_name
+from src.objects.read_object import read_object, read_raw_object
 from src.parsers import subparsers
 from src.repos.find_root import find_repo_root
 
+# how many threads read sub-trees ahead of the listing:
+DEFAULT_JOBS = min(8, os.cpu_count() or 1)
+# how much of the listing is gathered before it is written out:
+OUTPUT_BUFFER_SIZE = 64 * 1024
+
 # ls-tree: allows listing the contents of a tree object
 ls_tree_arg = subparsers.add_parser(
     "ls-tree",
     help="List the contents of a tree object",
-    usage="dit ls-tree <tree-sha>",
+    usage="dit ls-tree [-r] [-j <n>] <tree-ish>",
     epilog="See 'dit ls-tree --help' for more information on a specific "
     "command.")
 
@@ -20,44 +29,104 @@ ls_tree_arg.add_argument(
     dest="recursive",
     help="Recurse into sub-trees")
 
+ls_tree_arg.add_argument(
+    "-j", "--jobs",
+    type=int,
+    default=DEFAULT_JOBS,
+    dest="jobs",
+    help="The number of threads reading sub-trees ahead (default: "
+    f"{DEFAULT_JOBS})")
+
 ls_tree_arg.add_argument(
     "tree",
-    metavar="tree",
-    help="The tree to list")
+    metavar="tree-ish",
+    help="The tree (or the commit of the tree) to list")
 
 
 def dit_ls_tree(args):
     """List the contents of a tree object.
     Usage:
-        dit ls-tree <tree-sha>
+        dit ls-tree [-r] [-j <n>] <tree-ish>
         dit ls-tree (-h | --help)"""
     repo = find_repo_root()
 
-    tree = read_object(repo, args.tree)
-    # error handling if the tree is not found or is not a tree:
+    sha = resolve_name(repo, args.tree)
     try:
-        if not tree:
+        if sha is None:
             raise ValueError(f"{args.tree} not found")
-    except ValueError as err:
-        # print(err)
-        raise ValueError(f"{args.tree} not found") from err
-
-    if tree.object_format != "tree":
-        raise ValueError(f"{args.tree} is not a tree object")
-    ls_tree(repo, tree, args.recursive)
-
-
-def ls_tree(repo, tree, recursive=False, path=""):
-    """List the contents of a tree object."""
-    stack = [(tree, "")] # (tree, path) tuples in a stack
-    # while the stack is not empty
-    while stack:
-        node, path = stack.pop()    # pop the last element from the stack
-        for leaf in node.leaves:    # for each leaf in the tree
-            # print the leaf
-            print(leaf.mode, leaf.sha, path + leaf.path, sep="\t")
-            if leaf.mode.startswith(b"10") and recursive:
-                subtree = read_object(repo, leaf.sha)
-                if subtree.object_format == "tree":
-                    # if the leaf is a tree, add it to the stack
-                    stack.append((repo, subtree, path + leaf.path + "/"))
+        # listing the tree of a commit:
+        object_format, data = read_raw_object(repo, sha)
+        if object_format == b"commit" and data.startswith(b"tree "):
+            sha = data[5:45].decode()
+            object_format, data = read_raw_object(repo, sha)
+        if object_format != b"tree":
+            raise ValueError(f"{args.tree} is not a tree object")
+    except ValueError:
+        print(f"fatal: not a tree object: {args.tree}", file=sys.stderr)
+        sys.exit(128)
+
+    ls_tree(repo, read_object(repo, sha), args.recursive,
+            sys.stdout.buffer, args.jobs)
+
+
+def entry_type(mode):
+    """Return the type of the object a tree entry of a mode points to."""
+    if mode.startswith(b"4"):
+        return b"tree"
+    if mode.startswith(b"160"):
+        return b"commit"
+    return b"blob"
+
+
+def ls_tree(repo, tree, recursive=False, out=None, jobs=DEFAULT_JOBS):
+    """List the contents of a tree object, as git ls-tree does.
+    With recursive, sub-trees are listed in place of their entry, depth
+    first, in tree order. Every sub-tree met is read ahead through a thread
+    pool as soon as its parent is listed, and is read only once, however
+    many paths it appears under. The listing is written out in chunks of
+    OUTPUT_BUFFER_SIZE bytes, whether or not out is buffered itself.
+    Args:
+        repo: the git repository.
+        tree: the TreeObject to list.
+        recursive: if True, recurse into sub-trees.
+        out: a binary file the listing is written to (default: stdout).
+        jobs: the number of threads reading sub-trees.
+    """
+    if out is None:
+        out = sys.stdout.buffer
+    # the sub-trees read or being read, by sha:
+    subtrees = {}
+    pending = bytearray()
+    with concurrent.futures.ThreadPoolExecutor(max(1, jobs)) as executor:
+
+        def read_ahead(node):
+            """Start reading the sub-trees of a tree not read yet."""
+            for index in range(len(node)):
+                if node.is_tree_at(index):
+                    sha = node.sha_at(index)
+                    if sha not in subtrees:
+                        subtrees[sha] = executor.submit(read_object, repo, sha)
+
+        # (tree, path prefix, index of the next entry) tuples in a stack:
+        stack = [(tree, b"", 0)]
+        while stack:
+            node, prefix, index = stack.pop()
+            if recursive and index == 0:
+                read_ahead(node)
+            while index < len(node):
+                mode = node.mode_at(index)
+                name = prefix + node.name_at(index)
+                sha = node.sha_at(index)
+                index += 1
+                if recursive and mode.startswith(b"4"):
+                    # listing the sub-tree, then the rest of this tree:
+                    stack.append((node, prefix, index))
+                    stack.append((subtrees[sha].result(), name + b"/", 0))
+                    break
+                pending += b"%s %s %s\t%s\n" % (
+                    mode.rjust(6, b"0"), entry_type(mode), sha.encode(), name)
+            if len(pending) >= OUTPUT_BUFFER_SIZE:
+                out.write(pending)
+                pending.clear()
+    out.write(pending)
+    out.flush()
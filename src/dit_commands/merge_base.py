@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""A module that defines the merge-base command."""
+
+import heapq
+import itertools
+import sys
+import time
+
+from src.dit_commands.rev_list import DATE_SLOP, resolve_commit
+from src.objects.commit_graph_class import GENERATION_INFINITY
+from src.objects.object_cache import LRUCache
+from src.objects.read_commit import commit_node
+from src.parsers import subparsers
+from src.repos.find_root import find_repo_root
+
+# the paint of the merge-base walk:
+PARENT1 = 1
+PARENT2 = 2
+STALE = 4
+# how many answers are remembered per process:
+MEMO_ENTRIES = 65536
+
+# the answers of merge_bases and is_ancestor so far:
+#   (.git path, query, commits...) -> answer
+_MEMO = LRUCache(max_entries=MEMO_ENTRIES)
+
+# dit merge-base: allows finding the best common ancestors of commits
+# dit merge-base will be implemented as dit merge-base [--all] <commit>
+#  <commit>..., or dit merge-base --is-ancestor <commit> <commit>
+merge_base_arg = subparsers.add_parser(
+    "merge-base",
+    help="Find as good common ancestors as possible for a merge",
+    usage="dit merge-base [--all] [--timing] <commit> <commit>...\n"
+    "       dit merge-base --is-ancestor [--timing] <commit> <commit>",
+    epilog="See 'dit merge-base --help' for more information on a "
+    "specific command.")
+
+merge_base_mode = merge_base_arg.add_mutually_exclusive_group()
+
+merge_base_mode.add_argument(
+    "--all",
+    action="store_true",
+    dest="all",
+    help="Output all the merge bases, not only one")
+
+merge_base_mode.add_argument(
+    "--is-ancestor",
+    action="store_true",
+    dest="is_ancestor",
+    help="Exit with status 0 if the first commit is an ancestor of the "
+    "second, and 1 if not")
+
+merge_base_arg.add_argument(
+    "--timing",
+    action="store_true",
+    dest="timing",
+    help="Report how many commits were walked, and how long it took, on "
+    "stderr")
+
+merge_base_arg.add_argument(
+    "commits",
+    metavar="commit",
+    nargs="+",
+    help="The commits to find the merge bases of")
+
+
+def clear_memo():
+    """Forget every answer memoized so far."""
+    _MEMO.clear()
+
+
+class WalkStats:
+    """A class that counts the commits a merge-base query walked.
+    Attributes:
+        walked: the number of commits taken off the queue.
+        memo_hits: the number of answers found in the memo.
+    """
+
+    def __init__(self):
+        """Initialize the counters."""
+        self.walked = 0
+        self.memo_hits = 0
+
+
+def paint_down_to_common(repo, one, twos, stats=None):
+    """Paint the history of one and of twos, newest commit first, to find
+    the commits reachable from both.
+    A commit painted by both sides is a merge base candidate, and the paint
+    it passes to its parents is marked stale. The walk stops as soon as
+    every commit left in the queue is stale, which is usually long before
+    the root of the history.
+    Args:
+        repo: the git repository.
+        one: the sha of the first commit.
+        twos: the shas of the other commits.
+        stats: a WalkStats to count the commits walked in, or None.
+    Returns:
+        The list of candidate shas, newest first; some may be ancestors of
+        others.
+    """
+    paint = {}
+    heap = []
+    order = itertools.count()
+    # how many times each commit is in the queue, and the commits in the
+    #  queue that are not stale:
+    queued = {}
+    nonstale = set()
+
+    def push(sha, flags):
+        """Add paint to a commit, and queue it if the paint is new."""
+        old = paint.get(sha, 0)
+        if old & flags == flags:
+            return
+        paint[sha] = old | flags
+        node = commit_node(repo, sha)
+        heapq.heappush(heap, (-node.date, next(order), node))
+        queued[sha] = queued.get(sha, 0) + 1
+        if paint[sha] & STALE:
+            nonstale.discard(sha)
+        else:
+            nonstale.add(sha)
+
+    push(one, PARENT1)
+    for two in twos:
+        push(two, PARENT2)
+
+    results = []
+    while nonstale:
+        _, _, node = heapq.heappop(heap)
+        queued[node.sha] -= 1
+        if not queued[node.sha]:
+            del queued[node.sha]
+            nonstale.discard(node.sha)
+        if stats is not None:
+            stats.walked += 1
+        flags = paint[node.sha]
+        if flags == PARENT1 | PARENT2:
+            if node.sha not in results:
+                results.append(node.sha)
+            flags |= STALE
+        for parent in node.parents:
+            push(parent, flags)
+
+    # dropping the candidates reached from other candidates:
+    return [sha for sha in results if not paint[sha] & STALE]
+
+
+def is_ancestor(repo, ancestor, descendant, stats=None):
+    """Return True if a commit is an ancestor of (or is) another commit.
+    The history of the descendant is walked newest first, and commits that
+    cannot reach the ancestor are cut off: with the commit-graph, those of
+    a lower generation than the ancestor; without it, those more than
+    DATE_SLOP older than the ancestor. Answers are memoized per process.
+    Args:
+        repo: the git repository.
+        ancestor: the sha of the possible ancestor.
+        descendant: the sha of the possible descendant.
+        stats: a WalkStats to count the commits walked in, or None.
+    Returns:
+        True or False.
+    """
+    key = (repo.dotgit, "is-ancestor", ancestor, descendant)
+    answer = _MEMO.get(key)
+    if answer is not None:
+        if stats is not None:
+            stats.memo_hits += 1
+        return answer
+
+    target = commit_node(repo, ancestor)
+    answer = False
+    seen = {descendant}
+    start = commit_node(repo, descendant)
+    heap = [(-start.date, 0, start)]
+    order = itertools.count(1)
+    while heap:
+        _, _, node = heapq.heappop(heap)
+        if stats is not None:
+            stats.walked += 1
+        if node.sha == ancestor:
+            answer = True
+            break
+        for parent in node.parents:
+            if parent in seen:
+                continue
+            seen.add(parent)
+            parent_node = commit_node(repo, parent)
+            if cannot_reach(parent_node, target):
+                continue
+            heapq.heappush(heap, (-parent_node.date, next(order),
+                                  parent_node))
+    _MEMO.put(key, answer, 1)
+    return answer
+
+
+def cannot_reach(node, target):
+    """Return True if a commit certainly does not have target as ancestor
+    (or is not target itself)."""
+    if (node.generation != GENERATION_INFINITY and
+            target.generation != GENERATION_INFINITY):
+        return node.generation < target.generation
+    return node.date + DATE_SLOP < target.date
+
+
+def merge_bases(repo, one, twos, find_all=False, stats=None):
+    """Find the best common ancestors of commits, as git merge-base does.
+    Args:
+        repo: the git repository.
+        one: the sha of the first commit.
+        twos: the shas of the other commits.
+        find_all: if True, return every merge base, not only the best one.
+        stats: a WalkStats to count the commits walked in, or None.
+    Returns:
+        The list of the merge base shas, newest first (a single one unless
+        find_all), empty if the commits have no common ancestor.
+    """
+    twos = tuple(twos)
+    key = (repo.dotgit, "merge-base", one) + twos
+    bases = _MEMO.get(key)
+    if bases is not None:
+        if stats is not None:
+            stats.memo_hits += 1
+    else:
+        if one in twos:
+            bases = [one]
+        else:
+            bases = remove_redundant(
+                repo, paint_down_to_common(repo, one, twos, stats), stats)
+        _MEMO.put(key, bases, len(bases))
+    return list(bases) if find_all else list(bases[:1])
+
+
+def remove_redundant(repo, candidates, stats=None):
+    """Drop the candidates that are ancestors of other candidates."""
+    if len(candidates) < 2:
+        return candidates
+    return [candidate for candidate in candidates
+            if not any(other != candidate and
+                       is_ancestor(repo, candidate, other, stats)
+                       for other in candidates)]
+
+
+def dit_merge_base(args):
+    """Find as good common ancestors as possible for a merge.
+    Usage:
+        dit merge-base [--all] [--timing] <commit> <commit>...
+        dit merge-base --is-ancestor [--timing] <commit> <commit>
+        dit merge-base (-h | --help)
+    Options:
+        -h, --help  Show this screen and exit.
+    """
+    repo = find_repo_root()
+    if len(args.commits) < 2 or (args.is_ancestor and len(args.commits) != 2):
+        merge_base_arg.error("expected two commits (or more, without "
+                             "--is-ancestor)")
+    try:
+        shas = [resolve_commit(repo, name) for name in args.commits]
+    except ValueError as error:
+        print(f"fatal: {error}", file=sys.stderr)
+        sys.exit(128)
+
+    stats = WalkStats()
+    start = time.perf_counter()
+    if args.is_ancestor:
+        answer = is_ancestor(repo, shas[0], shas[1], stats)
+    else:
+        bases = merge_bases(repo, shas[0], shas[1:], args.all, stats)
+    elapsed = time.perf_counter() - start
+    if args.timing:
+        print(f"merge-base: {stats.walked} commits walked in "
+              f"{elapsed * 1000:.3f} ms", file=sys.stderr)
+
+    if args.is_ancestor:
+        sys.exit(0 if answer else 1)
+    if not bases:
+        sys.exit(1)
+    for base in bases:
+        print(base)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""A module that defines the pack-objects command."""
+
+import sys
+
+from src.objects.write_pack import DEFAULT_DEPTH, DEFAULT_WINDOW, write_pack
+from src.parsers import subparsers
+from src.repos.find_root import find_repo_root
+
+# dit pack-objects: allows writing a pack of the objects read from stdin
+# Each line of stdin holds a sha, optionally followed by the path the object
+# was found at (as printed by git rev-list --objects).
+pack_objects_arg = subparsers.add_parser(
+    "pack-objects",
+    help="Create a packed archive of objects",
+    usage="dit pack-objects [--window N] [--depth N] <base-name> "
+    "< object-list",
+    epilog="See 'dit pack-objects --help' for more information on a "
+    "specific command.")
+
+pack_objects_arg.add_argument(
+    "--window",
+    metavar="N",
+    type=int,
+    default=DEFAULT_WINDOW,
+    help="How many previous objects are tried as delta bases "
+    f"(default: {DEFAULT_WINDOW}, 0 disables deltas)")
+
+pack_objects_arg.add_argument(
+    "--depth",
+    metavar="N",
+    type=int,
+    default=DEFAULT_DEPTH,
+    help=f"The longest delta chain allowed (default: {DEFAULT_DEPTH})")
+
+pack_objects_arg.add_argument(
+    "base_name",
+    metavar="base-name",
+    help="Write the pack to <base-name>-<checksum>.pack and .idx")
+
+
+def read_object_list(lines):
+    """Read the shas, and the path hints, of the objects to pack.
+    Args:
+        lines: lines of "<sha> [<path>]".
+    Returns:
+        A (list of shas, dictionary of sha to path) tuple.
+    """
+    shas = []
+    names = {}
+    for line in lines:
+        fields = line.rstrip("\n").split(" ", 1)
+        if not fields[0]:
+            continue
+        shas.append(fields[0])
+        if len(fields) > 1 and fields[1]:
+            names[fields[0]] = fields[1].rsplit("/", 1)[-1].encode()
+    return shas, names
+
+
+def dit_pack_objects(args):
+    """Create a packed archive of the objects listed on stdin.
+    Usage:
+        dit pack-objects [--window N] [--depth N] <base-name> < object-list
+        dit pack-objects (-h | --help)
+    Options:
+        -h, --help  Show this screen and exit.
+    """
+    repo = find_repo_root()
+    shas, names = read_object_list(sys.stdin)
+    checksum, _ = write_pack(repo, shas, args.base_name, args.window,
+                             args.depth, names)
+    print(checksum)
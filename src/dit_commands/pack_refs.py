@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""A module that defines the pack-refs command."""
+
+import os
+import sys
+
+from src.dit_commands.packed_refs import format_packed_refs
+from src.dit_commands.resolve_list_refs import invalidate_refs, ref_snapshot
+from src.objects.read_object import read_object_header
+from src.parsers import subparsers
+from src.repos.find_root import find_repo_root
+from src.repos.lock_file import LockFile
+from src.repos.repo_paths import git_file_path
+
+# dit pack-refs: allows consolidating the loose refs into packed-refs
+# dit pack-refs will be implemented as dit pack-refs [--all] [--no-prune]
+pack_refs_arg = subparsers.add_parser(
+    "pack-refs",
+    help="Pack heads and tags for efficient repository access",
+    usage="dit pack-refs [--all] [--no-prune]",
+    epilog="See 'dit pack-refs --help' for more information on a specific "
+    "command.")
+
+pack_refs_arg.add_argument(
+    "--all",
+    action="store_true",
+    dest="all",
+    help="Pack all refs, not only tags and the refs already packed")
+
+pack_refs_arg.add_argument(
+    "--no-prune",
+    action="store_false",
+    dest="prune",
+    help="Keep the loose refs after packing them")
+
+
+def pack_refs(repo, pack_all=False, prune=True):
+    """Move loose refs into the packed-refs file.
+    Tags are always packed, other refs only with pack_all; refs that are
+    not packed keep their current packed-refs entry, if any. Symbolic refs
+    stay loose, as do refs pointing to a missing object (as git leaves
+    them). Annotated tags are written with the object they peel to.
+    packed-refs is locked before the refs are read, and stays locked until
+    the loose refs packed are pruned.
+    Args:
+        repo: the git repository.
+        pack_all: if True, pack every ref.
+        prune: if True, delete the loose refs once they are packed.
+    Returns:
+        The number of refs in packed-refs.
+    Raises:
+        FileExistsError: if packed-refs.lock already exists.
+    """
+    lock = LockFile(git_file_path(repo, "packed-refs"))
+    try:
+        # taking a fresh snapshot of the refs:
+        invalidate_refs(repo)
+        snapshot = ref_snapshot(repo)
+        refs = {}
+        peeled = {}
+        packed_loose = []
+        for name, value in snapshot.items():
+            if value.startswith("ref: "):
+                continue
+            if (pack_all or name.startswith("refs/tags/")) and (
+                    name not in snapshot.loose or
+                    object_exists(repo, value)):
+                refs[name] = value
+                target = snapshot.peel(name)
+                if target:
+                    peeled[name] = target
+                if name in snapshot.loose:
+                    packed_loose.append((name, value))
+                continue
+            if name in snapshot.loose and (pack_all or name.startswith(
+                    "refs/tags/")):
+                print(f"error: {name} does not point to a valid object!",
+                      file=sys.stderr)
+            if name in snapshot.packed:
+                # keeping the packed entry, which a loose ref may override:
+                refs[name] = snapshot.packed[name]
+                if name in snapshot.packed_peeled:
+                    peeled[name] = snapshot.packed_peeled[name]
+        lock.replace(format_packed_refs(refs, peeled))
+        if prune:
+            prune_loose_refs(repo, packed_loose)
+    finally:
+        lock.rollback()
+        invalidate_refs(repo)
+    return len(refs)
+
+
+def object_exists(repo, sha):
+    """Return True if the object a ref points to can be read."""
+    try:
+        read_object_header(repo, sha)
+    except ValueError:
+        return False
+    return True
+
+
+def prune_loose_refs(repo, refs):
+    """Delete loose refs that were packed, and the directories left empty.
+    A ref is only deleted if it still holds the value that was packed, which
+    is checked with the ref locked; a ref another writer holds the lock of
+    is left alone.
+    Args:
+        repo: the git repository.
+        refs: (name, value) pairs of the packed loose refs.
+    """
+    keep = {git_file_path(repo, "refs", name) for name in ("heads", "tags")}
+    keep.add(git_file_path(repo, "refs"))
+    for name, value in refs:
+        path = git_file_path(repo, name)
+        try:
+            lock = LockFile(path)
+        except FileExistsError:
+            continue
+        try:
+            with open(path, encoding="utf-8") as f:
+                if f.read().strip() != value:
+                    continue
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        finally:
+            lock.rollback()
+        directory = os.path.dirname(path)
+        while directory not in keep:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+
+def dit_pack_refs(args):
+    """Pack heads and tags for efficient repository access.
+    Usage:
+        dit pack-refs [--all] [--no-prune]
+        dit pack-refs (-h | --help)
+    Options:
+        -h, --help  Show this screen and exit.
+    """
+    repo = find_repo_root()
+    try:
+        pack_refs(repo, args.all, args.prune)
+    except FileExistsError:
+        print(f"fatal: Unable to create "
+              f"'{git_file_path(repo, 'packed-refs')}.lock': File exists.",
+              file=sys.stderr)
+        sys.exit(128)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""A module that defines the packed-refs reading and writing functions."""
+
+import collections
+
+from src.objects.read_object import read_object_header, read_raw_object
+from src.repos.lock_file import LockFile
+from src.repos.repo_paths import git_file_path
+
+# packed-refs: is a file that stores many references in a single file
+# Each line holds "<sha> <refname>", sorted by refname
+# A line "^<sha>" after an annotated tag holds the object the tag peels to
+PACKED_REFS_HEADER = "# pack-refs with: peeled fully-peeled sorted \n"
+
+
+def read_packed_refs(repo):
+    """Read the packed-refs file of the repository.
+    Args:
+        repo: the git repository.
+    Returns:
+        A (refs, peeled) tuple: an OrderedDict mapping ref names to shas, and
+        a dictionary mapping the names of annotated tags to the sha of the
+        object they peel to.
+    Raises:
+        ValueError: if the file is malformed.
+    """
+    refs = collections.OrderedDict()
+    peeled = {}
+    path = git_file_path(repo, "packed-refs")
+    try:
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return refs, peeled
+
+    name = None
+    for line in lines:
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("^"):
+            # the peeled value of the ref on the previous line:
+            if name is None:
+                raise ValueError(f"{path}: peeled line without a ref")
+            peeled[name] = line[1:]
+            continue
+        sha, _, name = line.partition(" ")
+        if len(sha) != 40 or not name:
+            raise ValueError(f"{path}: malformed line {line!r}")
+        refs[name] = sha
+    return refs, peeled
+
+
+def write_packed_refs(repo, refs, peeled, lock=None):
+    """Write the packed-refs file of the repository.
+    The file is written to packed-refs.lock, which also keeps concurrent
+    writers out, then renamed over packed-refs.
+    Args:
+        repo: the git repository.
+        refs: a mapping of ref names to shas.
+        peeled: a mapping of annotated tag names to their peeled shas.
+        lock: the LockFile of packed-refs, if it is already held; it is
+            then left to the caller to commit.
+    Raises:
+        FileExistsError: if packed-refs.lock already exists.
+    """
+    if lock is not None:
+        lock.write(format_packed_refs(refs, peeled))
+        return
+    with LockFile(git_file_path(repo, "packed-refs")) as new_lock:
+        new_lock.write(format_packed_refs(refs, peeled))
+
+
+def format_packed_refs(refs, peeled):
+    """Return the content of a packed-refs file, sorted by ref name.
+    Args:
+        refs: a mapping of ref names to shas.
+        peeled: a mapping of annotated tag names to their peeled shas.
+    """
+    lines = [PACKED_REFS_HEADER]
+    for name in sorted(refs):
+        lines.append(f"{refs[name]} {name}\n")
+        if name in peeled:
+            lines.append(f"^{peeled[name]}\n")
+    return "".join(lines)
+
+
+def peel_object(repo, sha):
+    """Follow an annotated tag (and any tag it points to) to the object it
+    finally refers to.
+    Args:
+        repo: the git repository.
+        sha: the sha the ref points to.
+    Returns:
+        The sha of the peeled object, or None if sha is not a tag.
+    """
+    peeled = None
+    while True:
+        # only the header is read for anything but tags:
+        if read_object_header(repo, sha)[0] != b"tag":
+            return peeled
+        _, data = read_raw_object(repo, sha)
+        # the first line of a tag is "object <sha>":
+        first_line = data.split(b"\n", 1)[0]
+        if not first_line.startswith(b"object "):
+            raise ValueError(f"{sha}: malformed tag object")
+        sha = peeled = first_line[7:].decode()
@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+"""A module that defines the read-tree command.
+The index is the manifest of the work tree: it lists the files last
+checked out with the stat data each had once written. Checking out another
+tree diffs it with the tree of HEAD, skipping the sub-trees they share, so
+that only the files that differ are removed or written; the blobs are
+inflated and written across a process pool, after the directories they need
+are created in one pass.
+"""
+
+import concurrent.futures
+import os
+import stat
+import sys
+import time
+
+from src.dit_commands.add import hash_workdir_files, is_unchanged
+from src.dit_commands.cat_file import resolve_name
+from src.dit_commands.tree_parsing import iter_tree_entries
+from src.objects.read_object import read_object_header, read_raw_object
+from src.parsers import subparsers
+from src.repos.find_root import find_repo_root
+from src.repos.gitrepo_class import GitRepo
+from src.repos.index_class import (MODE_EXECUTABLE, MODE_GITLINK,
+                                   MODE_SYMLINK, GitIndex, IndexEntry,
+                                   index_path, read_index, stat_fields,
+                                   write_index)
+from src.repos.lock_file import LockFile
+from src.repos.workdir import workdir_path
+
+# dit read-tree: allows reading a tree into the index
+# dit read-tree will be implemented as dit read-tree [-u] <tree-ish>
+read_tree_arg = subparsers.add_parser(
+    "read-tree",
+    help="Read a tree into the index, and optionally the work tree",
+    usage="dit read-tree [-u [-f] [-j N] [--timing]] <tree-ish>",
+    epilog="See 'dit read-tree --help' for more information on a specific "
+    "command.")
+
+read_tree_arg.add_argument(
+    "-u",
+    action="store_true",
+    dest="update",
+    help="Update the work tree to match the tree")
+
+read_tree_arg.add_argument(
+    "-f", "--force",
+    action="store_true",
+    dest="force",
+    help="Overwrite local changes and untracked files in the way")
+
+read_tree_arg.add_argument(
+    "-j", "--jobs",
+    metavar="N",
+    type=int,
+    default=1,
+    dest="jobs",
+    help="Write the files across N processes (default: 1)")
+
+read_tree_arg.add_argument(
+    "--timing",
+    action="store_true",
+    dest="timing",
+    help="Report the files written and removed on stderr")
+
+read_tree_arg.add_argument(
+    "tree",
+    metavar="tree-ish",
+    help="The tree, or the commit or tag pointing to it, to read")
+
+
+class CheckoutStats:
+    """A class that counts the work a checkout did.
+    Attributes:
+        written: the number of files written.
+        removed: the number of files removed.
+        directories: the number of directories created.
+        seconds: the time the checkout took.
+    """
+
+    def __init__(self):
+        """Initialize the counters."""
+        self.written = 0
+        self.removed = 0
+        self.directories = 0
+        self.seconds = 0.0
+
+    def report(self, command):
+        """Return the timing report of the checkout."""
+        return (f"{command}: {self.written} files written, {self.removed} "
+                f"removed, {self.directories} directories created in "
+                f"{self.seconds:.3f} s")
+
+
+def peel_to_tree(repo, name):
+    """Resolve a tree-ish (a tree, or a commit or tag pointing to one).
+    Returns:
+        The hex sha of the tree.
+    Raises:
+        ValueError: if the name does not resolve to a tree.
+    """
+    sha = resolve_name(repo, name)
+    if sha is None:
+        raise ValueError(f"not a valid object name {name}")
+    while True:
+        object_format = read_object_header(repo, sha)[0]
+        if object_format == b"tree":
+            return sha
+        if object_format not in (b"commit", b"tag"):
+            raise ValueError(f"{name} is not a tree-ish")
+        # the first line of a commit is its tree, that of a tag its object:
+        data = read_raw_object(repo, sha)[1]
+        sha = data[data.index(b" ") + 1:data.index(b"\n")].decode()
+
+
+def check_tree_name(name, prefix):
+    """Check that the name of a tree entry is a single path component that
+    may be written to the work tree: not empty, ".", ".." or ".git" (in any
+    case, for case-insensitive file systems), with no slash or null.
+    Raises:
+        ValueError: if the name is not.
+    """
+    if not name or name in (b".", b"..") or name.lower() == b".git" or \
+            b"/" in name or b"\x00" in name:
+        raise ValueError(f"invalid path '{os.fsdecode(prefix + name)}'")
+
+
+def diff_trees(repo, old_sha, new_sha, prefix=b"", changes=None):
+    """Compare two trees, skipping the sub-trees they share.
+    The names of the entries are checked as they are read, so that no path
+    built from them leaves the work tree or enters the repository.
+    Args:
+        repo: the git repository.
+        old_sha: the sha of the old tree, or None.
+        new_sha: the sha of the new tree, or None.
+        prefix: the work tree path of the trees, followed by a slash.
+    Returns:
+        The {path: (old (mode, sha) or None, new (mode, sha) or None)}
+        dictionary of the files that differ.
+    Raises:
+        ValueError: if a name is invalid, or is that of two entries.
+    """
+    if changes is None:
+        changes = {}
+    old = {}
+    new = {}
+    for entries, sha in ((old, old_sha), (new, new_sha)):
+        if sha is not None:
+            data = read_raw_object(repo, sha)[1]
+            for mode, name, entry_sha in iter_tree_entries(data):
+                check_tree_name(name, prefix)
+                if name in entries:
+                    # a blob and a tree of the same name would be one path:
+                    raise ValueError(f"tree {sha} has duplicate entries "
+                                     f"for '{os.fsdecode(prefix + name)}'")
+                entries[name] = (int(mode, 8), entry_sha)
+    for name in old.keys() | new.keys():
+        old_entry = old.get(name)
+        new_entry = new.get(name)
+        if old_entry == new_entry:
+            continue
+        path = prefix + name
+        old_tree = old_entry is not None and old_entry[0] == 0o40000
+        new_tree = new_entry is not None and new_entry[0] == 0o40000
+        if old_tree or new_tree:
+            diff_trees(repo, old_entry[1] if old_tree else None,
+                       new_entry[1] if new_tree else None, path + b"/",
+                       changes)
+        old_file = old_entry if not old_tree else None
+        new_file = new_entry if not new_tree else None
+        if old_file is not None or new_file is not None:
+            changes[path] = (old_file, new_file)
+    return changes
+
+
+def diff_index(repo, index, new_sha, old_sha=None):
+    """Compare what was last checked out with a tree, as diff_trees does.
+    The old tree (that of HEAD) is diffed against the new one. The
+    cache-tree of the index is not used in its place: it is the tree of the
+    index, staged changes included, which would then be taken for what was
+    checked out and overwritten. With no old tree, the entries of the index
+    are compared with the files of the new tree.
+    Returns:
+        A (changes, complete) tuple: the changes, and whether the index
+        holds the new tree once they are applied (it does only if it held
+        the old tree, with nothing staged).
+    """
+    if old_sha is not None:
+        return diff_trees(repo, old_sha, new_sha), index.tree == old_sha
+    old = {entry.path: (entry.mode, entry.sha) for entry in index
+           if not entry.stage}
+    new = {path: entry for path, (_, entry)
+           in diff_trees(repo, None, new_sha).items()}
+    return {path: (old.get(path), new.get(path))
+            for path in old.keys() | new.keys()
+            if old.get(path) != new.get(path)}, True
+
+
+def check_work_tree(repo, index, changes):
+    """Check that a checkout does not lose work: the files it changes or
+    removes must be clean, and the files it creates must not be untracked
+    files in the way.
+    Raises:
+        ValueError: listing the files that would be lost.
+    """
+    root = workdir_path(repo, b"")
+    modified = []
+    untracked = []
+    suspects = []
+    for path, (old, new) in changes.items():
+        entry = index.get(path)
+        staged = (entry.mode, entry.sha) if entry is not None else None
+        if staged != old and staged != new:
+            # the change staged in the index would be lost (the index
+            #  already holding the new file is kept, as git does):
+            modified.append(path)
+            continue
+        try:
+            st = os.lstat(root + path)
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        if entry is None:
+            if not stat.S_ISDIR(st.st_mode):
+                untracked.append(path)
+        elif entry.mode != MODE_GITLINK and not is_unchanged(index, entry,
+                                                             st):
+            suspects.append((path, st))
+    shas = hash_workdir_files(repo, suspects, write=False)
+    modified += [path for path, _ in suspects
+                 if shas[path] != index.get(path).sha]
+
+    if modified or untracked:
+        lines = []
+        for paths, what in ((modified, "Your local changes to the following "
+                             "files would be overwritten by checkout:"),
+                            (untracked, "The following untracked working "
+                             "tree files would be overwritten by checkout:")):
+            if paths:
+                lines.append(what)
+                lines += [f"\t{os.fsdecode(path)}" for path in sorted(paths)]
+        raise ValueError("\n".join(lines + ["Aborting"]))
+
+
+def has_symlink_leading_path(root, path, checked):
+    """Return True if a directory leading to a work tree path is a symbolic
+    link, through which the path would be outside the work tree.
+    Args:
+        root: the work tree path, followed by a slash.
+        path: the path, relative to the work tree.
+        checked: the set of the directories already found to be real ones.
+    """
+    slash = path.find(b"/")
+    while slash != -1:
+        directory = path[:slash]
+        if directory not in checked:
+            try:
+                if stat.S_ISLNK(os.lstat(root + directory).st_mode):
+                    return True
+            except OSError:
+                return False
+            checked.add(directory)
+        slash = path.find(b"/", slash + 1)
+    return False
+
+
+def remove_files(repo, paths):
+    """Remove files of the work tree, then the directories they leave
+    empty, deepest first. A file beyond a symbolic link is not in the work
+    tree, and is left alone.
+    Returns:
+        The number of files removed.
+    """
+    root = workdir_path(repo, b"")
+    removed = 0
+    parents = set()
+    checked = set()
+    for path in paths:
+        if has_symlink_leading_path(root, path, checked):
+            continue
+        try:
+            if os.path.isdir(root + path) and not os.path.islink(root + path):
+                # a submodule, removed only if empty:
+                os.rmdir(root + path)
+            else:
+                os.remove(root + path)
+            removed += 1
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        except OSError:
+            continue
+        slash = path.rfind(b"/")
+        if slash != -1:
+            parents.add(path[:slash])
+    for directory in sorted(parents, key=len, reverse=True):
+        while directory:
+            try:
+                os.rmdir(root + directory)
+            except OSError:
+                break
+            slash = directory.rfind(b"/")
+            directory = directory[:slash] if slash != -1 else b""
+    return removed
+
+
+def make_directories(repo, paths):
+    """Create the directories the files of a checkout need, at once, before
+    any file is written. A directory already there must be a real one, not
+    a symbolic link the files would be written through.
+    Returns:
+        The number of directories created.
+    Raises:
+        ValueError: if a file or a symbolic link is in the way.
+    """
+    root = workdir_path(repo, b"")
+    needed = set()
+    for path in paths:
+        slash = path.rfind(b"/")
+        while slash != -1 and path[:slash] not in needed:
+            needed.add(path[:slash])
+            slash = path.rfind(b"/", 0, slash)
+    created = 0
+    # parents sort before their sub-directories:
+    for directory in sorted(needed):
+        try:
+            os.mkdir(root + directory)
+            created += 1
+        except FileExistsError:
+            mode = os.lstat(root + directory).st_mode
+            if stat.S_ISLNK(mode):
+                raise ValueError(f"'{os.fsdecode(directory)}' is a symbolic "
+                                 "link in the way of a directory") from None
+            if not stat.S_ISDIR(mode):
+                raise ValueError(f"'{os.fsdecode(directory)}' is in the way "
+                                 "of a directory") from None
+    return created
+
+
+def checkout_file(repo, path, mode, sha):
+    """Write a file of the work tree from its blob.
+    The file is removed and created again rather than overwritten, so that
+    its mode is that of the blob and a hard link to it is left untouched.
+    Returns:
+        The stat data of the file, as the index records it.
+    """
+    full_path = workdir_path(repo, path)
+    if mode == MODE_GITLINK:
+        os.makedirs(full_path, exist_ok=True)
+        return (0,) * 6 + (MODE_GITLINK, 0, 0, 0)
+    data = read_raw_object(repo, sha)[1]
+    try:
+        os.remove(full_path)
+    except FileNotFoundError:
+        pass
+    if mode == MODE_SYMLINK:
+        os.symlink(data, full_path)
+    else:
+        fd = os.open(full_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                     0o777 if mode == MODE_EXECUTABLE else 0o666)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+    return stat_fields(os.lstat(full_path))
+
+
+# the repository of a checkout worker process:
+_WORKER_REPO = None
+
+
+def _init_worker(workdir):
+    """Open the repository once per worker process."""
+    global _WORKER_REPO  # pylint: disable=global-statement
+    _WORKER_REPO = GitRepo(workdir)
+
+
+def _checkout_in_worker(path, mode, sha):
+    """Write one file in a worker process."""
+    return checkout_file(_WORKER_REPO, path, mode, sha)
+
+
+def checkout_files(repo, files, jobs=1):
+    """Write files of the work tree from their blobs.
+    Args:
+        repo: the git repository.
+        files: a list of (path, mode, sha) tuples.
+        jobs: the number of worker processes.
+    Returns:
+        The list of the stat data of the files, in their order.
+    """
+    if jobs <= 1 or len(files) < 2 * jobs:
+        return [checkout_file(repo, *file) for file in files]
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs, initializer=_init_worker,
+            initargs=(repo.workdir,)) as executor:
+        paths, modes, shas = zip(*files)
+        return list(executor.map(
+            _checkout_in_worker, paths, modes, shas,
+            chunksize=max(1, len(files) // (jobs * 8))))
+
+
+def checkout_tree(repo, index, tree, old_tree=None, force=False, jobs=1,
+                  stats=None):
+    """Update the work tree and the index to a tree.
+    Only the files that differ between the tree last checked out and the
+    new one are removed or written; the other entries keep their stat data
+    (and their staged changes, which are checked not to be overwritten).
+    Args:
+        repo: the git repository.
+        index: the GitIndex, updated in place.
+        tree: the sha of the tree.
+        old_tree: the sha of the tree last checked out (that of HEAD), or
+            None if there is none.
+        force: if True, overwrite local changes and untracked files.
+        jobs: the number of processes writing the files.
+        stats: a CheckoutStats to count the work into, or None.
+    Raises:
+        ValueError: if local changes or untracked files would be lost.
+    """
+    if stats is None:
+        stats = CheckoutStats()
+    start_time = time.perf_counter()
+    changes, complete = diff_index(repo, index, tree, old_tree)
+    if not force:
+        check_work_tree(repo, index, changes)
+
+    # a path is removed first if it is no longer a file (or becomes or
+    #  stops being a submodule):
+    stats.removed = remove_files(repo, [
+        path for path, (old, new) in changes.items()
+        if new is None or (old is not None and
+                           MODE_GITLINK in (old[0], new[0]) and
+                           old[0] != new[0])])
+    files = [(path, new[0], new[1]) for path, (_, new) in changes.items()
+             if new is not None]
+    stats.directories = make_directories(repo, [path for path, _, _ in files])
+    stat_data = checkout_files(repo, files, jobs)
+    stats.written = len(files)
+
+    for path, (_, new) in changes.items():
+        if new is None:
+            index.remove(path)
+    for (path, _, sha), file_stat in zip(files, stat_data):
+        index.add(IndexEntry(path, sha, file_stat))
+    if complete:
+        index.tree = tree
+    stats.seconds = time.perf_counter() - start_time
+
+
+def read_tree(repo, tree):
+    """Return an index holding the files of a tree, with no stat data, so
+    that each file is hashed once before it is known clean.
+    Raises:
+        ValueError: if the tree holds an invalid path.
+    """
+    index = GitIndex()
+    for path, (_, (mode, sha)) in diff_trees(repo, None, tree).items():
+        index.add(IndexEntry(path, sha, (0,) * 6 + (mode, 0, 0, 0)))
+    index.tree = tree
+    return index
+
+
+def dit_read_tree(args):
+    """Read a tree into the index, and optionally the work tree.
+    Usage:
+        dit read-tree [-u [-f] [-j N] [--timing]] <tree-ish>
+        dit read-tree (-h | --help)
+    Options:
+        -h, --help  Show this screen and exit.
+    """
+    repo = find_repo_root()
+    try:
+        lock = LockFile(index_path(repo))
+    except FileExistsError:
+        print(f"fatal: unable to create '{index_path(repo)}.lock': File "
+              "exists.", file=sys.stderr)
+        sys.exit(128)
+    stats = CheckoutStats()
+    try:
+        tree = peel_to_tree(repo, args.tree)
+        if args.update:
+            index = read_index(repo)
+            head = resolve_name(repo, "HEAD")
+            checkout_tree(repo, index, tree,
+                          peel_to_tree(repo, head) if head else None,
+                          force=args.force, jobs=args.jobs, stats=stats)
+        else:
+            index = read_tree(repo, tree)
+    except ValueError as error:
+        lock.rollback()
+        print(f"error: {error}", file=sys.stderr)
+        sys.exit(128)
+    except BaseException:
+        lock.rollback()
+        raise
+    write_index(repo, index, lock)
+    if args.timing:
+        print(stats.report("read-tree"), file=sys.stderr)
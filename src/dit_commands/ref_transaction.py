@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""A module that defines the ref transaction class."""
+
+import os
+
+from src.dit_commands.packed_refs import format_packed_refs, read_packed_refs
+from src.dit_commands.resolve_list_refs import (MAX_SYMREF_DEPTH,
+                                                invalidate_refs)
+from src.repos.lock_file import LockFile
+from src.repos.repo_paths import git_file_path
+
+# the old value that means "the ref must not exist":
+ZERO_SHA = "0" * 40
+
+
+class RefUpdate:
+    """A class that defines one queued change of a ref transaction.
+    Attributes:
+        ref: the name of the ref, once symbolic refs are followed.
+        new: the new sha, None to only verify, or ZERO_SHA to delete.
+        old: the sha the ref must hold, ZERO_SHA if it must not exist, or
+            None for no check.
+    """
+    __slots__ = ("ref", "new", "old", "lock", "current")
+
+    def __init__(self, ref, new, old):
+        """Initialize a queued ref change."""
+        self.ref = ref
+        self.new = new
+        self.old = old
+        self.lock = None
+        self.current = None
+
+
+class RefTransaction:
+    """A class that defines a set of ref changes applied all or nothing.
+    Every ref is locked first (<ref>.lock), then the old values are checked
+    with the locks held, then all the new values are renamed into place. If
+    anything fails before that, every lock is removed and no ref changes;
+    if a rename fails, the refs already changed are restored.
+    """
+
+    def __init__(self, repo):
+        """Initialize an empty transaction on the repository."""
+        self.repo = repo
+        self.updates = []
+        self._packed = None
+
+    def update(self, ref, new, old=None):
+        """Queue setting ref to new, optionally checking it holds old."""
+        self.updates.append(RefUpdate(ref, new, old))
+
+    def create(self, ref, new):
+        """Queue creating ref, which must not exist yet."""
+        self.updates.append(RefUpdate(ref, new, ZERO_SHA))
+
+    def delete(self, ref, old=None):
+        """Queue deleting ref, optionally checking it holds old."""
+        self.updates.append(RefUpdate(ref, ZERO_SHA, old))
+
+    def verify(self, ref, old=None):
+        """Queue checking that ref holds old (or does not exist, if old is
+        None or ZERO_SHA), without changing it."""
+        self.updates.append(RefUpdate(ref, None, old or ZERO_SHA))
+
+    def packed_refs(self):
+        """Return the (refs, peeled) read from packed-refs, read once."""
+        if self._packed is None:
+            self._packed = read_packed_refs(self.repo)
+        return self._packed
+
+    def read_ref(self, ref):
+        """Return the raw value of a ref (loose first, then packed), or None
+        if it does not exist."""
+        path = git_file_path(self.repo, ref)
+        try:
+            with open(path, encoding="utf-8") as f:
+                return f.read().strip() or None
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            return self.packed_refs()[0].get(ref)
+
+    def dereference(self, ref):
+        """Follow symbolic refs to the ref that actually holds a sha."""
+        for _ in range(MAX_SYMREF_DEPTH + 1):
+            value = self.read_ref(ref)
+            if value is None or not value.startswith("ref: "):
+                return ref
+            ref = value[5:]
+        raise ValueError(f"{ref}: too many levels of symbolic refs")
+
+    def commit(self):
+        """Apply the queued changes, all or nothing.
+        Raises:
+            ValueError: if a ref is changed twice, or does not hold its
+                expected old value.
+            FileExistsError: if a ref is locked by another writer.
+        """
+        for update in self.updates:
+            update.ref = self.dereference(update.ref)
+        refs = [update.ref for update in self.updates]
+        if len(set(refs)) != len(refs):
+            raise ValueError("a ref cannot be changed twice in a transaction")
+
+        locks = []
+        try:
+            # locking every ref, in name order:
+            for update in sorted(self.updates, key=lambda u: u.ref):
+                update.lock = lock_ref(self.repo, update)
+                locks.append(update.lock)
+
+            deletes_packed = False
+            self._packed = None
+            for update in self.updates:
+                # checking the old values with the locks held:
+                update.current = self.read_ref(update.ref)
+                check_old_value(update)
+                if update.new is not None and update.new != ZERO_SHA:
+                    update.lock.write(update.new + "\n")
+                if (update.new == ZERO_SHA and
+                        update.ref in self.packed_refs()[0]):
+                    deletes_packed = True
+
+            packed_lock = None
+            if deletes_packed:
+                packed_lock = LockFile(git_file_path(self.repo,
+                                                     "packed-refs"))
+                locks.append(packed_lock)
+        except BaseException:
+            for lock in locks:
+                lock.rollback()
+            raise
+
+        self._apply(packed_lock)
+
+    def _apply(self, packed_lock):
+        """Move the new values into place, once every check has passed.
+        packed-refs goes first, so that a deleted ref never shows its packed
+        value once its loose file is gone; it stays locked until every ref
+        is in place, so that if one fails, the packed refs read with the
+        lock held can be written back, as are the loose refs already
+        changed (each under its lock).
+        """
+        done = []
+        packed_written = False
+        try:
+            if packed_lock is not None:
+                packed, peeled = self.packed_refs()
+                deleted = {update.ref for update in self.updates
+                           if update.new == ZERO_SHA}
+                packed_lock.replace(format_packed_refs(
+                    {name: sha for name, sha in packed.items()
+                     if name not in deleted},
+                    {name: sha for name, sha in peeled.items()
+                     if name not in deleted}))
+                packed_written = True
+            for update in self.updates:
+                if update.new is None:
+                    update.lock.rollback()
+                    continue
+                if update.new == ZERO_SHA:
+                    # the loose ref is removed with its lock still held (a
+                    #  ref only packed is put back with packed-refs):
+                    path = git_file_path(self.repo, update.ref)
+                    if os.path.isfile(path):
+                        os.remove(path)
+                        done.append(update)
+                    update.lock.rollback()
+                else:
+                    update.lock.commit()
+                    done.append(update)
+        except BaseException:
+            for update in self.updates:
+                update.lock.rollback()
+            # putting back the refs that were already changed:
+            for update in done:
+                restore_ref(self.repo, update)
+            if packed_written:
+                packed_lock.replace(format_packed_refs(*self.packed_refs()))
+            raise
+        finally:
+            if packed_lock is not None:
+                packed_lock.rollback()
+            invalidate_refs(self.repo)
+
+
+def check_old_value(update):
+    """Raise a ValueError if a ref does not hold its expected old value."""
+    if update.old is None:
+        return
+    if update.old == ZERO_SHA:
+        if update.current is not None:
+            raise ValueError(
+                f"cannot lock ref {update.ref}: reference already exists")
+    elif update.current != update.old:
+        raise ValueError(
+            f"cannot lock ref {update.ref}: is at {update.current} "
+            f"but expected {update.old}")
+
+
+def lock_ref(repo, update):
+    """Take the lock of the ref of an update.
+    Returns:
+        The LockFile of the ref.
+    Raises:
+        FileExistsError: if the ref is locked by another writer.
+        ValueError: if a ref is in the way: a ref named as a directory of
+            the ref, or a directory of refs named as the ref.
+    """
+    path = git_file_path(repo, update.ref)
+    try:
+        lock = LockFile(path)
+    except FileExistsError:
+        if os.path.exists(path + ".lock"):
+            raise FileExistsError(f"cannot lock ref {update.ref}: "
+                                  f"{update.ref}.lock exists") from None
+        # a ref is where a directory of the ref would be:
+        raise ValueError(f"cannot lock ref {update.ref}: a ref is in the "
+                         "way of its directories") from None
+    except NotADirectoryError:
+        raise ValueError(f"cannot lock ref {update.ref}: a ref is in the way "
+                         "of its directories") from None
+    if update.new is not None and update.new != ZERO_SHA and \
+            os.path.isdir(path):
+        lock.rollback()
+        raise ValueError(f"cannot lock ref {update.ref}: there is a "
+                         "directory of refs in the way")
+    return lock
+
+
+def restore_ref(repo, update):
+    """Write back the value a ref had before the transaction, under the lock
+    of the ref. A ref locked by another writer since is left to it."""
+    path = git_file_path(repo, update.ref, create_dir=True)
+    try:
+        lock = LockFile(path)
+    except FileExistsError:
+        return
+    if update.current is None:
+        if os.path.isfile(path):
+            os.remove(path)
+        lock.rollback()
+    else:
+        lock.write(update.current + "\n")
+        lock.commit()
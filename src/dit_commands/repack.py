@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""A module that defines the repack command."""
+
+import os
+
+from src.dit_commands.bitmap import write_bitmap
+from src.dit_commands.resolve_list_refs import ref_tips
+from src.objects.find_object import loose_object_shas
+from src.objects.write_pack import DEFAULT_DEPTH, DEFAULT_WINDOW, write_pack
+from src.parsers import subparsers
+from src.repos.find_root import find_repo_root
+from src.repos.repo_paths import git_file_path
+
+# dit repack: allows packing the loose objects of the repository
+# dit repack will be implemented as dit repack [-d] [-b]
+repack_arg = subparsers.add_parser(
+    "repack",
+    help="Pack unpacked objects in a repository",
+    usage="dit repack [-d] [-b] [--window N] [--depth N]",
+    epilog="See 'dit repack --help' for more information on a specific "
+    "command.")
+
+repack_arg.add_argument(
+    "-d",
+    action="store_true",
+    dest="delete",
+    help="Delete the loose objects that were packed")
+
+repack_arg.add_argument(
+    "-b", "--write-bitmap-index",
+    action="store_true",
+    dest="write_bitmap",
+    help="Also rewrite the reachability bitmap file")
+
+repack_arg.add_argument(
+    "--window",
+    metavar="N",
+    type=int,
+    default=DEFAULT_WINDOW,
+    help="How many previous objects are tried as delta bases "
+    f"(default: {DEFAULT_WINDOW}, 0 disables deltas)")
+
+repack_arg.add_argument(
+    "--depth",
+    metavar="N",
+    type=int,
+    default=DEFAULT_DEPTH,
+    help=f"The longest delta chain allowed (default: {DEFAULT_DEPTH})")
+
+
+def repack(repo, window=DEFAULT_WINDOW, depth=DEFAULT_DEPTH, delete=False):
+    """Pack the loose objects of a repository.
+    Args:
+        repo: the git repository.
+        window: how many previous objects are tried as delta bases.
+        depth: the longest delta chain allowed.
+        delete: if True, delete the loose objects once they are packed.
+    Returns:
+        The hex checksum of the new pack, or None if there was nothing
+        to pack.
+    """
+    shas = list(loose_object_shas(repo))
+    if not shas:
+        return None
+    base_name = git_file_path(repo, "objects", "pack", "pack",
+                              create_dir=True)
+    checksum, _ = write_pack(repo, shas, base_name, window, depth)
+    if delete:
+        prune_packed(repo, shas)
+    return checksum
+
+
+def prune_packed(repo, shas):
+    """Delete the loose copies of objects, and the fan-out directories left
+    empty.
+    Args:
+        repo: the git repository.
+        shas: the hex shas of the objects to delete.
+    """
+    fanouts = set()
+    for sha in shas:
+        path = git_file_path(repo, "objects", sha[:2], sha[2:])
+        if os.path.exists(path):
+            os.remove(path)
+        fanouts.add(sha[:2])
+
+    for fanout in fanouts:
+        try:
+            os.rmdir(git_file_path(repo, "objects", fanout))
+        except OSError:
+            # the directory still holds objects that were not packed:
+            pass
+
+
+def dit_repack(args):
+    """Pack unpacked objects in a repository.
+    Usage:
+        dit repack [-d] [-b] [--window N] [--depth N]
+        dit repack (-h | --help)
+    Options:
+        -h, --help  Show this screen and exit.
+    """
+    repo = find_repo_root()
+    checksum = repack(repo, args.window, args.depth, args.delete)
+    if checksum is None:
+        print("Nothing new to pack.")
+    else:
+        print(checksum)
+    if args.write_bitmap:
+        write_bitmap(repo, ref_tips(repo))
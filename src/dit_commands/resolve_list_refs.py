@@ -1,16 +1,172 @@
 #!/usr/bin/env python3
 """A module that defines the ref_resolver and list_refs functions."""
 
+import bisect
 import collections
 import os
 
+from src.dit_commands.packed_refs import peel_object, read_packed_refs
 from src.repos.repo_paths import git_file_path
+from src.trace import TRACING, count, span
 
 # References/refs: are files that store access to commit objects
 # Refs are aliases to commit objects
 # Refs contain a 48 byte hex string that is the sha of the commit object
 # Refs may refer to other references
-# Refs are stored in the .git/refs directory
+# Refs are stored in the .git/refs directory, or in the .git/packed-refs file
+
+# how many symbolic refs are followed before giving up (as git does):
+MAX_SYMREF_DEPTH = 5
+
+# the ref snapshots taken so far, per .git directory:
+_SNAPSHOTS = {}
+
+
+class RefSnapshot:
+    """A class that defines a snapshot of the references of a repository.
+    The packed refs are read first and the loose refs are merged over them,
+    so a loose ref wins over a packed one of the same name. The snapshot is
+    taken once per process and reused for every lookup; it has to be
+    invalidated (see invalidate_refs) after the refs are written.
+    Attributes:
+        refs: a dictionary mapping ref names to their raw values, a sha or
+            "ref: <target>" for a symbolic ref.
+        names: the sorted ref names.
+        peeled: a dictionary mapping annotated tag names to the sha they
+            peel to, as recorded in packed-refs.
+        packed: the refs read from packed-refs.
+        packed_peeled: the peeled values read from packed-refs.
+        loose: the names of the loose refs.
+    """
+
+    def __init__(self, repo):
+        """Take a snapshot of the references of the repository."""
+        self.repo = repo
+        self.packed, self.packed_peeled = read_packed_refs(repo)
+        self.peeled = dict(self.packed_peeled)
+        self.refs = dict(self.packed)
+        self.loose = set()
+        self._read_loose(git_file_path(repo, "refs"), "refs/")
+        self.names = sorted(self.refs)
+        # the refs outside refs/ (HEAD, ...) read so far:
+        self._others = {}
+
+    def _read_loose(self, path, prefix):
+        """Merge the loose refs under a directory into the snapshot."""
+        try:
+            entries = list(os.scandir(path))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.is_dir():
+                self._read_loose(entry.path, prefix + entry.name + "/")
+            elif not entry.name.endswith(".lock"):
+                with open(entry.path, encoding="utf-8") as f:
+                    value = f.read().strip()
+                if value:
+                    self.refs[prefix + entry.name] = value
+                    self.loose.add(prefix + entry.name)
+                    # a loose ref overrides what packed-refs says it peels to:
+                    self.peeled.pop(prefix + entry.name, None)
+
+    def get(self, name):
+        """Return the raw value of a ref, or None if there is no such ref.
+        Names outside refs/ (HEAD, FETCH_HEAD, ...) are read from their file
+        the first time they are asked for.
+        """
+        value = self.refs.get(name)
+        if value is not None or name.startswith("refs/"):
+            return value
+        if name not in self._others:
+            if TRACING:
+                count("ref_reads")
+            path = git_file_path(self.repo, name)
+            value = None
+            if os.path.isfile(path):
+                with open(path, encoding="utf-8") as f:
+                    value = f.read().strip() or None
+            self._others[name] = value
+        return self._others[name]
+
+    def resolve(self, name):
+        """Resolve a ref to a sha, following symbolic refs.
+        Args:
+            name: the name of the ref.
+        Returns:
+            The sha the ref points to.
+        Raises:
+            ValueError: if the ref, or a ref it points to, is not found.
+        """
+        for _ in range(MAX_SYMREF_DEPTH + 1):
+            value = self.get(name)
+            if value is None:
+                raise ValueError(f"{name} not found")
+            # removing the prefix "ref: " from the reference:
+            if not value.startswith("ref: "):
+                return value
+            name = value[5:]
+        raise ValueError(f"{name}: too many levels of symbolic refs")
+
+    def peel(self, name):
+        """Return the sha an annotated tag ref peels to, or None if the ref
+        does not point to a tag (or points to an object that cannot be
+        read, which is not peeled either)."""
+        if name in self.peeled:
+            return self.peeled[name]
+        sha = self.resolve(name)
+        try:
+            return peel_object(self.repo, sha)
+        except ValueError:
+            return None
+
+    def items(self, prefix="refs/"):
+        """Yield the (name, raw value) pairs of the refs starting with the
+        prefix, sorted by name."""
+        pos = bisect.bisect_left(self.names, prefix)
+        while pos < len(self.names) and self.names[pos].startswith(prefix):
+            name = self.names[pos]
+            yield name, self.refs[name]
+            pos += 1
+
+
+def ref_snapshot(repo):
+    """Return the ref snapshot of a repository, taking it if needed."""
+    snapshot = _SNAPSHOTS.get(repo.dotgit)
+    if snapshot is None:
+        with span("ref_snapshot") as trace_span:
+            snapshot = _SNAPSHOTS[repo.dotgit] = RefSnapshot(repo)
+            if TRACING:
+                trace_span.counters.update(
+                    packed_refs=len(snapshot.packed),
+                    loose_refs=len(snapshot.loose))
+    return snapshot
+
+
+def ref_tips(repo):
+    """Return the objects the refs of a repository and its HEAD point to.
+    Symbolic refs are followed and annotated tags peeled; refs that do not
+    resolve are skipped.
+    Args:
+        repo: the git repository.
+    Returns:
+        The list of distinct hex shas, in the order git takes them: that of
+        HEAD, then those of the refs by name (a walk from them breaks the
+        ties between commits of the same date in that order).
+    """
+    snapshot = ref_snapshot(repo)
+    tips = {}
+    for name in ["HEAD"] + [name for name, _ in snapshot.items()]:
+        try:
+            tips.setdefault(snapshot.peel(name) or snapshot.resolve(name))
+        except ValueError:
+            continue
+    return list(tips)
+
+
+def invalidate_refs(repo):
+    """Drop the ref snapshot of a repository, after its refs were written."""
+    _SNAPSHOTS.pop(repo.dotgit, None)
+
 
 def ref_resolver(repo, ref):
     """Resolve the reference to a commit sha.
@@ -22,54 +178,30 @@ def ref_resolver(repo, ref):
     Raises:
         ValueError: if the reference is not found.
 """
-
-    path = git_file_path(repo, ref)
-
-    # making sure the reference exist:
-    if not os.path.exists(path):
-        raise ValueError(f"{ref} not found")
-
-    # reading the reference without the newline character:
-    with open(path, encoding="utf-8") as f:
-        data = f.read()[:-1]
-
-    # removing the prefix "ref: " from the reference:
-    if data.startswith("ref: "):
-        return ref_resolver(repo, data[5:])
-    else:
-        return data
+    return ref_snapshot(repo).resolve(ref)
 
 
 # list_refs: allows listing the references in the repository
 #   as a dictionary of key-value pairs
-def list_refs(repo, path=None):
+def list_refs(repo, prefix="refs/"):
     """List the references in the repository as a dictionary of
-    key-value pairs.
+    key-value pairs, nested by directory.
     Args:
         repo: path to the git repository
-        path: path to the references
+        prefix: only list the references starting with the prefix
     Returns:
         A dictionary of references.
     """
     # creating the dictionary to store the references:
     refs = collections.OrderedDict()
 
-    # creating the path to the references:
-    if not path:
-        path = git_file_path(repo, "refs")
-
-    # iterating through the references:
-    for name in os.listdir(path):
-        # creating the path to the reference:
-        fullname = os.path.join(path, name)
-
-        # making sure the reference is not a directory:
-        if os.path.isdir(fullname):
-            refs[name] = list_refs(repo, fullname)
-        else:
-            # reading the reference without the newline character:
-            with open(fullname, encoding="utf-8") as f:
-                refs[name] = f.read()[:-1]
+    # iterating through the references in the snapshot, in sorted order:
+    for name, value in ref_snapshot(repo).items(prefix):
+        *dirs, leaf = name[len("refs/"):].split("/")
+        node = refs
+        for directory in dirs:
+            node = node.setdefault(directory, collections.OrderedDict())
+        node[leaf] = value
 
     # returning the dictionary of references:
     return refs
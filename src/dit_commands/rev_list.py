@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+"""A module that defines the rev-list command and the history walk."""
+
+import heapq
+import itertools
+import re
+import sys
+import time
+
+from src.dit_commands.cat_file import resolve_name
+from src.dit_commands.packed_refs import peel_object
+from src.dit_commands.resolve_list_refs import ref_snapshot, ref_tips
+from src.objects.commit_graph_class import GENERATION_INFINITY
+from src.objects.pack_class import OBJ_COMMIT, OBJ_TAG
+from src.objects.read_bitmap import reachability_bitmap, reachable_objects
+from src.objects.read_commit import commit_node
+from src.objects.read_object import read_object, read_object_header
+from src.parsers import subparsers
+from src.repos.find_root import find_repo_root
+
+# how much (in seconds of commit date) a commit may be older than its
+#  parents: the walk remembers the commits it has listed for that long, so
+#  that a skewed commit is not listed twice, and a range walks its excluded
+#  commits that much past the oldest commit listed:
+DATE_SLOP = 24 * 60 * 60
+# the walk forgets old commits only once it remembers at least this many:
+MIN_REMEMBERED = 4096
+# how much output is gathered before it is written out:
+OUTPUT_BUFFER_SIZE = 64 * 1024
+
+DATE_UNITS = {
+    "second": 1,
+    "minute": 60,
+    "hour": 60 * 60,
+    "day": 24 * 60 * 60,
+    "week": 7 * 24 * 60 * 60,
+    "month": 30 * 24 * 60 * 60,
+    "year": 365 * 24 * 60 * 60,
+}
+RELATIVE_DATE = re.compile(r"(\d+)[ .](second|minute|hour|day|week|month|year)"
+                           r"s?[ .]ago")
+
+# dit rev-list: allows listing commits in reverse chronological order
+# dit rev-list will be implemented as dit rev-list
+#  [--objects [--use-bitmap-index]] [--count] [-n <n>] [--since=<date>]
+#  [--first-parent] [--all]
+#  [<commit>... | <a>..<b> | ^<commit>...]
+rev_list_arg = subparsers.add_parser(
+    "rev-list",
+    help="Lists commit objects in reverse chronological order",
+    usage="dit rev-list [--objects [--use-bitmap-index]] [--count] "
+    "[-n <n>] [--since=<date>] [--first-parent] [--all] <commit>... "
+    "[^<commit>...] [<a>..<b>]",
+    epilog="See 'dit rev-list --help' for more information on a specific "
+    "command.")
+
+rev_list_arg.add_argument(
+    "--objects",
+    action="store_true",
+    dest="objects",
+    help="List the trees and blobs the commits reach, as well as the "
+    "commits")
+
+rev_list_arg.add_argument(
+    "--count",
+    action="store_true",
+    dest="count",
+    help="Print the number of commits (or objects, with --objects) instead "
+    "of listing them")
+
+rev_list_arg.add_argument(
+    "--use-bitmap-index",
+    action="store_true",
+    dest="use_bitmap_index",
+    help="List the objects from the reachability bitmaps, when there are "
+    "some: faster, but without the paths of the trees and blobs, and in "
+    "the order of the pack")
+
+
+def add_walk_arguments(arg_parser):
+    """Add the options of the history walk, shared by rev-list and log."""
+    arg_parser.add_argument(
+        "-n", "--max-count",
+        type=int,
+        default=None,
+        dest="max_count",
+        help="Stop after listing n commits")
+
+    arg_parser.add_argument(
+        "--since", "--after",
+        metavar="date",
+        default=None,
+        dest="since",
+        help="Only list commits newer than the date (a timestamp, "
+        "YYYY-MM-DD[ HH:MM[:SS]] or \"<n> <unit>s ago\")")
+
+    arg_parser.add_argument(
+        "--first-parent",
+        action="store_true",
+        dest="first_parent",
+        help="Only follow the first parent of merge commits")
+
+    arg_parser.add_argument(
+        "--all",
+        action="store_true",
+        dest="all",
+        help="Start from every ref, as well as the commits given")
+
+    arg_parser.add_argument(
+        "revisions",
+        metavar="revision",
+        nargs="*",
+        help="The commits to start from (default: HEAD); ^<commit> and "
+        "<a>..<b> exclude the commits reachable from <commit> and <a>")
+
+
+add_walk_arguments(rev_list_arg)
+
+
+def parse_date(text):
+    """Parse the date of --since into a timestamp.
+    Args:
+        text: a timestamp (optionally prefixed with @), a local date
+            "YYYY-MM-DD[ HH:MM[:SS]]", or a relative date "<n> <unit>s ago".
+    Returns:
+        The timestamp.
+    Raises:
+        ValueError: if the date is not understood.
+    """
+    text = text.strip()
+    if text.lstrip("@").isdigit():
+        return int(text.lstrip("@"))
+    match = RELATIVE_DATE.fullmatch(text)
+    if match:
+        return int(time.time()) - int(match.group(1)) * DATE_UNITS[
+            match.group(2)]
+    for date_format in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return int(time.mktime(time.strptime(text, date_format)))
+        except ValueError:
+            continue
+    raise ValueError(f"invalid date: {text}")
+
+
+def resolve_commit(repo, name):
+    """Resolve a revision name to the sha of a commit, peeling tags.
+    Raises:
+        ValueError: if the name does not resolve to a commit.
+    """
+    sha = resolve_name(repo, name)
+    if sha is None:
+        raise ValueError(f"bad revision '{name}'")
+    sha = peel_object(repo, sha) or sha
+    if read_object_header(repo, sha)[0] != b"commit":
+        raise ValueError(f"{name} is not a commit")
+    return sha
+
+
+def parse_revisions(repo, revisions, all_refs=False):
+    """Split revision arguments into the commits to list from and the
+    commits to exclude.
+    Args:
+        repo: the git repository.
+        revisions: the arguments, such as "B", "^A" or "A..B".
+        all_refs: if True, also list from every ref.
+    Returns:
+        An (include, exclude) tuple of lists of commit shas.
+    Raises:
+        ValueError: if a revision does not resolve to a commit.
+    """
+    include = []
+    exclude = []
+    for revision in revisions:
+        if ".." in revision:
+            start, end = revision.split("..", 1)
+            exclude.append(resolve_commit(repo, start or "HEAD"))
+            include.append(resolve_commit(repo, end or "HEAD"))
+        elif revision.startswith("^"):
+            exclude.append(resolve_commit(repo, revision[1:]))
+        else:
+            include.append(resolve_commit(repo, revision))
+    if all_refs:
+        include.extend(sha for sha in ref_tips(repo)
+                       if read_object_header(repo, sha)[0] == b"commit")
+    elif not include:
+        include.append(resolve_commit(repo, "HEAD"))
+    return include, exclude
+
+
+def limit_commits(repo, include, exclude, first_parent=False):
+    """Find the commits reachable from include but not from exclude, as git
+    limits the list of a range before listing it.
+    The commits are walked newest first, those reachable from exclude
+    marked uninteresting. A mark that reaches a commit already walked is
+    passed on to the commits it reached, so a commit taken for interesting
+    (a date skewed between it and its parents) is dropped again. Once only
+    uninteresting commits are left, the walk goes on until none of them can
+    reach a commit still listed: until their generations are all below
+    those listed, when the commit-graph holds these, else until their dates
+    are all more than DATE_SLOP older.
+    Args:
+        repo: the git repository.
+        include: the shas of the commits to list from.
+        exclude: the shas of the commits whose history is not listed.
+        first_parent: if True, only follow the first parent of merges.
+    Returns:
+        The list of the CommitNode of the commits listed, newest first.
+    """
+    heap = []
+    order = itertools.count()
+    # every commit reached, the uninteresting ones, the ones in the frontier,
+    #  and those of the frontier that are interesting:
+    nodes = {}
+    uninteresting = set()
+    queued = set()
+    queued_interesting = set()
+    listed = []
+    # the oldest date and lowest generation of the commits listed, once only
+    #  uninteresting commits are left, and how many commits of the frontier
+    #  have a generation at least that lowest one (and may reach a listed
+    #  commit):
+    oldest = lowest = None
+    reaching = 0
+
+    def push(sha, mark):
+        """Add a commit to the frontier, or mark it uninteresting."""
+        nonlocal reaching
+        if sha in nodes:
+            if mark:
+                paint(sha)
+            return
+        node = nodes[sha] = commit_node(repo, sha)
+        queued.add(sha)
+        if lowest is not None and node.generation >= lowest:
+            reaching += 1
+        if mark:
+            uninteresting.add(sha)
+        else:
+            queued_interesting.add(sha)
+        # newest first, and in the order they were reached for equal dates:
+        heapq.heappush(heap, (-node.date, next(order), node))
+
+    def paint(sha):
+        """Mark a commit uninteresting, and the commits it already
+        reached."""
+        pending = [sha]
+        while pending:
+            sha = pending.pop()
+            if sha in uninteresting:
+                continue
+            uninteresting.add(sha)
+            queued_interesting.discard(sha)
+            if sha in queued:
+                # its parents are marked once it is walked:
+                continue
+            for parent in nodes[sha].parents:
+                if parent in nodes:
+                    pending.append(parent)
+                else:
+                    push(parent, True)
+
+    for sha in exclude:
+        push(sha, True)
+    for sha in include:
+        push(sha, False)
+
+    while heap:
+        _, _, node = heapq.heappop(heap)
+        if lowest is not None and node.generation >= lowest:
+            reaching -= 1
+        queued.discard(node.sha)
+        queued_interesting.discard(node.sha)
+        if node.sha in uninteresting:
+            for parent in node.parents:
+                push(parent, True)
+        else:
+            listed.append(node)
+            for parent in node.parents[:1] if first_parent else node.parents:
+                push(parent, False)
+        if queued_interesting:
+            continue
+
+        # only uninteresting commits are left; the commits they can still
+        #  reach are newer (by generation, and by date give or take the
+        #  slop) than them:
+        if oldest is None:
+            remaining = [node for node in listed
+                         if node.sha not in uninteresting]
+            if not remaining:
+                break
+            oldest = min(node.date for node in remaining)
+            lowest = min(node.generation for node in remaining)
+            reaching = sum(1 for entry in heap
+                           if entry[2].generation >= lowest)
+        if not heap:
+            break
+        if lowest != GENERATION_INFINITY:
+            if not reaching:
+                break
+        elif -heap[0][0] < oldest - DATE_SLOP:
+            break
+
+    return [node for node in listed if node.sha not in uninteresting]
+
+
+def walk_commits(repo, include, exclude=(), since=None, first_parent=False):
+    """Walk the history, newest commit first, as git rev-list does.
+    The frontier of the walk is a heap ordered by commit date, so the
+    commits are yielded as soon as they are reached: a caller that stops
+    early never walks the rest of the history. When commits are excluded,
+    the commits to list are found first (see limit_commits), since a commit
+    is only known to be reachable from exclude once the walk is past it.
+    Parents, dates and generations come from the commit-graph when there is
+    one.
+    Memory grows with the frontier rather than with the history: listed
+    commits are only remembered while the walk is within DATE_SLOP of their
+    commit date.
+    Args:
+        repo: the git repository.
+        include: the shas of the commits to list from.
+        exclude: the shas of the commits whose history is not listed.
+        since: if given, stop at the first commit older than this timestamp.
+        first_parent: if True, only follow the first parent of merges.
+    Yields:
+        The CommitNode of each commit listed.
+    """
+    if exclude:
+        for node in limit_commits(repo, include, exclude, first_parent):
+            if since is not None and node.date < since:
+                return
+            yield node
+        return
+
+    heap = []
+    order = itertools.count()
+    # the commits in the frontier:
+    queued = set()
+    # the commits already walked -> their commit dates:
+    walked = {}
+    prune_at = MIN_REMEMBERED
+
+    def push(sha):
+        """Add a commit to the frontier."""
+        if sha in queued or sha in walked:
+            return
+        node = commit_node(repo, sha)
+        queued.add(sha)
+        # newest first, and in the order they were reached for equal dates:
+        heapq.heappush(heap, (-node.date, next(order), node))
+
+    for sha in include:
+        push(sha)
+
+    while heap:
+        _, _, node = heapq.heappop(heap)
+        queued.discard(node.sha)
+        walked[node.sha] = node.date
+        if since is not None and node.date < since:
+            return
+        for parent in node.parents[:1] if first_parent else node.parents:
+            push(parent)
+        yield node
+
+        if len(walked) >= prune_at:
+            # forgetting the commits the walk is now well past:
+            horizon = node.date + DATE_SLOP
+            walked = {sha: date for sha, date in walked.items()
+                      if date <= horizon}
+            prune_at = max(MIN_REMEMBERED, 2 * len(walked))
+
+
+def walk_from_args(repo, args):
+    """Run the history walk described by the rev-list / log options.
+    Returns:
+        An iterator over the CommitNode of each commit listed.
+    Raises:
+        ValueError: if a revision or the date is invalid.
+    """
+    since = parse_date(args.since) if args.since is not None else None
+    include, exclude = parse_revisions(repo, args.revisions, args.all)
+    commits = walk_commits(repo, include, exclude, since, args.first_parent)
+    if args.max_count is not None:
+        commits = itertools.islice(commits, max(0, args.max_count))
+    return commits
+
+
+def is_limited(args):
+    """Return True if the rev-list / log options stop the walk before the
+    end of the history, so that the bitmaps of whole histories cannot be
+    used."""
+    return (args.max_count is not None or args.since is not None or
+            args.first_parent)
+
+
+def find_objects(repo, args, trees=True, use_bitmap=False):
+    """Find the objects rev-list --objects lists.
+    Args:
+        repo: the git repository.
+        args: the rev-list options.
+        trees: if False, the trees of the commits the bitmaps do not cover
+            are not walked, for counting commits only.
+        use_bitmap: if True, use the reachability bitmaps when there are
+            some; the objects they hold are then found with no path, and
+            listed in pack order.
+    Returns:
+        The ObjectSet of the objects found.
+    Raises:
+        ValueError: if a revision or the date is invalid.
+    """
+    include, exclude = parse_revisions(repo, args.revisions, args.all)
+    bitmap = reachability_bitmap(repo) if use_bitmap else None
+    if is_limited(args):
+        # the trees of the commits the limited walk lists:
+        listed = [node.sha for node in walk_from_args(repo, args)]
+        objects = reachable_objects(repo, listed, bitmap, walk_parents=False,
+                                    trees=trees)
+    else:
+        objects = reachable_objects(repo, include, bitmap, trees=trees)
+    if exclude:
+        objects = objects.difference(
+            reachable_objects(repo, exclude, bitmap, trees=trees))
+    if args.all and trees:
+        for sha, name in annotated_tags(repo):
+            objects.extra.setdefault(sha, (OBJ_TAG, name))
+    return objects
+
+
+def annotated_tags(repo):
+    """Return the annotated tags the refs point to, which rev-list --all
+    --objects lists under their names.
+    Returns:
+        The list of (hex sha, name) tuples of the tags, by ref name.
+    """
+    snapshot = ref_snapshot(repo)
+    tags = []
+    for name, _ in snapshot.items():
+        try:
+            if snapshot.peel(name) is not None:
+                tags.append((snapshot.resolve(name),
+                             name.removeprefix("refs/tags/")))
+        except ValueError:
+            continue
+    return tags
+
+
+def list_tree(repo, tree_sha, prefix, seen):
+    """List the trees and blobs below a tree that were not listed yet, in
+    the order git lists them: each entry in the order of its tree, a
+    sub-tree followed by what is below it.
+    Args:
+        repo: the git repository.
+        tree_sha: the hex sha of the tree.
+        prefix: the path of the tree, followed by a slash (or "").
+        seen: the set of the shas already listed, updated.
+    Yields:
+        (hex sha, path) tuples.
+    """
+    tree = read_object(repo, tree_sha)
+    for index in range(len(tree)):
+        # the commits of submodules are not in this repository:
+        if tree.mode_at(index) == b"160000":
+            continue
+        sha = bytes(tree.binsha_at(index)).hex()
+        if sha in seen:
+            continue
+        seen.add(sha)
+        path = prefix + tree.name_at(index).decode("utf-8",
+                                                   "surrogateescape")
+        yield sha, path
+        if tree.is_tree_at(index):
+            yield from list_tree(repo, sha, path + "/", seen)
+
+
+def list_objects(repo, args):
+    """List the objects rev-list --objects lists, with their paths and in
+    git's order: the commits as the walk lists them, then the annotated
+    tags of --all, then the tree of each commit listed, followed by the
+    trees and blobs below it that were not listed yet.
+    The objects reachable from the excluded commits are not listed.
+    Yields:
+        (hex sha, path) tuples, the path being None for commits.
+    Raises:
+        ValueError: if a revision or the date is invalid.
+    """
+    exclude = parse_revisions(repo, args.revisions, args.all)[1]
+    seen = set(reachable_objects(repo, exclude).extra) if exclude else set()
+    trees = []
+    for node in walk_from_args(repo, args):
+        yield node.sha, None
+        trees.append(node.tree)
+    if args.all:
+        for sha, name in annotated_tags(repo):
+            if sha not in seen:
+                seen.add(sha)
+                yield sha, name
+    for tree in trees:
+        if tree not in seen:
+            seen.add(tree)
+            yield tree, ""
+            yield from list_tree(repo, tree, "", seen)
+
+
+def dit_rev_list(args):
+    """Lists commit objects in reverse chronological order.
+    Usage:
+        dit rev-list [--objects [--use-bitmap-index]] [--count] [-n <n>]
+            [--since=<date>] [--first-parent] [--all] <commit>...
+            [^<commit>...] [<a>..<b>]
+        dit rev-list (-h | --help)
+    Options:
+        -h, --help  Show this screen and exit.
+    """
+    repo = find_repo_root()
+    out = sys.stdout.buffer
+    try:
+        if args.count:
+            # a count is the same in any order, with or without the paths:
+            if args.objects:
+                count = len(find_objects(repo, args, use_bitmap=True))
+            elif reachability_bitmap(repo) is not None and not is_limited(
+                    args):
+                count = find_objects(repo, args, trees=False,
+                                     use_bitmap=True).count(OBJ_COMMIT)
+            else:
+                count = sum(1 for _ in walk_from_args(repo, args))
+            print(count)
+            return
+
+        if args.objects:
+            # the paths and the order of git come from the walk of the
+            #  trees; the bitmaps are used only when asked for:
+            objects = find_objects(repo, args, use_bitmap=True) \
+                if args.use_bitmap_index else list_objects(repo, args)
+            lines = (sha if path is None else f"{sha} {path}"
+                     for sha, path in objects)
+        else:
+            lines = (node.sha for node in walk_from_args(repo, args))
+        pending = bytearray()
+        for line in lines:
+            pending += line.encode("utf-8", "surrogateescape") + b"\n"
+            if len(pending) >= OUTPUT_BUFFER_SIZE:
+                out.write(pending)
+                out.flush()
+                pending.clear()
+        out.write(pending)
+        out.flush()
+    except ValueError as error:
+        print(f"fatal: {error}", file=sys.stderr)
+        sys.exit(128)
+    except BrokenPipeError:
+        # the reader (e.g. head) is gone: stopping quietly:
+        sys.stderr.close()
+        sys.exit(0)
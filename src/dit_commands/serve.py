@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""A module that defines the serve command.
+The daemon keeps a GitRepo per work tree it was asked about, and with it
+the object cache, the mapped packs and the ref snapshot, so that a request
+costs a lookup rather than the start of a process. Requests are answered
+one at a time by an asyncio loop on a Unix socket (see src/client.py for
+the framing). Objects never change once written, so what is cached of
+them stays valid; the ref snapshot is taken again when HEAD, packed-refs
+or a directory of loose refs changed, and the repository is opened again
+when its config changed.
+Requests:
+    {"op": "read-object", "repo": <work tree>, "name": <object name>,
+     "header": <bool>, "pretty": <bool>}
+        -> {"sha", "type", "size"[, "data" (base64)]}
+    {"op": "resolve", "repo", "name"} -> {"sha"}
+    {"op": "list-refs", "repo"[, "prefix", "peel"]}
+        -> {"refs": [[name, sha, peeled sha or null], ...]}
+    {"op": "hash", "repo", "type", "write"[, "paths"][, "data" (base64)]}
+        -> {"shas": [...]}
+    {"op": "ping"} -> {"pid"}
+    {"op": "shutdown"} -> {}
+A request that fails is answered with {"error": <message>}.
+"""
+
+import asyncio
+import base64
+import io
+import json
+import os
+import signal
+import stat
+import sys
+
+from src.client import (MAX_MESSAGE_SIZE, MESSAGE_HEADER, encode_message,
+                        is_private, request, socket_path)
+from src.dit_commands.cat_file import pretty_print, resolve_name
+from src.dit_commands.hash_object import hash_files, hash_object
+from src.dit_commands.resolve_list_refs import (invalidate_refs,
+                                                ref_snapshot)
+from src.objects.read_object import read_object_header, read_raw_object
+from src.parsers import subparsers
+from src.repos.gitrepo_class import GitRepo
+from src.repos.repo_paths import git_file_path
+from src.trace import flush as flush_trace, span
+
+# dit serve: allows running the dit daemon
+# dit serve will be implemented as dit serve [--socket <path>] [--stop]
+serve_arg = subparsers.add_parser(
+    "serve",
+    help="Run a daemon answering dit commands from warm caches",
+    usage="dit serve [--socket <path>] [--idle-timeout <seconds>] [--stop]",
+    epilog="See 'dit serve --help' for more information on a specific "
+    "command.")
+
+serve_arg.add_argument(
+    "--socket",
+    metavar="path",
+    dest="socket",
+    help="The Unix socket to listen on, in a directory only you may enter "
+    "(default: $DIT_SOCKET, dit-<uid>.sock in $XDG_RUNTIME_DIR, or "
+    "dit-<uid>/dit.sock in $TMPDIR)")
+
+serve_arg.add_argument(
+    "--idle-timeout",
+    metavar="seconds",
+    type=float,
+    dest="idle_timeout",
+    help="Exit after that long without a request")
+
+serve_arg.add_argument(
+    "--stop",
+    action="store_true",
+    dest="stop",
+    help="Stop the daemon listening on the socket")
+
+
+class Daemon:
+    """A class that answers the requests of the dit daemon.
+    Attributes:
+        repos: the {work tree: (config stamp, GitRepo)} dictionary of the
+            repositories opened.
+        ref_stamps: the {work tree: stamp} dictionary of the refs the
+            snapshot of each repository was taken from.
+        stopping: an asyncio.Event set when the daemon has to stop.
+    """
+
+    def __init__(self):
+        """Initialize a daemon with no repository open."""
+        self.repos = {}
+        self.ref_stamps = {}
+        self.stopping = asyncio.Event()
+        self.handlers = {
+            "read-object": self.read_object,
+            "resolve": self.resolve,
+            "list-refs": self.list_refs,
+            "hash": self.hash,
+            "ping": lambda message: {"pid": os.getpid()},
+            "shutdown": self.shutdown,
+        }
+
+    def repo(self, message):
+        """Return the GitRepo of the work tree a request names, opening it
+        again if its config changed.
+        Raises:
+            ValueError: if the work tree is not that of a git repository.
+        """
+        worktree = message.get("repo")
+        if not isinstance(worktree, str):
+            raise ValueError("no repository given")
+        try:
+            st = os.stat(os.path.join(worktree, ".git", "config"))
+        except OSError:
+            raise ValueError(f"{worktree} is not a git repository") from None
+        stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+        cached = self.repos.get(worktree)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        repo = GitRepo(worktree)
+        self.repos[worktree] = (stamp, repo)
+        invalidate_refs(repo)
+        self.ref_stamps.pop(worktree, None)
+        return repo
+
+    def refs(self, repo):
+        """Return the ref snapshot of a repository, taken again if a ref
+        changed since it was taken.
+        A ref is written to a lock file renamed over it, which changes the
+        directory holding it, so the stamp is made of HEAD, packed-refs and
+        the directories under refs/.
+        """
+        stamp = [ref_stamp(git_file_path(repo, "HEAD")),
+                 ref_stamp(git_file_path(repo, "packed-refs"))]
+        pending = [git_file_path(repo, "refs")]
+        while pending:
+            directory = pending.pop()
+            stamp.append(ref_stamp(directory))
+            try:
+                with os.scandir(directory) as entries:
+                    pending += [entry.path for entry in entries
+                                if entry.is_dir(follow_symlinks=False)]
+            except OSError:
+                continue
+        if self.ref_stamps.get(repo.workdir) != stamp:
+            invalidate_refs(repo)
+            self.ref_stamps[repo.workdir] = stamp
+        return ref_snapshot(repo)
+
+    def read_object(self, message):
+        """Read an object, or only its header."""
+        repo = self.repo(message)
+        self.refs(repo)
+        sha = resolve_name(repo, message["name"])
+        if sha is None:
+            raise ValueError(f"{message['name']} not found")
+        if message.get("header"):
+            object_format, size = read_object_header(repo, sha)
+            return {"sha": sha, "type": object_format.decode(), "size": size}
+        object_format, data = read_raw_object(repo, sha)
+        if message.get("pretty"):
+            out = io.BytesIO()
+            pretty_print(object_format, data, out)
+            output = out.getvalue()
+        else:
+            output = data
+        return {"sha": sha, "type": object_format.decode(), "size": len(data),
+                "data": base64.b64encode(output).decode()}
+
+    def resolve(self, message):
+        """Resolve an object name (a ref, a branch or tag, a sha prefix)."""
+        repo = self.repo(message)
+        self.refs(repo)
+        sha = resolve_name(repo, message["name"])
+        if sha is None:
+            raise ValueError(f"{message['name']} not found")
+        return {"sha": sha}
+
+    def list_refs(self, message):
+        """List the refs under a prefix, as show-ref does."""
+        snapshot = self.refs(self.repo(message))
+        refs = []
+        for name, _ in snapshot.items(message.get("prefix", "refs/")):
+            try:
+                sha = snapshot.resolve(name)
+            except ValueError:
+                continue
+            peeled = snapshot.peel(name) if message.get("peel") else None
+            refs.append([name, sha, peeled])
+        return {"refs": refs}
+
+    def hash(self, message):
+        """Hash (and optionally write) files, or data sent along."""
+        repo = self.repo(message)
+        object_format = message.get("type", "blob")
+        write = bool(message.get("write"))
+        shas = []
+        if message.get("data") is not None:
+            shas.append(hash_object(repo, base64.b64decode(message["data"]),
+                                    object_format, write))
+        shas += hash_files(repo, message.get("paths", []), object_format,
+                           write)
+        return {"shas": shas}
+
+    def shutdown(self, message):  # pylint: disable=unused-argument
+        """Stop the daemon once the response is sent."""
+        self.stopping.set()
+        return {}
+
+    def answer(self, message):
+        """Answer a request.
+        Returns:
+            The response, {"error": <message>} if the request failed.
+        """
+        if not isinstance(message, dict):
+            return {"error": "a request must be a JSON object"}
+        handler = self.handlers.get(message.get("op"))
+        if handler is None:
+            return {"error": f"unknown op {message.get('op')!r}"}
+        try:
+            with span("serve", op=message["op"]):
+                return handler(message)
+        except Exception as error:  # pylint: disable=broad-except
+            # a corrupt object (zlib.error, struct.error, ...) fails the
+            #  request, not the connection:
+            return {"error": str(error) or type(error).__name__}
+        finally:
+            # the daemon runs for long: its spans are written as they end:
+            flush_trace()
+
+    async def serve_connection(self, reader, writer):
+        """Answer the requests sent on a connection until it is closed."""
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(MESSAGE_HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                size, = MESSAGE_HEADER.unpack(header)
+                if size > MAX_MESSAGE_SIZE:
+                    break
+                try:
+                    message = json.loads(await reader.readexactly(size))
+                except ValueError:
+                    message = None
+                writer.write(encode_message(self.answer(message)))
+                await writer.drain()
+                if self.stopping.is_set():
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # the daemon is stopping with the connection still open:
+            pass
+        finally:
+            writer.close()
+
+
+def ref_stamp(path):
+    """Return what tells that a ref file or directory changed."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def claim_socket(path):
+    """Remove the socket left by a daemon that is gone.
+    Raises:
+        FileExistsError: if a daemon is listening on the socket.
+    """
+    if not os.path.exists(path):
+        return
+    try:
+        request({"op": "ping"}, path)
+    except OSError:
+        os.remove(path)
+        return
+    raise FileExistsError(f"a dit daemon is already listening on {path}")
+
+
+async def serve(path, idle_timeout=None):
+    """Run the daemon on a Unix socket until it is stopped (by a shutdown
+    request, SIGTERM or SIGINT, or for being idle)."""
+    daemon = Daemon()
+    last_request = asyncio.get_running_loop().time()
+
+    async def on_connection(reader, writer):
+        nonlocal last_request
+        last_request = asyncio.get_running_loop().time()
+        await daemon.serve_connection(reader, writer)
+        last_request = asyncio.get_running_loop().time()
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, 0o700, exist_ok=True)
+    # clients only connect to a socket in a directory of the user alone:
+    if not is_private(directory, stat.S_ISDIR):
+        raise ValueError(f"{directory} must belong to you alone (mode 700) "
+                         "to hold the socket")
+    claim_socket(path)
+    # only the user running the daemon may connect to it:
+    old_umask = os.umask(0o077)
+    try:
+        server = await asyncio.start_unix_server(on_connection, path)
+    finally:
+        os.umask(old_umask)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, daemon.stopping.set)
+    print(f"dit daemon listening on {path} (pid {os.getpid()})",
+          file=sys.stderr)
+    try:
+        async with server:
+            while not daemon.stopping.is_set():
+                try:
+                    await asyncio.wait_for(daemon.stopping.wait(),
+                                           idle_timeout or None)
+                except asyncio.TimeoutError:
+                    if loop.time() - last_request >= idle_timeout:
+                        break
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def dit_serve(args):
+    """Run a daemon answering dit commands from warm caches.
+    Usage:
+        dit serve [--socket <path>] [--idle-timeout <seconds>] [--stop]
+        dit serve (-h | --help)
+    Options:
+        -h, --help  Show this screen and exit.
+    """
+    path = args.socket or socket_path()
+    if args.stop:
+        try:
+            request({"op": "shutdown"}, path)
+        except OSError:
+            print(f"fatal: no dit daemon is listening on {path}",
+                  file=sys.stderr)
+            sys.exit(128)
+        return
+    try:
+        asyncio.run(serve(path, args.idle_timeout))
+    except (OSError, ValueError) as error:
+        print(f"fatal: {error}", file=sys.stderr)
+        sys.exit(128)
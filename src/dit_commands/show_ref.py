@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
 """A module that defines the show-ref command."""
 
-import collections
+import sys
 
-from src.dit_commands.resolve_list_refs import list_refs
+from src.dit_commands.resolve_list_refs import ref_snapshot
+from src.objects.sha_index import DEFAULT_ABBREV, sha_index
 from src.parsers import subparsers
 from src.repos.find_root import find_repo_root
 
@@ -13,31 +14,65 @@ from src.repos.find_root import find_repo_root
 show_ref_arg = subparsers.add_parser(
     "show-ref",
     help="List references in a local repository",
-    usage="dit show-ref",
+    usage="dit show-ref [-d] [--abbrev[=<n>]]",
     epilog="See 'dit show-ref --help' for more information on a specific "
     "command.")
 
+show_ref_arg.add_argument(
+    "-d", "--dereference",
+    action="store_true",
+    dest="dereference",
+    help="Also show the object annotated tags point to, as <tag>^{}")
 
-def show_ref(repo, refs, with_hash=True, prefix=""):
-    """List references in a local repository."""
+show_ref_arg.add_argument(
+    "--abbrev",
+    metavar="n",
+    nargs="?",
+    type=int,
+    const=DEFAULT_ABBREV,
+    dest="abbrev",
+    help="Abbreviate the object names to the shortest unique prefix of at "
+    f"least n digits (default: {DEFAULT_ABBREV})")
+
+
+def show_ref(repo, dereference=False, abbrev=None):
+    """List references in a local repository.
+    The refs come from the ref snapshot, already merged and sorted, and the
+    output is written in one go.
+    Args:
+        repo: the git repository.
+        dereference: if True, also list what annotated tags peel to.
+        abbrev: if given, abbreviate the shas to at least that many digits.
+    """
+    snapshot = ref_snapshot(repo)
+    lines = []
     # iterating through the references:
-    for name, ref in refs.items():
-        # making sure the reference is not a directory:
-        if isinstance(ref, collections.OrderedDict):
-            show_ref(repo, ref, with_hash, prefix + name + "/")
-        else:
-            # printing the reference:
-            print(ref, prefix + name)
+    for name, _ in snapshot.items():
+        try:
+            sha = snapshot.resolve(name)
+        except ValueError:
+            # a symbolic ref pointing to a ref that does not exist:
+            continue
+        peeled = snapshot.peel(name) if dereference else None
+        if abbrev is not None:
+            sha = sha_index(repo).abbreviate(sha, abbrev)
+            if peeled:
+                peeled = sha_index(repo).abbreviate(peeled, abbrev)
+        lines.append(f"{sha} {name}\n")
+        if peeled:
+            lines.append(f"{peeled} {name}^{{}}\n")
+
+    # printing the references:
+    sys.stdout.write("".join(lines))
 
 
 def dit_show_ref(args):
     """List references in a local repository.
     Usage:
-        dit show-ref
+        dit show-ref [-d] [--abbrev[=<n>]]
         dit show-ref (-h | --help)
     Options:
         -h, --help  Show this screen and exit.
     """
     repo = find_repo_root()
-    refs = list_refs(repo)
-    show_ref(repo, refs, prefix="refs/")
+    show_ref(repo, args.dereference, args.abbrev)
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""A module that defines the status command."""
+
+import os
+import sys
+
+from src.dit_commands.add import hash_workdir_files, is_unchanged
+from src.dit_commands.cat_file import resolve_name
+from src.dit_commands.resolve_list_refs import ref_snapshot
+from src.dit_commands.tree_parsing import iter_tree_entries
+from src.objects.read_object import read_object
+from src.parsers import subparsers
+from src.repos.find_root import find_repo_root
+from src.repos.ignore import ignore_rules, read_ignore_file
+from src.repos.index_class import (EXTENDED_INTENT_TO_ADD,
+                                   EXTENDED_SKIP_WORKTREE, MODE_GITLINK,
+                                   index_mode, index_path, read_index,
+                                   stat_fields, write_index)
+from src.repos.lock_file import LockFile
+from src.repos.workdir import is_nested_repo, workdir_path
+
+# the labels of the long format, padded as git pads them:
+LABELS = {
+    "A": "new file:   ",
+    "M": "modified:   ",
+    "D": "deleted:    ",
+}
+
+# the bytes that make git quote a path (besides the control characters,
+#  the non-ASCII bytes and the spaces), and the C escapes:
+QUOTED_BYTES = frozenset(b'"\\')
+C_ESCAPES = {
+    0x07: "\\a", 0x08: "\\b", 0x09: "\\t", 0x0a: "\\n", 0x0b: "\\v",
+    0x0c: "\\f", 0x0d: "\\r", 0x22: '\\"', 0x5c: "\\\\",
+}
+
+# dit status: allows showing the working tree status
+# dit status will be implemented as dit status [-s | --porcelain]
+status_arg = subparsers.add_parser(
+    "status",
+    help="Show the working tree status",
+    usage="dit status [-s | --porcelain] [--timing]",
+    epilog="See 'dit status --help' for more information on a specific "
+    "command.")
+
+status_arg.add_argument(
+    "-s", "--short", "--porcelain",
+    action="store_true",
+    dest="short",
+    help="Give the output in the short format, \"XY path\"")
+
+status_arg.add_argument(
+    "--timing",
+    action="store_true",
+    dest="timing",
+    help="Report how many files were checked and hashed on stderr")
+
+
+class StatusStats:
+    """A class that counts the work a status did.
+    Attributes:
+        checked: the number of tracked files whose stat data was read.
+        hashed: the number of tracked files that had to be read and hashed.
+        refreshed: the number of entries whose stat data was updated.
+    """
+
+    def __init__(self):
+        """Initialize the counters."""
+        self.checked = 0
+        self.hashed = 0
+        self.refreshed = 0
+
+
+def flatten_tree(repo, tree_sha):
+    """List the files of a tree, recursively.
+    Args:
+        repo: the git repository.
+        tree_sha: the hex sha of the tree.
+    Returns:
+        The {path (bytes): (mode, hex sha)} dictionary of the blobs (and
+        submodule commits) under the tree.
+    """
+    files = {}
+    modes = {}
+    stack = [(tree_sha, b"")]
+    while stack:
+        sha, prefix = stack.pop()
+        for mode, name, entry_sha in iter_tree_entries(
+                read_object(repo, sha).raw):
+            if mode == b"40000":
+                stack.append((entry_sha, prefix + name + b"/"))
+                continue
+            if mode not in modes:
+                modes[mode] = int(mode, 8)
+            files[prefix + name] = (modes[mode], entry_sha)
+    return files
+
+
+def head_files(repo):
+    """Return the files of the HEAD commit, or {} if there is no commit
+    yet."""
+    sha = resolve_name(repo, "HEAD")
+    if sha is None:
+        return {}
+    commit = read_object(repo, sha)
+    return flatten_tree(repo, commit.tree)
+
+
+def staged_changes(index, head):
+    """Compare the index with the files of HEAD.
+    An intent-to-add entry (git add -N) stages nothing: it is reported as
+    a change of the work tree.
+    Returns:
+        The {path: "A" | "M" | "D"} dictionary of the staged changes.
+    """
+    changes = {}
+    for entry in index.entries.values():
+        if entry.stage or entry.extended_flags & EXTENDED_INTENT_TO_ADD:
+            continue
+        committed = head.get(entry.path)
+        if committed is None:
+            changes[entry.path] = "A"
+        elif committed != (entry.mode, entry.sha):
+            changes[entry.path] = "M"
+    for path in head:
+        if index.get(path) is None:
+            changes[path] = "D"
+    return changes
+
+
+def unstaged_changes(repo, index, stats):
+    """Compare the work tree with the index.
+    Only the files whose stat data no longer matches their entry (or that
+    are racily clean) are hashed; those found unchanged have their stat
+    data refreshed in the index. The file of an intent-to-add entry is new
+    ("A") as long as it exists.
+    Returns:
+        The {path: "A" | "M" | "D"} dictionary of the unstaged changes.
+    """
+    changes = {}
+    suspects = []
+    # the paths are joined by hand, os.path.join costing more than lstat:
+    root = workdir_path(repo, b"")
+    for entry in index.entries.values():
+        if (entry.stage or entry.mode == MODE_GITLINK or
+                entry.extended_flags & EXTENDED_SKIP_WORKTREE):
+            continue
+        stats.checked += 1
+        try:
+            st = os.lstat(root + entry.path)
+        except (FileNotFoundError, NotADirectoryError):
+            changes[entry.path] = "D"
+            continue
+        mode = index_mode(st)
+        if mode is None:
+            changes[entry.path] = "D"
+        elif entry.extended_flags & EXTENDED_INTENT_TO_ADD:
+            changes[entry.path] = "A"
+        elif mode != entry.mode:
+            changes[entry.path] = "M"
+        elif not is_unchanged(index, entry, st):
+            suspects.append((entry.path, st))
+
+    stats.hashed += len(suspects)
+    shas = hash_workdir_files(repo, suspects, write=False)
+    for path, st in suspects:
+        entry = index.get(path)
+        if shas[path] != entry.sha:
+            changes[path] = "M"
+        else:
+            # writing the index again makes a racily clean entry clean:
+            entry.stat = stat_fields(st)
+            stats.refreshed += 1
+    return changes
+
+
+def untracked_files(repo, index):
+    """List the untracked files of the work tree, but for those .gitignore
+    files exclude; a directory holding no tracked file is listed once, as
+    "dir/", if it holds any file that is not ignored.
+    Returns:
+        The sorted list of the untracked paths.
+    """
+    tracked = set()
+    tracked_dirs = set()
+    for path, _ in index.entries:
+        tracked.add(path)
+        slash = path.rfind(b"/")
+        # the parents of a directory already seen were added with it:
+        while slash != -1 and path[:slash] not in tracked_dirs:
+            tracked_dirs.add(path[:slash])
+            slash = path.rfind(b"/", 0, slash)
+
+    untracked = []
+    stack = [(b"", ignore_rules(repo))]
+    while stack:
+        directory, rules = stack.pop()
+        rules, entries = list_untracked(repo, directory, rules)
+        for entry, path, is_dir in entries:
+            if path in tracked:
+                continue
+            if not is_dir:
+                untracked.append(path)
+            elif path in tracked_dirs:
+                stack.append((path, rules))
+            elif is_nested_repo(entry.path) or has_files(repo, path, rules):
+                untracked.append(path + b"/")
+    return sorted(untracked)
+
+
+def list_untracked(repo, directory, rules):
+    """List the entries of a directory that are not ignored.
+    Returns:
+        A (rules, entries) tuple: the IgnoreRules of the directory, with
+        its own .gitignore, and an (os.DirEntry, work tree path, is a
+        directory) tuple for each entry.
+    """
+    path = workdir_path(repo, directory)
+    data = read_ignore_file(os.path.join(path, b".gitignore"))
+    if data is not None:
+        rules = rules.child(directory, data)
+    prefix = directory + b"/" if directory else b""
+    listed = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.name == b".git":
+                continue
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if not rules.is_ignored(prefix + entry.name, is_dir):
+                listed.append((entry, prefix + entry.name, is_dir))
+    return rules, listed
+
+
+def has_files(repo, directory, rules):
+    """Return True if a directory holds a file that is not ignored, at any
+    depth."""
+    rules, entries = list_untracked(repo, directory, rules)
+    for _, path, is_dir in entries:
+        if not is_dir or has_files(repo, path, rules):
+            return True
+    return False
+
+
+def repo_status(repo, index, stats):
+    """Compute the status of a repository.
+    Returns:
+        A (staged, unstaged, untracked) tuple: the staged and unstaged
+        changes as {path: code} dictionaries, and the untracked paths.
+    """
+    staged = staged_changes(index, head_files(repo))
+    unstaged = unstaged_changes(repo, index, stats)
+    return staged, unstaged, untracked_files(repo, index)
+
+
+def current_branch(repo):
+    """Return the name of the branch HEAD is on, or None if it is detached.
+    """
+    value = ref_snapshot(repo).get("HEAD") or ""
+    if value.startswith("ref: refs/heads/"):
+        return value[len("ref: refs/heads/"):]
+    return None
+
+
+def quote_path(path, quote_space=True):
+    """Quote a path as git status does: a path holding a quote, a
+    backslash, a control character, a non-ASCII byte or (in the short
+    format) a space is put in double quotes, with C escapes (octal for the
+    bytes that have none)."""
+    if not any(byte in QUOTED_BYTES or byte < 0x20 or byte >= 0x7f or
+               (byte == 0x20 and quote_space) for byte in path):
+        return os.fsdecode(path)
+    out = []
+    for byte in path:
+        if byte in C_ESCAPES:
+            out.append(C_ESCAPES[byte])
+        elif byte < 0x20 or byte >= 0x7f:
+            out.append(f"\\{byte:03o}")
+        else:
+            out.append(chr(byte))
+    return '"' + "".join(out) + '"'
+
+
+def format_long(repo, staged, unstaged, untracked):
+    """Format the status as git status does (without the hints)."""
+    lines = []
+    branch = current_branch(repo)
+    if branch is not None:
+        lines.append(f"On branch {branch}")
+    else:
+        lines.append("HEAD detached")
+    if resolve_name(repo, "HEAD") is None:
+        lines += ["", "No commits yet", ""]
+
+    sections = [("Changes to be committed:", staged),
+                ("Changes not staged for commit:", unstaged)]
+    for title, changes in sections:
+        if changes:
+            lines.append(title)
+            for path in sorted(changes):
+                lines.append(f"\t{LABELS[changes[path]]}"
+                             f"{quote_path(path, False)}")
+            lines.append("")
+    if untracked:
+        lines.append("Untracked files:")
+        lines += [f"\t{quote_path(path, False)}" for path in untracked]
+        lines.append("")
+
+    if not staged:
+        if unstaged:
+            lines.append("no changes added to commit")
+        elif untracked:
+            lines.append("nothing added to commit but untracked files "
+                         "present")
+        else:
+            lines.append("nothing to commit, working tree clean")
+    return "\n".join(lines) + "\n"
+
+
+def format_short(staged, unstaged, untracked):
+    """Format the status as git status --porcelain does."""
+    lines = []
+    for path in sorted(set(staged) | set(unstaged)):
+        lines.append(f"{staged.get(path, ' ')}{unstaged.get(path, ' ')} "
+                     f"{quote_path(path)}")
+    lines += [f"?? {quote_path(path)}" for path in untracked]
+    return "".join(line + "\n" for line in lines)
+
+
+def dit_status(args):
+    """Show the working tree status.
+    Usage:
+        dit status [-s | --porcelain] [--timing]
+        dit status (-h | --help)
+    Options:
+        -h, --help  Show this screen and exit.
+    """
+    repo = find_repo_root()
+    # the refreshed stat data is written back if the index is not locked:
+    try:
+        lock = LockFile(index_path(repo))
+    except FileExistsError:
+        lock = None
+    try:
+        index = read_index(repo)
+        stats = StatusStats()
+        staged, unstaged, untracked = repo_status(repo, index, stats)
+    except ValueError as error:
+        if lock is not None:
+            lock.rollback()
+        print(f"fatal: {error}", file=sys.stderr)
+        sys.exit(128)
+    except BaseException:
+        if lock is not None:
+            lock.rollback()
+        raise
+    if lock is not None:
+        if stats.refreshed:
+            write_index(repo, index, lock)
+        else:
+            lock.rollback()
+
+    if args.short:
+        sys.stdout.write(format_short(staged, unstaged, untracked))
+    else:
+        sys.stdout.write(format_long(repo, staged, unstaged, untracked))
+    if args.timing:
+        print(f"status: {stats.checked} files checked, {stats.hashed} "
+              f"hashed, {stats.refreshed} refreshed", file=sys.stderr)
@@ -1,63 +1,83 @@
 #!/usr/bin/env python3
 """A module that defines the tree parsing functions."""
 
-from src.objects.tree_leaf_class import GitTreeLeaf
+import array
 
-def tree_parse_one(raw, start=0):
-    """Parse a git tree object."""
-    # Find the next space and newline characters:
-    end = raw.find(b"\x00", start)
-    # If the next space or newline characters are not found,
-    # set them to the length of the raw string:
-    if end == -1:
-        end = len(raw)
 
-    # Extract the mode, path, and sha from the binary string:
-    mode, path = raw[start:end].decode().split(" ", 1)
-    sha = raw[end + 1:end + 21]
+def iter_tree_entries(raw):
+    """Iterate over the entries of a binary git tree object.
+    Each entry is "<mode> <name>\\x00<20 byte sha>".
+    Args:
+        raw: the serialized tree object.
+    Yields:
+        (mode, name, hex sha) tuples, the mode and name as bytes.
+    """
+    pos = 0
+    end = len(raw)
+    while pos < end:
+        space = raw.find(b" ", pos)
+        null = raw.find(b"\x00", space)
+        if space == -1 or null == -1 or null + 21 > end:
+            raise ValueError("malformed tree entry")
+        yield raw[pos:space], raw[space + 1:null], raw[null + 1:null + 21].hex()
+        pos = null + 21
 
-    # Return the tree leaf:
-    return GitTreeLeaf(mode, path, sha), end + 21
 
-
-# def tree_parse(repo, data):
 def tree_parse(data):
-    """Parse a git tree object."""
-    # Create a list to store the tree leaves:
-    leaves = []
+    """Parse a binary git tree object into the offsets of its entries.
+    The data is not copied or decoded: each entry "<mode> <name>\\x00<sha>"
+    is only located, so that the mode, name and sha can be sliced out of the
+    data later, when they are needed. An entry starts 21 bytes after the
+    null byte of the previous one, so the null bytes are all that is kept.
+    Args:
+        data: the serialized tree object, as bytes.
+    Returns:
+        An array holding, for each entry, the offset of the null byte that
+        ends its name.
+    Raises:
+        ValueError: if an entry is truncated.
+    """
+    # 32 bit offsets are enough for any tree smaller than 4 GiB:
+    nulls = array.array("I" if len(data) < 1 << 32 else "Q")
+    add = nulls.append
+    find = data.find
+    pos = 0
+    end = len(data)
+    while pos < end:
+        null = find(b"\x00", pos)
+        if null == -1 or null + 21 > end:
+            raise ValueError("malformed tree entry")
+        add(null)
+        pos = null + 21
+    return nulls
 
-    # Iterate through the tree leaves:
-    for line in data.decode().split("\n"):
-        if not line:
-            continue
-        # Extract the mode, path, and sha from the binary string:
-        mode, path, sha = line.split(" ", 2)
-        leaves.append(GitTreeLeaf(mode, path, sha))
 
-    # Return the tree leaves:
-    return leaves
+def sort_tree_leaf(leaf):
+    """Return the key git sorts a tree leaf by: its name as bytes, followed
+    by a slash for a sub-tree."""
+    path = leaf.path
+    if isinstance(path, str):
+        path = path.encode("utf-8", "surrogateescape")
+    # sub-trees have the mode 40000 (written 040000 by ls-tree):
+    if leaf.mode.lstrip(b"0") == b"40000":
+        return path + b"/"
+    return path
 
 
-def sort_tree_leaf(leaf):
-    """Sort a git tree leaf."""
-    # Sort the tree leaves by path (directories first, then files):
-    if leaf.mode.startswith(b"10"):
-        # leaves that start with 100 are files:
-        return leaf.path
-    else:
-        # leaves that start with other modes are directories and
-        # end with a slash:
-        return leaf.path + "/"
-
-
-def tree_serialize(obj):
-    """Serialize a git tree object."""
-    # Create a list to store the tree leaves:
-    leaves = []
-
-    # Iterate through the tree leaves:
-    for entry in obj.leaves:
-        leaves.append(f"{entry.mode} {entry.path}\x00{entry.sha}")
-
-    # Join the tree leaves with a newline character:
-    return b"\n".join(leaves)
+def tree_serialize(leaves):
+    """Serialize git tree leaves into the data of a tree object.
+    Each entry is "<mode> <name>\x00<20 byte sha>", the entries sorted as
+    git sorts them, so that the same leaves always hash to the same tree.
+    Args:
+        leaves: the GitTreeLeaf instances (e.g. the leaves of a TreeObject).
+    Returns:
+        The serialized tree, as bytes.
+    """
+    entries = []
+    for leaf in sorted(leaves, key=sort_tree_leaf):
+        path = leaf.path
+        if isinstance(path, str):
+            path = path.encode("utf-8", "surrogateescape")
+        entries.append(leaf.mode.lstrip(b"0") + b" " + path + b"\x00" +
+                       bytes.fromhex(leaf.sha))
+    return b"".join(entries)
@@ -1,59 +1,183 @@
 #!/usr/bin/env python3
 """A module that defines the update-ref command."""
 
+import sys
+
+from src.dit_commands.cat_file import resolve_name
+from src.dit_commands.ref_transaction import ZERO_SHA, RefTransaction
 from src.parsers import subparsers
-from src.repos.repo_paths import git_file_path
 from src.repos.find_root import find_repo_root
 
+# the commands of update-ref --stdin, with their number of arguments:
+STDIN_COMMANDS = {
+    "update": (2, 3),
+    "create": (2, 2),
+    "delete": (1, 2),
+    "verify": (1, 2),
+}
+
 
 # dit update-ref: allows updating the references in the repository
-# dit update-ref will be implemented as dit update-ref <ref> <sha>
-# It will instantiate the tree object and write the files to the path provided
+# dit update-ref will be implemented as dit update-ref [-d] <ref>
+#  [<newvalue>] [<oldvalue>], or dit update-ref --stdin < commands
+# Every change goes through a RefTransaction: refs are locked, their old
+#  values checked, and the new values renamed into place all or nothing
 update_ref_arg = subparsers.add_parser(
     "update-ref",
     help="Update the object name stored in a ref safely",
-    usage="dit update-ref <ref> <sha>",
+    usage="dit update-ref [-d] <ref> [<newvalue>] [<oldvalue>]\n"
+    "       dit update-ref --stdin",
     epilog="See 'dit update-ref --help' for more information on a "
     "specific command.")
 
 update_ref_arg.add_argument(
-    "ref",
-    metavar="ref",
-    help="The ref to update")
+    "-d",
+    action="store_true",
+    dest="delete",
+    help="Delete the ref, after checking it holds <oldvalue> if given")
 
 update_ref_arg.add_argument(
-    "sha",
-    metavar="sha",
-    help="The sha to update the ref to")
+    "--stdin",
+    action="store_true",
+    dest="stdin",
+    help="Read update, create, delete and verify commands from stdin and "
+    "apply them in a single transaction")
+
+update_ref_arg.add_argument(
+    "args",
+    metavar="<ref> [<newvalue>] [<oldvalue>]",
+    nargs="*",
+    help="The ref to update, the sha to update it to, and the sha it must "
+    "currently hold")
+
+
+def resolve_value(repo, value):
+    """Resolve the value given for a ref to a full sha.
+    Args:
+        repo: the git repository.
+        value: a sha, a sha prefix, a ref, or a tag or branch name; an
+            empty value means "none".
+    Returns:
+        The full hex sha, ZERO_SHA for an empty value.
+    Raises:
+        ValueError: if the value does not name an object.
+    """
+    if not value:
+        return ZERO_SHA
+    sha = resolve_name(repo, value)
+    if sha is None:
+        raise ValueError(f"invalid object name {value}")
+    return sha
 
 
-def update_ref(repo, ref, sha):
+def parse_stdin_commands(repo, transaction, lines):
+    """Queue the commands read by update-ref --stdin in a transaction.
+    Each line is one of:
+        update <ref> <newvalue> [<oldvalue>]
+        create <ref> <newvalue>
+        delete <ref> [<oldvalue>]
+        verify <ref> [<oldvalue>]
+    Args:
+        repo: the git repository.
+        transaction: the RefTransaction to queue the commands in.
+        lines: the input lines.
+    Raises:
+        ValueError: if a line is malformed or names an invalid object.
+    """
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line:
+            continue
+        command, *words = line.split(" ")
+        if command not in STDIN_COMMANDS:
+            raise ValueError(f"unknown command: {line}")
+        fewest, most = STDIN_COMMANDS[command]
+        if not fewest <= len(words) <= most:
+            raise ValueError(f"{command}: wrong number of arguments: {line}")
+        ref, values = words[0], [resolve_value(repo, w) for w in words[1:]]
+        if command == "update":
+            transaction.update(ref, values[0],
+                               values[1] if len(values) > 1 else None)
+        elif command == "create":
+            if values[0] == ZERO_SHA:
+                raise ValueError(f"create {ref}: zero <newvalue>")
+            transaction.create(ref, values[0])
+        elif command == "delete":
+            transaction.delete(ref, values[0] if values else None)
+        else:
+            transaction.verify(ref, values[0] if values else None)
+
+
+def update_ref(repo, ref, sha, old_sha=None):
     """Update the object name stored in a ref safely.
     Args:
         repo: the repository to update the reference in.
         ref: the reference to update.
         sha: the sha to update the reference to.
+        old_sha: the sha the reference must currently hold (ZERO_SHA if
+            it must not exist), or None for no check.
     Returns:
         The reference.
+    Raises:
+        ValueError: if the reference does not hold old_sha.
+        FileExistsError: if the reference is locked.
     """
-    # creating the path to the reference:
-    path = git_file_path(repo, ref, create_dir=True)
-
-    # writing the reference to the git repository:
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(sha + "\n")
+    transaction = RefTransaction(repo)
+    transaction.update(ref, sha, old_sha)
+    transaction.commit()
 
     # returning the reference:
     return ref
 
 
+def delete_ref(repo, ref, old_sha=None):
+    """Delete a ref, loose and packed.
+    Args:
+        repo: the repository to delete the reference from.
+        ref: the reference to delete.
+        old_sha: the sha the reference must currently hold, or None.
+    Raises:
+        ValueError: if the reference does not hold old_sha.
+        FileExistsError: if the reference is locked.
+    """
+    transaction = RefTransaction(repo)
+    transaction.delete(ref, old_sha)
+    transaction.commit()
+
+
 def dit_update_ref(args):
     """Update the object name stored in a ref safely.
     Usage:
-        dit update-ref <ref> <sha>
+        dit update-ref [-d] <ref> [<newvalue>] [<oldvalue>]
+        dit update-ref --stdin
         dit update-ref (-h | --help)
     Options:
         -h, --help  Show this screen and exit.
     """
     repo = find_repo_root()
-    update_ref(repo, args.ref, args.sha)
+    try:
+        if args.stdin:
+            if args.args or args.delete:
+                update_ref_arg.error("--stdin takes no other arguments")
+            transaction = RefTransaction(repo)
+            parse_stdin_commands(repo, transaction, sys.stdin)
+            transaction.commit()
+        elif args.delete:
+            if len(args.args) not in (1, 2):
+                update_ref_arg.error("usage: dit update-ref -d <ref> "
+                                     "[<oldvalue>]")
+            old_sha = (resolve_value(repo, args.args[1])
+                       if len(args.args) == 2 else None)
+            delete_ref(repo, args.args[0], old_sha)
+        else:
+            if len(args.args) not in (2, 3):
+                update_ref_arg.error("usage: dit update-ref <ref> "
+                                     "<newvalue> [<oldvalue>]")
+            sha = resolve_value(repo, args.args[1])
+            old_sha = (resolve_value(repo, args.args[2])
+                       if len(args.args) == 3 else None)
+            update_ref(repo, args.args[0], sha, old_sha)
+    except (ValueError, FileExistsError, NotADirectoryError,
+            IsADirectoryError) as error:
+        print(f"fatal: {error}", file=sys.stderr)
+        sys.exit(128)
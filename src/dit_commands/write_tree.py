@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""A module that defines the write-tree command.
+The trees are built from a listing of the files read on stdin, in the
+format of git ls-files -s ("<mode> <sha> <stage>\\t<path>") or of git
+ls-tree -r ("<mode> <type> <sha>\\t<path>"). The cache-tree of the last
+tree written tells which directories did not change (and whose trees are
+still in the object database), so that only the trees along the changed
+paths are serialized and hashed again, and the new trees are written in
+one batch.
+"""
+
+import hashlib
+import os
+import sys
+
+from src.dit_commands.tree_parsing import tree_serialize
+from src.objects.read_pack import find_packed_object
+from src.objects.tree_leaf_class import GitTreeLeaf
+from src.objects.write_object import object_sha, write_objects
+from src.parsers import subparsers
+from src.repos.cache_tree import (CacheTree, read_cache_tree,
+                                  write_cache_tree)
+from src.repos.find_root import find_repo_root
+from src.repos.repo_paths import git_file_path
+
+# dit write-tree: allows creating a tree object from a listing of files
+# dit write-tree will be implemented as dit write-tree [-z] < listing
+write_tree_arg = subparsers.add_parser(
+    "write-tree",
+    help="Create a tree object from a listing of files read on stdin",
+    usage="git ls-files -s | dit write-tree [-z] [--no-cache] [--timing]",
+    epilog="See 'dit write-tree --help' for more information on a specific "
+    "command.")
+
+write_tree_arg.add_argument(
+    "-z",
+    action="store_true",
+    dest="null_terminated",
+    help="Read NUL-terminated records with unquoted paths (ls-files -s -z)")
+
+write_tree_arg.add_argument(
+    "--no-cache",
+    action="store_true",
+    dest="no_cache",
+    help="Build every tree, ignoring the cache-tree")
+
+write_tree_arg.add_argument(
+    "--timing",
+    action="store_true",
+    dest="timing",
+    help="Report how many trees were built and reused on stderr")
+
+# the modes a file of a tree may have:
+FILE_MODES = (b"100644", b"100755", b"120000", b"160000")
+
+# the C escapes of quoted paths:
+C_UNESCAPES = {
+    ord("a"): 0x07, ord("b"): 0x08, ord("t"): 0x09, ord("n"): 0x0a,
+    ord("v"): 0x0b, ord("f"): 0x0c, ord("r"): 0x0d, ord('"'): 0x22,
+    ord("\\"): 0x5c,
+}
+
+
+def unquote_path(path):
+    """Unquote a path that git put in double quotes, with C escapes."""
+    if not (path.startswith(b'"') and path.endswith(b'"') and
+            len(path) > 1):
+        return path
+    out = bytearray()
+    pos = 1
+    end = len(path) - 1
+    while pos < end:
+        byte = path[pos]
+        pos += 1
+        if byte != 0x5c:
+            out.append(byte)
+        elif path[pos] in C_UNESCAPES:
+            out.append(C_UNESCAPES[path[pos]])
+            pos += 1
+        else:
+            out.append(int(path[pos:pos + 3], 8))
+            pos += 3
+    return bytes(out)
+
+
+def parse_listing(data, null_terminated=False):
+    """Parse a listing of files.
+    Args:
+        data: the listing, in the format of ls-files -s or ls-tree -r.
+        null_terminated: if True, the records end with a null byte and the
+            paths are not quoted.
+    Returns:
+        A list of (mode, hex sha, path) tuples, each as bytes but the sha.
+    Raises:
+        ValueError: if a record is malformed or a path unmerged.
+    """
+    files = []
+    for record in data.split(b"\x00" if null_terminated else b"\n"):
+        if not record:
+            continue
+        meta, tab, path = record.partition(b"\t")
+        fields = meta.split(b" ")
+        if not tab or len(fields) != 3:
+            raise ValueError(f"malformed listing line '{record.decode()}'")
+        mode, sha = fields[0], fields[1]
+        if len(sha) != 40:
+            # ls-tree -r: "<mode> <type> <sha>":
+            sha = fields[2]
+        elif fields[2] != b"0":
+            raise ValueError(f"path '{path.decode()}' is unmerged")
+        if mode not in FILE_MODES or len(sha) != 40:
+            raise ValueError(f"malformed listing line '{record.decode()}'")
+        if not null_terminated:
+            path = unquote_path(path)
+        files.append((mode, sha.decode(), path))
+    return files
+
+
+def group_directories(files):
+    """Group the files of a listing by directory.
+    Returns:
+        The {directory path: (files, sub-directory names)} dictionary of
+        the directories, files being the (mode, name, sha) tuples of the
+        files directly in each; every parent directory is listed, the root
+        directory being b"".
+    Raises:
+        ValueError: if a path is listed twice, or is both that of a file
+            and of a directory (the tree would hold a duplicate entry).
+    """
+    directories = {b"": ([], set())}
+    paths = set()
+    for mode, sha, path in files:
+        if path in paths:
+            raise ValueError(f"path '{os.fsdecode(path)}' is listed twice")
+        paths.add(path)
+        slash = path.rfind(b"/")
+        directory = path[:slash] if slash != -1 else b""
+        if directory not in directories:
+            directories[directory] = ([], set())
+            # listing the parents of the directory, up to a known one:
+            child = directory
+            while child:
+                parent = parent_directory(child)
+                known = parent in directories
+                if not known:
+                    directories[parent] = ([], set())
+                directories[parent][1].add(child[len(parent) + 1 if parent
+                                                 else 0:])
+                if known:
+                    break
+                child = parent
+        directories[directory][0].append((mode, path[slash + 1:], sha))
+    for directory in directories:
+        if directory in paths:
+            raise ValueError(f"path '{os.fsdecode(directory)}' is both a "
+                             "file and a directory")
+    return directories
+
+
+def directory_digest(files, subdirectories):
+    """Return the digest of the entries listed directly in a directory."""
+    digest = hashlib.sha1()
+    for mode, name, sha in files:
+        digest.update(b"%s %s %s\x00" % (mode, name, sha.encode()))
+    for name in sorted(subdirectories):
+        digest.update(b"%s/\x00" % name)
+    return digest.digest()
+
+
+def parent_directory(path):
+    """Return the parent of a directory path, b"" being the root."""
+    slash = path.rfind(b"/")
+    return path[:slash] if slash != -1 else b""
+
+
+def tree_exists(repo, sha):
+    """Return True if a tree is in the object database, loose or packed."""
+    return os.path.exists(git_file_path(repo, "objects", sha[:2], sha[2:])) \
+        or find_packed_object(repo, sha) is not None
+
+
+def build_trees(directories, cache, repo=None):
+    """Build the trees of the directories whose entries changed since the
+    cache-tree was written, and of their parents.
+    Args:
+        directories: the directories, as group_directories returns them.
+        cache: the CacheTree of the last trees written.
+        repo: the git repository, in which the trees of the cache-tree are
+            checked to still exist (they may have been pruned since), or
+            None to trust them.
+    Returns:
+        A (cache, objects) tuple: the CacheTree of the new trees, and the
+        {sha: ("tree", data)} dictionary of the trees that were built.
+    """
+    digests = {}
+    dirty = set()
+    for path, (files, subdirectories) in directories.items():
+        digests[path] = directory_digest(files, subdirectories)
+        cached = cache.entries.get(path)
+        if cached is None or cached[1] != digests[path] or (
+                repo is not None and not tree_exists(repo, cached[0])):
+            dirty.add(path)
+    # a changed directory changes the trees of its parents:
+    for path in list(dirty):
+        while path:
+            path = parent_directory(path)
+            if path in dirty:
+                break
+            dirty.add(path)
+
+    new_cache = CacheTree({path: cache.entries[path] for path in directories
+                           if path not in dirty})
+    objects = {}
+    # a directory is deeper than its parent, so its tree is built first:
+    for path in sorted(dirty, key=lambda path: path.count(b"/") + 1
+                       if path else 0, reverse=True):
+        files, subdirectories = directories[path]
+        prefix = path + b"/" if path else b""
+        leaves = [GitTreeLeaf(mode, name, sha) for mode, name, sha in files]
+        leaves += [GitTreeLeaf(b"40000", name,
+                               new_cache.entries[prefix + name][0])
+                   for name in subdirectories]
+        data = tree_serialize(leaves)
+        sha = object_sha("tree", data)
+        objects[sha] = ("tree", data)
+        new_cache.entries[path] = (sha, digests[path])
+    return new_cache, objects
+
+
+def write_tree(repo, files, use_cache=True):
+    """Write the trees of a listing of files.
+    Args:
+        repo: the git repository.
+        files: the (mode, hex sha, path) tuples of the files.
+        use_cache: if False, build every tree, ignoring the cache-tree.
+    Returns:
+        A (sha, built, total) tuple: the sha of the root tree, the number
+        of trees built and the number of trees.
+    """
+    cache = read_cache_tree(repo) if use_cache else CacheTree()
+    directories = group_directories(files)
+    new_cache, objects = build_trees(directories, cache, repo)
+    write_objects(repo, objects)
+    write_cache_tree(repo, new_cache)
+    return new_cache.entries[b""][0], len(objects), len(directories)
+
+
+def dit_write_tree(args):
+    """Create a tree object from a listing of files read on stdin.
+    Usage:
+        git ls-files -s | dit write-tree [-z] [--no-cache] [--timing]
+        dit write-tree (-h | --help)
+    Options:
+        -h, --help  Show this screen and exit.
+    """
+    repo = find_repo_root()
+    try:
+        files = parse_listing(sys.stdin.buffer.read(), args.null_terminated)
+        sha, built, total = write_tree(repo, files, not args.no_cache)
+    except (ValueError, FileExistsError) as error:
+        print(f"fatal: {error}", file=sys.stderr)
+        sys.exit(128)
+    print(sha)
+    if args.timing:
+        print(f"write-tree: {built} of {total} trees built",
+              file=sys.stderr)
@@ -1,40 +1,119 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-"""A module that defines the dit commands."""
-
-# from src.dit_commands.cat_file import dit_cat_file
-# from src.dit_commands.checkout import dit_checkout
-from src.dit_commands.hash_object import dit_hash_object
-from src.dit_commands.init import dit_init
-from src.dit_commands.ls_tree import dit_ls_tree
-from src.dit_commands.show_ref import dit_show_ref
-# from src.dit_commands.symbolic_ref import dit_symbolic_ref
-# from src.dit_commands.tag import dit_tag
-from src.dit_commands.update_ref import dit_update_ref
-from src.parsers import parser
+"""A module that defines the dit commands.
+A command module registers its parser as it is imported, so the modules
+are only imported when their command is run: the registry below tells
+which module holds each command, and the help line listed by dit --help.
+"""
 
+import importlib
+import sys
+
+from src.parsers import parser, subparsers
+from src.trace import TRACING, span
+
+# the dit commands: name -> (module, function, help line):
 DITS = {
-    "hash-object": dit_hash_object,
-    "init": dit_init,
-    "ls-tree": dit_ls_tree,
-    "show-ref": dit_show_ref,
-    "update-ref": dit_update_ref
+    "add": ("src.dit_commands.add", "dit_add",
+            "Add file contents to the index"),
+    "bitmap": ("src.dit_commands.bitmap", "dit_bitmap",
+               "Write the reachability bitmap file"),
+    "cat-file": ("src.dit_commands.cat_file", "dit_cat_file",
+                 "Provide contents or details of repository objects"),
+    "checkout": ("src.dit_commands.checkout", "dit_checkout",
+                 "Switch branches, or check out a commit"),
+    "commit-graph": ("src.dit_commands.commit_graph", "dit_commit_graph",
+                     "Write and verify the commit-graph file"),
+    "fsck": ("src.dit_commands.fsck", "dit_fsck",
+             "Verify the connectivity and validity of the objects"),
+    "hash-object": ("src.dit_commands.hash_object", "dit_hash_object",
+                    "Compute object ID and optionally creates a blob from a "
+                    "file"),
+    "hash-tree": ("src.dit_commands.hash_tree", "dit_hash_tree",
+                  "Compute the tree object ID of a directory of the work "
+                  "tree"),
+    "init": ("src.dit_commands.init", "dit_init",
+             "Initialize a new, empty repository."),
+    "log": ("src.dit_commands.log", "dit_log", "Show commit logs"),
+    "ls-tree": ("src.dit_commands.ls_tree", "dit_ls_tree",
+                "List the contents of a tree object"),
+    "merge-base": ("src.dit_commands.merge_base", "dit_merge_base",
+                   "Find as good common ancestors as possible for a merge"),
+    "pack-objects": ("src.dit_commands.pack_objects", "dit_pack_objects",
+                     "Create a packed archive of objects"),
+    "pack-refs": ("src.dit_commands.pack_refs", "dit_pack_refs",
+                  "Pack heads and tags for efficient repository access"),
+    "read-tree": ("src.dit_commands.read_tree", "dit_read_tree",
+                  "Read a tree into the index, and optionally the work tree"),
+    "repack": ("src.dit_commands.repack", "dit_repack",
+               "Pack unpacked objects in a repository"),
+    "rev-list": ("src.dit_commands.rev_list", "dit_rev_list",
+                 "Lists commit objects in reverse chronological order"),
+    "serve": ("src.dit_commands.serve", "dit_serve",
+              "Run a daemon answering dit commands from warm caches"),
+    "show-ref": ("src.dit_commands.show_ref", "dit_show_ref",
+                 "List references in a local repository"),
+    "status": ("src.dit_commands.status", "dit_status",
+               "Show the working tree status"),
+    # "symbolic-ref": ("src.dit_commands.symbolic_ref", "dit_symbolic_ref"),
+    # "tag": ("src.dit_commands.tag", "dit_tag"),
+    "update-ref": ("src.dit_commands.update_ref", "dit_update_ref",
+                   "Update the object name stored in a ref safely"),
+    "write-tree": ("src.dit_commands.write_tree", "dit_write_tree",
+                   "Create a tree object from a listing of files read on "
+                   "stdin"),
 }
 
 
+def load_command(command):
+    """Import the module of a command, which registers its parser.
+    Returns:
+        The function running the command, or None if there is no such
+        command.
+    """
+    if command not in DITS:
+        return None
+    module, function, _ = DITS[command]
+    return getattr(importlib.import_module(module), function)
+
+
+def list_commands():
+    """Register a parser holding only the help line of every command not
+    loaded, so that dit --help (or an unknown command) lists them all
+    without importing any of them."""
+    for command, (_, _, help_line) in DITS.items():
+        if command not in subparsers.choices:
+            subparsers.add_parser(command, help=help_line)
+
+
 def main(arg=None):
     """Main function."""
     if arg is None:
+        # the command is the first argument that is not an option of dit:
+        command = next((word for word in sys.argv[1:]
+                        if not word.startswith("-")), None)
+        if load_command(command) is None:
+            list_commands()
         args = parser.parse_args()
     else:
         args = arg
 
     # Call the function that matches the command name
     command = args.dit_command
+    function = load_command(command)
 
-    if command in DITS:
-        DITS[command](args)
+    if function is not None:
+        with span("command", command=command,
+                  argv=sys.argv[1:]) as command_span:
+            try:
+                function(args)
+            finally:
+                if TRACING:
+                    # pylint: disable=import-outside-toplevel
+                    from src.objects.object_cache import \
+                        traced_cache_counters
+                    command_span.counters.update(traced_cache_counters())
     else:
         print(f"#{command} is not a dit command. See dit --help.")
 
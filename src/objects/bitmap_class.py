@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A module that defines the reachability bitmap class.
+The reachability bitmap (objects/info/bitmap) numbers the objects reachable
+from the refs, oldest commit first, each commit followed by the trees and
+blobs it brings in, and stores for selected commits the EWAH compressed
+bitmap of every object they reach. Counting or listing the objects of a
+history is then a few bitmap operations instead of a walk of every tree.
+The file is laid out as the commit-graph is, a header, a table of chunks
+and a trailing checksum:
+    OIDF: the 256 entry fanout table of the object shas.
+    OIDL: the sorted binary object shas.
+    OPOS: per sorted sha, the position of its bit in the bitmaps.
+    OORD: per bit position, the index of its sha in OIDL.
+    TYPE: the bitmaps of the commits, trees, blobs and tags.
+    BCOM: per bitmap, the bit position of its commit and its offset in
+          BDAT, sorted by bit position.
+    BDAT: the bitmaps of the selected commits.
+"""
+
+import bisect
+import hashlib
+import struct
+
+from src.objects.commit_graph_class import read_chunk_table
+from src.objects.ewah import ewah_decode
+from src.objects.pack_class import (OBJ_BLOB, OBJ_COMMIT, OBJ_TAG, OBJ_TREE,
+                                    map_file)
+
+BITMAP_SIGNATURE = b"DBMP"
+BITMAP_VERSION = 1
+# the hash version of SHA-1:
+BITMAP_HASH_VERSION = 1
+CHUNK_FANOUT = b"OIDF"
+CHUNK_LOOKUP = b"OIDL"
+CHUNK_POSITIONS = b"OPOS"
+CHUNK_ORDER = b"OORD"
+CHUNK_TYPES = b"TYPE"
+CHUNK_COMMITS = b"BCOM"
+CHUNK_BITMAPS = b"BDAT"
+
+COMMIT_ENTRY_SIZE = 12
+# the order of the type bitmaps in TYPE:
+BITMAP_TYPES = (OBJ_COMMIT, OBJ_TREE, OBJ_BLOB, OBJ_TAG)
+
+
+class ReachabilityBitmap:
+    """A class that defines a memory-mapped reachability bitmap file.
+    Attributes:
+        path: the path to the bitmap file.
+        fanout: the 256 entry fanout table of the object shas.
+        count: the number of objects numbered by the bitmaps.
+        types: the {object type: bitmap} dictionary of the type bitmaps.
+    """
+
+    def __init__(self, path):
+        """Map the bitmap file at the path provided and check its layout.
+        Args:
+            path: the path to the bitmap file.
+        Raises:
+            ValueError: if the file is not a valid bitmap file.
+        """
+        self.path = path
+        self.data = map_file(path)
+        try:
+            self._check_layout()
+        except (ValueError, struct.error) as error:
+            self.data.close()
+            raise ValueError(f"{path}: {error}") from None
+
+    def _check_layout(self):
+        """Read the header and the chunk table, checking their bounds."""
+        data = self.data
+        signature, version, hash_version, chunk_count, _ = struct.unpack_from(
+            ">4sBBBB", data, 0)
+        if signature != BITMAP_SIGNATURE:
+            raise ValueError("bad bitmap signature")
+        if version != BITMAP_VERSION or hash_version != BITMAP_HASH_VERSION:
+            raise ValueError(f"unsupported bitmap version {version}")
+
+        chunks = read_chunk_table(data, chunk_count)
+        for chunk_id in (CHUNK_FANOUT, CHUNK_LOOKUP, CHUNK_POSITIONS,
+                         CHUNK_ORDER, CHUNK_TYPES, CHUNK_COMMITS,
+                         CHUNK_BITMAPS):
+            if chunk_id not in chunks:
+                raise ValueError(f"missing bitmap chunk {chunk_id}")
+        offset, size = chunks[CHUNK_FANOUT]
+        if size != 256 * 4:
+            raise ValueError("bad bitmap fanout size")
+        self.fanout = struct.unpack_from(">256I", data, offset)
+        self.count = self.fanout[255]
+        if any(low > high for low, high in zip(self.fanout, self.fanout[1:])):
+            raise ValueError("bitmap fanout is not sorted")
+        if chunks[CHUNK_LOOKUP][1] != 20 * self.count:
+            raise ValueError("bad bitmap lookup size")
+        for chunk_id in (CHUNK_POSITIONS, CHUNK_ORDER):
+            if chunks[chunk_id][1] != 4 * self.count:
+                raise ValueError(f"bad bitmap {chunk_id} size")
+        if chunks[CHUNK_COMMITS][1] % COMMIT_ENTRY_SIZE:
+            raise ValueError("bad bitmap commit table size")
+
+        self._lookup = chunks[CHUNK_LOOKUP][0]
+        self._positions = chunks[CHUNK_POSITIONS][0]
+        self._order = chunks[CHUNK_ORDER][0]
+        self._bitmaps, self._bitmaps_size = chunks[CHUNK_BITMAPS]
+
+        offset, size = chunks[CHUNK_TYPES]
+        self.types = {}
+        for object_type in BITMAP_TYPES:
+            self.types[object_type], _, offset = ewah_decode(data, offset)
+        if offset != chunks[CHUNK_TYPES][0] + size:
+            raise ValueError("bad bitmap type bitmaps")
+
+        # the bit positions of the commits that have a bitmap, sorted:
+        offset, size = chunks[CHUNK_COMMITS]
+        self._commit_table = offset
+        self.commits = [
+            struct.unpack_from(">I", data, entry)[0]
+            for entry in range(offset, offset + size, COMMIT_ENTRY_SIZE)]
+
+    def __len__(self):
+        """Return the number of objects numbered by the bitmaps."""
+        return self.count
+
+    def find(self, sha):
+        """Find the bit position of an object.
+        Args:
+            sha: the binary (20 byte) sha of the object.
+        Returns:
+            The bit position of the object, or None if it is not numbered.
+        """
+        first = sha[0]
+        low = self.fanout[first - 1] if first else 0
+        high = self.fanout[first]
+        data = self.data
+        table = self._lookup
+        while low < high:
+            mid = (low + high) // 2
+            start = table + 20 * mid
+            current = data[start:start + 20]
+            if current < sha:
+                low = mid + 1
+            elif current > sha:
+                high = mid
+            else:
+                return struct.unpack_from(">I", data,
+                                          self._positions + 4 * mid)[0]
+        return None
+
+    def sha_at(self, pos):
+        """Return the binary sha of the object at a bit position."""
+        index = struct.unpack_from(">I", self.data, self._order + 4 * pos)[0]
+        start = self._lookup + 20 * index
+        return self.data[start:start + 20]
+
+    def bitmap_at(self, pos):
+        """Return the bitmap of the commit at a bit position.
+        Args:
+            pos: the bit position of the commit.
+        Returns:
+            The bitmap of the objects the commit reaches, as an int, or None
+            if the commit has no bitmap.
+        """
+        index = bisect.bisect_left(self.commits, pos)
+        if index == len(self.commits) or self.commits[index] != pos:
+            return None
+        offset = struct.unpack_from(
+            ">Q", self.data,
+            self._commit_table + COMMIT_ENTRY_SIZE * index + 4)[0]
+        if offset >= self._bitmaps_size:
+            raise ValueError(f"{self.path}: bad bitmap offset {offset}")
+        return ewah_decode(self.data, self._bitmaps + offset)[0]
+
+    def checksum_ok(self):
+        """Return True if the trailing checksum matches the file."""
+        with memoryview(self.data) as view:
+            return (hashlib.sha1(view[:-20]).digest() ==
+                    self.data[len(self.data) - 20:])
+
+    def close(self):
+        """Unmap the bitmap file."""
+        self.data.close()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A module that defines the git commit-graph class.
+The commit-graph file (objects/info/commit-graph) stores, for every commit
+of a repository, its tree, its parents, its generation number and its
+commit date, so that walking the history does not inflate or parse any
+commit object. The file is a header, a table of chunks and a trailing
+checksum:
+    OIDF: the 256 entry fanout table of the commit shas.
+    OIDL: the sorted binary commit shas.
+    CDAT: per commit, the tree sha, the positions of the first two parents,
+          the generation number and the commit date.
+    EDGE: the positions of the other parents of octopus merges.
+"""
+
+import hashlib
+import struct
+
+from src.objects.pack_class import map_file
+
+GRAPH_SIGNATURE = b"CGPH"
+GRAPH_VERSION = 1
+# the hash version of SHA-1:
+GRAPH_HASH_VERSION = 1
+CHUNK_FANOUT = b"OIDF"
+CHUNK_LOOKUP = b"OIDL"
+CHUNK_DATA = b"CDAT"
+CHUNK_EXTRA_EDGES = b"EDGE"
+
+HEADER_SIZE = 8
+CHUNK_ENTRY_SIZE = 12
+DATA_ENTRY_SIZE = 20 + 16
+
+# the parent positions of CDAT and EDGE:
+PARENT_NONE = 0x70000000
+PARENT_EXTRA_EDGES = 0x80000000
+PARENT_LAST_EDGE = 0x80000000
+# the generation numbers stored (topological levels), and the generation of
+#  a commit that is not in the graph:
+GENERATION_MAX = 0x3fffffff
+GENERATION_INFINITY = 0xffffffff
+
+
+def read_chunk_table(data, chunk_count):
+    """Read the table of chunks that follows the header of a chunked file
+    (the commit-graph, or the reachability bitmap): 12-byte entries of a
+    chunk id and its offset, ending with an entry for the end of the last
+    chunk. The file ends with a 20-byte checksum.
+    Args:
+        data: the mapped file.
+        chunk_count: the number of chunks, read from the header.
+    Returns:
+        A {chunk id: (offset, size)} dictionary.
+    Raises:
+        ValueError: if the chunks are out of order or out of the file.
+    """
+    chunks = {}
+    end = len(data) - 20
+    for index in range(chunk_count):
+        chunk_id, offset = struct.unpack_from(
+            ">4sQ", data, HEADER_SIZE + CHUNK_ENTRY_SIZE * index)
+        next_offset = struct.unpack_from(
+            ">Q", data, HEADER_SIZE + CHUNK_ENTRY_SIZE * (index + 1) + 4)[0]
+        if not offset <= next_offset <= end:
+            raise ValueError("bad chunk offsets")
+        chunks[chunk_id] = (offset, next_offset - offset)
+    return chunks
+
+
+def chunk_file_parts(header, chunks):
+    """Lay out a chunked file, the inverse of read_chunk_table.
+    Args:
+        header: the HEADER_SIZE bytes of the header.
+        chunks: a list of (chunk id, chunk bytes) tuples, in file order.
+    Returns:
+        The list of the parts of the file, but for the trailing checksum:
+        the header, then the chunk table ending with a zero id, then the
+        chunks.
+    """
+    parts = [header]
+    offset = HEADER_SIZE + CHUNK_ENTRY_SIZE * (len(chunks) + 1)
+    for chunk_id, chunk in chunks:
+        parts.append(struct.pack(">4sQ", chunk_id, offset))
+        offset += len(chunk)
+    parts.append(struct.pack(">4sQ", b"\x00" * 4, offset))
+    parts.extend(chunk for _, chunk in chunks)
+    return parts
+
+
+class CommitNode:
+    """A class that defines what a history walk needs of a commit.
+    Attributes:
+        sha: the hex sha of the commit.
+        tree: the hex sha of its tree.
+        parents: the hex shas of its parents.
+        generation: its generation number (1 for a root commit), or
+            GENERATION_INFINITY if it is not known.
+        date: its committer timestamp.
+    """
+    __slots__ = ("sha", "tree", "parents", "generation", "date")
+
+    def __init__(self, sha, tree, parents, generation, date):
+        """Initialize a commit node."""
+        self.sha = sha
+        self.tree = tree
+        self.parents = parents
+        self.generation = generation
+        self.date = date
+
+
+class CommitGraph:
+    """A class that defines a memory-mapped commit-graph file.
+    Attributes:
+        path: the path to the commit-graph file.
+        fanout: the 256 entry fanout table of the commit shas.
+        count: the number of commits in the graph.
+    """
+
+    def __init__(self, path):
+        """Map the commit-graph at the path provided and check its layout.
+        Args:
+            path: the path to the commit-graph file.
+        Raises:
+            ValueError: if the file is not a valid commit-graph.
+        """
+        self.path = path
+        self.data = map_file(path)
+        try:
+            self._check_layout()
+        except (ValueError, struct.error) as error:
+            self.data.close()
+            raise ValueError(f"{path}: {error}") from None
+
+    def _check_layout(self):
+        """Read the header and the chunk table, checking their bounds."""
+        data = self.data
+        signature, version, hash_version, chunk_count, _ = struct.unpack_from(
+            ">4sBBBB", data, 0)
+        if signature != GRAPH_SIGNATURE:
+            raise ValueError("bad commit-graph signature")
+        if version != GRAPH_VERSION or hash_version != GRAPH_HASH_VERSION:
+            raise ValueError(f"unsupported commit-graph version {version}")
+
+        chunks = read_chunk_table(data, chunk_count)
+        for chunk_id in (CHUNK_FANOUT, CHUNK_LOOKUP, CHUNK_DATA):
+            if chunk_id not in chunks:
+                raise ValueError(f"missing commit-graph chunk {chunk_id}")
+        offset, size = chunks[CHUNK_FANOUT]
+        if size != 256 * 4:
+            raise ValueError("bad commit-graph fanout size")
+        self.fanout = struct.unpack_from(">256I", data, offset)
+        self.count = self.fanout[255]
+        if any(low > high for low, high in zip(self.fanout, self.fanout[1:])):
+            raise ValueError("commit-graph fanout is not sorted")
+        if chunks[CHUNK_LOOKUP][1] != 20 * self.count:
+            raise ValueError("bad commit-graph lookup size")
+        if chunks[CHUNK_DATA][1] != DATA_ENTRY_SIZE * self.count:
+            raise ValueError("bad commit-graph data size")
+
+        self._lookup = chunks[CHUNK_LOOKUP][0]
+        self._commit_data = chunks[CHUNK_DATA][0]
+        self._extra_edges, self._extra_edges_size = chunks.get(
+            CHUNK_EXTRA_EDGES, (0, 0))
+
+    def __len__(self):
+        """Return the number of commits in the graph."""
+        return self.count
+
+    def sha_at(self, pos):
+        """Return the binary sha of the commit at the position provided."""
+        start = self._lookup + 20 * pos
+        return self.data[start:start + 20]
+
+    def find(self, sha):
+        """Find the position of a commit in the graph.
+        Args:
+            sha: the binary (20 byte) sha of the commit.
+        Returns:
+            The position of the commit, or None if it is not in the graph.
+        """
+        first = sha[0]
+        low = self.fanout[first - 1] if first else 0
+        high = self.fanout[first]
+        data = self.data
+        table = self._lookup
+        while low < high:
+            mid = (low + high) // 2
+            start = table + 20 * mid
+            current = data[start:start + 20]
+            if current < sha:
+                low = mid + 1
+            elif current > sha:
+                high = mid
+            else:
+                return mid
+        return None
+
+    def parent_positions(self, pos):
+        """Return the positions of the parents of the commit at a position."""
+        first, second = struct.unpack_from(
+            ">II", self.data, self._commit_data + DATA_ENTRY_SIZE * pos + 20)
+        if first == PARENT_NONE:
+            return []
+        if second == PARENT_NONE:
+            return [first]
+        if not second & PARENT_EXTRA_EDGES:
+            return [first, second]
+
+        # the other parents of an octopus merge are listed in EDGE:
+        parents = [first]
+        edge = self._extra_edges + 4 * (second & ~PARENT_EXTRA_EDGES)
+        end = self._extra_edges + self._extra_edges_size
+        while edge < end:
+            value = struct.unpack_from(">I", self.data, edge)[0]
+            parents.append(value & ~PARENT_LAST_EDGE)
+            if value & PARENT_LAST_EDGE:
+                return parents
+            edge += 4
+        raise ValueError(f"{self.path}: truncated extra edges")
+
+    def generation_at(self, pos):
+        """Return the generation number of the commit at a position."""
+        value = struct.unpack_from(
+            ">I", self.data, self._commit_data + DATA_ENTRY_SIZE * pos + 28)[0]
+        return value >> 2
+
+    def date_at(self, pos):
+        """Return the commit date of the commit at a position."""
+        high, low = struct.unpack_from(
+            ">II", self.data, self._commit_data + DATA_ENTRY_SIZE * pos + 28)
+        return ((high & 0x3) << 32) | low
+
+    def node_at(self, pos):
+        """Return the CommitNode of the commit at a position."""
+        start = self._commit_data + DATA_ENTRY_SIZE * pos
+        tree = self.data[start:start + 20].hex()
+        parents = []
+        for parent in self.parent_positions(pos):
+            if parent >= self.count:
+                raise ValueError(f"{self.path}: bad parent position {parent}")
+            parents.append(self.sha_at(parent).hex())
+        return CommitNode(self.sha_at(pos).hex(), tree, parents,
+                          self.generation_at(pos), self.date_at(pos))
+
+    def checksum_ok(self):
+        """Return True if the trailing checksum matches the file."""
+        with memoryview(self.data) as view:
+            return (hashlib.sha1(view[:-20]).digest() ==
+                    self.data[len(self.data) - 20:])
+
+    def close(self):
+        """Unmap the commit-graph."""
+        self.data.close()
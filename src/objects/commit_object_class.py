@@ -7,11 +7,30 @@ import collections
 from src.objects.gitobject_class import GitObject
 from src.dit_commands.commit_msg import commit_msg_parse, commit_msg_serialize
 
+
+def signature_date(signature):
+    """Return the timestamp of an author or committer line,
+    "Name <email> <timestamp> <timezone>", or 0 if it has none."""
+    fields = signature.rsplit(b" ", 2)
+    if len(fields) == 3 and fields[1].isdigit():
+        return int(fields[1])
+    return 0
+
+
 class CommitObject(GitObject):
     """Defines a git commit object, a subclass of the GitObject class.
     Attributes:
         object_format: The format of the git object.
             A git commit object has the format "commit".
+        fields: The headers of the commit, in order, and the message under
+            the None key, as parsed by commit_msg_parse.
+        tree: The hex sha of the tree of the commit.
+        parents: The hex shas of the parents of the commit, in order
+            (none for a root commit, several for a merge).
+        parent: The hex sha of the first parent, or None.
+        author: The author line.
+        committer: The committer line.
+        message: The commit message.
     """
     object_format = "commit"
 
@@ -24,11 +43,16 @@ class CommitObject(GitObject):
         # creating the dictionary to store the commit message:
         dictn = collections.OrderedDict()
 
-        # creating the commit message:
-        dictn[b"tree"] = self.tree
-        dictn[b"parent"] = self.parent
+        # creating the commit message, the other headers (such as encoding
+        #  or gpgsig) following in their original order:
+        dictn[b"tree"] = self.tree.encode()
+        if self.parents:
+            dictn[b"parent"] = [parent.encode() for parent in self.parents]
         dictn[b"author"] = self.author
         dictn[b"committer"] = self.committer
+        for key, value in getattr(self, "fields", {}).items():
+            if key not in dictn and key is not None:
+                dictn[key] = value
         dictn[None] = self.message
 
         # serializing the commit message:
@@ -40,8 +64,18 @@ class CommitObject(GitObject):
         dictn = commit_msg_parse(data)
 
         # extracting the commit message:
-        self.tree = dictn[b"tree"]
-        self.parent = dictn[b"parent"]
-        self.author = dictn[b"author"]
-        self.committer = dictn[b"committer"]
+        self.fields = dictn
+        self.tree = dictn[b"tree"].decode()
+        parents = dictn.get(b"parent", [])
+        if not isinstance(parents, list):
+            parents = [parents]
+        self.parents = [parent.decode() for parent in parents]
+        self.parent = self.parents[0] if self.parents else None
+        self.author = dictn.get(b"author", b"")
+        self.committer = dictn.get(b"committer", b"")
         self.message = dictn[None]
+
+    @property
+    def date(self):
+        """The committer timestamp of the commit."""
+        return signature_date(self.committer)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A module that defines the git delta encoding functions.
+A delta describes how to rebuild a target object from a base object with a
+sequence of "copy from base" and "insert literal data" instructions. Deltas
+are used by pack files to store similar objects compactly.
+"""
+
+# the size of the base blocks indexed when looking for copies:
+DELTA_BLOCK = 16
+# the largest copy a single instruction can express (24-bit size):
+MAX_COPY_SIZE = 0xffffff
+# the largest literal a single insert instruction can carry:
+MAX_INSERT_SIZE = 0x7f
+
+
+def delta_header_size(delta, pos=0):
+    """Read one of the variable length sizes at the start of a delta.
+    Args:
+        delta: the delta data.
+        pos: the offset of the size in the delta.
+    Returns:
+        A (size, position after the size) tuple.
+    """
+    size = 0
+    shift = 0
+    while True:
+        byte = delta[pos]
+        pos += 1
+        size |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return size, pos
+
+
+def apply_delta(base, delta):
+    """Rebuild a target object from its base and a delta.
+    Args:
+        base: the data of the base object.
+        delta: the delta data.
+    Returns:
+        The data of the target object.
+    Raises:
+        ValueError: if the delta does not match the base or is corrupt.
+    """
+    base_size, pos = delta_header_size(delta)
+    if base_size != len(base):
+        raise ValueError(
+            f"delta base size mismatch: expected {base_size}, "
+            f"got {len(base)}")
+    result_size, pos = delta_header_size(delta, pos)
+
+    # building the target object in a single preallocated buffer:
+    result = bytearray(result_size)
+    base = memoryview(base)
+    end = len(delta)
+    out = 0
+    while pos < end:
+        opcode = delta[pos]
+        pos += 1
+        if opcode & 0x80:
+            # copy instruction: offset and size follow as sparse bytes:
+            offset = 0
+            for shift in (0, 8, 16, 24):
+                if opcode & (1 << (shift // 8)):
+                    offset |= delta[pos] << shift
+                    pos += 1
+            size = 0
+            for shift in (0, 8, 16):
+                if opcode & (0x10 << (shift // 8)):
+                    size |= delta[pos] << shift
+                    pos += 1
+            if size == 0:
+                size = 0x10000
+            if offset + size > len(base) or out + size > result_size:
+                raise ValueError("delta copy out of range")
+            result[out:out + size] = base[offset:offset + size]
+            out += size
+        elif opcode:
+            # insert instruction: the opcode is the literal length:
+            if out + opcode > result_size or pos + opcode > end:
+                raise ValueError("delta insert out of range")
+            result[out:out + opcode] = delta[pos:pos + opcode]
+            pos += opcode
+            out += opcode
+        else:
+            raise ValueError("invalid delta opcode 0")
+
+    if out != result_size:
+        raise ValueError(
+            f"delta result size mismatch: expected {result_size}, got {out}")
+    return bytes(result)
+
+
+def encode_delta_size(size):
+    """Encode a size as the variable length integer used in delta headers."""
+    encoded = bytearray()
+    while True:
+        byte = size & 0x7f
+        size >>= 7
+        if size:
+            encoded.append(byte | 0x80)
+        else:
+            encoded.append(byte)
+            return bytes(encoded)
+
+
+class DeltaIndex:
+    """A class that defines an index of the blocks of a delta base, so that
+    several targets can be compared against the same base cheaply.
+    Attributes:
+        base: the data of the base object.
+        blocks: a dictionary mapping each DELTA_BLOCK sized block of the
+            base (at block aligned offsets) to its first offset.
+    """
+
+    def __init__(self, base):
+        """Index the base object provided."""
+        self.base = base
+        self.blocks = {}
+        for offset in range(0, len(base) - DELTA_BLOCK + 1, DELTA_BLOCK):
+            self.blocks.setdefault(base[offset:offset + DELTA_BLOCK], offset)
+
+
+def _match_length(base, base_pos, target, target_pos):
+    """Return how many bytes match from the positions provided."""
+    limit = min(len(base) - base_pos, len(target) - target_pos)
+    length = 0
+    # comparing whole runs first, then byte by byte:
+    step = 256
+    while (length + step <= limit and
+           base[base_pos + length:base_pos + length + step] ==
+           target[target_pos + length:target_pos + length + step]):
+        length += step
+    while (length < limit and
+           base[base_pos + length] == target[target_pos + length]):
+        length += 1
+    return length
+
+
+def _emit_insert(out, data, start, end):
+    """Append insert instructions for data[start:end] to the delta."""
+    while start < end:
+        size = min(end - start, MAX_INSERT_SIZE)
+        out.append(size)
+        out += data[start:start + size]
+        start += size
+
+
+def _emit_copy(out, offset, size):
+    """Append copy instructions for base[offset:offset + size] to the delta."""
+    while size:
+        chunk = min(size, MAX_COPY_SIZE)
+        opcode = 0x80
+        args = bytearray()
+        for index in range(4):
+            byte = (offset >> (8 * index)) & 0xff
+            if byte:
+                opcode |= 1 << index
+                args.append(byte)
+        for index in range(3):
+            byte = (chunk >> (8 * index)) & 0xff
+            if byte:
+                opcode |= 0x10 << index
+                args.append(byte)
+        out.append(opcode)
+        out += args
+        offset += chunk
+        size -= chunk
+
+
+def create_delta(index, target, max_size=None):
+    """Create a delta that rebuilds the target from an indexed base.
+    Args:
+        index: the DeltaIndex of the base object.
+        target: the data of the target object.
+        max_size: if given, give up as soon as the delta would be larger.
+    Returns:
+        The delta data, or None if it would be larger than max_size.
+    """
+    base = index.base
+    blocks = index.blocks
+    out = bytearray(encode_delta_size(len(base)))
+    out += encode_delta_size(len(target))
+
+    pending = 0     # start of the literal data not emitted yet
+    pos = 0
+    last = len(target) - DELTA_BLOCK
+    while pos <= last:
+        offset = blocks.get(target[pos:pos + DELTA_BLOCK])
+        if offset is None:
+            pos += 1
+            # the literal data alone is already too large:
+            if max_size is not None and len(out) + pos - pending > max_size:
+                return None
+            continue
+
+        # extending the match backwards over the pending literal data:
+        while (offset > 0 and pos > pending and
+               base[offset - 1] == target[pos - 1]):
+            offset -= 1
+            pos -= 1
+        length = _match_length(base, offset, target, pos)
+
+        _emit_insert(out, target, pending, pos)
+        _emit_copy(out, offset, length)
+        pos += length
+        pending = pos
+        if max_size is not None and len(out) > max_size:
+            return None
+
+    _emit_insert(out, target, pending, len(target))
+    if max_size is not None and len(out) > max_size:
+        return None
+    return bytes(out)
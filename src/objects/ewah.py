@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A module that defines the EWAH bitmap compression, as git stores it.
+A bitmap is a sequence of 64-bit words, compressed into marker words each
+followed by literal words. A marker word holds a run of words that are all
+zeros or all ones (its low bit, then a 32-bit run length) and the number of
+literal words that follow it (its high 31 bits). The serialized bitmap is:
+    the number of bits (32 bits), the number of words (32 bits), the words
+    (64 bits each), and the index of the last marker word (32 bits),
+all in network byte order.
+In memory, bitmaps are plain Python ints (bit n of the int is bit n of the
+bitmap), so that combining them is a single |, & or & ~ done in C.
+"""
+
+import array
+import re
+import struct
+import sys
+
+WORD_BITS = 64
+ALL_ONES = (1 << WORD_BITS) - 1
+RUN_LENGTH_MAX = (1 << 32) - 1
+LITERAL_WORDS_MAX = (1 << 31) - 1
+
+# runs of clean words, found in the little-endian bytes of a bitmap:
+ZERO_RUN = re.compile(rb"\x00+")
+ONES_RUN = re.compile(rb"\xff+")
+
+
+def _words(data):
+    """Return bytes of little-endian words as an array of ints."""
+    words = array.array("Q")
+    words.frombytes(data)
+    if sys.byteorder == "big":
+        words.byteswap()
+    return words
+
+
+def _swapped(data):
+    """Swap the byte order of each 64-bit word of data."""
+    words = array.array("Q")
+    words.frombytes(data)
+    words.byteswap()
+    return words.tobytes()
+
+
+def ewah_encode(bits, bit_size):
+    """Compress a bitmap.
+    Args:
+        bits: the bitmap, as an int.
+        bit_size: the number of bits of the bitmap.
+    Returns:
+        The serialized bitmap, as bytes.
+    """
+    word_count = (bit_size + WORD_BITS - 1) // WORD_BITS
+    data = bits.to_bytes(word_count * 8, "little")
+    words = _words(data)
+    out = array.array("Q")
+    last_marker = 0
+    index = 0
+    while index < word_count or not out:
+        # the run of clean words, found a few bytes at a time by the regex:
+        run_bit = 0
+        run = 0
+        if index < word_count and words[index] in (0, ALL_ONES):
+            run_bit = 1 if words[index] else 0
+            match = (ONES_RUN if run_bit else ZERO_RUN).match(data, index * 8)
+            run = min(RUN_LENGTH_MAX, (match.end() - index * 8) // 8)
+            index += run
+        # then the literal words, up to the next clean one:
+        start = index
+        while (index < word_count and index - start < LITERAL_WORDS_MAX and
+               words[index] not in (0, ALL_ONES)):
+            index += 1
+        last_marker = len(out)
+        out.append(run_bit | (run << 1) | ((index - start) << 33))
+        out.extend(words[start:index])
+
+    if sys.byteorder == "little":
+        out.byteswap()
+    return (struct.pack(">II", bit_size, len(out)) + out.tobytes() +
+            struct.pack(">I", last_marker))
+
+
+def ewah_decode(data, offset=0):
+    """Decompress a bitmap.
+    Args:
+        data: the buffer holding the serialized bitmap.
+        offset: where the bitmap starts in data.
+    Returns:
+        A (bits, bit_size, end) tuple: the bitmap as an int, its number of
+        bits, and the offset following the serialized bitmap.
+    Raises:
+        ValueError: if the bitmap is truncated.
+    """
+    bit_size, word_count = struct.unpack_from(">II", data, offset)
+    start = offset + 8
+    end = start + 8 * word_count + 4
+    if end > len(data):
+        raise ValueError("truncated EWAH bitmap")
+
+    chunks = []
+    index = 0
+    while index < word_count:
+        marker = struct.unpack_from(">Q", data, start + 8 * index)[0]
+        run = (marker >> 1) & RUN_LENGTH_MAX
+        literals = marker >> 33
+        if index + 1 + literals > word_count:
+            raise ValueError("truncated EWAH bitmap")
+        if run:
+            chunks.append((b"\xff" if marker & 1 else b"\x00") * (8 * run))
+        if literals:
+            literal_start = start + 8 * (index + 1)
+            literal_data = bytes(data[literal_start:literal_start +
+                                      8 * literals])
+            # network order words, in the little-endian order of the int:
+            chunks.append(_swapped(literal_data))
+        index += 1 + literals
+
+    bits = int.from_bytes(b"".join(chunks), "little")
+    # a run of ones fills its last word, past the end of the bitmap:
+    return bits & ((1 << bit_size) - 1), bit_size, end
+
+
+def iter_bits(bits):
+    """Iterate over the positions of the bits set in a bitmap, in order."""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield index * 8 + low.bit_length() - 1
+            byte ^= low
@@ -5,12 +5,15 @@
 
 import os
 
+from src.objects.sha_index import HEX_DIGITS, MIN_ABBREV, sha_index
 from src.repos.repo_paths import git_file_path
 
 
 def find_object(repo, name, format=None, follow=True):
     """Find the object with the given name.
     The name can be a sha, a tag, a relative ref, a short sha, or a sha prefix.
+    Short shas are resolved through the sorted sha index of the repository,
+    which covers both the loose and the packed objects.
     Args:
         repo: the repository where the object is located.
         name: the name of the object.
@@ -19,8 +22,8 @@ def find_object(repo, name, format=None, follow=True):
     Returns:
         The object with the given name.
     Raises:
-        ValueError: if the name is empty, a sha, a sha prefix, a tag, a relative
-            ref, or a short sha.
+        ValueError: if the name is empty, or is a short sha that matches
+            more than one object.
     """
     # making sure the name is not empty:
     if not name.strip():
@@ -30,23 +33,45 @@ def find_object(repo, name, format=None, follow=True):
     if len(name) == 40:
         return name
 
-    # making sure the name is not a sha prefix:
-    if len(name) >= 4 and all(c in "0123456789abcdef" for c in name):
-        return name
+    # making sure the name is not a short sha or a sha prefix
+    #  (an ambiguous prefix raises a ValueError):
+    if len(name) >= MIN_ABBREV and all(c in HEX_DIGITS for c in name):
+        matches = sha_index(repo).match_prefix(name, limit=10)
+        if len(matches) == 1:
+            return matches[0]
+        if len(matches) > 1:
+            raise ValueError(
+                f"short sha {name} is ambiguous; candidates are: "
+                + ", ".join(matches))
 
     # making sure the name is not a tag:
-    if git_file_path(repo, "refs", "tags", name):
-        with open(git_file_path(repo, "refs", "tags", name), encoding="utf-8") as f:
+    path = git_file_path(repo, "refs", "tags", name)
+    if os.path.isfile(path):
+        with open(path, encoding="utf-8") as f:
             return f.read().strip()
 
     # making sure the name is not a relative ref:
     if "/" in name:
         ref, name = name.split("/", 1)
-        with open(git_file_path(repo, "refs", ref, name), encoding="utf-8") as f:
-            return f.read().strip()
+        path = git_file_path(repo, "refs", ref, name)
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                return f.read().strip()
+    return None
+
 
-    # making sure the name is not a short sha:
-    if len(name) >= 4:
-        for sha in os.listdir(git_file_path(repo, "objects", name[:2])):
-            if sha.startswith(name):
-                return sha
+def loose_object_shas(repo):
+    """Yield the shas of the loose objects of the repository.
+    Args:
+        repo: the repository to list the objects of.
+    Yields:
+        The hex sha of each loose object.
+    """
+    objects_dir = git_file_path(repo, "objects")
+    for fanout in sorted(os.listdir(objects_dir)):
+        # skipping pack/, info/ and anything that is not a fan-out directory:
+        if len(fanout) != 2 or not all(c in HEX_DIGITS for c in fanout):
+            continue
+        for name in sorted(os.listdir(os.path.join(objects_dir, fanout))):
+            if len(name) == 38 and all(c in HEX_DIGITS for c in name):
+                yield fanout + name
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A module that defines the object cache classes.
+Each repository keeps an ObjectCache, used by read_object and
+read_raw_object, so that objects read many times (the trees of a
+recursive ls-tree, the commits of a history walk) are only inflated and
+parsed once.
+When tracing, the counters of the caches are added to the counters of the
+command span (see traced_cache_counters).
+"""
+
+import collections
+import threading
+
+from src.trace import TRACING
+
+# the default bounds of the object cache of a repository:
+PARSED_CACHE_ENTRIES = 4096
+PARSED_CACHE_BYTES = 64 * 1024 * 1024
+RAW_CACHE_ENTRIES = 1024
+RAW_CACHE_BYTES = 32 * 1024 * 1024
+# blobs larger than this are never cached:
+BIG_BLOB_THRESHOLD = 1024 * 1024
+# the object caches created while tracing, whose counters are reported:
+_traced_caches = []
+
+
+class LRUCache:
+    """A class that defines a least recently used cache bounded by both its
+    number of entries and the total size of its values. It can be shared
+    by threads, such as the readers of a parallel ls-tree.
+    Attributes:
+        max_entries: the most entries kept, or None for no limit.
+        max_bytes: the most bytes kept, or None for no limit.
+        size: the total size of the values kept.
+        hits: how many lookups found their key.
+        misses: how many lookups did not find their key.
+        evictions: how many entries were dropped to stay within bounds.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        """Initialize an empty cache with the bounds provided."""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        """Return the number of entries in the cache."""
+        return len(self.entries)
+
+    def __contains__(self, key):
+        """Return True if the key is cached, without counting a lookup."""
+        return key in self.entries
+
+    def get(self, key):
+        """Return the value cached for the key, or None.
+        Args:
+            key: the key to look up.
+        Returns:
+            The value, which is then the most recently used, or None.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, size):
+        """Cache a value, evicting the least recently used entries as needed.
+        Args:
+            key: the key of the value.
+            value: the value to cache.
+            size: the size the value counts for.
+        """
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self.entries[key] = (value, size)
+            self.size += size
+            while ((self.max_bytes is not None and
+                    self.size > self.max_bytes) or
+                   (self.max_entries is not None and
+                    len(self.entries) > self.max_entries)):
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry; the counters are kept."""
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """Return the counters and the current size of the cache."""
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class ObjectCache:
+    """A class that defines the object cache of a repository.
+    Parsed objects (TreeObject and CommitObject instances) and raw blob data
+    are kept in two separate LRU caches, so that a few large blobs cannot
+    push out the trees and commits a walk keeps coming back to.
+    The cached objects are shared: callers must not modify them.
+    Attributes:
+        parsed: the LRUCache of parsed objects, keyed by sha.
+        raw: the LRUCache of (format, data) tuples of blobs, keyed by sha.
+        big_blob_threshold: blobs larger than this bypass the cache.
+    """
+
+    def __init__(self, parsed_entries=PARSED_CACHE_ENTRIES,
+                 parsed_bytes=PARSED_CACHE_BYTES,
+                 raw_entries=RAW_CACHE_ENTRIES, raw_bytes=RAW_CACHE_BYTES,
+                 big_blob_threshold=BIG_BLOB_THRESHOLD):
+        """Initialize an empty object cache with the bounds provided."""
+        self.parsed = LRUCache(parsed_entries, parsed_bytes)
+        self.raw = LRUCache(raw_entries, raw_bytes)
+        self.big_blob_threshold = big_blob_threshold
+        if TRACING:
+            _traced_caches.append(self)
+
+    def get_parsed(self, sha):
+        """Return the parsed object cached for the sha, or None."""
+        return self.parsed.get(sha)
+
+    def put_parsed(self, sha, obj, size):
+        """Cache a parsed object whose serialized size is size."""
+        self.parsed.put(sha, obj, size)
+
+    def get_raw(self, sha):
+        """Return the (format, data) tuple cached for the sha, or None."""
+        return self.raw.get(sha)
+
+    def put_raw(self, sha, object_format, data):
+        """Cache the data of a blob, unless it is too large."""
+        if len(data) <= self.big_blob_threshold:
+            self.raw.put(sha, (object_format, data), len(data))
+
+    def clear(self):
+        """Drop every cached object."""
+        self.parsed.clear()
+        self.raw.clear()
+
+    def stats(self):
+        """Return the counters of both caches.
+        Returns:
+            A {"parsed": {...}, "raw": {...}} dictionary of the entries,
+            bytes, hits, misses and evictions of each cache.
+        """
+        return {"parsed": self.parsed.stats(), "raw": self.raw.stats()}
+
+
+def traced_cache_counters():
+    """Sum the counters of the object caches created while tracing.
+    Returns:
+        A {"<cache>_cache_<counter>": amount} dictionary of the hits,
+        misses and evictions of the parsed and raw caches.
+    """
+    counters = {}
+    for cache in _traced_caches:
+        for name, stats in cache.stats().items():
+            for counter in ("hits", "misses", "evictions"):
+                key = f"{name}_cache_{counter}"
+                counters[key] = counters.get(key, 0) + stats[counter]
+    return counters
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A module that defines the git pack file and pack index classes.
+A pack file (objects/pack/pack-<sha>.pack) stores many objects in a single
+file, each one zlib compressed and optionally stored as a delta against
+another object. The matching index (pack-<sha>.idx, version 2) maps object
+shas to offsets in the pack.
+Both files are memory-mapped, so looking up an object does not open any
+file and the compressed data is handed to zlib straight from the mapping.
+"""
+
+import mmap
+import os
+import struct
+import zlib
+
+from src.objects.delta import apply_delta, delta_header_size
+from src.objects.object_cache import LRUCache
+from src.trace import TRACING, count
+
+# pack object types:
+OBJ_COMMIT = 1
+OBJ_TREE = 2
+OBJ_BLOB = 3
+OBJ_TAG = 4
+OBJ_OFS_DELTA = 6
+OBJ_REF_DELTA = 7
+
+TYPE_NAMES = {
+    OBJ_COMMIT: b"commit",
+    OBJ_TREE: b"tree",
+    OBJ_BLOB: b"blob",
+    OBJ_TAG: b"tag",
+}
+TYPE_NUMBERS = {name: number for number, name in TYPE_NAMES.items()}
+
+IDX_MAGIC = b"\xfftOc"
+IDX_VERSION = 2
+PACK_MAGIC = b"PACK"
+
+# how much compressed data is handed to zlib at a time:
+INFLATE_CHUNK = 64 * 1024
+# how many bytes of delta bases are kept per pack (core.deltaBaseCacheLimit):
+DELTA_BASE_CACHE_LIMIT = 32 * 1024 * 1024
+
+
+def map_file(path):
+    """Memory-map a file read-only.
+    Args:
+        path: the path to the file.
+    Returns:
+        The mmap object.
+    Raises:
+        ValueError: if the file is empty.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"{path} is empty")
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class PackIndex:
+    """A class that defines a version 2 pack index.
+    Attributes:
+        path: the path to the .idx file.
+        fanout: the 256 entry fanout table; fanout[b] is the number of
+            objects whose sha starts with a byte <= b.
+        count: the number of objects in the pack.
+    """
+
+    def __init__(self, path):
+        """Map the pack index at the path provided.
+        Args:
+            path: the path to the .idx file.
+        Raises:
+            ValueError: if the file is not a version 2 pack index.
+        """
+        self.path = path
+        self.data = map_file(path)
+        if (self.data[:4] != IDX_MAGIC or
+                struct.unpack_from(">I", self.data, 4)[0] != IDX_VERSION):
+            raise ValueError(f"{path} is not a version 2 pack index")
+
+        self.fanout = struct.unpack_from(">256I", self.data, 8)
+        self.count = self.fanout[255]
+
+        # offsets of the tables that follow the fanout table:
+        self._sha_table = 8 + 256 * 4
+        self._crc_table = self._sha_table + 20 * self.count
+        self._offset_table = self._crc_table + 4 * self.count
+        self._large_offset_table = self._offset_table + 4 * self.count
+
+    def __len__(self):
+        """Return the number of objects in the pack."""
+        return self.count
+
+    def sha_at(self, pos):
+        """Return the binary sha of the object at the position provided."""
+        start = self._sha_table + 20 * pos
+        return self.data[start:start + 20]
+
+    def crc_at(self, pos):
+        """Return the crc32 of the packed object at the position provided."""
+        return struct.unpack_from(">I", self.data, self._crc_table + 4 * pos)[0]
+
+    def offset_at(self, pos):
+        """Return the pack offset of the object at the position provided."""
+        offset = struct.unpack_from(
+            ">I", self.data, self._offset_table + 4 * pos)[0]
+        # offsets over 2 GiB live in the 64-bit offset table:
+        if offset & 0x80000000:
+            offset = struct.unpack_from(
+                ">Q", self.data,
+                self._large_offset_table + 8 * (offset & 0x7fffffff))[0]
+        return offset
+
+    def find(self, sha):
+        """Find the position of an object in the index.
+        The fanout table narrows the search to the objects sharing the first
+        byte of the sha, and a binary search is done over that range.
+        Args:
+            sha: the binary (20 byte) sha of the object.
+        Returns:
+            The position of the object, or None if it is not in the pack.
+        """
+        first = sha[0]
+        low = self.fanout[first - 1] if first else 0
+        high = self.fanout[first]
+        data = self.data
+        table = self._sha_table
+        while low < high:
+            mid = (low + high) // 2
+            start = table + 20 * mid
+            current = data[start:start + 20]
+            if current < sha:
+                low = mid + 1
+            elif current > sha:
+                high = mid
+            else:
+                return mid
+        return None
+
+    def lower_bound(self, sha):
+        """Return the position of the first object whose sha is not smaller
+        than the binary sha provided (the index count if there is none)."""
+        first = sha[0]
+        low = self.fanout[first - 1] if first else 0
+        high = self.fanout[first]
+        data = self.data
+        table = self._sha_table
+        while low < high:
+            mid = (low + high) // 2
+            start = table + 20 * mid
+            if data[start:start + 20] < sha:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def close(self):
+        """Unmap the pack index."""
+        self.data.close()
+
+
+class PackFile:
+    """A class that defines a git pack file and its index.
+    Attributes:
+        path: the path to the .pack file.
+        index: the PackIndex of the pack.
+        count: the number of objects in the pack.
+    """
+
+    def __init__(self, path, index=None):
+        """Map the pack file at the path provided.
+        Args:
+            path: the path to the .pack file.
+            index: the PackIndex of the pack; by default the .idx file next
+                to the pack is used.
+        Raises:
+            ValueError: if the file is not a version 2 or 3 pack.
+        """
+        self.path = path
+        self.data = map_file(path)
+        self.view = memoryview(self.data)
+        magic, version, self.count = struct.unpack_from(">4sII", self.data)
+        if magic != PACK_MAGIC or version not in (2, 3):
+            raise ValueError(f"{path} is not a supported pack file")
+
+        if index is None:
+            index = PackIndex(path[:-len(".pack")] + ".idx")
+        self.index = index
+        if self.index.count != self.count:
+            raise ValueError(f"{path} does not match its index")
+        # the delta bases used recently, keyed by offset:
+        self.base_cache = LRUCache(max_bytes=DELTA_BASE_CACHE_LIMIT)
+
+    def __contains__(self, sha):
+        """Return True if the binary sha is in the pack."""
+        return self.index.find(sha) is not None
+
+    def entry_header(self, offset):
+        """Read the header of the packed object at the offset provided.
+        Args:
+            offset: the offset of the object in the pack.
+        Returns:
+            A (type, size, position of the data) tuple. For deltas the size
+            is the size of the delta data, and the position points at the
+            base reference.
+        """
+        data = self.data
+        byte = data[offset]
+        pos = offset + 1
+        object_type = (byte >> 4) & 7
+        size = byte & 0x0f
+        shift = 4
+        while byte & 0x80:
+            byte = data[pos]
+            pos += 1
+            size |= (byte & 0x7f) << shift
+            shift += 7
+        return object_type, size, pos
+
+    def ofs_delta_base(self, offset, pos):
+        """Read the base offset of the OFS_DELTA object at the offset.
+        Args:
+            offset: the offset of the delta object in the pack.
+            pos: the position of the encoded base distance.
+        Returns:
+            A (base offset, position of the delta data) tuple.
+        """
+        data = self.data
+        byte = data[pos]
+        pos += 1
+        distance = byte & 0x7f
+        while byte & 0x80:
+            byte = data[pos]
+            pos += 1
+            distance = ((distance + 1) << 7) | (byte & 0x7f)
+        return offset - distance, pos
+
+    def iter_inflate(self, pos, size):
+        """Inflate the zlib stream starting at the position provided, chunk
+        by chunk.
+        The compressed data is passed to zlib as slices of the mapping, so
+        nothing is copied before it is decompressed.
+        Args:
+            pos: the position of the zlib stream in the pack.
+            size: the expected size of the inflated data.
+        Yields:
+            The inflated data, in chunks.
+        Raises:
+            ValueError: if the stream is truncated or has the wrong size.
+        """
+        decompressor = zlib.decompressobj()
+        total = 0
+        # small objects are read with a small window to keep unused_data
+        # (the bytes zlib did not need) short:
+        step = min(size + 64, INFLATE_CHUNK)
+        end = len(self.view)
+        while not decompressor.eof:
+            if pos >= end:
+                raise ValueError(f"{self.path}: truncated object")
+            chunk = self.view[pos:pos + step]
+            data = decompressor.decompress(chunk)
+            total += len(data)
+            if data:
+                yield data
+            pos += len(chunk)
+            step = INFLATE_CHUNK
+        if total != size:
+            raise ValueError(
+                f"{self.path}: expected {size} bytes, got {total}")
+        if TRACING:
+            count("inflate_bytes", total)
+
+    def inflate(self, pos, size):
+        """Inflate the zlib stream starting at the position provided.
+        Args:
+            pos: the position of the zlib stream in the pack.
+            size: the expected size of the inflated data.
+        Returns:
+            The inflated data.
+        Raises:
+            ValueError: if the stream is truncated or has the wrong size.
+        """
+        return b"".join(self.iter_inflate(pos, size))
+
+    def header_at(self, offset, resolve_ref_header=None):
+        """Read the format and size of the object at the offset provided,
+        without inflating it.
+        The size of a delta object is read from the header of its delta,
+        which only needs the first few bytes inflated; its format is the one
+        of the base at the end of its chain.
+        Args:
+            offset: the offset of the object in the pack.
+            resolve_ref_header: a function called with the hex sha of a
+                REF_DELTA base that is not in this pack; it must return a
+                (format, size) tuple.
+        Returns:
+            A (format, size) tuple.
+        """
+        size = None
+        while True:
+            object_type, entry_size, pos = self.entry_header(offset)
+            if object_type in TYPE_NAMES:
+                if size is None:
+                    size = entry_size
+                return TYPE_NAMES[object_type], size
+
+            if object_type == OBJ_OFS_DELTA:
+                base_offset, pos = self.ofs_delta_base(offset, pos)
+            elif object_type == OBJ_REF_DELTA:
+                base_sha = self.data[pos:pos + 20]
+                pos += 20
+                base_pos = self.index.find(base_sha)
+                base_offset = None
+                if base_pos is not None:
+                    base_offset = self.index.offset_at(base_pos)
+            else:
+                raise ValueError(
+                    f"{self.path}: unknown object type {object_type} "
+                    f"at offset {offset}")
+
+            if size is None:
+                size = self.delta_result_size(pos)
+            if base_offset is None:
+                if resolve_ref_header is None:
+                    raise ValueError(
+                        f"{self.path}: missing delta base {base_sha.hex()}")
+                return resolve_ref_header(base_sha.hex())[0], size
+            offset = base_offset
+
+    def delta_result_size(self, pos):
+        """Return the result size declared by the delta stored at pos."""
+        # two sizes of at most 10 bytes each start the delta:
+        head = zlib.decompressobj().decompress(self.view[pos:pos + 64], 20)
+        _, size_pos = delta_header_size(head)
+        return delta_header_size(head, size_pos)[0]
+
+    def read(self, sha, resolve_ref=None):
+        """Read an object from the pack.
+        Args:
+            sha: the binary sha of the object.
+            resolve_ref: see read_at.
+        Returns:
+            A (format, data) tuple, or None if the object is not in the pack.
+        """
+        pos = self.index.find(sha)
+        if pos is None:
+            return None
+        return self.read_at(self.index.offset_at(pos), resolve_ref)
+
+    def read_at(self, offset, resolve_ref=None):
+        """Read the object at the offset provided, resolving delta chains.
+        The chain is followed down to a base that is either stored whole or
+        already in the delta base cache, then the deltas are applied back up.
+        Args:
+            offset: the offset of the object in the pack.
+            resolve_ref: a function called with the hex sha of a REF_DELTA
+                base that is not in this pack; it must return a
+                (format, data) tuple.
+        Returns:
+            A (format, data) tuple, where format is b"blob", b"tree", etc.
+        Raises:
+            ValueError: if the object is corrupt or a delta base is missing.
+        """
+        chain = []
+        while True:
+            cached = self.base_cache.get(offset)
+            if cached is not None:
+                object_format, data = cached
+                break
+
+            object_type, size, pos = self.entry_header(offset)
+            if object_type == OBJ_OFS_DELTA:
+                base_offset, pos = self.ofs_delta_base(offset, pos)
+                chain.append((offset, pos, size))
+                offset = base_offset
+            elif object_type == OBJ_REF_DELTA:
+                base_sha = self.data[pos:pos + 20]
+                chain.append((offset, pos + 20, size))
+                base_pos = self.index.find(base_sha)
+                if base_pos is not None:
+                    offset = self.index.offset_at(base_pos)
+                    continue
+                if resolve_ref is None:
+                    raise ValueError(
+                        f"{self.path}: missing delta base {base_sha.hex()}")
+                # the base lives outside this pack (a thin pack):
+                object_format, data = resolve_ref(base_sha.hex())
+                offset = None
+                break
+            elif object_type in TYPE_NAMES:
+                object_format = TYPE_NAMES[object_type]
+                data = self.inflate(pos, size)
+                break
+            else:
+                raise ValueError(
+                    f"{self.path}: unknown object type {object_type} "
+                    f"at offset {offset}")
+
+        # applying the deltas from the base back up to the object asked for,
+        # caching every object that served as a base on the way:
+        for delta_offset, pos, size in reversed(chain):
+            if offset is not None and offset not in self.base_cache:
+                self.base_cache.put(offset, (object_format, data), len(data))
+            data = apply_delta(data, self.inflate(pos, size))
+            offset = delta_offset
+        return object_format, data
+
+    def stream_at(self, offset, resolve_ref=None):
+        """Read the object at the offset provided as a stream of chunks.
+        Objects stored whole are inflated chunk by chunk as the stream is
+        consumed; deltas have to be resolved first and come as one chunk.
+        Args:
+            offset: the offset of the object in the pack.
+            resolve_ref: see read_at.
+        Returns:
+            A (format, size, iterator of data chunks) tuple.
+        """
+        object_type, size, pos = self.entry_header(offset)
+        if object_type in TYPE_NAMES:
+            return TYPE_NAMES[object_type], size, self.iter_inflate(pos, size)
+        object_format, data = self.read_at(offset, resolve_ref)
+        return object_format, len(data), iter((data,))
+
+    def close(self):
+        """Unmap the pack file and its index."""
+        self.view.release()
+        self.data.close()
+        self.index.close()
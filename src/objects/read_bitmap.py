@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A module that defines the functions to find the objects reachable from
+commits.
+Commits that have a bitmap in the reachability bitmap file contribute it
+whole; only the commits the bitmaps do not cover are walked, along with the
+trees and blobs they bring in that no bitmap holds yet. A bitmap file that
+is missing, corrupt or older than the newest commits only makes the walk
+longer, never wrong.
+"""
+
+import heapq
+import itertools
+import sys
+
+from src.objects.bitmap_class import BITMAP_TYPES, ReachabilityBitmap
+from src.objects.ewah import iter_bits
+from src.objects.pack_class import OBJ_BLOB, OBJ_COMMIT, OBJ_TREE
+from src.objects.read_commit import commit_node
+from src.objects.read_object import read_object
+from src.repos.repo_paths import git_file_path
+
+# the bitmap files mapped so far, per repository:
+#   bitmap path -> ReachabilityBitmap, or None if there is no usable file
+_BITMAPS = {}
+
+
+def bitmap_path(repo):
+    """Return the path to the reachability bitmap of a repository."""
+    return git_file_path(repo, "objects", "info", "bitmap")
+
+
+def reachability_bitmap(repo):
+    """Return the reachability bitmap of a repository, mapped once per
+    process. A file whose layout or checksum is invalid is ignored, with a
+    warning.
+    Args:
+        repo: the git repository.
+    Returns:
+        The ReachabilityBitmap, or None if the repository has no usable
+        bitmap file.
+    """
+    path = bitmap_path(repo)
+    if path in _BITMAPS:
+        return _BITMAPS[path]
+
+    bitmap = None
+    try:
+        bitmap = ReachabilityBitmap(path)
+        if not bitmap.checksum_ok():
+            bitmap.close()
+            raise ValueError(f"{path}: checksum mismatch")
+    except FileNotFoundError:
+        bitmap = None
+    except ValueError as error:
+        bitmap = None
+        print(f"warning: ignoring bitmap: {error}", file=sys.stderr)
+    _BITMAPS[path] = bitmap
+    return bitmap
+
+
+def invalidate_bitmap(repo):
+    """Forget the bitmap file mapped for a repository, once it has been
+    rewritten."""
+    bitmap = _BITMAPS.pop(bitmap_path(repo), None)
+    if bitmap is not None:
+        bitmap.close()
+
+
+class ObjectSet:
+    """A class that defines a set of objects: a bitmap over the objects the
+    bitmap file numbers, and a dictionary of the others.
+    Attributes:
+        bitmap: the ReachabilityBitmap numbering the objects, or None.
+        bits: the bitmap of the numbered objects in the set, as an int.
+        extra: the {hex sha: (object type, path)} dictionary of the objects
+            in the set that the bitmap does not number; the path is None
+            for commits.
+    """
+    __slots__ = ("bitmap", "bits", "extra")
+
+    def __init__(self, bitmap, bits, extra):
+        """Initialize an object set."""
+        self.bitmap = bitmap
+        self.bits = bits
+        self.extra = extra
+
+    def __len__(self):
+        """Return the number of objects in the set."""
+        return self.bits.bit_count() + len(self.extra)
+
+    def difference(self, other):
+        """Return the objects of this set that are not in another set, built
+        on the same bitmap."""
+        return ObjectSet(self.bitmap, self.bits & ~other.bits,
+                         {sha: entry for sha, entry in self.extra.items()
+                          if sha not in other.extra})
+
+    def count(self, object_type):
+        """Return the number of objects of a type in the set."""
+        count = sum(1 for entry_type, _ in self.extra.values()
+                    if entry_type == object_type)
+        if self.bits:
+            count += (self.bits & self.bitmap.types[object_type]).bit_count()
+        return count
+
+    def __iter__(self):
+        """Iterate over the objects of the set, commits first, as (hex sha,
+        path) tuples; the path is None for commits and for the objects
+        found in bitmaps, which do not record it."""
+        for object_type in BITMAP_TYPES:
+            if self.bits:
+                for pos in iter_bits(self.bits &
+                                     self.bitmap.types[object_type]):
+                    yield self.bitmap.sha_at(pos).hex(), None
+            for sha, (entry_type, path) in self.extra.items():
+                if entry_type == object_type:
+                    yield sha, path
+
+
+def reachable_objects(repo, tips, bitmap=None, walk_parents=True,
+                      trees=True):
+    """Find the commits, trees and blobs reachable from commits.
+    The commits are walked newest first, so that the commits with a bitmap
+    are met before their ancestors; the walk stops at them, and at the
+    commits their bitmaps already hold. The trees of the other commits are
+    then walked, skipping every object the bitmaps hold (a bitmap holding a
+    tree holds everything below it).
+    Args:
+        repo: the git repository.
+        tips: the hex shas of the commits to start from.
+        bitmap: the ReachabilityBitmap to use, or None to walk everything.
+        walk_parents: if False, only the tips and their trees are walked.
+        trees: if False, the trees of the commits are not walked; the set
+            still holds the trees and blobs of the bitmaps it used.
+    Returns:
+        The ObjectSet of the objects found.
+    Raises:
+        ValueError: if an object is missing.
+    """
+    covered = 0
+    pending = []
+    seen = set(tips)
+    heap = []
+    order = itertools.count()
+    for sha in seen:
+        node = commit_node(repo, sha)
+        heapq.heappush(heap, (-node.date, next(order), node))
+    while heap:
+        _, _, node = heapq.heappop(heap)
+        # the bitmap of a commit holds its whole history:
+        if bitmap is not None and walk_parents:
+            pos = bitmap.find(bytes.fromhex(node.sha))
+            if pos is not None:
+                if covered >> pos & 1:
+                    continue
+                bits = bitmap.bitmap_at(pos)
+                if bits is not None:
+                    covered |= bits
+                    continue
+        pending.append(node)
+        if walk_parents:
+            for parent in node.parents:
+                if parent not in seen:
+                    seen.add(parent)
+                    parent_node = commit_node(repo, parent)
+                    heapq.heappush(heap, (-parent_node.date, next(order),
+                                          parent_node))
+
+    size = len(bitmap) if bitmap is not None else 0
+    covered_bytes = covered.to_bytes((size + 7) // 8, "little")
+    found = bytearray(len(covered_bytes))
+    extra = {}
+
+    def mark(binsha, object_type, path):
+        """Add an object to the set; return False if it was already in."""
+        pos = bitmap.find(binsha) if bitmap is not None else None
+        if pos is None:
+            sha = binsha.hex()
+            if sha in extra:
+                return False
+            extra[sha] = (object_type, path)
+            return True
+        mask = 1 << (pos & 7)
+        if (covered_bytes[pos >> 3] | found[pos >> 3]) & mask:
+            return False
+        found[pos >> 3] |= mask
+        return True
+
+    for node in pending:
+        mark(bytes.fromhex(node.sha), OBJ_COMMIT, None)
+        if trees and mark(bytes.fromhex(node.tree), OBJ_TREE, ""):
+            walk_tree(repo, node.tree, mark)
+    return ObjectSet(bitmap, covered | int.from_bytes(found, "little"),
+                     extra)
+
+
+def walk_tree(repo, tree_sha, mark):
+    """Walk the trees and blobs below a tree, depth first.
+    Args:
+        repo: the git repository.
+        tree_sha: the hex sha of the tree.
+        mark: called with the binary sha, the object type and the path of
+            each entry; the sub-trees it returns True for are walked.
+    """
+    stack = [(tree_sha, "")]
+    while stack:
+        sha, prefix = stack.pop()
+        tree = read_object(repo, sha)
+        for index in range(len(tree)):
+            mode = tree.mode_at(index)
+            # the commits of submodules are not in this repository:
+            if mode == b"160000":
+                continue
+            path = prefix + tree.name_at(index).decode("utf-8",
+                                                       "surrogateescape")
+            binsha = bytes(tree.binsha_at(index))
+            if tree.is_tree_at(index):
+                if mark(binsha, OBJ_TREE, path):
+                    stack.append((binsha.hex(), path + "/"))
+            else:
+                mark(binsha, OBJ_BLOB, path)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A module that defines the functions to read commits for history walks.
+The parents, generation and date of a commit are read from the commit-graph
+when it holds the commit, and from the commit object otherwise, so a graph
+that is missing, malformed or older than the newest commits only makes the
+walk slower, never wrong. As in git, the checksum of the graph is not
+verified when it is loaded (that would read the whole file for every
+command), but by dit commit-graph verify and dit fsck.
+"""
+
+import sys
+
+from src.objects.commit_graph_class import (GENERATION_INFINITY, CommitGraph,
+                                            CommitNode)
+from src.objects.read_object import read_object
+from src.repos.repo_paths import git_file_path
+
+# the commit-graph mapped so far, per repository:
+#   commit-graph path -> CommitGraph, or None if there is no usable graph
+_GRAPHS = {}
+
+
+def commit_graph_path(repo):
+    """Return the path to the commit-graph of a repository."""
+    return git_file_path(repo, "objects", "info", "commit-graph")
+
+
+def commit_graph(repo):
+    """Return the commit-graph of a repository, mapped once per process.
+    A graph whose layout is invalid is ignored, with a warning; its checksum
+    is left to verify_commit_graph.
+    Args:
+        repo: the git repository.
+    Returns:
+        The CommitGraph, or None if the repository has no usable graph.
+    """
+    path = commit_graph_path(repo)
+    if path in _GRAPHS:
+        return _GRAPHS[path]
+
+    graph = None
+    try:
+        graph = CommitGraph(path)
+    except FileNotFoundError:
+        graph = None
+    except ValueError as error:
+        graph = None
+        print(f"warning: ignoring commit-graph: {error}", file=sys.stderr)
+    _GRAPHS[path] = graph
+    return graph
+
+
+def invalidate_commit_graph(repo):
+    """Forget the commit-graph mapped for a repository, once it has been
+    rewritten."""
+    graph = _GRAPHS.pop(commit_graph_path(repo), None)
+    if graph is not None:
+        graph.close()
+
+
+def commit_node(repo, sha):
+    """Read what a history walk needs of a commit.
+    Args:
+        repo: the git repository.
+        sha: the hex sha of the commit.
+    Returns:
+        A CommitNode; its generation is GENERATION_INFINITY when the commit
+        is not in the commit-graph.
+    Raises:
+        ValueError: if the object is not found or is not a commit.
+    """
+    graph = commit_graph(repo)
+    if graph is not None:
+        pos = graph.find(bytes.fromhex(sha))
+        if pos is not None:
+            return graph.node_at(pos)
+
+    commit = read_object(repo, sha)
+    if commit.object_format != "commit":
+        raise ValueError(f"{sha} is not a commit")
+    return CommitNode(sha, commit.tree, commit.parents, GENERATION_INFINITY,
+                      commit.date)
+
+
+def commit_parents(repo, sha):
+    """Return the hex shas of the parents of a commit."""
+    return commit_node(repo, sha).parents
@@ -2,58 +2,39 @@
 # -*- coding: utf-8 -*-
 """A module that defines the read_object function."""
 
-import os
 import zlib
 
-from src.dit_commands.tree_parsing import tree_parse, tree_serialize
 from src.objects.blob_object_class import BlobObject
 from src.objects.commit_object_class import CommitObject
-from src.objects.gitobject_class import GitObject
-# from src.objects.tree_object_class import TreeObject
+from src.objects.read_pack import (packed_object_header, read_packed_object,
+                                   stream_packed_object)
+from src.objects.tree_object_class import TreeObject
 from src.repos.repo_paths import git_file_path
+from src.trace import TRACING, count, traced
 
 
-class TreeObject(GitObject):
-    """A class that defines a git tree object,
-    a subclass of the GitObject class.
-    Attributes:
-        object_format: The format of the git object.
-            A git tree object has the format "tree".
-        leaves: The leaves of the git tree object.
-            A leaf is a file or a directory.
-            A leaf is an instance of the GitTreeLeaf class.
-    """
-    object_format = "tree"
-
-    def __init__(self, repo, data=None):
-        """Initialize a git tree object with the provided repo and
-        data (optional).
-        Args:
-            repo (str): The path to the git repository.
-            data (str): The serialized git tree object.
-        """
-        # GitObject.__init__(self, repo, data)
-        super().__init__(repo, data)
-
-    # Convert the tree object to a string representation
-    def serialize(self):
-        """Serialize the git tree object."""
-        return tree_serialize(self)
-
-    # Convert the string representation of a tree object to a tree object,
-    #  an instance of the TreeObject class
-    def deserialize(self, data):
-        """Deserialize the git tree object."""
-        self.leaves = tree_parse(data)
+# how much of a loose object is read at a time:
+STREAM_CHUNK_SIZE = 64 * 1024
+# how much of a loose object is read at a time while looking for its header,
+# and the longest header ("<format> <size>\x00") accepted:
+HEADER_READ_SIZE = 64
+MAX_HEADER_SIZE = 64
 
+OBJECT_CLASSES = {
+    b"blob": BlobObject,
+    b"commit": CommitObject,
+    b"tree": TreeObject,
+}
 
 
+@traced("read_object")
 def read_object(repo, sha):
     """Reads an object from a git repository.
     It reads the object's content from the repository, decompresses it, and
     extracts the format and size information.
     Based on the format, it creates an instance of the corresponding git object
     class, such as BlobObject or TreeObject.
+    Objects that are not stored as loose files are looked up in the packs.
     Args:
         repo: path to the git repository
         sha: SHA hash of the object to be read.
@@ -63,65 +44,221 @@ def read_object(repo, sha):
         ValueError: if the object is not found or the size of the object is
             incorrect.
     """
+    # parsed trees and commits are kept in the object cache of the repo:
+    obj = repo.object_cache.get_parsed(sha)
+    if obj is not None:
+        return obj
+    object_format, object_data = read_raw_object(repo, sha)
+    obj = make_object(repo, object_format, object_data)
+    if object_format != b"blob":
+        repo.object_cache.put_parsed(sha, obj, len(object_data))
+    return obj
+
+
+@traced("read_raw_object")
+def read_raw_object(repo, sha):
+    """Reads the format and the data of an object, loose or packed.
+    Args:
+        repo: path to the git repository
+        sha: SHA hash of the object to be read.
+    Returns:
+        A (format, data) tuple, where format is b"blob", b"tree", etc.
+    Raises:
+        ValueError: if the object is not found or the size of the object is
+            incorrect.
+    """
+    # blob data is kept in the object cache of the repo:
+    cached = repo.object_cache.get_raw(sha)
+    if cached is not None:
+        if TRACING:
+            count("cache_hits")
+        return cached
 
     # creating the path to the object:
     path = git_file_path(repo, "objects", sha[:2], sha[2:])
 
-    # making sure the object exists
+    # falling back to the packs when there is no loose object
     #  (a ValueError is raised to indicate mismatch):
     try:
-        assert os.path.exists(path)
-    except AssertionError as err:
-        raise ValueError(f"{sha} not found") from err
+        object_format, object_data = read_loose_object(path)
+    except FileNotFoundError:
+        packed = read_packed_object(repo, sha)
+        if packed is None:
+            raise ValueError(f"{sha} not found") from None
+        object_format, object_data = packed
 
-    # if not os.path.exists(path):
-    #     raise ValueError(f"{sha} not found")
+    if object_format == b"blob":
+        repo.object_cache.put_raw(sha, object_format, object_data)
+    return object_format, object_data
 
-    # reading the object's content as a zlib compressed binary string:
+
+def read_loose_object(path):
+    """Reads the format and the data of a loose object file.
+    The header is inflated first; the data is then inflated incrementally
+    into a single buffer of the size the header declares, and never past it.
+    Args:
+        path: the path to the loose object.
+    Returns:
+        A (format, data) tuple.
+    Raises:
+        FileNotFoundError: if there is no such file.
+        ValueError: if the size of the object is incorrect.
+    """
     with open(path, "rb") as f:
         decompressor = zlib.decompressobj()
-        object_format = None
-        object_size = None
-        raw_data_chunks = []
-        object_data = b""
-
-        while True:
-            # reading the object's content in chunks:
-            chunk = f.read(1024)
+        object_format, object_size, first = read_loose_header(f, decompressor)
+        if len(first) > object_size:
+            raise ValueError(f"{path}: expected {object_size} bytes, got more")
+
+        buffer = bytearray(object_size)
+        view = memoryview(buffer)
+        view[:len(first)] = first
+        pos = len(first)
+        pending = decompressor.unconsumed_tail
+        while not decompressor.eof:
+            chunk = pending or f.read(STREAM_CHUNK_SIZE)
             if not chunk:
                 break
-            raw_data_chunks.append(decompressor.decompress(chunk))
-
-            if object_format is None or object_size is None:
-                raw_data = b"".join(raw_data_chunks)
-
-                if object_format is None:
-                    # null_index = raw_data.find(b"\x00", 1)
-                    null_index = raw_data.find(b" ")
-                    # object_format = raw_data[:null_index].decode()
-                    object_format = raw_data[:null_index]
-
-                # if object_size is None:
-                #     null_index = raw_data.find(b"\x00", null_index + 1)
-                #     object_size = raw_data[null_index+1:null_index+21]
-                #     expected_size = int(object_size.decode("ascii"))
-                #     if expected_size != len(raw_data):
-                #         raise ValueError(f"expected {expected_size} bytes, "
-                #                          f"got {len(raw_data)}")
-
-            if len(raw_data_chunks) > 1:
-                object_data += chunk
-
-        object_classes = {
-            b"blob": BlobObject,
-            b"commit": CommitObject,
-            b"tree": TreeObject,
-        }
-        object_class = object_classes.get(object_format)
-        if object_class is None:
-            raise ValueError(f"Unknown object type {object_format}")
-
-        if object_data:
-            object_data += decompressor.flush()
-
-        return object_class(repo, object_data)
+            # asking for one byte more than expected exposes oversized data:
+            data = decompressor.decompress(chunk, object_size - pos + 1)
+            pending = decompressor.unconsumed_tail
+            if pos + len(data) > object_size:
+                raise ValueError(
+                    f"{path}: expected {object_size} bytes, got more")
+            view[pos:pos + len(data)] = data
+            pos += len(data)
+
+    if pos != object_size or not decompressor.eof:
+        raise ValueError(f"{path}: expected {object_size} bytes, got {pos}")
+    if TRACING:
+        count("loose_reads")
+        count("inflate_bytes", object_size)
+    return object_format, bytes(buffer)
+
+
+def read_loose_header(f, decompressor):
+    """Inflates a loose object file only up to the end of its header.
+    Args:
+        f: the loose object file, opened in binary mode.
+        decompressor: the zlib decompressor of the file.
+    Returns:
+        A (format, size, data inflated past the header) tuple. Compressed
+        data read but not inflated yet is left in decompressor.unconsumed_tail.
+    Raises:
+        ValueError: if the header is malformed.
+    """
+    head = b""
+    while True:
+        chunk = decompressor.unconsumed_tail or f.read(HEADER_READ_SIZE)
+        if not chunk:
+            raise ValueError(f"{f.name}: truncated object header")
+        head += decompressor.decompress(chunk, MAX_HEADER_SIZE - len(head))
+        null_index = head.find(b"\x00")
+        if null_index != -1:
+            break
+        if len(head) >= MAX_HEADER_SIZE or decompressor.eof:
+            raise ValueError(f"{f.name}: malformed object header")
+
+    # splitting the "<format> <size>\x00" header:
+    object_format, _, object_size = head[:null_index].partition(b" ")
+    if not object_size.isdigit():
+        raise ValueError(f"{f.name}: malformed object header")
+    return object_format, int(object_size), head[null_index + 1:]
+
+
+def read_object_header(repo, sha):
+    """Reads the format and the size of an object without inflating it.
+    Only the header of a loose object is inflated; for a packed object the
+    pack entry header (and the start of a delta) is enough.
+    Args:
+        repo: path to the git repository
+        sha: SHA hash of the object to be read.
+    Returns:
+        A (format, size) tuple, where format is b"blob", b"tree", etc.
+    Raises:
+        ValueError: if the object is not found or its header is malformed.
+    """
+    cached = repo.object_cache.get_raw(sha)
+    if cached is not None:
+        return cached[0], len(cached[1])
+
+    path = git_file_path(repo, "objects", sha[:2], sha[2:])
+    try:
+        f = open(path, "rb")  # pylint: disable=consider-using-with
+    except FileNotFoundError:
+        header = packed_object_header(repo, sha)
+        if header is None:
+            raise ValueError(f"{sha} not found") from None
+        return header
+    with f:
+        object_format, object_size, _ = read_loose_header(
+            f, zlib.decompressobj())
+    return object_format, object_size
+
+
+def stream_raw_object(repo, sha):
+    """Reads an object as a stream of decompressed chunks, so that large
+    objects can be copied out without holding them whole in memory.
+    Args:
+        repo: path to the git repository
+        sha: SHA hash of the object to be read.
+    Returns:
+        A (format, size, iterator of data chunks) tuple.
+    Raises:
+        ValueError: if the object is not found or the size of the object is
+            incorrect.
+    """
+    path = git_file_path(repo, "objects", sha[:2], sha[2:])
+    try:
+        f = open(path, "rb")  # pylint: disable=consider-using-with
+    except FileNotFoundError:
+        packed = stream_packed_object(repo, sha)
+        if packed is None:
+            raise ValueError(f"{sha} not found") from None
+        return packed
+
+    decompressor = zlib.decompressobj()
+    try:
+        object_format, object_size, first = read_loose_header(f, decompressor)
+    except ValueError:
+        f.close()
+        raise
+
+    def chunks():
+        """Yield the rest of the object as it is decompressed."""
+        with f:
+            total = len(first)
+            if first:
+                yield first
+            pending = decompressor.unconsumed_tail
+            while not decompressor.eof:
+                chunk = pending or f.read(STREAM_CHUNK_SIZE)
+                pending = b""
+                if not chunk:
+                    break
+                data = decompressor.decompress(chunk)
+                total += len(data)
+                if data:
+                    yield data
+            if total != object_size:
+                raise ValueError(f"expected {object_size} bytes, "
+                                 f"got {total}")
+
+    return object_format, object_size, chunks()
+
+
+def make_object(repo, object_format, object_data):
+    """Create an instance of the git object class matching the format.
+    Args:
+        repo: path to the git repository
+        object_format: the format of the object, e.g. b"blob".
+        object_data: the serialized object, without its header.
+    Returns:
+        An instance of the corresponding git object class.
+    Raises:
+        ValueError: if the format is unknown.
+    """
+    object_class = OBJECT_CLASSES.get(object_format)
+    if object_class is None:
+        raise ValueError(f"Unknown object type {object_format}")
+    return object_class(repo, object_data)
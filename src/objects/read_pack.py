@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A module that defines the functions to find and read packed objects."""
+
+import os
+
+from src.objects.pack_class import PackFile
+from src.repos.repo_paths import git_file_path
+
+# the packs mapped so far, per objects/pack directory:
+#   pack directory -> (directory mtime, [PackFile, ...])
+_PACKS = {}
+
+
+def repo_packs(repo, rescan=False):
+    """Return the packs of a repository, newest first.
+    The packs are mapped once per process and reused. The pack directory is
+    only listed again when rescan is True and its mtime has changed.
+    Args:
+        repo: the git repository.
+        rescan: if True, look for packs added since the last scan.
+    Returns:
+        A list of PackFile instances.
+    """
+    pack_dir = git_file_path(repo, "objects", "pack")
+    cached = _PACKS.get(pack_dir)
+    if cached is not None and not rescan:
+        return cached[1]
+
+    try:
+        mtime = os.stat(pack_dir).st_mtime_ns
+    except FileNotFoundError:
+        return []
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    # keeping the packs that are already mapped:
+    mapped = {pack.path: pack for pack in cached[1]} if cached else {}
+    found = []
+    for name in os.listdir(pack_dir):
+        if not name.endswith(".idx"):
+            continue
+        path = os.path.join(pack_dir, name[:-len(".idx")] + ".pack")
+        if path in mapped:
+            found.append((os.stat(path).st_mtime_ns, mapped.pop(path)))
+        elif os.path.exists(path):
+            found.append((os.stat(path).st_mtime_ns, PackFile(path)))
+
+    # unmapping the packs that were removed (e.g. by a repack):
+    for pack in mapped.values():
+        pack.close()
+
+    packs = [pack for _, pack in
+             sorted(found, key=lambda item: item[0], reverse=True)]
+    _PACKS[pack_dir] = (mtime, packs)
+    return packs
+
+
+def find_packed_object(repo, sha):
+    """Find the pack holding an object.
+    Args:
+        repo: the git repository.
+        sha: the hex sha of the object.
+    Returns:
+        A (PackFile, offset) tuple, or None if no pack holds the object.
+    """
+    binsha = bytes.fromhex(sha)
+    for rescan in (False, True):
+        for pack in repo_packs(repo, rescan):
+            pos = pack.index.find(binsha)
+            if pos is not None:
+                return pack, pack.index.offset_at(pos)
+    return None
+
+
+def _ref_resolver(repo):
+    """Return a function reading REF_DELTA bases from the other packs."""
+    def resolve_ref(base_sha):
+        """Read a REF_DELTA base from the other packs."""
+        base = read_packed_object(repo, base_sha)
+        if base is None:
+            raise ValueError(f"missing delta base {base_sha}")
+        return base
+    return resolve_ref
+
+
+def read_packed_object(repo, sha):
+    """Read an object from the packs of a repository.
+    Args:
+        repo: the git repository.
+        sha: the hex sha of the object.
+    Returns:
+        A (format, data) tuple, or None if no pack holds the object.
+    """
+    found = find_packed_object(repo, sha)
+    if found is None:
+        return None
+    pack, offset = found
+    return pack.read_at(offset, _ref_resolver(repo))
+
+
+def stream_packed_object(repo, sha):
+    """Read an object from the packs of a repository as a stream.
+    Args:
+        repo: the git repository.
+        sha: the hex sha of the object.
+    Returns:
+        A (format, size, iterator of data chunks) tuple, or None if no pack
+        holds the object.
+    """
+    found = find_packed_object(repo, sha)
+    if found is None:
+        return None
+    pack, offset = found
+    return pack.stream_at(offset, _ref_resolver(repo))
+
+
+def packed_object_header(repo, sha):
+    """Read the format and size of an object from the packs of a repository
+    without inflating it.
+    Args:
+        repo: the git repository.
+        sha: the hex sha of the object.
+    Returns:
+        A (format, size) tuple, or None if no pack holds the object.
+    """
+    found = find_packed_object(repo, sha)
+    if found is None:
+        return None
+    pack, offset = found
+
+    def resolve_ref_header(base_sha):
+        """Read the header of a REF_DELTA base from the other packs."""
+        base = packed_object_header(repo, base_sha)
+        if base is None:
+            raise ValueError(f"missing delta base {base_sha}")
+        return base
+
+    return pack.header_at(offset, resolve_ref_header)
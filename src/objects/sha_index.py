@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A module that defines the sorted sha index used to resolve abbreviated
+shas.
+The index covers the loose objects, kept as one sorted list per fan-out
+directory, and the packs, whose .idx files are already sorted and are
+searched in place. Each fan-out list is built the first time a prefix falls
+in it, and built again when the mtime of the directory changes.
+"""
+
+import bisect
+import os
+
+from src.objects.read_pack import repo_packs
+from src.repos.repo_paths import git_file_path
+
+HEX_DIGITS = "0123456789abcdef"
+# the shortest prefix accepted, and the default abbreviation length:
+MIN_ABBREV = 4
+DEFAULT_ABBREV = 7
+
+# the sha indexes built so far, per objects directory:
+_INDEXES = {}
+
+
+def sha_index(repo):
+    """Return the sha index of a repository, shared within the process."""
+    objects_dir = git_file_path(repo, "objects")
+    index = _INDEXES.get(objects_dir)
+    if index is None:
+        index = _INDEXES[objects_dir] = ShaIndex(repo)
+    return index
+
+
+def common_prefix_length(first, second):
+    """Return the length of the common prefix of two hex shas."""
+    length = 0
+    for a, b in zip(first, second):
+        if a != b:
+            break
+        length += 1
+    return length
+
+
+class ShaIndex:
+    """A class that defines a sorted index of the object shas of a
+    repository, for prefix lookups.
+    Attributes:
+        repo: the git repository.
+        objects_dir: the path to the objects directory.
+    """
+
+    def __init__(self, repo):
+        """Initialize an empty index; fan-out lists are built lazily."""
+        self.repo = repo
+        self.objects_dir = git_file_path(repo, "objects")
+        # fan-out directory -> (directory mtime, sorted list of shas):
+        self._loose = {}
+
+    def loose_shas(self, fanout):
+        """Return the sorted shas of the loose objects in a fan-out
+        directory, listing it again only if its mtime has changed.
+        Args:
+            fanout: the two hex digits naming the directory.
+        Returns:
+            A sorted list of hex shas.
+        """
+        path = os.path.join(self.objects_dir, fanout)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self._loose.pop(fanout, None)
+            return []
+        cached = self._loose.get(fanout)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        shas = sorted(
+            fanout + name for name in os.listdir(path)
+            if len(name) == 38 and all(c in HEX_DIGITS for c in name))
+        self._loose[fanout] = (mtime, shas)
+        return shas
+
+    def match_prefix(self, prefix, limit=2):
+        """Find the shas starting with a prefix.
+        Args:
+            prefix: the hex prefix, at least MIN_ABBREV digits long.
+            limit: stop once this many distinct shas are found; the default
+                of 2 is enough to tell a unique prefix from an ambiguous one.
+        Returns:
+            A sorted list of at most limit hex shas.
+        Raises:
+            ValueError: if the prefix is too short or not hexadecimal.
+        """
+        prefix = prefix.lower()
+        if (len(prefix) < MIN_ABBREV or len(prefix) > 40 or
+                not all(c in HEX_DIGITS for c in prefix)):
+            raise ValueError(f"{prefix} is not a valid sha prefix")
+
+        matches = set()
+        shas = self.loose_shas(prefix[:2])
+        pos = bisect.bisect_left(shas, prefix)
+        while (pos < len(shas) and shas[pos].startswith(prefix) and
+               len(matches) < limit):
+            matches.add(shas[pos])
+            pos += 1
+
+        # the packs are searched from the smallest sha with the prefix:
+        low = bytes.fromhex(prefix.ljust(40, "0"))
+        for pack in repo_packs(self.repo, rescan=True):
+            index = pack.index
+            found = 0
+            pos = index.lower_bound(low)
+            while pos < index.count and found < limit:
+                sha = index.sha_at(pos).hex()
+                if not sha.startswith(prefix):
+                    break
+                matches.add(sha)
+                found += 1
+                pos += 1
+        return sorted(matches)[:limit]
+
+    def resolve_prefix(self, prefix):
+        """Resolve a prefix to the single sha that starts with it.
+        Args:
+            prefix: the hex prefix.
+        Returns:
+            The full hex sha.
+        Raises:
+            ValueError: if no sha, or more than one, starts with the prefix.
+        """
+        matches = self.match_prefix(prefix, limit=10)
+        if not matches:
+            raise ValueError(f"{prefix} not found")
+        if len(matches) > 1:
+            raise ValueError(
+                f"short sha {prefix} is ambiguous; candidates are: "
+                + ", ".join(matches))
+        return matches[0]
+
+    def neighbors(self, sha):
+        """Yield the shas sorting right before and after a sha, in the loose
+        objects and in each pack."""
+        shas = self.loose_shas(sha[:2])
+        pos = bisect.bisect_left(shas, sha)
+        if pos > 0:
+            yield shas[pos - 1]
+        if pos < len(shas) and shas[pos] == sha:
+            pos += 1
+        if pos < len(shas):
+            yield shas[pos]
+
+        binsha = bytes.fromhex(sha)
+        for pack in repo_packs(self.repo):
+            index = pack.index
+            pos = index.lower_bound(binsha)
+            if pos > 0:
+                yield index.sha_at(pos - 1).hex()
+            if pos < index.count and index.sha_at(pos) == binsha:
+                pos += 1
+            if pos < index.count:
+                yield index.sha_at(pos).hex()
+
+    def min_unique_length(self, sha, minimum=DEFAULT_ABBREV):
+        """Return the length of the shortest unique abbreviation of a sha.
+        Only the neighbors of the sha in each sorted source can share a
+        longer prefix with it than any other sha, so only those are checked.
+        Args:
+            sha: the full hex sha.
+            minimum: the shortest length returned.
+        Returns:
+            The abbreviation length, between minimum and 40.
+        """
+        longest = 0
+        for neighbor in self.neighbors(sha):
+            longest = max(longest, common_prefix_length(sha, neighbor))
+        return min(40, max(minimum, longest + 1))
+
+    def abbreviate(self, sha, minimum=DEFAULT_ABBREV):
+        """Return the shortest unique abbreviation of a sha."""
+        return sha[:self.min_unique_length(sha, minimum)]
@@ -10,14 +10,16 @@ class GitTreeLeaf:
             Files: beginning with 100
             Directories: beginning with 040
         path: The path of the leaf node (file or directory).
-        ssh: The sha of the leaf node.
+        sha: The sha of the leaf node.
     """
+    __slots__ = ("mode", "path", "sha")
 
     def __init__(self, mode, path, sha):
         """Initialize a git tree leaf.
         Args:
-            mode (str): The mode of the leaf node.
-            path (str): The path of the leaf node (file or directory).
+            mode (bytes): The mode of the leaf node.
+            path (str or bytes): The path of the leaf node (file or
+                directory).
             sha (str): The sha of the leaf node.
         """
         # defines the mode of the tree leaf:
@@ -2,28 +2,40 @@
 # -*- coding: utf-8 -*-
 """A module that defines the git tree object class."""
 
-from src.dit_commands.tree_parsing import tree_parse, tree_serialize
+import bisect
+
+from src.dit_commands.tree_parsing import tree_parse
 from src.objects.gitobject_class import GitObject
+from src.objects.tree_leaf_class import GitTreeLeaf
 
 
 class TreeObject(GitObject):
     """A class that defines a git tree object,
     a subclass of the GitObject class.
+    The serialized tree is kept as is, with the offsets of its entries;
+    names and shas are only sliced out and decoded when they are asked for,
+    so that a tree of a million entries costs little more than its data.
     Attributes:
         object_format: The format of the git object.
             A git tree object has the format "tree".
-        leaves: The leaves of the git tree object.
+        raw: The serialized git tree object.
+        view: A memoryview of raw, that entries are sliced from.
+        nulls: The offset of the null byte ending each entry's name.
+        leaves: The leaves of the git tree object, built on demand.
             A leaf is a file or a directory.
             A leaf is an instance of the GitTreeLeaf class.
     """
     object_format = "tree"
+    raw = b""
+    view = memoryview(b"")
+    nulls = ()
 
     def __init__(self, repo, data=None):
         """Initialize a git tree object with the provided repo and
         data (optional).
         Args:
             repo (str): The path to the git repository.
-            data (str): The serialized git tree object.
+            data (bytes): The serialized git tree object.
         """
         # GitObject.__init__(self, repo, data)
         super().__init__(repo, data)
@@ -31,10 +43,107 @@ class TreeObject(GitObject):
     # Convert the tree object to a string representation
     def serialize(self):
         """Serialize the git tree object."""
-        return tree_serialize(self)
+        return self.raw
 
     # Convert the string representation of a tree object to a tree object,
     #  an instance of the TreeObject class
     def deserialize(self, data):
         """Deserialize the git tree object."""
-        self.leaves = tree_parse(data)
+        self.raw = bytes(data)
+        self.view = memoryview(self.raw)
+        self.nulls = tree_parse(self.raw)
+
+    def __len__(self):
+        """Return the number of entries of the tree."""
+        return len(self.nulls)
+
+    def __iter__(self):
+        """Iterate over the leaves of the tree, building each on demand."""
+        for index in range(len(self.nulls)):
+            yield self.leaf_at(index)
+
+    def __getitem__(self, index):
+        """Return the leaf at an index of the tree."""
+        return self.leaf_at(index)
+
+    @property
+    def leaves(self):
+        """The leaves of the tree, as a list of GitTreeLeaf instances."""
+        return list(self)
+
+    def entry_start(self, index):
+        """Return the offset of the mode of the entry at an index."""
+        if index < 0:
+            index += len(self.nulls)
+        return self.nulls[index - 1] + 21 if index > 0 else 0
+
+    def mode_at(self, index):
+        """Return the mode of the entry at an index, as bytes."""
+        start = self.entry_start(index)
+        space = self.raw.find(b" ", start, self.nulls[index])
+        if space == -1:
+            raise ValueError("malformed tree entry")
+        return self.raw[start:space]
+
+    def name_at(self, index):
+        """Return the name of the entry at an index, as bytes."""
+        start = self.entry_start(index)
+        null = self.nulls[index]
+        space = self.raw.find(b" ", start, null)
+        if space == -1:
+            raise ValueError("malformed tree entry")
+        return self.raw[space + 1:null]
+
+    def binsha_at(self, index):
+        """Return the binary sha of the entry at an index, without copying
+        it out of the tree."""
+        null = self.nulls[index]
+        return self.view[null + 1:null + 21]
+
+    def sha_at(self, index):
+        """Return the hex sha of the entry at an index."""
+        return self.binsha_at(index).hex()
+
+    def is_tree_at(self, index):
+        """Return True if the entry at an index is a sub-tree."""
+        return self.raw[self.entry_start(index)] == ord("4")
+
+    def leaf_at(self, index):
+        """Return the entry at an index as a GitTreeLeaf."""
+        start = self.entry_start(index)
+        null = self.nulls[index]
+        space = self.raw.find(b" ", start, null)
+        if space == -1:
+            raise ValueError("malformed tree entry")
+        return GitTreeLeaf(
+            self.raw[start:space],
+            self.raw[space + 1:null].decode("utf-8", "surrogateescape"),
+            self.view[null + 1:null + 21].hex())
+
+    def sort_key_at(self, index):
+        """Return the name git sorts the entry at an index by: the name,
+        followed by a slash for a sub-tree."""
+        name = self.name_at(index)
+        return name + b"/" if self.is_tree_at(index) else name
+
+    def find(self, name):
+        """Find an entry by name, by bisecting the sorted entries.
+        Args:
+            name: the name of the entry, as str or bytes.
+        Returns:
+            The index of the entry, or None if the tree has no such entry.
+        """
+        if isinstance(name, str):
+            name = name.encode("utf-8", "surrogateescape")
+        # a file sorts under its name, a sub-tree under its name and a slash:
+        for key in (name, name + b"/"):
+            index = bisect.bisect_left(range(len(self.nulls)), key,
+                                       key=self.sort_key_at)
+            if index < len(self.nulls) and self.sort_key_at(index) == key:
+                return index
+        return None
+
+    def get(self, name):
+        """Return the leaf with a name, or None if there is none."""
+        index = self.find(name)
+        return None if index is None else self.leaf_at(index)
@@ -1,30 +1,84 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-"""A module that defines the write_object function."""
+"""A module that defines the functions writing objects into the object
+database."""
 
+import collections
+import hashlib
+import os
+import tempfile
 import zlib
 
 from src.repos.repo_paths import git_file_path
+from src.trace import TRACING, count, traced
 
 
+def object_sha(object_format, data):
+    """Return the hex sha of an object from its type and data."""
+    sha1 = hashlib.sha1(f"{object_format} {len(data)}\x00".encode())
+    sha1.update(data)
+    return sha1.hexdigest()
+
+
+@traced("write_objects")
+def write_objects(repo, objects):
+    """Write many objects into the object database at once.
+    The objects are grouped by fan-out directory, so that each directory is
+    created and listed once; objects already stored loose are skipped. Each
+    object is written to a temporary file, then renamed into place.
+    Args:
+        repo: the git repository.
+        objects: the {hex sha: (object format, data)} dictionary of the
+            objects.
+    Returns:
+        The number of objects written.
+    """
+    by_directory = collections.defaultdict(list)
+    for sha in objects:
+        by_directory[sha[:2]].append(sha)
+
+    written = 0
+    for fanout, shas in by_directory.items():
+        directory = git_file_path(repo, "objects", fanout)
+        os.makedirs(directory, exist_ok=True)
+        stored = set(os.listdir(directory))
+        for sha in shas:
+            if sha[2:] in stored:
+                continue
+            object_format, data = objects[sha]
+            header = f"{object_format} {len(data)}\x00".encode()
+            compressed = zlib.compress(header + data)
+            if TRACING:
+                count("deflate_bytes", len(header) + len(data))
+                count("deflated_bytes", len(compressed))
+            fd, tmp_path = tempfile.mkstemp(prefix="tmp_obj_", dir=directory)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(compressed)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            os.chmod(tmp_path, 0o444)
+            os.replace(tmp_path, os.path.join(directory, sha[2:]))
+            written += 1
+    if TRACING:
+        count("objects_written", written)
+    return written
+
+
+@traced("write_object")
 def write_object(obj, actually_write=True):
     """Writes an object to a git repository.
-    It serializes the object, compresses it, and writes it to the repository.
+    It serializes the object, and writes it to the repository with the
+    header of its type, compressed.
     Args:
         obj: the object to be written.
         actually_write: if True, the object is written to the repository.
     Returns:
-        The path to the object.
+        The hex sha of the object.
     """
-    # serializing the object:
     data = obj.serialize()
-
-    # creating the path to the object:
-    path = git_file_path(obj.repo, "objects", obj.sha[:2], obj.sha[2:],
-                         create_dir=actually_write)
-
-    # writing the object to the git repository:
+    sha = object_sha(obj.object_format, data)
     if actually_write:
-        with open(path, "wb") as f:
-            f.write(zlib.compress(data))
-    return path
+        write_objects(obj.repo, {sha: (obj.object_format, data)})
+    return sha
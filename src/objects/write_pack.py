@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A module that defines the write_pack function.
+Objects are sorted by type, path name hash and size (largest first), then a
+window of the previously written objects is searched for the delta base
+that gives the smallest delta. The pack is written as it goes, followed by
+its version 2 index.
+"""
+
+import collections
+import hashlib
+import os
+import struct
+import tempfile
+import zlib
+
+from src.dit_commands.tree_parsing import iter_tree_entries
+from src.objects.delta import DeltaIndex, create_delta
+from src.objects.pack_class import (IDX_MAGIC, IDX_VERSION, OBJ_OFS_DELTA,
+                                    PACK_MAGIC, TYPE_NUMBERS)
+from src.objects.read_object import read_object_header, read_raw_object
+from src.trace import TRACING, count, traced
+
+DEFAULT_WINDOW = 10
+DEFAULT_DEPTH = 50
+# objects smaller than this are always stored whole:
+MIN_DELTA_SIZE = 64
+
+
+def name_hash(name):
+    """Hash a path name so that files with the same name (and, loosely, the
+    same extension) sort next to each other, as git's pack_name_hash does.
+    Args:
+        name: the path name, as bytes.
+    Returns:
+        A 32-bit hash.
+    """
+    value = 0
+    for byte in name:
+        if byte in b" \t\n\r\f\v":
+            continue
+        value = ((value >> 2) + (byte << 24)) & 0xffffffff
+    return value
+
+
+class PackEntry:
+    """A class that defines an object to be written to a pack.
+    Attributes:
+        sha: the hex sha of the object.
+        object_format: the format of the object, e.g. b"blob".
+        size: the size of the object data.
+        name_hash: the hash of a path the object was found at.
+        depth: the length of the delta chain of the object.
+        offset: the offset of the object in the pack.
+        crc: the crc32 of the packed object.
+    """
+    __slots__ = ("sha", "object_format", "size", "name_hash", "depth",
+                 "offset", "crc")
+
+    def __init__(self, sha, object_format, size):
+        """Initialize a pack entry."""
+        self.sha = sha
+        self.object_format = object_format
+        self.size = size
+        self.name_hash = 0
+        self.depth = 0
+        self.offset = None
+        self.crc = None
+
+    def sort_key(self):
+        """Return the key that orders the objects for the delta search."""
+        return (TYPE_NUMBERS[self.object_format], self.name_hash, -self.size)
+
+
+def collect_entries(repo, shas, names=None, trees=None):
+    """Read the format and size of the objects to pack, and the path names
+    they are found at, from the trees being packed and the names provided.
+    Only the headers of the objects are read, but for the trees, which are
+    read whole for the names of their entries.
+    Args:
+        repo: the git repository.
+        shas: the hex shas of the objects to pack.
+        names: a dictionary mapping hex shas to path names (bytes).
+        trees: a dictionary to keep the data of the trees in, by hex sha,
+            so that they are not inflated again to be packed; or None.
+    Returns:
+        A list of PackEntry instances.
+    """
+    names = dict(names or {})
+    entries = []
+    for sha in dict.fromkeys(shas):
+        object_format, size = read_object_header(repo, sha)
+        entries.append(PackEntry(sha, object_format, size))
+        if object_format == b"tree":
+            data = read_raw_object(repo, sha)[1]
+            if trees is not None:
+                trees[sha] = data
+            for _, name, child in iter_tree_entries(data):
+                names.setdefault(child, name)
+
+    for entry in entries:
+        name = names.get(entry.sha)
+        if name:
+            entry.name_hash = name_hash(name)
+    return entries
+
+
+def encode_entry_header(object_type, size):
+    """Encode the type and size header of a packed object."""
+    byte = (object_type << 4) | (size & 0x0f)
+    size >>= 4
+    header = bytearray()
+    while size:
+        header.append(byte | 0x80)
+        byte = size & 0x7f
+        size >>= 7
+    header.append(byte)
+    return bytes(header)
+
+
+def encode_ofs_distance(distance):
+    """Encode the distance back to the base of an OFS_DELTA object."""
+    encoded = bytearray([distance & 0x7f])
+    distance >>= 7
+    while distance:
+        distance -= 1
+        encoded.append(0x80 | (distance & 0x7f))
+        distance >>= 7
+    return bytes(reversed(encoded))
+
+
+def find_delta(entry, data, window, max_depth):
+    """Find the base in the window that gives the smallest delta.
+    Args:
+        entry: the PackEntry of the object.
+        data: the data of the object.
+        window: a sequence of [PackEntry, data, DeltaIndex or None] lists.
+        max_depth: the longest delta chain allowed.
+    Returns:
+        A (base PackEntry, delta) tuple, or None if storing the object whole
+        is better.
+    """
+    if entry.size < MIN_DELTA_SIZE:
+        return None
+    best = None
+    # a delta must at least halve the object to be worth it:
+    max_size = entry.size // 2 - 20
+    for candidate in reversed(window):
+        base, base_data, index = candidate
+        if (base.object_format != entry.object_format or
+                base.depth >= max_depth or
+                base.size < entry.size // 32 or
+                entry.size - base.size >= max_size):
+            continue
+        if index is None:
+            index = candidate[2] = DeltaIndex(base_data)
+        delta = create_delta(index, data, max_size)
+        if delta is not None:
+            best = (base, delta)
+            max_size = len(delta) - 1
+    return best
+
+
+def write_pack_index(path, entries, pack_checksum):
+    """Write a version 2 pack index.
+    Args:
+        path: the path of the .idx file.
+        entries: the PackEntry instances written to the pack.
+        pack_checksum: the trailing sha1 of the pack.
+    """
+    entries = sorted(entries, key=lambda entry: entry.sha)
+    binshas = [bytes.fromhex(entry.sha) for entry in entries]
+
+    fanout = [0] * 256
+    for binsha in binshas:
+        fanout[binsha[0]] += 1
+    total = 0
+    for byte in range(256):
+        total += fanout[byte]
+        fanout[byte] = total
+
+    offsets = bytearray()
+    large_offsets = bytearray()
+    for entry in entries:
+        if entry.offset < 0x80000000:
+            offsets += struct.pack(">I", entry.offset)
+        else:
+            offsets += struct.pack(
+                ">I", 0x80000000 | (len(large_offsets) // 8))
+            large_offsets += struct.pack(">Q", entry.offset)
+
+    content = b"".join([
+        IDX_MAGIC,
+        struct.pack(">I", IDX_VERSION),
+        struct.pack(">256I", *fanout),
+        b"".join(binshas),
+        b"".join(struct.pack(">I", entry.crc) for entry in entries),
+        bytes(offsets),
+        bytes(large_offsets),
+        pack_checksum,
+    ])
+    with open(path, "wb") as f:
+        f.write(content)
+        f.write(hashlib.sha1(content).digest())
+
+
+@traced("write_pack")
+def write_pack(repo, shas, base_name, window=DEFAULT_WINDOW,
+               depth=DEFAULT_DEPTH, names=None):
+    """Write the objects provided to a new pack and its index.
+    The pack is written to a temporary file next to base_name and renamed
+    to <base_name>-<checksum>.pack once complete, followed by the .idx.
+    Args:
+        repo: the git repository.
+        shas: the hex shas of the objects to pack.
+        base_name: the path prefix of the pack, e.g. .git/objects/pack/pack.
+        window: how many previous objects are tried as delta bases.
+        depth: the longest delta chain allowed.
+        names: a dictionary mapping hex shas to path names (bytes), used as
+            hints to sort similar objects together.
+    Returns:
+        A (hex checksum of the pack, list of PackEntry) tuple.
+    """
+    # the trees read for their names, each dropped once it is packed:
+    trees = {}
+    entries = collect_entries(repo, shas, names, trees)
+    entries.sort(key=PackEntry.sort_key)
+
+    pack_dir = os.path.dirname(os.path.abspath(base_name))
+    os.makedirs(pack_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix="tmp_pack_", dir=pack_dir)
+    try:
+        checksum = hashlib.sha1()
+        with os.fdopen(fd, "wb") as f:
+            header = struct.pack(">4sII", PACK_MAGIC, 2, len(entries))
+            f.write(header)
+            checksum.update(header)
+            offset = len(header)
+
+            recent = collections.deque(maxlen=window)
+            for entry in entries:
+                data = trees.pop(entry.sha, None)
+                if data is None:
+                    _, data = read_raw_object(repo, entry.sha)
+                found = find_delta(entry, data, recent, depth) if window \
+                    else None
+                if found is None:
+                    packed = encode_entry_header(
+                        TYPE_NUMBERS[entry.object_format], len(data))
+                    packed += zlib.compress(data)
+                else:
+                    base, delta = found
+                    entry.depth = base.depth + 1
+                    packed = encode_entry_header(OBJ_OFS_DELTA, len(delta))
+                    packed += encode_ofs_distance(offset - base.offset)
+                    packed += zlib.compress(delta)
+
+                if TRACING:
+                    count("deflate_bytes", len(data if found is None
+                                               else found[1]))
+                    count("deflated_bytes", len(packed))
+                entry.offset = offset
+                entry.crc = zlib.crc32(packed)
+                f.write(packed)
+                checksum.update(packed)
+                offset += len(packed)
+                recent.append([entry, data, None])
+
+            pack_checksum = checksum.digest()
+            f.write(pack_checksum)
+
+        name = f"{base_name}-{pack_checksum.hex()}"
+        tmp_idx = tmp_path + ".idx"
+        write_pack_index(tmp_idx, entries, pack_checksum)
+        # the .pack goes in place first, as readers look for the .idx:
+        os.chmod(tmp_path, 0o444)
+        os.chmod(tmp_idx, 0o444)
+        os.replace(tmp_path, name + ".pack")
+        os.replace(tmp_idx, name + ".idx")
+    except BaseException:
+        for path in (tmp_path, tmp_path + ".idx"):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    return pack_checksum.hex(), entries
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A module that defines the cache-tree of write-tree.
+The cache-tree (.git/cache-tree) records, for each directory of the last
+tree written, the sha of its tree and a digest of the entries listed
+directly in it. A directory whose digest has not changed, and none of
+whose sub-directories changed, still has the same tree, which is not
+serialized nor hashed again.
+The file is a header ("DCTR", the version and the number of directories),
+then for each directory its path, a null byte, the binary sha of its tree
+and its 20 byte digest, and a trailing checksum.
+"""
+
+import hashlib
+import struct
+import sys
+
+from src.repos.lock_file import LockFile
+from src.repos.repo_paths import git_file_path
+
+CACHE_TREE_SIGNATURE = b"DCTR"
+CACHE_TREE_VERSION = 1
+
+
+def cache_tree_path(repo):
+    """Return the path to the cache-tree of a repository."""
+    return git_file_path(repo, "cache-tree")
+
+
+class CacheTree:
+    """A class that defines the cache-tree of a repository.
+    Attributes:
+        entries: the {directory path (bytes): (tree sha, digest)}
+            dictionary, the root directory being b"".
+    """
+
+    def __init__(self, entries=None):
+        """Initialize a cache-tree."""
+        self.entries = entries if entries is not None else {}
+
+    def parse(self, data):
+        """Parse the content of a cache-tree file.
+        Raises:
+            ValueError: if the file is corrupt or of an unknown version.
+        """
+        if len(data) < 12 + 20 or data[:4] != CACHE_TREE_SIGNATURE:
+            raise ValueError("bad cache-tree signature")
+        if hashlib.sha1(data[:-20]).digest() != data[-20:]:
+            raise ValueError("bad cache-tree checksum")
+        version, count = struct.unpack_from(">II", data, 4)
+        if version != CACHE_TREE_VERSION:
+            raise ValueError(f"unsupported cache-tree version {version}")
+        entries = {}
+        pos = 12
+        end = len(data) - 20
+        for _ in range(count):
+            null = data.find(b"\x00", pos, end)
+            if null == -1 or null + 41 > end:
+                raise ValueError("truncated cache-tree entry")
+            entries[data[pos:null]] = (data[null + 1:null + 21].hex(),
+                                       data[null + 21:null + 41])
+            pos = null + 41
+        self.entries = entries
+
+    def serialize(self):
+        """Serialize the cache-tree, with its trailing checksum."""
+        parts = [struct.pack(">4sII", CACHE_TREE_SIGNATURE,
+                             CACHE_TREE_VERSION, len(self.entries))]
+        for path in sorted(self.entries):
+            sha, digest = self.entries[path]
+            parts.append(path + b"\x00" + bytes.fromhex(sha) + digest)
+        data = b"".join(parts)
+        return data + hashlib.sha1(data).digest()
+
+
+def read_cache_tree(repo):
+    """Read the cache-tree of a repository.
+    A missing or corrupt cache-tree is an empty one: every tree is then
+    built again.
+    """
+    cache = CacheTree()
+    try:
+        with open(cache_tree_path(repo), "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return cache
+    try:
+        cache.parse(data)
+    except ValueError as error:
+        print(f"warning: ignoring cache-tree: {error}", file=sys.stderr)
+    return cache
+
+
+def write_cache_tree(repo, cache):
+    """Write the cache-tree of a repository.
+    Raises:
+        FileExistsError: if cache-tree.lock already exists.
+    """
+    with LockFile(cache_tree_path(repo)) as lock:
+        lock.write(cache.serialize())
@@ -3,9 +3,11 @@
 """A module that defines the find_repo_root function."""
 
 import os
+from src.trace import TRACING, count, traced
 from .gitrepo_class import GitRepo
 
 
+@traced("find_repo_root")
 def find_repo_root(path=".", required=True):
     """Find the root directory of the git repository from the path provided.
     Args:
@@ -19,16 +21,17 @@ def find_repo_root(path=".", required=True):
     """
     path = os.path.realpath(path)
 
-    # making sure the path exists:
-    if os.path.isdir(os.path.join(path, ".git")): # if the path exists
-        return GitRepo(path)                       # return the path
-    elif path == "/":
-        if required: # if the path is required
-            raise FileNotFoundError(
-                "fatal: not a git repository (or any of the parent "
-                "directories)")
-        else:
+    # walking up from the path to the root directory:
+    while True:
+        if TRACING:
+            count("directories_checked")
+        if os.path.isdir(os.path.join(path, ".git")): # if the path exists
+            return GitRepo(path)                       # return the path
+        if path == "/":
+            if required: # if the path is required
+                raise FileNotFoundError(
+                    "fatal: not a git repository (or any of the parent "
+                    "directories)")
             return None
-    else:
-        # recursively call find_repo_root on the parent directory
-        return find_repo_root(os.path.dirname(path), required)
+        # moving on to the parent directory:
+        path = os.path.dirname(path)
@@ -5,6 +5,8 @@
 import configparser
 import os
 
+from src.objects.object_cache import ObjectCache
+
 from .repo_paths import git_file_path
 
 
@@ -18,6 +20,8 @@ class GitRepo:
     dotgit = None
     # the config file:
     config = None
+    # the cache of the objects read from the repository:
+    object_cache = None
 
     def __init__(self, path, create=False):
         """Initialize a git repository.
@@ -30,6 +34,7 @@ class GitRepo:
         """
         self.workdir = path
         self.dotgit = os.path.join(path, ".git")
+        self.object_cache = ObjectCache()
         # making sure the path exists:
         if not (create or os.path.isdir(self.dotgit)):
             raise FileNotFoundError(
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A module that defines the .gitignore rules.
+The patterns of .git/info/exclude apply to the whole work tree, those of a
+.gitignore file to the directory holding it and below. When several
+patterns match a path, the last one wins, a pattern of a deeper .gitignore
+coming after those of its parents. A pattern starting with "!" re-includes
+what an earlier pattern excluded, but nothing is looked for under an
+ignored directory, so a file cannot be re-included from inside one.
+"""
+
+import os
+import re
+
+from src.repos.repo_paths import git_file_path
+
+
+def translate_pattern(pattern):
+    """Translate a .gitignore glob into a regular expression.
+    "*" and "?" do not match "/"; "**/" matches any number of leading
+    directories and "/**" everything inside a directory.
+    Args:
+        pattern: the glob, as bytes.
+    Returns:
+        The regular expression, as bytes.
+    """
+    out = []
+    pos = 0
+    end = len(pattern)
+    while pos < end:
+        char = pattern[pos:pos + 1]
+        if char == b"*":
+            if pattern.startswith(b"**", pos) and (
+                    pos == 0 or pattern[pos - 1:pos] == b"/"):
+                if pos + 2 == end:
+                    out.append(b".*")
+                    pos += 2
+                    continue
+                if pattern[pos + 2:pos + 3] == b"/":
+                    out.append(b"(?:.*/)?")
+                    pos += 3
+                    continue
+            while pattern[pos:pos + 1] == b"*":
+                pos += 1
+            out.append(b"[^/]*")
+            continue
+        if char == b"?":
+            out.append(b"[^/]")
+        elif char == b"[":
+            close = pattern.find(b"]", pos + 2)
+            if close == -1:
+                out.append(re.escape(char))
+            else:
+                members = pattern[pos + 1:close]
+                if members[:1] == b"!":
+                    members = b"^" + members[1:]
+                out.append(b"[" + members.replace(b"\\", b"\\\\") + b"]")
+                pos = close
+        elif char == b"\\" and pos + 1 < end:
+            pos += 1
+            out.append(re.escape(pattern[pos:pos + 1]))
+        else:
+            out.append(re.escape(char))
+        pos += 1
+    return b"".join(out)
+
+
+def parse_ignore_file(data, base=b""):
+    """Parse the patterns of a .gitignore file.
+    Args:
+        data: the content of the file.
+        base: the work tree path of the directory holding it.
+    Returns:
+        A list of (compiled regex, negated, directories only, match the name
+        only) tuples, in the order of the file.
+    """
+    patterns = []
+    prefix = re.escape(base + b"/") if base else b""
+    for line in data.splitlines():
+        if not line or line.startswith(b"#"):
+            continue
+        # trailing spaces are dropped, unless escaped:
+        stripped = line.rstrip(b" ")
+        if stripped.endswith(b"\\") and len(stripped) < len(line):
+            stripped += b" "
+        line = stripped
+        negated = line.startswith(b"!")
+        if negated:
+            line = line[1:]
+        directory_only = line.endswith(b"/")
+        line = line.rstrip(b"/")
+        if not line:
+            continue
+        # a pattern holding a slash is relative to the .gitignore directory,
+        #  one without is matched against the name at any depth:
+        name_only = b"/" not in line
+        if name_only:
+            regex = translate_pattern(line)
+        else:
+            regex = prefix + translate_pattern(line.lstrip(b"/"))
+        patterns.append((re.compile(regex, re.DOTALL), negated,
+                         directory_only, name_only))
+    return patterns
+
+
+class IgnoreRules:
+    """A class that defines the ignore rules that apply in a directory.
+    Rules are immutable: those of a sub-directory are a new IgnoreRules,
+    sharing the patterns of its parent, so that directories can be walked
+    concurrently.
+    Attributes:
+        patterns: the list of patterns, as parse_ignore_file returns them.
+    """
+
+    def __init__(self, patterns=()):
+        """Initialize the rules with a list of patterns."""
+        self.patterns = list(patterns)
+
+    def __bool__(self):
+        """Return True if there is any pattern."""
+        return bool(self.patterns)
+
+    def child(self, directory, data):
+        """Return the rules of a directory holding a .gitignore file.
+        Args:
+            directory: the work tree path of the directory.
+            data: the content of its .gitignore file.
+        """
+        return IgnoreRules(self.patterns +
+                           parse_ignore_file(data, directory))
+
+    def is_ignored(self, path, is_dir=False):
+        """Return True if a work tree path (bytes) is ignored."""
+        name = path[path.rfind(b"/") + 1:]
+        for regex, negated, directory_only, name_only in reversed(
+                self.patterns):
+            if directory_only and not is_dir:
+                continue
+            if regex.fullmatch(name if name_only else path):
+                return not negated
+        return False
+
+
+def read_ignore_file(path):
+    """Return the content of an ignore file, or None if there is none."""
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+        return None
+
+
+def ignore_rules(repo, directory=b""):
+    """Load the ignore rules a directory of the work tree is walked with:
+    those of .git/info/exclude, then of each .gitignore from the root down
+    to the parent of the directory. The .gitignore of the directory itself
+    is read by the walk, as it lists the directory.
+    Args:
+        repo: the git repository.
+        directory: the work tree path of the directory.
+    Returns:
+        The IgnoreRules.
+    """
+    rules = IgnoreRules()
+    data = read_ignore_file(git_file_path(repo, "info", "exclude"))
+    if data is not None:
+        rules = rules.child(b"", data)
+    root = os.fsencode(repo.workdir)
+    parts = directory.split(b"/") if directory else []
+    for end in range(len(parts)):
+        base = b"/".join(parts[:end])
+        data = read_ignore_file(os.path.join(root, base, b".gitignore"))
+        if data is not None:
+            rules = rules.child(base, data)
+    return rules
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A module that defines the git index (dircache) classes.
+The index (.git/index) lists the files staged for the next commit, sorted
+by path, each with the sha of its blob and the stat data the file had when
+it was hashed. A file whose stat data has not changed since does not need
+to be read again to know that its content has not changed either.
+The file is a header ("DIRC", the version and the number of entries), the
+entries, optional extensions and a trailing checksum. Versions 2 and 3 pad
+each path with nulls to a multiple of 8 bytes (version 3 adds extended
+flags); version 4 drops the padding and prefix-compresses each path
+against the previous one.
+The cache-tree extension ("TREE") records the shas of the trees the
+entries make up; only its root is kept, as the tree the index was last
+read from (by a checkout), until an entry is added or removed.
+A file changed in the same second the index was written may still match
+the stat data of its entry ("racy git"), so such entries are always
+rehashed, and are smudged (their size set to 0) when the index is written
+again.
+"""
+
+import hashlib
+import os
+import stat
+import struct
+import time
+
+from src.objects.write_pack import encode_ofs_distance
+from src.repos.lock_file import LockFile
+from src.repos.repo_paths import git_file_path
+
+INDEX_SIGNATURE = b"DIRC"
+CACHE_TREE_SIGNATURE = b"TREE"
+INDEX_VERSIONS = (2, 3, 4)
+DEFAULT_INDEX_VERSION = 2
+
+# ctime, mtime (seconds and nanoseconds), dev, ino, mode, uid, gid, size,
+#  sha, flags:
+ENTRY_HEADER = struct.Struct(">10I20sH")
+FLAG_ASSUME_VALID = 0x8000
+FLAG_EXTENDED = 0x4000
+FLAG_STAGE_SHIFT = 12
+FLAG_STAGE_MASK = 0x3000
+NAME_LENGTH_MASK = 0x0fff
+# the extended flags of version 3 and later:
+EXTENDED_SKIP_WORKTREE = 0x4000
+EXTENDED_INTENT_TO_ADD = 0x2000
+
+MODE_FILE = 0o100644
+MODE_EXECUTABLE = 0o100755
+MODE_SYMLINK = 0o120000
+MODE_GITLINK = 0o160000
+
+EMPTY_BLOB = "e69de29bb2d1d6434b8b29ae775ad8c2e48c5391"
+
+
+def index_path(repo):
+    """Return the path to the index of a repository."""
+    return git_file_path(repo, "index")
+
+
+def index_mode(st):
+    """Return the mode git records for a file, from its stat data, or None
+    if the file is neither a regular file nor a symbolic link."""
+    if stat.S_ISLNK(st.st_mode):
+        return MODE_SYMLINK
+    if stat.S_ISREG(st.st_mode):
+        return MODE_EXECUTABLE if st.st_mode & 0o100 else MODE_FILE
+    return None
+
+
+def stat_fields(st):
+    """Return the stat data of a file as the index records it: ctime and
+    mtime (seconds and nanoseconds), dev, ino, mode, uid, gid and size, each
+    truncated to 32 bits."""
+    ctime = st.st_ctime_ns
+    mtime = st.st_mtime_ns
+    return (ctime // 1000000000 & 0xffffffff, ctime % 1000000000,
+            mtime // 1000000000 & 0xffffffff, mtime % 1000000000,
+            st.st_dev & 0xffffffff, st.st_ino & 0xffffffff, index_mode(st),
+            st.st_uid & 0xffffffff, st.st_gid & 0xffffffff,
+            st.st_size & 0xffffffff)
+
+
+class IndexEntry:
+    """A class that defines an entry of the index.
+    Attributes:
+        path: the path of the file, relative to the work tree, as bytes.
+        sha: the hex sha of the blob.
+        stat: the stat data of the file when it was hashed, as stat_fields
+            returns it (the mode included).
+        flags: the flags, without the name length.
+        extended_flags: the extended flags (version 3 and later).
+    """
+    __slots__ = ("path", "sha", "stat", "flags", "extended_flags")
+
+    def __init__(self, path, sha, stat_data, flags=0, extended_flags=0):
+        """Initialize an index entry."""
+        self.path = path
+        self.sha = sha
+        self.stat = stat_data
+        self.flags = flags
+        self.extended_flags = extended_flags
+
+    @property
+    def mode(self):
+        """The mode of the file (e.g. 0o100644)."""
+        return self.stat[6]
+
+    @property
+    def stage(self):
+        """The merge stage of the entry (0 unless it is in conflict)."""
+        return (self.flags & FLAG_STAGE_MASK) >> FLAG_STAGE_SHIFT
+
+    @property
+    def mtime(self):
+        """The modification time of the file, in seconds."""
+        return self.stat[2]
+
+    @property
+    def size(self):
+        """The size of the file (0 once the entry was smudged)."""
+        return self.stat[9]
+
+    def stat_matches(self, st):
+        """Return True if a file has the stat data and mode of the entry.
+        An entry of size 0 whose blob is not empty was smudged, and never
+        matches.
+        """
+        if self.flags & FLAG_ASSUME_VALID:
+            return True
+        if not self.stat[9] and self.sha != EMPTY_BLOB:
+            return False
+        return stat_fields(st) == self.stat
+
+    def smudge(self):
+        """Set the size of the entry to 0, so that the file is rehashed."""
+        self.stat = self.stat[:9] + (0,)
+
+
+class GitIndex:
+    """A class that defines the index of a repository.
+    Attributes:
+        version: the version of the index file.
+        entries: the {(path, stage): IndexEntry} dictionary.
+        timestamp: the modification time (in seconds) of the index file when
+            it was read, or None if it was not read from a file.
+        tree: the sha of the tree the entries make up, if it is known, or
+            None.
+    """
+
+    def __init__(self, version=DEFAULT_INDEX_VERSION):
+        """Initialize an empty index."""
+        self.version = version
+        self.entries = {}
+        self.timestamp = None
+        self.tree = None
+        # True while the entries are in sorted order:
+        self._sorted = True
+
+    def __len__(self):
+        """Return the number of entries."""
+        return len(self.entries)
+
+    def __iter__(self):
+        """Iterate over the entries, sorted by path and stage."""
+        if not self._sorted:
+            self.entries = {key: self.entries[key]
+                            for key in sorted(self.entries)}
+            self._sorted = True
+        return iter(list(self.entries.values()))
+
+    def get(self, path):
+        """Return the stage 0 entry of a path (bytes), or None."""
+        return self.entries.get((path, 0))
+
+    def add(self, entry):
+        """Add an entry, replacing the entries of the path in any stage."""
+        for stage in range(1, 4):
+            self.entries.pop((entry.path, stage), None)
+        key = (entry.path, entry.stage)
+        if key not in self.entries:
+            self._sorted = False
+        self.entries[key] = entry
+        self.tree = None
+
+    def remove(self, path):
+        """Remove the entries of a path (bytes) in every stage."""
+        for stage in range(4):
+            self.entries.pop((path, stage), None)
+        self.tree = None
+
+    def is_racy(self, entry):
+        """Return True if the file of an entry may have changed within the
+        second the index was written, so that its stat data cannot be
+        trusted."""
+        return self.timestamp is not None and entry.mtime >= self.timestamp
+
+    def parse(self, data):
+        """Parse the content of an index file.
+        Args:
+            data: the content of the index file.
+        Raises:
+            ValueError: if the file is corrupt, or of an unsupported version
+                or uses an extension that is required but not understood.
+        """
+        if len(data) < 12 + 20 or data[:4] != INDEX_SIGNATURE:
+            raise ValueError("bad index signature")
+        if hashlib.sha1(data[:-20]).digest() != data[-20:]:
+            raise ValueError("bad index checksum")
+        version, count = struct.unpack_from(">II", data, 4)
+        if version not in INDEX_VERSIONS:
+            raise ValueError(f"unsupported index version {version}")
+        self.version = version
+
+        entries = {}
+        pos = 12
+        end = len(data) - 20
+        path = b""
+        unpack = ENTRY_HEADER.unpack_from
+        header_size = ENTRY_HEADER.size
+        for _ in range(count):
+            if pos + header_size > end:
+                raise ValueError("truncated index entry")
+            fields = unpack(data, pos)
+            flags = fields[11]
+            start = pos
+            pos += header_size
+            extended_flags = 0
+            if flags & FLAG_EXTENDED:
+                if version < 3:
+                    raise ValueError("extended flags in a version 2 index")
+                extended_flags = struct.unpack_from(">H", data, pos)[0]
+                pos += 2
+            if version == 4:
+                # the length to strip from the previous path, as OFS_DELTA
+                #  distances are encoded, then the rest of the path:
+                byte = data[pos]
+                pos += 1
+                strip = byte & 0x7f
+                while byte & 0x80:
+                    byte = data[pos]
+                    pos += 1
+                    strip = ((strip + 1) << 7) | (byte & 0x7f)
+                if strip > len(path):
+                    raise ValueError("bad index path compression")
+                null = data.index(b"\x00", pos)
+                path = path[:len(path) - strip] + data[pos:null]
+                pos = null + 1
+            else:
+                null = data.index(b"\x00", pos)
+                path = data[pos:null]
+                # padded with 1 to 8 nulls to a multiple of 8 bytes:
+                pos = start + ((null - start + 8) & ~7)
+            entries[(path, (flags & FLAG_STAGE_MASK) >> FLAG_STAGE_SHIFT)] = \
+                IndexEntry(path, fields[10].hex(), fields[:10],
+                           flags & ~(NAME_LENGTH_MASK | FLAG_EXTENDED),
+                           extended_flags)
+        if pos > end:
+            raise ValueError("truncated index entry")
+
+        # the extensions (a signature, a size and data each):
+        self.tree = None
+        while pos + 8 <= end:
+            signature, size = struct.unpack_from(">4sI", data, pos)
+            if not b"A" <= signature[:1] <= b"Z":
+                raise ValueError("index uses the "
+                                 f"{signature.decode('latin-1')} extension, "
+                                 "which is not understood")
+            if signature == CACHE_TREE_SIGNATURE:
+                self.tree = parse_cache_tree_root(
+                    data[pos + 8:pos + 8 + size])
+            # the other optional extensions are dropped, since they describe
+            #  entries that are about to change:
+            pos += 8 + size
+        # git writes the entries sorted, but a file may not be:
+        self.entries = entries
+        self._sorted = False
+
+    def serialize(self, racy_after=None):
+        """Serialize the index, but for its trailing checksum.
+        Args:
+            racy_after: entries whose files were modified at or after this
+                time (in seconds) are smudged.
+        Returns:
+            The list of the parts of the file.
+        """
+        entries = list(self)
+        version = self.version
+        if version == 2 and any(entry.extended_flags for entry in entries):
+            version = 3
+        parts = [struct.pack(">4sII", INDEX_SIGNATURE, version, len(entries))]
+        previous = b""
+        for entry in entries:
+            if racy_after is not None and entry.mtime >= racy_after:
+                entry.smudge()
+            flags = entry.flags | min(len(entry.path), NAME_LENGTH_MASK)
+            if entry.extended_flags and version >= 3:
+                flags |= FLAG_EXTENDED
+            header = ENTRY_HEADER.pack(*entry.stat, bytes.fromhex(entry.sha),
+                                       flags)
+            if flags & FLAG_EXTENDED:
+                header += struct.pack(">H", entry.extended_flags)
+            if version == 4:
+                common = len(os.path.commonprefix([previous, entry.path]))
+                parts.append(header + encode_ofs_distance(
+                    len(previous) - common) + entry.path[common:] + b"\x00")
+                previous = entry.path
+            else:
+                length = len(header) + len(entry.path)
+                parts.append(header + entry.path +
+                             b"\x00" * (8 - length % 8))
+        if self.tree is not None:
+            # the root of the cache-tree alone: "<path>\0<entry count>
+            #  <subtree count>\n<sha>":
+            data = (b"\x00%d 0\n" % len(entries)) + bytes.fromhex(self.tree)
+            parts.append(struct.pack(">4sI", CACHE_TREE_SIGNATURE,
+                                     len(data)) + data)
+        return parts
+
+
+def parse_cache_tree_root(data):
+    """Return the sha of the root tree of a cache-tree extension, or None if
+    it is invalidated (its entry count is -1)."""
+    null = data.find(b"\x00")
+    newline = data.find(b"\n", null)
+    if null != 0 or newline == -1:
+        raise ValueError("bad index cache-tree")
+    entry_count = int(data[null + 1:newline].split(b" ")[0])
+    if entry_count < 0:
+        return None
+    return data[newline + 1:newline + 21].hex()
+
+
+def read_index(repo):
+    """Read the index of a repository.
+    Args:
+        repo: the git repository.
+    Returns:
+        The GitIndex, empty if the repository has no index.
+    Raises:
+        ValueError: if the index is corrupt.
+    """
+    index = GitIndex()
+    try:
+        with open(index_path(repo), "rb") as f:
+            st = os.fstat(f.fileno())
+            data = f.read()
+    except FileNotFoundError:
+        return index
+    index.parse(data)
+    index.timestamp = int(st.st_mtime)
+    return index
+
+
+def write_index(repo, index, lock=None):
+    """Write the index of a repository.
+    Entries whose files were modified in the second the index is written
+    are smudged, so that they are rehashed once that second is over.
+    Args:
+        repo: the git repository.
+        index: the GitIndex.
+        lock: the LockFile of the index, if it is already held.
+    Raises:
+        FileExistsError: if index.lock already exists.
+    """
+    if lock is None:
+        lock = LockFile(index_path(repo))
+    with lock:
+        parts = index.serialize(racy_after=int(time.time()))
+        checksum = hashlib.sha1()
+        for part in parts:
+            checksum.update(part)
+            lock.write(part)
+        lock.write(checksum.digest())
+    index.timestamp = int(os.stat(index_path(repo)).st_mtime)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A module that defines the git lock file class."""
+
+import os
+
+
+class LockFile:
+    """A class that defines a git style lock file.
+    A file is updated by writing its new content to <path>.lock, created
+    exclusively so that only one writer holds it, then renaming the lock over
+    the file. Readers see either the old or the new content, never a
+    partial write. Rolling back removes the lock and leaves the file as is.
+    Attributes:
+        path: the path of the file being updated.
+        lock_path: the path of the lock file.
+        held: True until the lock is committed or rolled back.
+    """
+
+    def __init__(self, path):
+        """Take the lock of the file at the path provided.
+        Args:
+            path: the path of the file to update.
+        Raises:
+            FileExistsError: if the file is already locked.
+        """
+        self.path = path
+        self.lock_path = path + ".lock"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.fd = os.open(self.lock_path,
+                          os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        self.held = True
+
+    def write(self, data):
+        """Write data (str or bytes) to the lock file."""
+        if isinstance(data, str):
+            data = data.encode()
+        view = memoryview(data)
+        while view:
+            written = os.write(self.fd, view)
+            view = view[written:]
+
+    def close(self):
+        """Close the lock file, keeping the lock."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def replace(self, data):
+        """Replace the file with data (bytes or str) at once, keeping the
+        lock, so that the file may be changed again (or put back) before the
+        lock is released with rollback().
+        The data goes through <path>.lock.new, which only the holder of the
+        lock writes."""
+        if isinstance(data, str):
+            data = data.encode()
+        new_path = self.lock_path + ".new"
+        with open(new_path, "wb") as f:
+            f.write(data)
+        os.replace(new_path, self.path)
+
+    def commit(self):
+        """Rename the lock file over the file, releasing the lock."""
+        self.close()
+        os.replace(self.lock_path, self.path)
+        self.held = False
+
+    def rollback(self):
+        """Remove the lock file, leaving the file unchanged. Once the lock
+        is released, the lock file may be another writer's: it is then left
+        alone."""
+        self.close()
+        if not self.held:
+            return
+        self.held = False
+        try:
+            os.remove(self.lock_path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        """Return the lock file."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Commit the lock file, or roll it back if the block raised."""
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
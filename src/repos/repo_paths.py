@@ -28,13 +28,16 @@ def git_file_path(repo, *path, create_dir=False):
     Args:
         repo: the git repository.
         path: the path to the file or directory.
-        create_dir: if True, create the directory if it doesn't exist.
+        create_dir: if True, create the parent directory if it doesn't exist.
     Returns:
         The path to the file or directory in the git directory.
     """
-    if git_path_finder(repo, *path[:1], create_dir): # if the path exists
-        return git_path_finder(repo, *path)         # return the path
-    return None
+    path = git_path_finder(repo, *path)
+    # creating the directory that holds the file
+    #  (the last component may itself hold slashes, e.g. refs/heads/x):
+    if create_dir:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
 
 
 def git_file_dir(repo, *path, create_dir=False):
@@ -48,14 +51,13 @@ def git_file_dir(repo, *path, create_dir=False):
     Raises:
         NotADirectoryError: if the path is not a directory.
     """
-    path = repo.git_file_path(*path)
+    path = git_path_finder(repo, *path)
     # making sure the path exists:
     if os.path.exists(path):
         if os.path.isdir(path):
             return path
-    else:
         raise NotADirectoryError(f"fatal: {path} is not a directory")
     if create_dir:
-        os.makedirs(path)
+        os.makedirs(path, exist_ok=True)
         return path
     return None
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A module that defines the functions to walk the work tree.
+Paths are handled as bytes relative to the root of the work tree, with
+"/" separators, as the index and trees record them.
+"""
+
+import concurrent.futures
+import os
+
+from src.repos.ignore import read_ignore_file
+
+# how many directories are listed at once; listing is bound by the latency
+#  of the file system (NFS in particular) rather than by the CPU:
+SCAN_THREADS = 16
+
+def workdir_path(repo, path):
+    """Return the path on disk of a work tree path (bytes)."""
+    return os.path.join(os.fsencode(repo.workdir), path)
+
+
+def relative_path(repo, path):
+    """Convert a path given on the command line to a work tree path.
+    Args:
+        repo: the git repository.
+        path: the path, relative to the current directory or absolute.
+    Returns:
+        The path relative to the root of the work tree, as bytes ("" for
+        the root itself).
+    Raises:
+        ValueError: if the path is outside the work tree.
+    """
+    absolute = os.path.abspath(path)
+    root = os.path.realpath(repo.workdir)
+    # the root may be reached through a symbolic link:
+    parent = os.path.realpath(os.path.dirname(absolute))
+    absolute = os.path.join(parent, os.path.basename(absolute))
+    relative = os.path.relpath(absolute, root)
+    if relative == ".":
+        return b""
+    if relative == ".." or relative.startswith(".." + os.sep):
+        raise ValueError(f"'{path}' is outside repository at '{root}'")
+    return os.fsencode(relative.replace(os.sep, "/"))
+
+
+def is_nested_repo(path):
+    """Return True if a directory holds a git repository of its own."""
+    return os.path.exists(os.path.join(path, b".git"))
+
+
+def list_directory(repo, directory, rules=None):
+    """List a directory of the work tree, skipping .git, the nested
+    repositories and the ignored paths.
+    Args:
+        repo: the git repository.
+        directory: the work tree path of the directory.
+        rules: the IgnoreRules of the directory, or None not to ignore any
+            path; a .gitignore in the directory is added to them.
+    Returns:
+        A (files, sub-directories) tuple: the os.DirEntry of each file and
+        symbolic link, and a (work tree path, IgnoreRules) tuple for each
+        sub-directory.
+    """
+    path = workdir_path(repo, directory)
+    with os.scandir(path) as listing:
+        entries = list(listing)
+    if rules is not None:
+        data = read_ignore_file(os.path.join(path, b".gitignore"))
+        if data is not None:
+            rules = rules.child(directory, data)
+    prefix = directory + b"/" if directory else b""
+    files = []
+    directories = []
+    for entry in entries:
+        if entry.name == b".git":
+            continue
+        is_dir = entry.is_dir(follow_symlinks=False)
+        if rules and rules.is_ignored(prefix + entry.name, is_dir):
+            continue
+        if is_dir:
+            if not is_nested_repo(entry.path):
+                directories.append((prefix + entry.name, rules))
+        elif entry.is_file(follow_symlinks=False) or entry.is_symlink():
+            files.append(entry)
+    return files, directories
+
+
+def iter_workdir(repo, start=b"", rules=None):
+    """Iterate over the files and symbolic links of the work tree, skipping
+    .git, the nested repositories and the ignored paths.
+    Args:
+        repo: the git repository.
+        start: the work tree path of the directory to walk.
+        rules: the IgnoreRules of the directory, or None not to ignore any
+            path.
+    Yields:
+        (work tree path, os.DirEntry) tuples, in no particular order.
+    """
+    stack = [(start, rules)]
+    while stack:
+        directory, rules = stack.pop()
+        try:
+            files, directories = list_directory(repo, directory, rules)
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        prefix = directory + b"/" if directory else b""
+        for entry in files:
+            yield prefix + entry.name, entry
+        stack += directories
+
+
+def scan_workdir(repo, start=b"", rules=None, threads=SCAN_THREADS):
+    """List every directory under a directory of the work tree, one task
+    per directory on a thread pool, so that many directories are listed at
+    once. Ignored directories are pruned as they are found.
+    Args:
+        repo: the git repository.
+        start: the work tree path of the directory to walk.
+        rules: the IgnoreRules of the directory, or None not to ignore any
+            path.
+        threads: the number of directories listed at once.
+    Returns:
+        The {work tree path: (files, sub-directory paths)} dictionary of
+        the directories, files being the os.DirEntry of the files and
+        symbolic links of each.
+    Raises:
+        OSError: if the directory cannot be listed.
+    """
+    listings = {}
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        pending = {executor.submit(list_directory, repo, start, rules): start}
+        while pending:
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                directory = pending.pop(future)
+                try:
+                    files, directories = future.result()
+                except (FileNotFoundError, NotADirectoryError):
+                    # a sub-directory removed while the tree is walked:
+                    if directory == start:
+                        raise
+                    continue
+                listings[directory] = (files,
+                                       [path for path, _ in directories])
+                for path, sub_rules in directories:
+                    pending[executor.submit(list_directory, repo, path,
+                                            sub_rules)] = path
+    return listings
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""A module that traces where the time of a dit command goes.
+When DIT_TRACE is set (to a file, or to 1 or 2 for stdout or stderr), the
+command, the objects read and written, the ref snapshots and the discovery
+of the repository are recorded as nested spans, one JSON line per span:
+    {"pid": ..., "tid": ..., "id": 3, "parent": 1, "name": "read_object",
+     "start_us": ..., "dur_us": ..., "data": {...}, "counters": {...}}
+The counters (bytes inflated and deflated, cache hits, ...) belong to the
+innermost span open when they were counted. Each thread nests its own spans
+(the spans of a worker thread are roots, with a "tid" telling the thread).
+Lines are appended to the file as root spans end, so several processes
+(and the workers of a command) can trace to the same file.
+When DIT_TRACE is not set, traced() returns the functions it decorates
+unchanged and the counters are guarded by TRACING, so tracing costs nothing.
+The summarizer lists the hottest spans of a trace:
+    python -m src.trace <trace file> [--top N]
+"""
+
+import itertools
+import os
+import sys
+import threading
+import time
+
+# where the trace goes, and whether the spans are recorded at all:
+TRACE_TARGET = os.environ.get("DIT_TRACE", "")
+TRACING = TRACE_TARGET not in ("", "0")
+# how many span lines are buffered before they are written:
+FLUSH_LINES = 256
+
+# the spans open in each thread (its stack attribute, innermost last), the
+#  ids of the spans, and the lines not written yet:
+_local = threading.local()
+_ids = itertools.count(1)
+_lines = []
+_lines_lock = threading.Lock()
+# the wall clock time of perf_counter_ns() == 0, so that the start of a span
+#  and its duration are read from the same clock, and nested spans end
+#  within their parents:
+_EPOCH_NS = time.time_ns() - time.perf_counter_ns()
+
+
+def _span_stack():
+    """Return the stack of the spans open in the current thread."""
+    try:
+        return _local.stack
+    except AttributeError:
+        _local.stack = []
+        return _local.stack
+
+
+class Span:
+    """A class that defines a span: a timed, named section of a command.
+    Attributes:
+        name: the name of the span.
+        data: a dictionary describing what the span worked on.
+        counters: a dictionary of the amounts counted during the span.
+    """
+
+    __slots__ = ("name", "data", "counters", "span_id", "parent", "stack",
+                 "start", "start_ns")
+
+    def __init__(self, name, data):
+        """Create a span, which starts when it is entered."""
+        self.name = name
+        self.data = data
+        self.counters = {}
+        self.span_id = self.parent = self.stack = None
+        self.start = self.start_ns = 0
+
+    def __enter__(self):
+        # next() of an itertools.count is atomic, so ids are never shared:
+        self.span_id = next(_ids)
+        self.stack = _span_stack()
+        self.parent = self.stack[-1].span_id if self.stack else None
+        self.stack.append(self)
+        self.start_ns = time.perf_counter_ns()
+        self.start = _EPOCH_NS + self.start_ns
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter_ns() - self.start_ns
+        self.stack.pop()
+        record = {"pid": os.getpid(), "tid": threading.get_ident(),
+                  "id": self.span_id,
+                  "parent": self.parent, "name": self.name,
+                  "start_us": self.start // 1000, "dur_us": duration / 1000}
+        if self.data:
+            record["data"] = self.data
+        if self.counters:
+            record["counters"] = self.counters
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        _lines.append(record)
+        # the workers of a command exit without running atexit, so the
+        #  lines are written as soon as no span is left open:
+        if not self.stack or len(_lines) >= FLUSH_LINES:
+            flush()
+        return False
+
+
+class _NoSpan:
+    """A span that records nothing, used when tracing is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name, **data):
+    """Return a context manager recording a span, when tracing is on."""
+    if not TRACING:
+        return _NO_SPAN
+    return Span(name, data)
+
+
+def traced(name):
+    """Decorate a function so that each call is recorded as a span.
+    When tracing is off the function itself is returned, so calling it
+    costs nothing more.
+    """
+    def decorator(function):
+        if not TRACING:
+            return function
+
+        def wrapper(*args, **kwargs):
+            with Span(name, None):
+                return function(*args, **kwargs)
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        wrapper.__wrapped__ = function
+        return wrapper
+    return decorator
+
+
+def count(counter, amount=1):
+    """Add an amount to a counter of the innermost span open in the
+    current thread.
+    Callers on hot paths check TRACING first, to skip the call.
+    """
+    stack = _span_stack()
+    if stack:
+        counters = stack[-1].counters
+        counters[counter] = counters.get(counter, 0) + amount
+
+
+def flush():
+    """Write the span lines buffered so far."""
+    with _lines_lock:
+        records = _lines[:]
+        _lines.clear()
+    if not records:
+        return
+    # pylint: disable=import-outside-toplevel
+    import json
+    text = "".join(json.dumps(record, separators=(",", ":")) + "\n"
+                   for record in records)
+    if TRACE_TARGET in ("1", "2"):
+        stream = sys.stdout if TRACE_TARGET == "1" else sys.stderr
+        stream.write(text)
+        stream.flush()
+        return
+    # a single write of whole lines to a file opened in append mode, so
+    #  that the lines of processes tracing to the same file do not mix:
+    fd = os.open(TRACE_TARGET, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, text.encode())
+    finally:
+        os.close(fd)
+
+
+def _reset_after_fork():
+    """Forget, in a forked child, the spans and lines of its parent."""
+    global _local, _ids, _lines_lock  # pylint: disable=global-statement
+    _local = threading.local()
+    _ids = itertools.count(1)
+    _lines.clear()
+    _lines_lock = threading.Lock()
+
+
+if TRACING:
+    # pylint: disable=wrong-import-position,wrong-import-order
+    import atexit
+    atexit.register(flush)
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def read_trace(lines):
+    """Parse the lines of a trace, skipping the ones that are not spans.
+    Returns:
+        The list of span records.
+    """
+    # pylint: disable=import-outside-toplevel
+    import json
+    records = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict) and "name" in record:
+            records.append(record)
+    return records
+
+
+def summarize(records):
+    """Sum the spans of a trace by name.
+    The self time of a span is its duration less the durations of the spans
+    nested directly in it.
+    Returns:
+        The {name: {"calls", "total_us", "self_us", "max_us", "counters"}}
+        dictionary of the spans.
+    """
+    children = {}
+    for record in records:
+        if record.get("parent") is not None:
+            key = (record.get("pid"), record["parent"])
+            children[key] = children.get(key, 0) + record["dur_us"]
+
+    summary = {}
+    for record in records:
+        entry = summary.setdefault(record["name"], {
+            "calls": 0, "total_us": 0, "self_us": 0, "max_us": 0,
+            "counters": {}})
+        duration = record["dur_us"]
+        entry["calls"] += 1
+        entry["total_us"] += duration
+        entry["self_us"] += duration - children.get(
+            (record.get("pid"), record["id"]), 0)
+        entry["max_us"] = max(entry["max_us"], duration)
+        for counter, amount in record.get("counters", {}).items():
+            entry["counters"][counter] = \
+                entry["counters"].get(counter, 0) + amount
+    return summary
+
+
+def print_summary(summary, top=20, file=None):
+    """Print the hottest spans of a summary, by self time."""
+    file = file or sys.stdout
+    print(f"{'span':<20} {'calls':>8} {'self ms':>10} {'total ms':>10} "
+          f"{'mean us':>10} {'max us':>10}  counters", file=file)
+    hottest = sorted(summary.items(), key=lambda item: item[1]["self_us"],
+                     reverse=True)[:top]
+    for name, entry in hottest:
+        counters = " ".join(f"{counter}={amount}" for counter, amount
+                            in sorted(entry["counters"].items()))
+        print(f"{name:<20} {entry['calls']:>8} "
+              f"{entry['self_us'] / 1000:>10.2f} "
+              f"{entry['total_us'] / 1000:>10.2f} "
+              f"{entry['total_us'] / entry['calls']:>10.1f} "
+              f"{entry['max_us']:>10.1f}  {counters}", file=file)
+
+
+def main():
+    """Print the hottest spans of a trace file."""
+    # pylint: disable=import-outside-toplevel
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Summarize a DIT_TRACE file: the spans by self time")
+    parser.add_argument("file", help="the trace file ('-' for stdin)")
+    parser.add_argument("--top", type=int, default=20,
+                        help="how many spans to list")
+    args = parser.parse_args()
+    if args.file == "-":
+        records = read_trace(sys.stdin)
+    else:
+        with open(args.file, encoding="utf-8") as f:
+            records = read_trace(f)
+    if not records:
+        print(f"{args.file}: no spans", file=sys.stderr)
+        sys.exit(1)
+    print_summary(summarize(records), args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Fixtures shared by the tests: scratch repositories, and runners of git
+and dit in them.
+dit is run as the dit script in a new process, with the daemon disabled,
+so that its output can be compared with that of git.
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+# the dit script:
+DIT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))), "dit")
+# the environment of git and dit: no user configuration, fixed identities:
+ENV = dict(os.environ, DIT_NO_DAEMON="1", GIT_CONFIG_NOSYSTEM="1",
+           GIT_CONFIG_GLOBAL=os.devnull, GIT_AUTHOR_NAME="A U Thor",
+           GIT_AUTHOR_EMAIL="author@example.com",
+           GIT_COMMITTER_NAME="C O Mitter",
+           GIT_COMMITTER_EMAIL="committer@example.com")
+ENV.pop("DIT_TRACE", None)
+
+
+class Runner:
+    """A class that runs git and dit in a repository.
+    Attributes:
+        path: the work tree of the repository.
+    """
+
+    def __init__(self, path):
+        """Initialize the runner of the repository at the path."""
+        self.path = str(path)
+
+    def run(self, command, check=True, env=None, input_data=None):
+        """Run a command in the work tree.
+        Returns:
+            The CompletedProcess, with its output as text.
+        """
+        return subprocess.run(command, cwd=self.path, env=dict(ENV, **(
+            env or {})), input=input_data, capture_output=True, text=True,
+            check=check)
+
+    def git(self, *args, check=True, env=None, input_data=None):
+        """Run git, returning its stdout."""
+        return self.run(["git"] + list(args), check, env, input_data).stdout
+
+    def dit(self, *args, check=True, env=None, input_data=None):
+        """Run dit, returning the CompletedProcess."""
+        return self.run([sys.executable, DIT] + list(args), check, env,
+                        input_data)
+
+    def write(self, path, data):
+        """Write a file of the work tree, creating its directories."""
+        full_path = os.path.join(self.path, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "w", encoding="utf-8") as f:
+            f.write(data)
+
+    def commit(self, message, date=None):
+        """Commit everything in the work tree, returning the commit sha."""
+        env = None
+        if date is not None:
+            env = {"GIT_AUTHOR_DATE": f"{date} +0000",
+                   "GIT_COMMITTER_DATE": f"{date} +0000"}
+        self.git("add", "-A")
+        self.git("commit", "-q", "--allow-empty", "-m", message, env=env)
+        return self.git("rev-parse", "HEAD").strip()
+
+
+@pytest.fixture
+def repo(tmp_path):
+    """A new git repository, on branch main."""
+    runner = Runner(tmp_path / "repo")
+    os.mkdir(runner.path)
+    runner.git("init", "-q", "-b", "main")
+    return runner
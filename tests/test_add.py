@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Tests of dit add, against the index git add writes."""
+
+import os
+
+
+def staged_by(repo, command, *args):
+    """Reset the index to HEAD, add paths with git or dit, and return the
+    index git lists and the result of the command."""
+    repo.git("read-tree", "HEAD")
+    if command == "git":
+        result = repo.run(["git", "add"] + list(args), check=False)
+    else:
+        result = repo.dit("add", *args, check=False)
+    return repo.git("ls-files", "-s"), result.returncode, result.stderr
+
+
+def test_pathspecs_match_git(repo):
+    """A pathspec matches the path and the paths beneath it, not those it
+    is a prefix of; tracked files that are gone are removed."""
+    for path in ("b", "b-x", "b.c", "c/d", "c/e/f", "c0", "cc/g"):
+        repo.write(path, f"{path}\n")
+    repo.commit("first")
+    for path in ("b", "b-x", "c/d", "c0", "cc/g", "c/new"):
+        repo.write(path, f"{path} changed\n")
+    os.remove(os.path.join(repo.path, "c", "e", "f"))
+    os.remove(os.path.join(repo.path, "b.c"))
+    for args in (["b"], ["c"], ["b", "c", "b.c"], ["."]):
+        assert staged_by(repo, "dit", *args)[:2] == \
+            staged_by(repo, "git", *args)[:2]
+
+
+def test_ignored_files_need_force(repo):
+    """An ignored untracked file named on the command line is refused,
+    while the other paths are added; -f adds it, and a tracked ignored
+    file is added without -f."""
+    repo.write(".gitignore", "*.log\nbuild/\n")
+    repo.write("tracked.log", "t\n")
+    repo.git("add", "-f", "tracked.log")
+    repo.commit("first")
+    for path in ("a.log", "b", "tracked.log", "d/c.log", "build/x"):
+        repo.write(path, f"{path} changed\n")
+    for args in (["a.log", "b", "tracked.log"], ["d/c.log"], ["build/x"],
+                 ["d"], ["-f", "a.log", "build/x"]):
+        index, status, stderr = staged_by(repo, "dit", *args)
+        assert (index, status) == staged_by(repo, "git", *args)[:2]
+        if status:
+            assert stderr.startswith("The following paths are ignored")
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Tests of dit cat-file --batch and --batch-check, against git."""
+
+import hashlib
+import os
+
+
+def write_colliding_blobs(repo):
+    """Write two blobs whose shas share their first 4 digits.
+    Returns:
+        The 4 digit prefix of both blobs.
+    """
+    seen = {}
+    for number in range(1 << 16):
+        data = f"{number}\n".encode()
+        sha = hashlib.sha1(b"blob %d\x00" % len(data) + data).hexdigest()
+        if sha[:4] in seen:
+            break
+        seen[sha[:4]] = data
+    for blob in (seen[sha[:4]], data):
+        repo.run(["git", "hash-object", "-w", "--stdin"],
+                 input_data=blob.decode())
+    return sha[:4]
+
+
+def test_batch_check_matches_git(repo):
+    """Names are split from %(rest) only when the format uses it, and
+    ambiguous short shas are reported as such."""
+    head = repo.commit("first")
+    prefix = write_colliding_blobs(repo)
+    lines = f"{prefix}\n{prefix} x\n{head[:7]} a  b\nHEAD\tz y\nnosuch\n"
+    for option in ("--batch-check", "--batch-check=%(objectname) [%(rest)]",
+                   "--batch=%(objecttype) %(rest)"):
+        assert repo.dit("cat-file", option, input_data=lines).stdout == \
+            repo.git("cat-file", option, input_data=lines)
+
+
+def test_corrupt_object_has_no_header(repo):
+    """--batch reads an object whole before writing its header: a corrupt
+    object is answered as missing, with no header or partial contents."""
+    sha = repo.git("hash-object", "-w", "--stdin",
+                   input_data="a\n" * 100000).strip()
+    path = os.path.join(repo.path, ".git", "objects", sha[:2], sha[2:])
+    with open(path, "rb") as f:
+        data = f.read()
+    os.chmod(path, 0o644)
+    with open(path, "wb") as f:
+        f.write(data[:len(data) // 2])
+    assert repo.dit("cat-file", "--batch", input_data=f"{sha}\n").stdout \
+        == f"{sha} missing\n"
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Tests of dit checkout, against what git does."""
+
+import os
+import shutil
+
+import pytest
+
+
+def make_branches(repo):
+    """Commit d/e/a and b on main, and a branch b1 changing d/e/a."""
+    repo.write("d/e/a", "one\n")
+    repo.write("b", "bee\n")
+    repo.commit("first")
+    repo.git("branch", "b1")
+    repo.git("checkout", "-q", "b1")
+    repo.write("d/e/a", "two\n")
+    repo.commit("second")
+    repo.git("checkout", "-q", "main")
+
+
+def copy_repo(repo, tmp_path):
+    """Return a runner of a copy of the repository."""
+    copy = type(repo)(tmp_path / "copy")
+    shutil.copytree(repo.path, copy.path, symlinks=True)
+    return copy
+
+
+def test_checkout_switches_files(repo):
+    """The files that differ are written, and the index matches git's."""
+    make_branches(repo)
+    repo.dit("checkout", "b1")
+    assert repo.git("symbolic-ref", "HEAD").strip() == "refs/heads/b1"
+    with open(f"{repo.path}/d/e/a", encoding="utf-8") as f:
+        assert f.read() == "two\n"
+    assert repo.git("status", "--porcelain") == ""
+    assert repo.git("write-tree") == repo.git("rev-parse", "b1^{tree}")
+
+
+def test_checkout_keeps_staged_change(repo, tmp_path):
+    """A change staged to a file the checkout changes is not overwritten,
+    even after git write-tree recorded the tree of the index."""
+    make_branches(repo)
+    repo.write("d/e/a", "staged\n")
+    repo.git("add", "d/e/a")
+    repo.git("write-tree")
+    staged = repo.git("ls-files", "-s", "d/e/a")
+    copy = copy_repo(repo, tmp_path)
+
+    assert copy.git("checkout", "b1", check=False) == ""
+    assert copy.git("symbolic-ref", "HEAD").strip() == "refs/heads/main"
+    result = repo.dit("checkout", "b1", check=False)
+    assert result.returncode != 0
+    assert "d/e/a" in result.stderr
+    assert repo.git("symbolic-ref", "HEAD").strip() == "refs/heads/main"
+    assert repo.git("ls-files", "-s", "d/e/a") == staged
+
+
+def test_checkout_carries_staged_change(repo, tmp_path):
+    """A change staged to a file the checkout leaves alone is carried over,
+    as git does."""
+    make_branches(repo)
+    repo.write("b", "staged\n")
+    repo.git("add", "b")
+    repo.git("write-tree")
+    copy = copy_repo(repo, tmp_path)
+
+    copy.git("checkout", "-q", "b1")
+    repo.dit("checkout", "b1")
+    assert repo.git("ls-files", "-s") == copy.git("ls-files", "-s")
+    assert repo.git("status", "--porcelain") == \
+        copy.git("status", "--porcelain")
+
+
+def write_tree(repo, entries):
+    """Write a tree as given, unchecked, from (mode, name, sha) entries.
+    Returns:
+        The sha of the tree.
+    """
+    data = b"".join(mode + b" " + name + b"\x00" + bytes.fromhex(sha)
+                    for mode, name, sha in entries)
+    path = os.path.join(repo.path, "..", "tree")
+    with open(path, "wb") as f:
+        f.write(data)
+    return repo.git("hash-object", "-t", "tree", "-w", "--literally",
+                    path).strip()
+
+
+@pytest.mark.parametrize("name", [b".git", b".GIT", b"..", b"."])
+def test_read_tree_refuses_bad_names(repo, name):
+    """A tree holding .git (in any case), . or .. is neither read into the
+    index nor written to the work tree."""
+    repo.commit("first")
+    blob = repo.git("hash-object", "-w", "--stdin",
+                    input_data="#!/bin/sh\necho pwned\n").strip()
+    hooks = write_tree(repo, [(b"100755", b"post-checkout", blob)])
+    parent = write_tree(repo, [(b"40000", b"hooks", hooks)])
+    tree = write_tree(repo, [(b"40000", name, parent)])
+    index = repo.git("ls-files", "-s")
+    for args in (["-u", tree], [tree]):
+        result = repo.dit("read-tree", *args, check=False)
+        assert result.returncode != 0
+        assert "invalid path" in result.stderr
+        assert repo.git("ls-files", "-s") == index
+    assert not os.path.exists(os.path.join(repo.path, ".git", "hooks",
+                                           "post-checkout"))
+
+
+def test_read_tree_refuses_duplicate_names(repo):
+    """A tree holding a blob and a tree of the same name is refused."""
+    repo.commit("first")
+    blob = repo.git("hash-object", "-w", "--stdin", input_data="x\n").strip()
+    sub_tree = write_tree(repo, [(b"100644", b"x", blob)])
+    tree = write_tree(repo, [(b"100644", b"a", blob),
+                             (b"40000", b"a", sub_tree)])
+    result = repo.dit("read-tree", "-u", tree, check=False)
+    assert result.returncode != 0
+    assert "duplicate entries for 'a'" in result.stderr
+    assert not os.path.exists(os.path.join(repo.path, "a"))
+
+
+def test_read_tree_does_not_write_through_symlinks(repo, tmp_path):
+    """A file is not written through a symbolic link to a directory out of
+    the work tree."""
+    repo.commit("first")
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    os.symlink(outside, os.path.join(repo.path, "d"))
+    blob = repo.git("hash-object", "-w", "--stdin", input_data="x\n").strip()
+    sub_tree = write_tree(repo, [(b"100644", b"x", blob)])
+    tree = write_tree(repo, [(b"40000", b"d", sub_tree)])
+    result = repo.dit("read-tree", "-u", tree, check=False)
+    assert result.returncode != 0
+    assert "symbolic link" in result.stderr
+    assert not os.listdir(outside)
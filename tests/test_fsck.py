@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Tests of the checks dit fsck makes on objects."""
+
+import os
+
+import pytest
+
+from src.dit_commands.fsck import check_tree
+
+# the sha of the entries of the trees:
+SHA = "e69de29bb2d1d6429bb1ec4e4b25f3e3a1c5c391"
+
+
+def tree_data(entries):
+    """Return the content of a tree made of (mode, name) entries."""
+    return b"".join(mode + b" " + name + b"\x00" + bytes.fromhex(SHA)
+                    for mode, name in entries)
+
+
+def test_sorted_tree_is_valid():
+    """A blob sorts before a tree of a name it is a prefix of, which sorts
+    as if its name ended with a slash."""
+    assert len(check_tree(tree_data([(b"100644", b"a"), (b"100644", b"a-b"),
+                                     (b"40000", b"a.c"), (b"40000", b"b"),
+                                     (b"100644", b"b0")]))) == 5
+
+
+@pytest.mark.parametrize("entries,error", [
+    ([(b"100644", b"a"), (b"100644", b"a")], "duplicate"),
+    ([(b"100644", b"a"), (b"40000", b"a")], "duplicate"),
+    ([(b"100644", b"a"), (b"100644", b"a-b"), (b"40000", b"a")],
+     "duplicate"),
+    ([(b"100644", b"b"), (b"100644", b"a")], "sorted"),
+    ([(b"40000", b"a"), (b"100644", b"a-b")], "sorted"),
+    ([(b"40000", b".GIT")], "bad name"),
+    ([(b"100644", b".Git")], "bad name"),
+])
+def test_bad_trees_are_reported(entries, error):
+    """Duplicate names, whatever the type of their entries, misordered
+    entries and .git in any case are errors."""
+    with pytest.raises(ValueError, match=error):
+        check_tree(tree_data(entries))
+
+
+def test_commit_graph_checksum_is_verified_not_loaded(repo):
+    """A commit-graph whose checksum is wrong is still used by history
+    walks, which do not read all of it, and is reported by commit-graph
+    verify and fsck."""
+    for number in range(5):
+        repo.commit(f"commit {number}", 1_600_000_000 + number)
+    repo.git("commit-graph", "write", "--reachable")
+    assert repo.dit("fsck").stdout == ""
+    path = os.path.join(repo.path, ".git", "objects", "info", "commit-graph")
+    os.chmod(path, 0o644)
+    with open(path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xff]))
+    result = repo.dit("rev-list", "HEAD")
+    assert (result.stdout, result.stderr) == (repo.git("rev-list", "HEAD"),
+                                              "")
+    result = repo.dit("commit-graph", "verify", check=False)
+    assert result.returncode == 1
+    assert "incorrect checksum" in result.stderr
+    result = repo.dit("fsck", check=False)
+    assert result.returncode == 1
+    assert "incorrect checksum" in result.stdout
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""Tests of dit hash-object, against what git hash-object prints."""
+
+import os
+
+
+def test_files_and_stdin_match_git(repo):
+    """Files, --stdin and --stdin-paths give the shas git gives."""
+    repo.write("a", "a\n")
+    repo.write("b/c", "c" * 100000)
+    assert repo.dit("hash-object", "a", "b/c").stdout == \
+        repo.git("hash-object", "a", "b/c")
+    assert repo.dit("hash-object", "--stdin", input_data="data\n").stdout \
+        == repo.git("hash-object", "--stdin", input_data="data\n")
+    assert repo.dit("hash-object", "--stdin-paths",
+                    input_data="a\nb/c\n").stdout == \
+        repo.git("hash-object", "--stdin-paths", input_data="a\nb/c\n")
+
+
+def test_stdin_with_stdin_paths_is_refused(repo):
+    """--stdin and --stdin-paths cannot both read stdin, as in git."""
+    repo.write("a", "a\n")
+    result = repo.dit("hash-object", "--stdin", "--stdin-paths",
+                      input_data="a\n", check=False)
+    assert result.returncode != 0
+    assert result.stdout == ""
+    assert "Can't use --stdin-paths with --stdin" in result.stderr
+    assert repo.git("hash-object", "--stdin", "--stdin-paths",
+                    input_data="a\n", check=False) == ""
+
+
+def test_unreadable_files_are_fatal(repo):
+    """A missing file, or a directory, ends hash-object as it ends git
+    hash-object, after the shas of the files before it."""
+    repo.write("a", "a\n")
+    os.mkdir(os.path.join(repo.path, "d"))
+    for jobs in ("1", "2"):
+        for name in ("nosuch", "d"):
+            result = repo.dit("hash-object", "-j", jobs, "a", name,
+                              check=False)
+            expected = repo.run(["git", "hash-object", "a", name],
+                                check=False)
+            assert (result.returncode, result.stdout, result.stderr) == \
+                (expected.returncode, expected.stdout, expected.stderr)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Tests of the index: read and written again by dit, git sees the same
+entries."""
+
+import os
+
+import pytest
+
+from src.repos.gitrepo_class import GitRepo
+from src.repos.index_class import read_index, write_index
+
+
+def make_index(repo):
+    """Commit a few files, then stage a change, a removal, an executable, a
+    new file and an intent-to-add entry."""
+    repo.write("a", "a\n")
+    repo.write("b/c", "c\n")
+    repo.write("b/d/e", "e\n")
+    repo.write("f", "f\n")
+    repo.commit("first")
+    repo.write("a", "changed\n")
+    repo.write("b/new", "new\n")
+    repo.write("run", "#!/bin/sh\n")
+    os.chmod(os.path.join(repo.path, "run"), 0o755)
+    repo.write("ita/g", "g\n")
+    repo.git("add", "a", "b/new", "run")
+    repo.git("add", "-N", "ita/g")
+    repo.git("rm", "-q", "--cached", "f")
+    # files older than the index, so that no entry is smudged as racy:
+    past = os.stat(os.path.join(repo.path, "a")).st_mtime - 60
+    for path in ("a", "b/c", "b/d/e", "b/new", "run", "ita/g"):
+        os.utime(os.path.join(repo.path, path), (past, past))
+    repo.git("update-index", "-q", "--refresh")
+
+
+def index_state(repo):
+    """Return what git reads from the index: its entries with their stat
+    data, the status and the flags of each entry."""
+    return (repo.git("ls-files", "-s", "--debug"),
+            repo.git("status", "--porcelain"),
+            repo.git("ls-files", "-t", "-v"))
+
+
+def index_version(repo):
+    """Return the version of the index file, from its header."""
+    with open(os.path.join(repo.path, ".git", "index"), "rb") as f:
+        return int.from_bytes(f.read(8)[4:], "big")
+
+
+@pytest.mark.parametrize("version", [2, 3, 4])
+def test_round_trip_keeps_entries(repo, version):
+    """An index git wrote, read and written again by dit, has the same
+    entries, stat data and flags for git (which writes version 2 as 3,
+    since some entries have extended flags)."""
+    make_index(repo)
+    repo.git("update-index", "--index-version", str(version))
+    repo.git("update-index", "--skip-worktree", "b/c")
+    before = index_state(repo) + (index_version(repo),)
+    git_repo = GitRepo(repo.path)
+    index = read_index(git_repo)
+    write_index(git_repo, index)
+    assert index_state(repo) + (index_version(repo),) == before
+
+
+def test_read_tree_matches_git(repo):
+    """The index dit read-tree writes lists what git read-tree lists."""
+    make_index(repo)
+    repo.git("read-tree", "HEAD")
+    expected = (repo.git("ls-files", "-s"), repo.git("write-tree"),
+                repo.git("status", "--porcelain"))
+    repo.git("read-tree", "--empty")
+    repo.dit("read-tree", "HEAD")
+    assert (repo.git("ls-files", "-s"), repo.git("write-tree"),
+            repo.git("status", "--porcelain")) == expected
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Tests of dit pack-refs and dit show-ref, against git."""
+
+import os
+
+from src.dit_commands import pack_refs
+from src.repos.gitrepo_class import GitRepo
+
+# a sha no object of the tests has:
+MISSING = "1234567890123456789012345678901234567890"
+
+
+def make_refs(repo):
+    """Commit, tag it with an annotated tag, and add a loose branch
+    pointing to a missing object."""
+    repo.commit("first")
+    repo.git("tag", "-a", "-m", "v1", "v1")
+    repo.write(".git/refs/heads/broken", f"{MISSING}\n")
+
+
+def test_broken_ref_is_not_peeled(repo):
+    """show-ref -d lists a ref to a missing object without peeling it."""
+    make_refs(repo)
+    result = repo.dit("show-ref", "-d")
+    assert f"{MISSING} refs/heads/broken\n" in result.stdout
+    assert "refs/tags/v1^{}\n" in result.stdout
+
+
+def test_broken_ref_stays_loose(repo):
+    """pack-refs --all packs the refs git packs, and leaves a ref to a
+    missing object loose as git does."""
+    make_refs(repo)
+    result = repo.dit("pack-refs", "--all")
+    assert result.stderr == \
+        "error: refs/heads/broken does not point to a valid object!\n"
+    with open(os.path.join(repo.path, ".git", "packed-refs"),
+              encoding="utf-8") as f:
+        packed = f.read()
+    refs = os.path.join(repo.path, ".git", "refs")
+    loose = sorted(os.path.relpath(os.path.join(root, name), refs)
+                   for root, _, names in os.walk(refs) for name in names)
+    repo.git("pack-refs", "--all")
+    with open(os.path.join(repo.path, ".git", "packed-refs"),
+              encoding="utf-8") as f:
+        assert f.read() == packed
+    assert loose == ["heads/broken"]
+
+
+def test_refs_are_pruned_locked(repo, monkeypatch):
+    """Loose refs are pruned while packed-refs is still locked."""
+    repo.commit("first")
+    repo.git("branch", "other")
+    lock = os.path.join(repo.path, ".git", "packed-refs.lock")
+    locked = []
+    prune = pack_refs.prune_loose_refs
+
+    def check_prune(git_repo, refs):
+        locked.append(os.path.exists(lock))
+        prune(git_repo, refs)
+    monkeypatch.setattr(pack_refs, "prune_loose_refs", check_prune)
+    pack_refs.pack_refs(GitRepo(repo.path), pack_all=True)
+    assert locked == [True]
+    assert not os.path.exists(lock)
+    assert not os.path.exists(os.path.join(repo.path, ".git", "refs",
+                                           "heads", "other"))
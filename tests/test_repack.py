@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Tests of dit repack and of the pack writer."""
+
+import collections
+import glob
+
+from src.objects import read_object as read_object_module
+from src.objects.find_object import loose_object_shas
+from src.objects.write_pack import write_pack
+from src.repos.gitrepo_class import GitRepo
+
+
+def make_history(repo, revisions=6):
+    """Commit a few revisions of a few files, each changing a line."""
+    for revision in range(revisions):
+        for index in range(4):
+            lines = [f"line {line} of file {index}\n" for line in range(50)]
+            lines[revision * 7 % 50] = f"revision {revision}\n"
+            repo.write(f"d{index % 2}/f{index}", "".join(lines))
+        repo.commit(f"revision {revision}")
+
+
+def test_repack_is_valid_for_git(repo):
+    """git reads every object of the pack dit writes, and finds none
+    missing."""
+    make_history(repo)
+    objects = sorted(repo.git("cat-file", "--batch-all-objects",
+                              "--batch-check").splitlines())
+    repo.dit("repack", "-d")
+    assert repo.git("count-objects", "-v").startswith("count: 0\n")
+    repo.git("fsck", "--strict")
+    packs = glob.glob(f"{repo.path}/.git/objects/pack/pack-*.idx")
+    assert len(packs) == 1
+    repo.git("verify-pack", packs[0])
+    assert sorted(repo.git("cat-file", "--batch-all-objects",
+                           "--batch-check").splitlines()) == objects
+
+
+def test_write_pack_inflates_each_object_once(repo, tmp_path, monkeypatch):
+    """The objects are only inflated whole once, to be packed: their sizes
+    come from their headers, and the trees read for their names are kept.
+    """
+    make_history(repo)
+    git_repo = GitRepo(repo.path)
+    shas = list(loose_object_shas(git_repo))
+    inflated = collections.Counter()
+    read_loose_object = read_object_module.read_loose_object
+
+    def counting_read(path):
+        inflated[path] += 1
+        return read_loose_object(path)
+    monkeypatch.setattr(read_object_module, "read_loose_object",
+                        counting_read)
+    # blobs are cached once read, which would hide a second inflation:
+    monkeypatch.setattr(git_repo.object_cache, "get_raw", lambda sha: None)
+
+    _, entries = write_pack(git_repo, shas, str(tmp_path / "pack"))
+    assert len(entries) == len(shas)
+    assert len(inflated) == len(shas)
+    assert set(inflated.values()) == {1}
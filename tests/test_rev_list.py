@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Tests of dit rev-list, against what git rev-list lists."""
+
+import os
+import random
+
+import pytest
+
+# the commits of the random history, and the ranges listed in it:
+COMMITS = 300
+RANGES = 60
+
+
+def make_history(repo, skew, seed=0):
+    """Commit a random history of merges and branches with git fast-import.
+    Each commit is a minute after its first parent, give or take up to skew
+    seconds, so that a commit can be older than its parents.
+    Returns:
+        The list of the shas of the commits, in the order they were made.
+    """
+    rng = random.Random(seed)
+    lines = []
+    dates = []
+    for number in range(COMMITS):
+        parents = []
+        if number:
+            parents.append(rng.randrange(max(0, number - 20), number))
+            if number > 2 and rng.random() < 0.3:
+                other = rng.randrange(number)
+                if other not in parents:
+                    parents.append(other)
+        date = (dates[parents[0]] if parents else 1600000000) + 60 + \
+            rng.randint(-skew, skew)
+        dates.append(date)
+        message = f"commit {number}\n"
+        lines += [f"commit refs/heads/c{number}", f"mark :{number + 1}",
+                  f"committer C O Mitter <committer@example.com> {date} "
+                  "+0000", f"data {len(message)}", message.rstrip("\n")]
+        if parents:
+            lines.append(f"from :{parents[0] + 1}")
+            lines += [f"merge :{parent + 1}" for parent in parents[1:]]
+        lines.append(f"M 644 inline f{number % 7}")
+        lines += [f"data {len(message)}", message.rstrip("\n"), ""]
+    repo.git("fast-import", "--quiet", input_data="\n".join(lines) + "\n")
+    return [repo.git("rev-parse", f"c{number}").strip()
+            for number in range(COMMITS)]
+
+
+def reachable_difference(repo, include, exclude):
+    """Return the commits reachable from include but not from exclude, from
+    whole histories listed by git (exact whatever the dates)."""
+    listed = set(repo.git("rev-list", *include).split())
+    if exclude:
+        listed -= set(repo.git("rev-list", *exclude).split())
+    return listed
+
+
+@pytest.mark.parametrize("skew, commit_graph", [
+    (0, False), (30, False), (3000, False), (3000, True), (6 * 3600, True)])
+def test_ranges_are_exact(repo, skew, commit_graph):
+    """A..B lists the commits reachable from B and not from A, however
+    skewed the dates are.
+    git rev-list A..B itself stops walking A early, by a slop of a few
+    commits, so with dates skewed by minutes it lists commits reachable
+    from A: it is only compared with when the dates are hardly skewed.
+    Without a commit-graph, dit relies on DATE_SLOP, which skews of hours
+    summed over many commits can exceed; with one, generations are exact.
+    """
+    shas = make_history(repo, skew)
+    if commit_graph:
+        repo.git("commit-graph", "write", "--reachable")
+    rng = random.Random(1)
+    for _ in range(RANGES):
+        start, end = rng.sample(shas, 2)
+        listed = repo.dit("rev-list", f"{start}..{end}").stdout.split()
+        assert len(listed) == len(set(listed))
+        assert set(listed) == reachable_difference(repo, [end], [start]), \
+            f"{start}..{end}"
+        if skew <= 60:
+            assert set(listed) == set(repo.git(
+                "rev-list", f"{start}..{end}").split())
+
+
+def test_exclusions_are_exact(repo):
+    """Several commits, some excluded with ^, list the commits reachable
+    from the others only."""
+    shas = make_history(repo, 3000, seed=2)
+    rng = random.Random(3)
+    for _ in range(20):
+        picked = rng.sample(shas, 4)
+        listed = repo.dit("rev-list", picked[0], picked[1], f"^{picked[2]}",
+                          f"^{picked[3]}").stdout.split()
+        assert set(listed) == reachable_difference(repo, picked[:2],
+                                                   picked[2:]), picked
+
+
+def test_history_order_matches_git(repo):
+    """Without exclusions, the commits are listed in git's order."""
+    shas = make_history(repo, 0)
+    assert repo.dit("rev-list", shas[-1]).stdout == \
+        repo.git("rev-list", shas[-1])
+
+
+def check_objects_listing(repo, ranges):
+    """Check that rev-list --objects lists the objects of ranges with their
+    paths, in git's order, whether there is a bitmap file or not, and that
+    the counts are the same too; --use-bitmap-index lists the same objects,
+    from the bitmaps."""
+    expected = {tuple(revisions): repo.git("rev-list", "--objects",
+                                           *revisions)
+                for revisions in ranges}
+    repo.dit("bitmap", "write", "--interval", "10")
+    bitmap = os.path.join(repo.path, ".git", "objects", "info", "bitmap")
+    assert os.path.exists(bitmap)
+    for present in (True, False):
+        for revisions in ranges:
+            listed = repo.dit("rev-list", "--objects", *revisions).stdout
+            assert listed == expected[tuple(revisions)], (present, revisions)
+            assert repo.dit("rev-list", "--objects", "--count",
+                            *revisions).stdout == \
+                f"{len(listed.splitlines())}\n"
+            assert repo.dit("rev-list", "--count", *revisions).stdout == \
+                repo.git("rev-list", "--count", *revisions)
+            by_bitmap = repo.dit("rev-list", "--objects", "--use-bitmap-index",
+                                 *revisions).stdout
+            assert sorted(line.split(" ")[0] for line in
+                          by_bitmap.splitlines()) == \
+                sorted(line.split(" ")[0] for line in listed.splitlines())
+        if present:
+            os.rename(bitmap, bitmap + ".moved")
+
+
+def test_objects_are_listed_as_git_with_bitmaps(repo):
+    """The objects of a history of merges, annotated tags included, are
+    listed as git lists them, with or without bitmaps."""
+    shas = make_history(repo, 0)
+    repo.git("tag", "-a", "-m", "tag", "v1", shas[150])
+    check_objects_listing(repo, [["--all"], [shas[-1]],
+                                 [f"{shas[100]}..{shas[-1]}"]])
+
+
+def test_nested_trees_are_listed_as_git(repo):
+    """The trees and blobs below nested trees are listed depth first, in
+    the order of their trees, as git lists them."""
+    shas = []
+    for revision in range(12):
+        for path in ("a/b/c", "a/d", "a/b/e/f", "g", "h/i"):
+            if revision % 3 == len(path) % 3:
+                repo.write(path, f"{path} {revision}\n")
+        repo.write(f"x/{revision % 4}/y", f"{revision}\n")
+        shas.append(repo.commit(f"revision {revision}"))
+    check_objects_listing(repo, [["--all"], [f"{shas[5]}..{shas[-1]}"],
+                                 [f"^{shas[2]}", shas[8]]])
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Tests of the dit daemon and of its client."""
+
+import os
+import socket
+
+from src.client import forward, socket_is_private
+from src.dit_commands.serve import Daemon
+
+
+def test_client_trusts_private_sockets_only(repo, tmp_path, monkeypatch):
+    """A command is not forwarded to a socket another user could have put
+    there: one in a directory others may enter, or that others may
+    connect to."""
+    directory = tmp_path / "sockets"
+    directory.mkdir(mode=0o700)
+    path = str(directory / "dit.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(path)
+        server.listen()
+        os.chmod(path, 0o600)
+        assert socket_is_private(path)
+        os.chmod(path, 0o666)
+        assert not socket_is_private(path)
+        os.chmod(path, 0o600)
+        os.chmod(directory, 0o755)
+        assert not socket_is_private(path)
+        monkeypatch.setenv("DIT_SOCKET", path)
+        monkeypatch.delenv("DIT_NO_DAEMON", raising=False)
+        monkeypatch.delenv("DIT_TRACE", raising=False)
+        monkeypatch.chdir(repo.path)
+        assert forward(["show-ref"]) is None
+    assert not socket_is_private(str(tmp_path / "missing.sock"))
+
+
+def test_corrupt_object_fails_the_request(repo):
+    """A request reading a corrupt object is answered with an error, and
+    the next request on the connection is still answered."""
+    sha = repo.git("hash-object", "-w", "--stdin", input_data="a\n").strip()
+    path = os.path.join(repo.path, ".git", "objects", sha[:2], sha[2:])
+    os.chmod(path, 0o644)
+    with open(path, "wb") as f:
+        f.write(b"not zlib data")
+    daemon = Daemon()
+    response = daemon.answer({"op": "read-object", "repo": repo.path,
+                              "name": sha, "header": False, "pretty": False})
+    assert set(response) == {"error"}
+    assert daemon.answer({"op": "ping"}) == {"pid": os.getpid()}
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""Tests of dit status, against what git status prints."""
+
+import os
+
+
+def test_porcelain_matches_git(repo):
+    """Staged, unstaged and untracked changes are reported as git does."""
+    repo.write("a", "a\n")
+    repo.write("b/c", "c\n")
+    repo.write("b/d", "d\n")
+    repo.commit("first")
+    repo.write("a", "changed\n")
+    repo.write("b/c", "staged\n")
+    repo.git("add", "b/c")
+    repo.write("b/c", "staged, then changed\n")
+    os.remove(os.path.join(repo.path, "b", "d"))
+    repo.write("new", "new\n")
+    repo.git("add", "new")
+    repo.write("untracked/e", "e\n")
+    assert repo.dit("status", "--porcelain").stdout == \
+        repo.git("status", "--porcelain")
+
+
+def test_intent_to_add_is_unstaged(repo):
+    """An entry added with git add -N is a new file of the work tree, or a
+    deleted one once its file is gone, but nothing staged."""
+    repo.write("a", "a\n")
+    repo.commit("first")
+    repo.write("c/nn", "nn\n")
+    repo.write("gone", "gone\n")
+    repo.git("add", "-N", "c/nn", "gone")
+    os.remove(os.path.join(repo.path, "gone"))
+    expected = repo.git("status", "--porcelain")
+    assert expected == " A c/nn\n D gone\n"
+    assert repo.dit("status", "--porcelain").stdout == expected
+    long_format = repo.dit("status").stdout
+    assert "Changes to be committed" not in long_format
+    assert "\tnew file:   c/nn\n" in long_format
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Tests of the DIT_TRACE spans."""
+
+import json
+
+from src.trace import read_trace, summarize
+
+
+def make_tree(repo):
+    """Commit a tree of a few directories of files."""
+    for directory in range(64):
+        for number in range(8):
+            repo.write(f"d{directory}/s{number % 4}/f{number}",
+                       f"{directory} {number}\n")
+    return repo.commit("tree")
+
+
+def test_spans_nest_per_thread(repo, tmp_path):
+    """The spans of the threads of ls-tree -r -j 8 each have the parent
+    open in their own thread, and contain it in time."""
+    make_tree(repo)
+    for run in range(3):
+        trace = tmp_path / f"trace{run}.json"
+        repo.dit("ls-tree", "-r", "-j", "8", "HEAD",
+                 env={"DIT_TRACE": str(trace)})
+        with open(trace, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        check_nesting(records)
+
+
+def check_nesting(records):
+    """Check that each span has a parent open in its thread around it."""
+    spans = {record["id"]: record for record in records}
+    assert len(spans) == len(records)
+    assert any(record["name"] == "read_object" for record in records)
+    for record in records:
+        if record["parent"] is None:
+            continue
+        parent = spans[record["parent"]]
+        assert parent.get("tid") == record.get("tid")
+        assert parent["start_us"] <= record["start_us"]
+        assert record["start_us"] + record["dur_us"] <= \
+            parent["start_us"] + parent["dur_us"] + 1
+
+
+def test_summary_self_time():
+    """The self time of a span is what its children did not take."""
+    lines = [
+        '{"pid":1,"tid":1,"id":2,"parent":1,"name":"read_object",'
+        '"start_us":10,"dur_us":30,"counters":{"inflate_bytes":5}}',
+        '{"pid":1,"tid":1,"id":1,"parent":null,"name":"command",'
+        '"start_us":0,"dur_us":100}',
+        "not a span",
+    ]
+    summary = summarize(read_trace(lines))
+    assert summary["command"]["self_us"] == 70
+    assert summary["read_object"]["calls"] == 1
+    assert summary["read_object"]["counters"] == {"inflate_bytes": 5}
+
+
+def test_command_reports_cache_counters(repo, tmp_path):
+    """The command span holds the hits, misses and evictions of the object
+    caches, including the header lookups of cat-file --batch-check."""
+    tree = repo.git("rev-parse", f"{make_tree(repo)}^{{tree}}").strip()
+    trace = tmp_path / "trace.json"
+    repo.dit("cat-file", "--batch-check", env={"DIT_TRACE": str(trace)},
+             input_data=f"{tree}\n{tree}\n")
+    with open(trace, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    command = next(record for record in records
+                   if record["name"] == "command")
+    assert command["counters"]["raw_cache_misses"] >= 1
+    assert set(command["counters"]) >= {
+        "parsed_cache_hits", "parsed_cache_misses", "raw_cache_hits",
+        "raw_cache_evictions"}
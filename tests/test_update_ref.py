@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Tests of dit update-ref and of ref transactions."""
+
+import glob
+import os
+
+import pytest
+
+from src.dit_commands import ref_transaction
+from src.dit_commands.ref_transaction import RefTransaction
+from src.repos.gitrepo_class import GitRepo
+from src.repos.lock_file import LockFile
+
+
+def test_values_resolve_as_git(repo):
+    """A branch, a tag and a sha prefix set a ref as git would."""
+    first = repo.commit("first")
+    second = repo.commit("second")
+    repo.git("tag", "v1", first)
+    repo.dit("update-ref", "refs/heads/a", "v1")
+    repo.dit("update-ref", "refs/heads/b", second[:8])
+    repo.dit("update-ref", "refs/heads/c", "main")
+    repo.dit("update-ref", "refs/heads/c", "v1", "main")
+    assert repo.git("rev-parse", "a", "b", "c").split() == \
+        [first, second, first]
+    result = repo.dit("update-ref", "refs/heads/d", "nosuchname",
+                      check=False)
+    assert result.returncode == 128
+    assert "invalid object name nosuchname" in result.stderr
+
+
+def test_failed_transaction_restores_packed_refs(repo, monkeypatch):
+    """When a ref cannot be renamed into place, a packed ref deleted in
+    the same transaction is put back in packed-refs."""
+    first = repo.commit("first")
+    second = repo.commit("second")
+    repo.git("branch", "packed", first)
+    repo.git("pack-refs", "--all")
+    repo.git("branch", "loose", first)
+    with open(f"{repo.path}/.git/packed-refs", encoding="utf-8") as f:
+        packed = f.read()
+
+    commit = LockFile.commit
+
+    def failing_commit(lock):
+        if lock.path.endswith("loose"):
+            raise OSError("disk full")
+        commit(lock)
+    monkeypatch.setattr(LockFile, "commit", failing_commit)
+
+    transaction = RefTransaction(GitRepo(repo.path))
+    transaction.delete("refs/heads/packed")
+    transaction.update("refs/heads/loose", second)
+    with pytest.raises(OSError):
+        transaction.commit()
+    monkeypatch.undo()
+
+    assert repo.git("rev-parse", "packed", "loose").split() == \
+        [first, first]
+    with open(f"{repo.path}/.git/packed-refs", encoding="utf-8") as f:
+        assert "refs/heads/packed" in f.read()
+    assert "refs/heads/packed" in packed
+
+
+def test_failed_transaction_restores_under_locks(repo, monkeypatch):
+    """The refs a failed transaction already changed are put back under
+    their locks, and packed-refs stays locked until they are."""
+    first = repo.commit("first")
+    second = repo.commit("second")
+    repo.git("branch", "packed", first)
+    repo.git("pack-refs", "--all")
+    repo.git("branch", "changed", first)
+    repo.git("branch", "loose", first)
+    git_dir = f"{repo.path}/.git"
+
+    commit = LockFile.commit
+    replace = LockFile.replace
+    events = []
+
+    def failing_commit(lock):
+        if lock.path.endswith("loose"):
+            assert os.path.exists(f"{git_dir}/packed-refs.lock")
+            raise OSError("disk full")
+        events.append(("commit", os.path.basename(lock.path)))
+        commit(lock)
+
+    def tracked_replace(lock, data):
+        assert os.path.exists(lock.lock_path)
+        events.append(("replace", os.path.basename(lock.path)))
+        replace(lock, data)
+    monkeypatch.setattr(LockFile, "commit", failing_commit)
+    monkeypatch.setattr(LockFile, "replace", tracked_replace)
+
+    transaction = RefTransaction(GitRepo(repo.path))
+    transaction.delete("refs/heads/packed")
+    transaction.update("refs/heads/changed", second)
+    transaction.update("refs/heads/loose", second)
+    with pytest.raises(OSError):
+        transaction.commit()
+    monkeypatch.undo()
+
+    # packed-refs written, "changed" moved then put back, packed-refs put
+    #  back:
+    assert events == [("replace", "packed-refs"), ("commit", "changed"),
+                      ("commit", "changed"), ("replace", "packed-refs")]
+    assert repo.git("rev-parse", "packed", "changed", "loose").split() == \
+        [first, first, first]
+    assert not glob.glob(f"{git_dir}/**/*.lock*", recursive=True)
+
+
+def test_deleted_ref_is_removed_locked(repo, monkeypatch):
+    """A loose ref is deleted while its lock is held."""
+    first = repo.commit("first")
+    repo.git("branch", "gone", first)
+    removed = []
+    remove = os.remove
+
+    def checked_remove(path):
+        if path.endswith("gone"):
+            assert os.path.exists(path + ".lock")
+            removed.append(path)
+        remove(path)
+    monkeypatch.setattr(ref_transaction.os, "remove", checked_remove)
+    transaction = RefTransaction(GitRepo(repo.path))
+    transaction.delete("refs/heads/gone", first)
+    transaction.commit()
+    monkeypatch.undo()
+    assert removed
+    assert repo.git("branch", "--list", "gone") == ""
+
+
+def test_rollback_after_commit_keeps_other_locks(tmp_path):
+    """Rolling back a lock already committed leaves alone the lock another
+    writer took since."""
+    path = str(tmp_path / "file")
+    lock = LockFile(path)
+    lock.write("mine\n")
+    lock.commit()
+    other = LockFile(path)
+    lock.rollback()
+    assert os.path.exists(other.lock_path)
+    other.rollback()
+
+
+def test_ref_directory_conflicts_are_fatal(repo):
+    """A ref cannot be created where a ref is a directory of it, nor where
+    a directory of refs has its name: update-ref fails as git does."""
+    repo.commit("first")
+    repo.git("branch", "a")
+    repo.git("branch", "x/y")
+    for ref in ("refs/heads/a/b", "refs/heads/x"):
+        result = repo.dit("update-ref", ref, "HEAD", check=False)
+        assert result.returncode == 128
+        assert result.stderr.startswith("fatal: cannot lock ref")
+        assert repo.git("update-ref", ref, "HEAD", check=False) == ""
+    assert repo.git("for-each-ref", "--format=%(refname)") == \
+        "refs/heads/a\nrefs/heads/main\nrefs/heads/x/y\n"
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Tests of dit write-tree, against the trees git writes."""
+
+import os
+
+
+def make_files(repo):
+    """Stage a few files, in nested directories."""
+    for path in ("a", "b/c", "b/d/e", "b/d/f", "g/h"):
+        repo.write(path, f"{path}\n")
+    repo.git("add", "-A")
+
+
+def test_trees_match_git(repo):
+    """The tree of a listing is the one git writes from the index."""
+    make_files(repo)
+    listing = repo.git("ls-files", "-s")
+    assert repo.dit("write-tree", input_data=listing).stdout == \
+        repo.git("write-tree")
+    repo.git("fsck", "--strict", "--no-dangling")
+
+
+def test_duplicates_are_refused(repo):
+    """A path listed twice, or both as a file and a directory, would make a
+    tree with duplicate entries."""
+    make_files(repo)
+    listing = repo.git("ls-files", "-s")
+    line = listing.split("\n")[0]
+    sha = line.split(" ")[1]
+    for bad in (listing + line + "\n",
+                listing + f"100644 {sha} 0\ta/x\n",
+                f"100644 {sha} 0\tb/c/x\n" + listing):
+        result = repo.dit("write-tree", input_data=bad, check=False)
+        assert result.returncode == 128
+        assert result.stderr.startswith("fatal: ")
+        assert result.stdout == ""
+
+
+def test_pruned_trees_are_written_again(repo):
+    """A tree of the cache-tree that is gone is built and written again,
+    not taken from the cache-tree."""
+    make_files(repo)
+    listing = repo.git("ls-files", "-s")
+    tree = repo.dit("write-tree", input_data=listing).stdout.strip()
+    sub_tree = repo.git("rev-parse", f"{tree}:b/d").strip()
+    for sha in (tree, sub_tree):
+        os.remove(os.path.join(repo.path, ".git", "objects", sha[:2],
+                               sha[2:]))
+    assert repo.dit("write-tree", input_data=listing).stdout.strip() == tree
+    assert repo.git("ls-tree", "-r", "--name-only", tree) == \
+        repo.git("ls-files")